@@ -0,0 +1,80 @@
+import time
+
+import numpy as np
+
+from extra_foam.algorithms import (
+    SimpleSequence, SimpleVectorSequence, SimplePairSequence
+)
+
+
+def _run(seq, chunks, func):
+    t0 = time.perf_counter()
+    for chunk in chunks:
+        func(seq, chunk)
+    return time.perf_counter() - t0
+
+
+def benchmark_sequence(cls, max_len, n_chunks, chunk_size, *args):
+    if cls is SimpleVectorSequence:
+        size = args[0]
+        chunks = [np.random.randn(chunk_size, size) for _ in range(n_chunks)]
+
+        def append(seq, chunk):
+            for item in chunk:
+                seq.append(item)
+
+        def extend(seq, chunk):
+            seq.extend(chunk)
+
+    elif cls is SimplePairSequence:
+        chunks = [np.random.randn(2, chunk_size) for _ in range(n_chunks)]
+
+        def append(seq, chunk):
+            for x, y in zip(*chunk):
+                seq.append((x, y))
+
+        def extend(seq, chunk):
+            seq.extend_pairs(*chunk)
+
+    else:
+        chunks = [np.random.randn(chunk_size) for _ in range(n_chunks)]
+
+        def append(seq, chunk):
+            for item in chunk:
+                seq.append(item)
+
+        def extend(seq, chunk):
+            seq.extend(chunk)
+
+    seq_append = cls(*args, max_len=max_len)
+    dt_append = _run(seq_append, chunks, append)
+
+    seq_extend = cls(*args, max_len=max_len)
+    dt_extend = _run(seq_extend, chunks, extend)
+
+    np.testing.assert_array_equal(seq_append.data(), seq_extend.data())
+
+    t0 = time.perf_counter()
+    for _ in range(n_chunks):
+        seq_extend.data()
+    dt_data = (time.perf_counter() - t0) / n_chunks
+
+    print(f"\n{cls.__name__}, max_len = {max_len}, "
+          f"{n_chunks} x {chunk_size} items - \n"
+          f"dt (append): {dt_append:.4f}, "
+          f"dt (extend): {dt_extend:.4f}, "
+          f"dt (data): {dt_data * 1e6:.2f} us")
+
+
+if __name__ == "__main__":
+    print("*" * 80)
+    print("Benchmark data structures")
+    print("*" * 80)
+
+    max_len = 1000000
+    # e.g. 400 pulses per train, the history is wrapped twice
+    n_chunks, chunk_size = 5000, 400
+
+    benchmark_sequence(SimpleSequence, max_len, n_chunks, chunk_size)
+    benchmark_sequence(SimplePairSequence, max_len, n_chunks, chunk_size)
+    benchmark_sequence(SimpleVectorSequence, max_len, n_chunks, chunk_size, 2)
@@ -12,8 +12,8 @@ import time
 import numpy as np
 
 from extra_foam.algorithms import (
-    correct_image_data, mask_image_data, movingAvgImageData,
-    nanmean_image_data
+    correct_image_data, downsample_image, mask_image_data,
+    movingAvgImageData, nanmean_image_data
 )
 
 
@@ -232,6 +232,26 @@ def bench_correct_gain_offset(shape):
     _run_correct_image_array(data, np.float64, gain, offset)
 
 
+def bench_downsample_image(shape, factor):
+    for dtype in (np.uint16, np.float32):
+        img = (100 * np.random.rand(*shape)).astype(dtype)
+
+        t0 = time.perf_counter()
+        downsample_image(img, factor)
+        dt_cpp = time.perf_counter() - t0
+
+        h, w = shape[0] // factor * factor, shape[1] // factor * factor
+        t0 = time.perf_counter()
+        np.nanmean(img[:h, :w].astype(np.float32).reshape(
+            h // factor, factor, w // factor, factor), axis=(1, 3))
+        dt_py = time.perf_counter() - t0
+
+        print(f"\ndownsample image with shape {shape} by {factor}, "
+              f"dtype = {dtype} - \n"
+              f"dt (cpp): {dt_cpp:.4f}, "
+              f"dt (numpy): {dt_py:.4f}")
+
+
 if __name__ == "__main__":
     print("*" * 80)
     print("Benchmark image processing")
@@ -246,3 +266,5 @@ if __name__ == "__main__":
         bench_moving_average_image_array(s)
         bench_mask_image_array(s)
         bench_correct_gain_offset(s)
+        # 4-Mpixel camera
+        bench_downsample_image((2048, 2048), 4)
@@ -0,0 +1,40 @@
+import time
+
+import numpy as np
+from scipy.stats import binned_statistic
+
+from extra_foam.algorithms import compute_spectrum_1d
+
+
+def _compute_spectrum_1d_scipy(x, y, n_bins):
+    stats, edges, _ = binned_statistic(x, y, 'mean', n_bins)
+    counts, _, _ = binned_statistic(x, y, 'count', n_bins)
+    return stats, edges, counts
+
+
+def benchmark_spectrum_1d(n_points, n_ys, n_bins):
+    x = 600. + 10 * np.random.rand(n_points)
+    ys = np.random.rand(n_ys, n_points)
+
+    t0 = time.perf_counter()
+    stats_scipy = [_compute_spectrum_1d_scipy(x, y, n_bins)[0] for y in ys]
+    dt_scipy = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    stats, _, _ = compute_spectrum_1d(x, ys, n_bins)
+    dt_foam = time.perf_counter() - t0
+
+    np.testing.assert_allclose(stats_scipy, stats)
+
+    print(f"\n{n_points} points, {n_ys} y array(s), {n_bins} bins - \n"
+          f"dt (foam): {dt_foam:.4f}, dt (scipy): {dt_scipy:.4f}")
+
+
+if __name__ == "__main__":
+    print("*" * 80)
+    print("Benchmark spectrum")
+    print("*" * 80)
+
+    for n_ys in (1, 5):
+        benchmark_spectrum_1d(1000000, n_ys, 80)
+        benchmark_spectrum_1d(1000000, n_ys, 999)
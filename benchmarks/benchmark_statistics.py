@@ -3,8 +3,11 @@ import time
 import numpy as np
 
 from extra_foam.algorithms import (
-    nanmean, nansum
+    nanmean, nansum, nanstd, nanvar, nanhist_with_stats, compute_roi_foms,
+    mask_image_data, compute_asic_moments
 )
+from extra_foam.config import RoiFom
+from extra_foam.algorithms.statistics_py import _nanhist_with_stats_py
 
 
 def benchmark_nan_without_axis(f_cpp, f_py, shape, dtype):
@@ -45,6 +48,111 @@ def benchmark_nan_keep_zero_axis(f_cpp, f_py, shape, dtype):
           f"dt (numpy): {dt_py:.4f}")
 
 
+def benchmark_normalized_nan_var(f_cpp, f_py, shape, dtype):
+    data = np.random.randn(*shape).astype(dtype=dtype) + 1.  # shift to avoid very small mean
+    data[:, :3, ::3] = np.nan
+
+    t0 = time.perf_counter()
+    ret_cpp = f_cpp(data, axis=(-2, -1), normalized=True)
+    dt_cpp = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    ret_py = f_py(data, axis=(-2, -1)) / np.nanmean(data, axis=(-2, -1))
+    if f_py is np.nanvar:
+        ret_py /= np.nanmean(data, axis=(-2, -1))
+    dt_py = time.perf_counter() - t0
+
+    np.testing.assert_allclose(ret_cpp, ret_py, rtol=1e-4)
+
+    print(f"\nnormalized, keep zero axis, dtype = {dtype} - \n"
+          f"dt (cpp): {dt_cpp:.4f}, "
+          f"dt (numpy): {dt_py:.4f}")
+
+
+def benchmark_nanhist_with_stats(shape, dtype):
+    data = np.random.randn(*shape).astype(dtype)
+    data[::2, ::3] = np.nan
+    bin_range = (-2., 2.)
+
+    t0 = time.perf_counter()
+    ret_cpp = nanhist_with_stats(data, bin_range, 20)
+    dt_cpp = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    ret_py = _nanhist_with_stats_py(data, bin_range, 20)
+    dt_py = time.perf_counter() - t0
+
+    np.testing.assert_array_equal(ret_cpp[0], ret_py[0])
+
+    print(f"\nnanhist_with_stats, dtype = {dtype} - \n"
+          f"dt (cpp): {dt_cpp:.4f}, "
+          f"dt (numpy): {dt_py:.4f}")
+
+
+def benchmark_roi_foms(shape, dtype):
+    data = np.random.randn(*shape).astype(dtype)
+    data[:, ::2, ::3] = np.nan
+    image_mask = np.zeros(shape[-2:], dtype=bool)
+    image_mask[::5, ::7] = True
+    threshold_mask = (-2., 2.)
+    rects = [(0, 0, 200, 300), (100, 200, 300, 200),
+             (500, 500, 400, 400), (700, 100, 64, 64)]
+
+    for fom_type, handler in [(RoiFom.SUM, nansum),
+                              (RoiFom.MEDIAN, np.nanmedian),
+                              (RoiFom.STD, nanstd)]:
+        t0 = time.perf_counter()
+        ret_cpp = compute_roi_foms(data, rects, [fom_type] * len(rects),
+                                   image_mask=image_mask,
+                                   threshold_mask=threshold_mask)
+        dt_cpp = time.perf_counter() - t0
+
+        # per-ROI masking and reduction in the processor before
+        t0 = time.perf_counter()
+        ret_py = []
+        for x, y, w, h in rects:
+            roi = data[:, y:y + h, x:x + w].copy()
+            mask_image_data(roi,
+                            image_mask=image_mask[y:y + h, x:x + w],
+                            threshold_mask=threshold_mask)
+            ret_py.append(handler(roi, axis=(-2, -1)))
+        dt_py = time.perf_counter() - t0
+
+        np.testing.assert_allclose(ret_cpp, ret_py, rtol=1e-4)
+
+        print(f"\nroi foms ({fom_type.name}), dtype = {dtype} - \n"
+              f"dt (batched): {dt_cpp:.4f}, "
+              f"dt (per ROI): {dt_py:.4f}")
+
+
+def benchmark_asic_moments(n_modules, n_pulses, module_shape, asic_shape,
+                           dtype):
+    modules = [np.random.randn(n_pulses, *module_shape).astype(dtype)
+               for _ in range(n_modules)]
+    h, w = module_shape
+    ah, aw = asic_shape
+
+    t0 = time.perf_counter()
+    ret_cpp = compute_asic_moments(modules, asic_shape)
+    dt_cpp = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    data = np.stack(modules).reshape(
+        n_modules, n_pulses, h // ah, ah, w // aw, aw)
+    mean_py = np.nanmean(data, axis=(1, 3, 5))
+    var_py = np.nanvar(data, axis=(1, 3, 5))
+    dt_py = time.perf_counter() - t0
+
+    np.testing.assert_allclose(ret_cpp[..., 1], mean_py, atol=1e-4)
+    np.testing.assert_allclose(ret_cpp[..., 2] / ret_cpp[..., 0], var_py,
+                               rtol=1e-4)
+
+    print(f"\nasic moments, {n_modules} modules x {n_pulses} pulses, "
+          f"dtype = {dtype} - \n"
+          f"dt (cpp): {dt_cpp:.4f}, "
+          f"dt (numpy): {dt_py:.4f}")
+
+
 if __name__ == "__main__":
     print("*" * 80)
     print("Benchmark statistics functions")
@@ -52,9 +160,27 @@ if __name__ == "__main__":
 
     s = (16, 1096, 1120)
 
-    for f_cpp, f_py in [(nansum, np.nansum), (nanmean, np.nanmean)]:
+    for f_cpp, f_py in [(nansum, np.nansum), (nanmean, np.nanmean),
+                        (nanvar, np.nanvar), (nanstd, np.nanstd)]:
         print(f"\n----- {f_cpp.__name__} ------")
         benchmark_nan_without_axis(f_cpp, f_py, s, np.float32)
         benchmark_nan_without_axis(f_cpp, f_py, s, np.float64)
         benchmark_nan_keep_zero_axis(f_cpp, f_py, s, np.float32)
         benchmark_nan_keep_zero_axis(f_cpp, f_py, s, np.float64)
+
+    for f_cpp, f_py in [(nanvar, np.nanvar), (nanstd, np.nanstd)]:
+        print(f"\n----- normalized {f_cpp.__name__} ------")
+        benchmark_normalized_nan_var(f_cpp, f_py, s, np.float32)
+        benchmark_normalized_nan_var(f_cpp, f_py, s, np.float64)
+
+    print("\n----- nanhist_with_stats ------")
+    benchmark_nanhist_with_stats((1024, 1024), np.float32)
+    benchmark_nanhist_with_stats((1024, 1024), np.float64)
+
+    print("\n----- roi foms ------")
+    benchmark_roi_foms(s, np.float32)
+    benchmark_roi_foms(s, np.float64)
+
+    print("\n----- asic moments ------")
+    # AGIPD
+    benchmark_asic_moments(16, 352, (512, 128), (64, 64), np.float32)
@@ -13,13 +13,44 @@ from collections import deque
 import numpy as np
 
 from PyQt5.QtCore import QTimer
+from PyQt5.QtGui import QImage
 
+from extra_foam.algorithms import map_image_to_color, pack_lut
 from extra_foam.gui import mkQApp
 from extra_foam.gui.plot_widgets import ImageViewF
+from extra_foam.gui.pyqtgraph import functions as fn
 
 app = mkQApp()
 
 
+def bench_render(shape, n=20):
+    """Compare rendering an image with and without the native kernel."""
+    lut = (255 * np.random.rand(512, 3)).astype(np.uint8)
+    packed_lut = pack_lut(lut)
+    levels = (10., 90.)
+
+    for dtype in (np.uint16, np.float32):
+        img = (100 * np.random.rand(*shape)).astype(dtype)
+        h, w = shape
+        buffer = np.empty(shape, dtype=np.uint32)
+
+        t0 = time.perf_counter()
+        for _ in range(n):
+            map_image_to_color(img, levels, packed_lut, out=buffer)
+            QImage(buffer.ctypes.data, w, h, 4 * w, QImage.Format_ARGB32)
+        dt_cpp = (time.perf_counter() - t0) / n
+
+        t0 = time.perf_counter()
+        for _ in range(n):
+            argb, alpha = fn.makeARGB(img, lut=lut, levels=levels)
+            fn.makeQImage(argb, alpha, transpose=False)
+        dt_py = (time.perf_counter() - t0) / n
+
+        print(f"\nrender image with shape {shape}, dtype = {dtype} - \n"
+              f"dt (cpp): {dt_cpp:.4f}, "
+              f"dt (pyqtgraph): {dt_py:.4f}")
+
+
 class BenchmarkImageViewSpeed:
     def __init__(self):
         self._dt = deque(maxlen=60)
@@ -53,6 +84,9 @@ class BenchmarkImageViewSpeed:
 
 
 if __name__ == '__main__':
+    bench_render((1024, 1280))
+    bench_render((2048, 2048))
+
     bench = BenchmarkImageViewSpeed()
     bench.start()
     app.exec_()
@@ -26,6 +26,8 @@ class PlotType(IntEnum):
     Bar = 1
     StatisticsBar = 2
     Scatter = 3
+    # a long curve which grows in each update
+    History = 4
 
 
 class BenchmarkPlotItemSpeed:
@@ -52,11 +54,17 @@ class BenchmarkPlotItemSpeed:
         elif plot_type == PlotType.Scatter:
             self._graph = self._widget.plotScatter(name='scatter')
             n_pts = 5000
+        elif plot_type == PlotType.History:
+            self._graph = self._widget.plotCurve(name='history')
+            n_pts = 1000000
         else:
             raise ValueError(f"Unknown plot type: {plot_type}")
 
         self._x = np.arange(n_pts)
-        self._data = 100 * np.random.normal(size=(50, n_pts))
+        if plot_type == PlotType.History:
+            self._data = 100 * np.random.normal(size=n_pts)
+        else:
+            self._data = 100 * np.random.normal(size=(50, n_pts))
         if plot_type == PlotType.StatisticsBar:
             self._y_min = self._data - 20
             self._y_max = self._data + 20
@@ -76,6 +84,10 @@ class BenchmarkPlotItemSpeed:
         if self._plot_type == PlotType.StatisticsBar:
             self._graph.setData(self._x, self._data[idx],
                                 y_min=self._y_min[idx], y_max=self._y_max[idx])
+        elif self._plot_type == PlotType.History:
+            # 10 new points per update in the second half
+            n = len(self._x) // 2 + 10 * self._count % (len(self._x) // 2)
+            self._graph.setData(self._x[:n], self._data[:n])
         else:
             self._graph.setData(self._x, self._data[idx])
 
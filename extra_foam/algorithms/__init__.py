@@ -10,7 +10,8 @@ All rights reserved.
 from .statistics_py import (
     hist_with_stats, nanhist_with_stats, compute_statistics,
     nanmean, nansum, nanstd, nanvar,
-    quick_min_max
+    quick_min_max, StreamingHistogram, compute_roi_foms, compute_asic_moments,
+    compute_image_histogram, ImageHistogram
 )
 
 from .miscellaneous import (
@@ -29,7 +30,7 @@ from .helpers import intersection
 
 from .imageproc_py import (
     nanmean_image_data, correct_image_data, mask_image_data,
-    movingAvgImageData
+    movingAvgImageData, downsample_image, pack_lut, map_image_to_color
 )
 
 from .datamodel import (
@@ -39,7 +40,7 @@ from .datamodel import (
 )
 
 from .spectrum import (
-    compute_spectrum_1d
+    compute_spectrum_1d, compute_binned_statistics_1d, StreamingSpectrum
 )
 
 from .computer_vision import (
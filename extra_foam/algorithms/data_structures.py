@@ -119,7 +119,80 @@ class _AbstractSequence(Sequence):
         raise NotImplementedError
 
 
-class SimpleSequence(_AbstractSequence):
+class _RingSequence(_AbstractSequence):
+    """Abstract class for 'Sequence' data stored in append-only buffers.
+
+    Each buffer has a length of _OVER_CAPACITY * max_len and new data
+    points are always written behind the current data. Therefore, the
+    data is always available as a contiguous view of the buffer, and a
+    view returned by 'data' is never modified by later updates. When the
+    end of the buffers is reached, the data are copied to the beginning
+    of new buffers, while the old ones are kept by the views still in use.
+    """
+    @abstractmethod
+    def _buffers(self):
+        """Return the buffers which store the data."""
+        pass
+
+    @abstractmethod
+    def _set_buffers(self, *buffers):
+        """Replace the buffers which store the data."""
+        pass
+
+    def _slice(self):
+        return slice(self._i0, self._i0 + self._len)
+
+    def _reserve(self, n):
+        """Make room for n new data points behind the data."""
+        buffers = self._buffers()
+        if self._i0 + self._len + n <= len(buffers[0]):
+            return
+
+        s = self._slice()
+        new_buffers = []
+        for buf in buffers:
+            new_buf = np.empty_like(buf)
+            new_buf[:self._len] = buf[s]
+            new_buffers.append(new_buf)
+        self._set_buffers(*new_buffers)
+        self._i0 = 0
+
+    def _append_imp(self, *items):
+        self._reserve(1)
+        i = self._i0 + self._len
+        for buf, item in zip(self._buffers(), items):
+            buf[i] = item
+
+        if self._len < self._max_len:
+            self._len += 1
+        else:
+            self._i0 += 1
+
+    def _extend_imp(self, *items):
+        n = len(items[0])
+        if n == 0:
+            return
+
+        # only the last max_len items will survive
+        k = min(n, self._max_len)
+        n_kept = min(self._len, self._max_len - k)
+        self._i0 += self._len - n_kept
+        self._len = n_kept
+
+        self._reserve(k)
+        i = self._i0 + self._len
+        for buf, item in zip(self._buffers(), items):
+            buf[i:i + k] = item[n - k:]
+        self._len += k
+
+    def reset(self):
+        """Override."""
+        # continue writing behind the data which could still be in use
+        self._i0 += self._len
+        self._len = 0
+
+
+class SimpleSequence(_RingSequence):
     """Store the history of scalar data."""
 
     def __init__(self, *, max_len=100000, dtype=np.float64):
@@ -127,45 +200,42 @@ class SimpleSequence(_AbstractSequence):
 
         self._x = np.zeros(self._OVER_CAPACITY * max_len, dtype=dtype)
 
+    def _buffers(self):
+        """Override."""
+        return self._x,
+
+    def _set_buffers(self, x):
+        """Override."""
+        self._x = x
+
     def __getitem__(self, index):
         """Override."""
-        return self._x[self._i0:self._i0 + self._len][index]
+        return self._x[self._slice()][index]
 
     def data(self):
-        """Override."""
-        return self._x[slice(self._i0, self._i0 + self._len)]
+        """Override.
+
+        The returned array is a view of the internal buffer, which is
+        not modified by later updates.
+        """
+        return self._x[self._slice()]
 
     def append(self, item):
         """Override."""
-        self._x[self._i0 + self._len] = item
-        max_len = self._max_len
-        if self._len < max_len:
-            self._len += 1
-        else:
-            self._i0 += 1
-            if self._i0 == max_len:
-                self._i0 = 0
-                self._x[:max_len] = self._x[max_len:]
+        self._append_imp(item)
 
     def extend(self, items):
-        for item in items:
-            self.append(item)
-
-    def reset(self):
         """Override."""
-        self._i0 = 0
-        self._len = 0
-        self._x.fill(0)
+        self._extend_imp(np.asarray(items, dtype=self._x.dtype).ravel())
 
     @classmethod
     def from_array(cls, ax, *args, **kwargs):
         instance = cls(*args, **kwargs)
-        for x in ax:
-            instance.append(x)
+        instance.extend(ax)
         return instance
 
 
-class SimpleVectorSequence(_AbstractSequence):
+class SimpleVectorSequence(_RingSequence):
     """Store the history of vector data."""
 
     def __init__(self, size, *, max_len=100000, dtype=np.float64, order='C'):
@@ -179,13 +249,25 @@ class SimpleVectorSequence(_AbstractSequence):
     def size(self):
         return self._size
 
+    def _buffers(self):
+        """Override."""
+        return self._x,
+
+    def _set_buffers(self, x):
+        """Override."""
+        self._x = x
+
     def __getitem__(self, index):
         """Override."""
-        return self._x[self._i0:self._i0 + self._len, :][index]
+        return self._x[self._slice(), :][index]
 
     def data(self):
-        """Override."""
-        return self._x[slice(self._i0, self._i0 + self._len), :]
+        """Override.
+
+        The returned array is a view of the internal buffer, which is
+        not modified by later updates.
+        """
+        return self._x[self._slice(), :]
 
     def append(self, item):
         """Override.
@@ -197,36 +279,34 @@ class SimpleVectorSequence(_AbstractSequence):
             raise ValueError(f"Item size {len(item)} differs from the vector "
                              f"size {self._size}!")
 
-        self._x[self._i0 + self._len, :] = np.array(item)
-        max_len = self._max_len
-        if self._len < max_len:
-            self._len += 1
-        else:
-            self._i0 += 1
-            if self._i0 == max_len:
-                self._i0 = 0
-                self._x[:max_len, :] = self._x[max_len:, :]
+        self._append_imp(np.array(item))
 
     def extend(self, items):
-        """Override."""
-        for item in items:
-            self.append(item)
+        """Override.
 
-    def reset(self):
-        """Override."""
-        self._i0 = 0
-        self._len = 0
-        self._x.fill(0)
+        :raises: ValueError, if any of the items has different size.
+        """
+        try:
+            items = np.asarray(items, dtype=self._x.dtype)
+        except ValueError:
+            raise ValueError(f"Items must be vectors of size {self._size}!")
+
+        if items.size == 0:
+            return
+
+        if items.ndim != 2 or items.shape[1] != self._size:
+            raise ValueError(f"Items must be vectors of size {self._size}!")
+
+        self._extend_imp(items)
 
     @classmethod
     def from_array(cls, ax, *args, **kwargs):
         instance = cls(*args, **kwargs)
-        for x in ax:
-            instance.append(x)
+        instance.extend(ax)
         return instance
 
 
-class SimplePairSequence(_AbstractSequence):
+class SimplePairSequence(_RingSequence):
     """Store the history a pair of scalar data.
 
     Each data point is pair of data: (x, y).
@@ -237,53 +317,57 @@ class SimplePairSequence(_AbstractSequence):
         self._x = np.zeros(self._OVER_CAPACITY * max_len, dtype=dtype)
         self._y = np.zeros(self._OVER_CAPACITY * max_len, dtype=dtype)
 
+    def _buffers(self):
+        """Override."""
+        return self._x, self._y
+
+    def _set_buffers(self, x, y):
+        """Override."""
+        self._x, self._y = x, y
+
     def __getitem__(self, index):
         """Override."""
-        s = slice(self._i0, self._i0 + self._len)
+        s = self._slice()
         return self._x[s][index], self._y[s][index]
 
     def data(self):
-        """Override."""
-        s = slice(self._i0, self._i0 + self._len)
+        """Override.
+
+        The returned arrays are views of the internal buffers, which
+        are not modified by later updates.
+        """
+        s = self._slice()
         return self._x[s], self._y[s]
 
     def append(self, item):
         """Override."""
         x, y = item
-
-        max_len = self._max_len
-        self._x[self._i0 + self._len] = x
-        self._y[self._i0 + self._len] = y
-        if self._len < max_len:
-            self._len += 1
-        else:
-            self._i0 += 1
-            if self._i0 == max_len:
-                self._i0 = 0
-                self._x[:max_len] = self._x[max_len:]
-                self._y[:max_len] = self._y[max_len:]
+        self._append_imp(x, y)
 
     def extend(self, items):
         """Override."""
-        for item in items:
-            self.append(item)
+        items = np.asarray(items, dtype=self._x.dtype)
+        if items.size == 0:
+            return
+        self._extend_imp(items[:, 0], items[:, 1])
 
-    def reset(self):
-        """Override."""
-        self._i0 = 0
-        self._len = 0
-        self._x.fill(0)
-        self._y.fill(0)
+    def extend_pairs(self, ax, ay):
+        """Add data points from two arrays.
 
-    @classmethod
-    def from_array(cls, ax, ay, *args, **kwargs):
+        :raises: ValueError, if ax and ay have different lengths.
+        """
         if len(ax) != len(ay):
             raise ValueError(f"ax and ay must have the same length. "
                              f"Actual: {len(ax)}, {len(ay)}")
 
+        dtype = self._x.dtype
+        self._extend_imp(np.asarray(ax, dtype=dtype).ravel(),
+                         np.asarray(ay, dtype=dtype).ravel())
+
+    @classmethod
+    def from_array(cls, ax, ay, *args, **kwargs):
         instance = cls(*args, **kwargs)
-        for x, y in zip(ax, ay):
-            instance.append((x, y))
+        instance.extend_pairs(ax, ay)
         return instance
 
 
@@ -12,9 +12,13 @@ import numpy as np
 from .imageproc import (
     nanmeanImageArray, movingAvgImageData,
     imageDataNanMask, maskImageDataNan, maskImageDataZero,
-    correctGain, correctOffset, correctGainOffset
+    correctGain, correctOffset, correctGainOffset, downsampleImage,
+    mapImageToColor
 )
 
+_DOWNSAMPLE_CPP_TYPES = (np.float32, np.float64, np.uint16, np.uint8)
+_MAP_TO_COLOR_CPP_TYPES = _DOWNSAMPLE_CPP_TYPES
+
 
 def nanmean_image_data(data, *, kept=None):
     """Compute nanmean of an array of images of a tuple/list of two images.
@@ -101,3 +105,77 @@ def mask_image_data(arr, *,
                 f(arr, image_mask, out)
             else:
                 f(arr, image_mask, *threshold_mask, out)
+
+
+def downsample_image(img, factor):
+    """Downsample an image by averaging blocks of factor x factor pixels.
+
+    It uses the C++ implementation in EXtra-foam, which releases the GIL.
+    Nan pixels are ignored.
+
+    :param numpy.ndarray img: image data. Shape = (y, x)
+    :param int factor: downsampling factor.
+
+    :return numpy.ndarray: the downsampled image with dtype float64 if the
+        input is float64, otherwise float32. The input image is returned
+        if factor is 1. Shape = (ceil(y / factor), ceil(x / factor))
+    """
+    if img.ndim != 2:
+        raise ValueError("Input must be a 2D array!")
+
+    if factor == 1:
+        return img
+
+    if img.dtype not in _DOWNSAMPLE_CPP_TYPES:
+        img = img.astype(np.float32)
+
+    return downsampleImage(img, factor)
+
+
+def pack_lut(lut):
+    """Pack a lookup table of RGB(A) colors into 32-bit ARGB colors.
+
+    :param numpy.ndarray lut: lookup table with dtype uint8.
+        Shape = (n, 3) or (n, 4)
+
+    :return numpy.ndarray: colors in the format of QImage.Format_ARGB32.
+        Colors without alpha channel are opaque. Shape = (n,)
+    """
+    if lut.ndim != 2 or lut.shape[1] not in (3, 4):
+        raise ValueError("Lookup table must have the shape (n, 3) or (n, 4)!")
+
+    lut = lut.astype(np.uint32)
+    alpha = lut[:, 3] if lut.shape[1] == 4 else np.uint32(255)
+    return (alpha << 24) | (lut[:, 0] << 16) | (lut[:, 1] << 8) | lut[:, 2]
+
+
+def map_image_to_color(img, levels, lut, *, nan_color=0, out=None):
+    """Map an image to 32-bit ARGB colors with a lookup table.
+
+    It uses the C++ implementation in EXtra-foam, which releases the GIL.
+    Values in [min, max] of the levels are mapped linearly onto the
+    lookup table and values outside are clipped.
+
+    :param numpy.ndarray img: image data. Shape = (y, x)
+    :param tuple levels: (min, max).
+    :param numpy.ndarray lut: colors returned by pack_lut. Shape = (n,)
+    :param int nan_color: color of nan pixels. The default is transparent.
+    :param numpy.ndarray out: Optional output array with dtype uint32 and
+        the same shape as the image. It is allocated if not provided.
+
+    :return numpy.ndarray: colors in the format of QImage.Format_ARGB32.
+        Shape = (y, x)
+    """
+    if img.ndim != 2:
+        raise ValueError("Input must be a 2D array!")
+
+    if img.dtype not in _MAP_TO_COLOR_CPP_TYPES:
+        img = img.astype(np.float32)
+    img = np.ascontiguousarray(img)
+
+    if out is None:
+        out = np.empty(img.shape, dtype=np.uint32)
+
+    mapImageToColor(img, float(levels[0]), float(levels[1]),
+                    lut, nan_color, out)
+    return out
@@ -7,24 +7,132 @@ Author: Jun Zhu <jun.zhu@xfel.eu>
 Copyright (C) European X-Ray Free-Electron Laser Facility GmbH.
 All rights reserved.
 """
+from collections import namedtuple
+
 import numpy as np
-from scipy.stats import binned_statistic
 
+from .data_structures import SimpleVectorSequence
 
-def compute_spectrum_1d(x, y, n_bins=10, *,
-                        bin_range=None, edge2center=True, nan_to_num=False):
-    """Compute spectrum."""
-    if len(x) != len(y):
+
+_BinnedStatistics = namedtuple(
+    '_BinnedStatistics', ['sum', 'count', 'mean', 'std', 'edges'])
+
+
+def _bin_edges(v_min, v_max, n_bins):
+    """Return the bin edges used by compute_spectrum_1d."""
+    if v_min == v_max:
+        v_min, v_max = v_min - 0.5, v_max + 0.5
+    return np.linspace(v_min, v_max, n_bins + 1)
+
+
+def _bin_indices(x, edges):
+    """Return the bin indices of x, which is within the outer edges.
+
+    The last bin is closed on the right, as in numpy.histogram.
+    """
+    n_bins = len(edges) - 1
+    lb, ub = edges[0], edges[-1]
+    indices = ((x - lb) * (n_bins / (ub - lb))).astype(np.intp)
+    np.clip(indices, 0, n_bins - 1, out=indices)
+    # correct the rounding error at the bin edges
+    indices[x < edges[indices]] -= 1
+    indices[(x >= edges[indices + 1]) & (indices != n_bins - 1)] += 1
+    return indices
+
+
+def compute_binned_statistics_1d(x, y, n_bins=10, *,
+                                 bin_range=None, with_std=False):
+    """Compute statistics of y in bins of x in a single pass.
+
+    :param array-like x: 1D array.
+    :param array-like y: 1D array or a 2D array whose rows share the
+        same x.
+    :param int n_bins: number of bins.
+    :param tuple bin_range: (lb, ub) of bins. Data points outside the
+        range are ignored. If None, (min(x), max(x)) is used.
+    :param bool with_std: True for computing the standard deviation of
+        y in each bin as well.
+
+    :return: a namedtuple of (sum, count, mean, std, edges). std is None
+        if with_std is False. The mean and std of an empty bin is NaN.
+        sum, mean and std have the same dimension as y.
+    """
+    x = np.asarray(x)
+    y = np.asarray(y)
+    if x.ndim != 1 or y.ndim not in (1, 2):
+        raise ValueError("x must be a 1D array and y must be a 1D or "
+                         "2D array!")
+    if len(x) != y.shape[-1]:
         raise ValueError(f"x and y have different lengths: "
-                         f"{len(x)} and {len(y)}")
+                         f"{len(x)} and {y.shape[-1]}")
 
+    ys = y if y.ndim == 2 else y[np.newaxis, :]
     if len(x) == 0:
-        stats = np.full((n_bins,), np.nan)
-        edges = np.full((n_bins + 1,), np.nan)
+        nan = np.full((len(ys), n_bins), np.nan)
+        sums = means = nan
+        stds = nan if with_std else None
         counts = np.full((n_bins,), np.nan)
+        edges = np.full((n_bins + 1,), np.nan)
     else:
-        stats, edges, _ = binned_statistic(x, y, 'mean', n_bins, range=bin_range)
-        counts, _, _ = binned_statistic(x, y, 'count', n_bins, range=bin_range)
+        if bin_range is None:
+            edges = _bin_edges(np.min(x), np.max(x), n_bins)
+        else:
+            edges = _bin_edges(*bin_range, n_bins)
+            inbound = (x >= edges[0]) & (x <= edges[-1])
+            if not inbound.all():
+                x, ys = x[inbound], ys[:, inbound]
+
+        indices = _bin_indices(x, edges)
+        counts = np.bincount(indices, minlength=n_bins).astype(np.float64)
+        sums = np.empty((len(ys), n_bins), dtype=np.float64)
+        for i, item in enumerate(ys):
+            sums[i] = np.bincount(indices, weights=item, minlength=n_bins)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            means = sums / counts
+
+        stds = None
+        if with_std:
+            stds = np.empty_like(sums)
+            for i, item in enumerate(ys):
+                stds[i] = np.bincount(
+                    indices, weights=(item - means[i][indices]) ** 2,
+                    minlength=n_bins)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                np.sqrt(stds / counts, out=stds)
+
+    if y.ndim == 1:
+        sums, means = sums[0], means[0]
+        if stds is not None:
+            stds = stds[0]
+
+    return _BinnedStatistics(sums, counts, means, stds, edges)
+
+
+def compute_spectrum_1d(x, y, n_bins=10, *,
+                        bin_range=None, edge2center=True, nan_to_num=False):
+    """Compute spectrum.
+
+    :param array-like x: 1D array.
+    :param array-like y: 1D array or a 2D array whose rows share the
+        same x. In the latter case, the spectra of all the rows are
+        computed in a single pass.
+    :param int n_bins: number of bins.
+    :param tuple bin_range: (lb, ub) of bins. If None, (min(x), max(x))
+        is used.
+    :param bool edge2center: True for returning bin centers instead of
+        bin edges.
+    :param bool nan_to_num: True for replacing NaN with zero in the
+        returned mean and counts.
+
+    :return: (mean of y in each bin, bin centers/edges, counts).
+    """
+    if len(x) != np.shape(y)[-1]:
+        raise ValueError(f"x and y have different lengths: "
+                         f"{len(x)} and {np.shape(y)[-1]}")
+
+    ret = compute_binned_statistics_1d(x, y, n_bins, bin_range=bin_range)
+    stats, counts, edges = ret.mean, ret.count, ret.edges
 
     if nan_to_num:
         np.nan_to_num(stats, copy=False)
@@ -33,3 +141,173 @@ def compute_spectrum_1d(x, y, n_bins=10, *,
     if edge2center:
         return stats, (edges[1:] + edges[:-1]) / 2., counts
     return stats, edges, counts
+
+
+class StreamingSpectrum:
+    """Incremental 1D spectra of the data points in a sliding window.
+
+    It produces the same results as compute_spectrum_1d applied to each
+    y array in the window, which shares the same x.
+
+    The per-bin counts and sums are updated with the new data points and
+    the data points which leave the window. The window is only re-binned
+    when the bin edges change, i.e. the number of bins, the window size
+    or the range of x in the window changes.
+    """
+    def __init__(self, n_ys, *, max_len=100000):
+        """Initialization.
+
+        :param int n_ys: number of y arrays.
+        :param int max_len: maximum number of data points retained. It
+            is also the maximum window size.
+        """
+        self._n_ys = n_ys
+        self._max_len = max_len
+        # columns are (x, y1, y2, ...)
+        self._data = SimpleVectorSequence(
+            n_ys + 1, max_len=max_len, order='F')
+        self._window = max_len
+
+        self._n_bins = None
+        self._edges = None
+        self._x_min = np.inf
+        self._x_max = -np.inf
+        self._counts = None
+        self._sums = None
+        # number of data points subtracted since the last re-binning
+        self._n_removed = 0
+        self._outdated = True
+
+    def __len__(self):
+        return min(len(self._data), self._window)
+
+    @property
+    def window(self):
+        return self._window
+
+    @window.setter
+    def window(self, v):
+        v = min(int(v), self._max_len)
+        if v != self._window:
+            self._window = v
+            self._outdated = True
+
+    def _window_data(self):
+        data = self._data.data()
+        return data[max(0, len(data) - self._window):]
+
+    def data(self):
+        """Return x and y arrays in the window.
+
+        The returned arrays are views of the internal buffer.
+        """
+        data = self._window_data()
+        return data[:, 0], data[:, 1:].T
+
+    def extend(self, x, ys):
+        """Add new data points.
+
+        :param array-like x: x of the new data points.
+        :param array-like ys: a list of y arrays of the new data points.
+        """
+        x = np.asarray(x, dtype=np.float64).ravel()
+        n = len(x)
+        if n == 0:
+            return
+
+        new = np.empty((n, self._n_ys + 1), dtype=np.float64)
+        new[:, 0] = x
+        for i, y in enumerate(ys):
+            new[:, i + 1] = y
+
+        if not self._outdated:
+            w = self._window
+            window_data = self._window_data()
+            n_left = min(max(0, len(window_data) + n - w), len(window_data))
+            # copy since they could be overwritten by the new data
+            left = window_data[:n_left].copy()
+            new_in = new[-w:]
+
+            x_min = min(self._x_min, np.min(new_in[:, 0]))
+            x_max = max(self._x_max, np.max(new_in[:, 0]))
+            if n_left > 0 and (np.min(left[:, 0]) <= self._x_min
+                               or np.max(left[:, 0]) >= self._x_max):
+                # the range can only be found after the data is updated
+                x_min = x_max = None
+
+            if x_min == self._x_min and x_max == self._x_max \
+                    and not np.isnan(left[:, 1:]).any():
+                self._accumulate(left, -1)
+                self._accumulate(new_in, 1)
+                self._n_removed += n_left
+                # re-bin periodically to get rid of the rounding error
+                if self._n_removed > self._max_len:
+                    self._outdated = True
+            else:
+                self._outdated = True
+
+        self._data.extend(new)
+
+    def _accumulate(self, data, sign):
+        if len(data) == 0:
+            return
+
+        n_bins = self._n_bins
+        indices = _bin_indices(data[:, 0], self._edges)
+        self._counts += sign * np.bincount(indices, minlength=n_bins)
+        for i in range(self._n_ys):
+            self._sums[i] += sign * np.bincount(
+                indices, weights=data[:, i + 1], minlength=n_bins)
+
+        if sign < 0:
+            self._sums[:, self._counts == 0] = 0.
+
+    def _rebin(self, n_bins):
+        self._n_bins = n_bins
+        self._counts = np.zeros(n_bins, dtype=np.int64)
+        self._sums = np.zeros((self._n_ys, n_bins), dtype=np.float64)
+        self._n_removed = 0
+        self._outdated = False
+
+        data = self._window_data()
+        if len(data) == 0:
+            self._x_min, self._x_max = np.inf, -np.inf
+            self._edges = np.full(n_bins + 1, np.nan)
+            return
+
+        self._x_min = np.min(data[:, 0])
+        self._x_max = np.max(data[:, 0])
+        self._edges = _bin_edges(self._x_min, self._x_max, n_bins)
+        self._accumulate(data, 1)
+
+    def spectra(self, n_bins, *, edge2center=True):
+        """Return the spectra of all the y arrays.
+
+        :param int n_bins: number of bins.
+        :param bool edge2center: True for returning bin centers instead
+            of bin edges.
+
+        :return: (stats, centers/edges, counts), where stats is an array
+            of the mean of each y array in each bin.
+        """
+        if self._outdated or n_bins != self._n_bins:
+            self._rebin(n_bins)
+
+        edges = self._edges
+        if len(self) == 0:
+            stats = np.full((self._n_ys, n_bins), np.nan)
+            counts = np.full(n_bins, np.nan)
+        else:
+            counts = self._counts.astype(np.float64)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                stats = self._sums / counts
+            stats[:, self._counts == 0] = np.nan
+
+        if edge2center:
+            return stats, (edges[1:] + edges[:-1]) / 2., counts
+        return stats, edges.copy(), counts
+
+    def reset(self):
+        """Reset the data history and the accumulator."""
+        self._data.reset()
+        self._outdated = True
@@ -12,6 +12,12 @@ import numpy as np
 from .imageproc_py import mask_image_data, nanmeanImageArray
 from .statistics import nanmean as _nanmean_cpp
 from .statistics import nansum as _nansum_cpp
+from .statistics import nanstd as _nanstd_cpp
+from .statistics import nanvar as _nanvar_cpp
+from .statistics import nanhistWithStats as _nanhist_with_stats_cpp
+from .statistics import roiFoms as _roi_foms_cpp
+from .statistics import asicMoments as _asic_moments_cpp
+from .statistics import imageHistogram as _image_histogram_cpp
 
 
 _NAN_CPP_TYPES = (np.float32, np.float64)
@@ -81,14 +87,155 @@ def quick_min_max(x, q=None):
            np.nanquantile(x, q, interpolation='nearest')
 
 
+def compute_image_histogram(img, n_bins=500):
+    """Estimate the histogram of image pixels for display.
+
+    The image is down-sampled to about 200 x 200 pixels before
+    calculating the histogram.
+
+    :param numpy.ndarray img: image data. Shape = (y, x)
+    :param int n_bins: number of bins for float data.
+
+    :return tuple: (hist, bin_centers) or (None, None) if the image is
+        empty or all-nan.
+    """
+    if img is None or img.size == 0:
+        return None, None
+
+    step = (max(1, int(np.ceil(img.shape[0] / 200))),
+            max(1, int(np.ceil(img.shape[1] / 200))))
+
+    sliced_data = img[::step[0], ::step[1]]
+
+    lb, ub = np.nanmin(sliced_data), np.nanmax(sliced_data)
+
+    if np.isnan(lb) or np.isnan(ub):
+        # the data are all-nan
+        return None, None
+
+    if lb == ub:
+        # degenerate image, arange will fail
+        lb -= 0.5
+        ub += 0.5
+
+    if sliced_data.dtype.kind in "ui":
+        # step >= 1
+        step = np.ceil((ub - lb) / n_bins)
+        # len(bins) >= 2
+        bins = np.arange(lb, ub + 0.01 * step, step, dtype=np.int)
+    else:
+        # for float data, let numpy select the bins.
+        bins = np.linspace(lb, ub, n_bins)
+
+    hist, bin_edges = np.histogram(sliced_data, bins=bins)
+
+    return hist, (bin_edges[:-1] + bin_edges[1:]) / 2.
+
+
+class ImageHistogram:
+    """Fixed-bin histogram of the pixels of an image.
+
+    The histogram is calculated over all the pixels by the C++
+    implementation in EXtra-foam. The bins are fine enough to estimate
+    the levels of the image and to be merged into a coarser histogram
+    for display without revisiting the image.
+
+    Attributes:
+        hist (numpy.ndarray): counts in equal-width bins. None if the
+            image is empty or all-nan.
+        lb (float): lower edge of the bins.
+        ub (float): upper edge of the bins.
+    """
+
+    __slots__ = ['hist', 'lb', 'ub']
+
+    def __init__(self, img, n_bins=1024):
+        """Initialization.
+
+        :param numpy.ndarray img: image data. Shape = (y, x)
+        :param int n_bins: number of bins.
+        """
+        if img.ndim != 2:
+            raise ValueError("Input must be a 2D array!")
+
+        self.hist = None
+        self.lb = np.nan
+        self.ub = np.nan
+        if img.size == 0:
+            return
+
+        if img.dtype not in _NAN_CPP_TYPES:
+            img = img.astype(np.float32)
+
+        hist, lb, ub = _image_histogram_cpp(img, n_bins)
+        if not np.isnan(lb):
+            self.hist, self.lb, self.ub = hist, lb, ub
+
+    def levels(self, q=None):
+        """Estimate the levels of the image.
+
+        The estimation has the same convention as quick_min_max and its
+        error is within the width of a bin.
+
+        :param float/None q: quantile when calculating the min/max, which
+            must be within [0, 1].
+
+        :return tuple: (min, max) or None if the histogram is empty.
+        """
+        if self.hist is None:
+            return None
+
+        if q is None:
+            return self.lb, self.ub
+
+        if not 0 <= q <= 1:
+            raise ValueError("Quantile must be within [0, 1]!")
+
+        if q < 0.5:
+            q = 1 - q
+
+        cum = np.cumsum(self.hist)
+        n = cum[-1]
+        lo = np.searchsorted(cum, round((1 - q) * (n - 1)), side='right')
+        hi = np.searchsorted(cum, round(q * (n - 1)), side='right')
+
+        step = (self.ub - self.lb) / len(self.hist)
+        return self.lb + lo * step, self.lb + (hi + 1) * step
+
+    def rebin(self, n_bins):
+        """Merge adjacent bins.
+
+        :param int n_bins: maximum number of bins.
+
+        :return tuple: (hist, bin_centers) or (None, None) if the
+            histogram is empty.
+        """
+        if self.hist is None:
+            return None, None
+
+        n = len(self.hist)
+        factor = max(1, int(np.ceil(n / n_bins)))
+        starts = np.arange(0, n, factor)
+        ends = np.minimum(starts + factor, n)
+        step = (self.ub - self.lb) / n
+        return np.add.reduceat(self.hist, starts), \
+            self.lb + 0.5 * step * (starts + ends)
+
+
 def nanstd(a, axis=None, *, normalized=False):
     """Faster numpy.nanstd.
 
-    # TODO:
-
     This is a wrapper over numpy.nanstd. It uses the C++ implementation
-    in EXtra-foam when applicable. Otherwise, it falls back to numpy.nansum.
+    in EXtra-foam when applicable. Otherwise, it falls back to numpy.nanstd.
+
+    :param bool normalized: True for normalizing the standard deviation
+        by the mean. The C++ implementation calculates both in one pass.
     """
+    if a.dtype in _NAN_CPP_TYPES:
+        if axis is None:
+            return _nanstd_cpp(a, normalized=normalized)
+        return _nanstd_cpp(a, axis=axis, normalized=normalized)
+
     if normalized:
         return np.nanstd(a, axis=axis) / np.nanmean(a, axis=axis)
     return np.nanstd(a, axis=axis)
@@ -97,11 +244,17 @@ def nanstd(a, axis=None, *, normalized=False):
 def nanvar(a, axis=None, *, normalized=False):
     """Faster numpy.nanvar.
 
-    # TODO:
-
     This is a wrapper over numpy.nanvar. It uses the C++ implementation
-    in EXtra-foam when applicable. Otherwise, it falls back to numpy.nansum.
+    in EXtra-foam when applicable. Otherwise, it falls back to numpy.nanvar.
+
+    :param bool normalized: True for normalizing the variance by the
+        squared mean. The C++ implementation calculates both in one pass.
     """
+    if a.dtype in _NAN_CPP_TYPES:
+        if axis is None:
+            return _nanvar_cpp(a, normalized=normalized)
+        return _nanvar_cpp(a, axis=axis, normalized=normalized)
+
     if normalized:
         return np.nanvar(a, axis=axis) / np.nanmean(a, axis=axis) ** 2
     return np.nanvar(a, axis=axis)
@@ -166,21 +319,10 @@ def compute_statistics(data):
     return np.mean(data), np.median(data), np.std(data)
 
 
-def nanhist_with_stats(data, bin_range=(-np.inf, np.inf), n_bins=10):
-    """Compute nan-histogram and nan-statistics of an array.
-
-    :param numpy.ndarray data: image ROI.
-    :param tuple bin_range: (lb, ub) of histogram.
-    :param int n_bins: number of bins of histogram.
-
-    :raise ValueError: if finite outer edges cannot be found.
-    """
+def _nanhist_with_stats_py(data, bin_range, n_bins):
     # Note: Since the nan functions in numpy is typically 5-8 slower
     # than the non-nan counterpart, it is always faster to remove nan
     # first, which results in a copy, and then calculate the statistics.
-
-    # TODO: the following three steps can be merged into one to improve
-    #       the performance.
     filtered = data.copy()
     mask_image_data(filtered, threshold_mask=bin_range)
     filtered = filtered[~np.isnan(filtered)]
@@ -193,15 +335,46 @@ def nanhist_with_stats(data, bin_range=(-np.inf, np.inf), n_bins=10):
     return hist, bin_centers, mean, median, std
 
 
+def nanhist_with_stats(data, bin_range=(-np.inf, np.inf), n_bins=10):
+    """Compute nan-histogram and nan-statistics of an array.
+
+    It uses the single-pass C++ implementation in EXtra-foam when
+    applicable. Otherwise, it falls back to the numpy implementation.
+
+    :param numpy.ndarray data: image ROI.
+    :param tuple bin_range: (lb, ub) of histogram.
+    :param int n_bins: number of bins of histogram.
+
+    :raise ValueError: if finite outer edges cannot be found.
+    """
+    if data.dtype in _NAN_CPP_TYPES and 1 <= data.ndim <= 3:
+        return _nanhist_with_stats_cpp(data, *bin_range, n_bins)
+
+    return _nanhist_with_stats_py(data, bin_range, n_bins)
+
+
 def hist_with_stats(data, bin_range=(-np.inf, np.inf), n_bins=10):
     """Compute histogram and statistics of an array.
 
+    It uses the single-pass C++ implementation in EXtra-foam when
+    applicable. Otherwise, it falls back to the numpy implementation.
+
     :param numpy.ndarray data: input data.
     :param tuple bin_range: (lb, ub) of histogram.
     :param int n_bins: number of bins of histogram.
 
     :raise ValueError: if finite outer edges cannot be found.
     """
+    if data.dtype in _NAN_CPP_TYPES and 1 <= data.ndim <= 3:
+        # Outer edges taken from data with nan are not finite, which is
+        # not checked by the nan version.
+        if not np.all(np.isfinite(bin_range)) and np.isnan(data).any():
+            raise ValueError("Finite outer edges cannot be found: "
+                             "input data contain nan")
+        # For data without nan, the histogram and statistics of the data
+        # within the outer edges are identical to the nan version.
+        return _nanhist_with_stats_cpp(data, *bin_range, n_bins)
+
     v_min, v_max = _get_outer_edges(data, bin_range)
 
     filtered = data[(data >= v_min) & (data <= v_max)]
@@ -211,3 +384,255 @@ def hist_with_stats(data, bin_range=(-np.inf, np.inf), n_bins=10):
     mean, median, std = compute_statistics(filtered)
 
     return hist, bin_centers, mean, median, std
+
+
+def compute_roi_foms(data, rects, fom_types, *,
+                     image_mask=None, threshold_mask=None):
+    """Compute FOMs of multiple rectangular ROIs in an array of images.
+
+    All the ROIs are reduced in a single pass over the images by the C++
+    implementation in EXtra-foam. Pixels which are nan, masked by the
+    image mask or outside the threshold mask are ignored. The input data
+    are not modified.
+
+    :param numpy.ndarray data: array of images. Shape = (indices, y, x)
+    :param list rects: ROI rectangles in the form of (x, y, w, h). They
+        must be within the image.
+    :param list fom_types: FOM type (RoiFom) of each ROI.
+    :param numpy.ndarray image_mask: image mask. If provided, it must have
+        the same shape as a single image, and the type must be bool.
+        Shape = (y, x)
+    :param tuple/None threshold_mask: (min, max) of the threshold mask.
+
+    :return numpy.ndarray: FOMs. Shape = (rois, indices)
+
+    :raise ValueError: if any of the ROIs is out of the image boundary or
+        the FOM type is unknown.
+    """
+    if data.dtype not in _NAN_CPP_TYPES:
+        data = data.astype(np.float64)
+
+    if threshold_mask is None:
+        lb, ub = -np.inf, np.inf
+    else:
+        lb, ub = threshold_mask
+
+    if image_mask is None:
+        return _roi_foms_cpp(data, lb, ub, rects, fom_types)
+    return _roi_foms_cpp(data, image_mask, lb, ub, rects, fom_types)
+
+
+def compute_asic_moments(data, asic_shape, *, saturation=np.inf):
+    """Compute the moments of every ASIC of every module over a train.
+
+    Each ASIC is reduced over all the pulses in a single pass by the C++
+    implementation in EXtra-foam and the ASICs are processed in parallel.
+    Pixels which are nan are ignored.
+
+    :param numpy.ndarray/list data: multi-pulse, multi-module data with
+        shape (memory cells, modules, y, x) or a list of module data with
+        shape (memory cells, y, x).
+    :param tuple asic_shape: shape (y, x) of an ASIC.
+    :param float saturation: pixels with values not less than it are
+        counted as saturated.
+
+    :return numpy.ndarray: (count, mean, sum of squared deviations,
+        number of saturated pixels) of each ASIC.
+        Shape = (modules, asics in y, asics in x, 4)
+
+    :raise ValueError: if the module cannot be divided into ASICs or the
+        modules have different shapes.
+    """
+    if isinstance(data, np.ndarray):
+        if data.dtype not in _NAN_CPP_TYPES:
+            data = data.astype(np.float32)
+    else:
+        dtype = data[0].dtype if len(data) > 0 else np.float32
+        if dtype not in _NAN_CPP_TYPES:
+            dtype = np.float32
+        data = [np.asarray(d, dtype=dtype) for d in data]
+
+    return _asic_moments_cpp(data, tuple(asic_shape), saturation)
+
+
+class StreamingHistogram:
+    """Incremental histogram and statistics of an accumulating data history.
+
+    It produces the same histogram, mean and std as hist_with_stats applied
+    to the whole history. The median is estimated from a fine-binned
+    (mergeable) quantile sketch, whose resolution is the bin range divided
+    by the number of sketch bins.
+
+    Data points dropped from the head of a bounded history are subtracted
+    from the accumulator. The history is only revisited when the outer
+    edges of the histogram change, e.g. a new extremum arrives or the
+    extremum is dropped when the bin range is not finite, or when the
+    history and the accumulator are out of sync.
+    """
+
+    _N_SKETCH_BINS = 4096
+
+    def __init__(self):
+        self._bin_range = None
+        self._n_bins = None
+        self._edges = None
+
+        self._v_min = np.inf
+        self._v_max = -np.inf
+        self._n_seen = 0
+
+        self._hist = None
+        self._sketch = None
+        # moments of the data within the outer edges
+        self._count = 0
+        self._mean = 0.
+        self._m2 = 0.
+
+    def reset(self):
+        """Reset the accumulator."""
+        self.__init__()
+
+    def update(self, new, history, bin_range, n_bins, evicted=()):
+        """Update the accumulator with newly arrived data.
+
+        :param numpy.ndarray new: new data points, which are expected to
+            be the tail of history.
+        :param numpy.ndarray history: the whole data history. It is only
+            used for re-binning.
+        :param tuple bin_range: (lb, ub) of histogram.
+        :param int n_bins: number of bins of histogram.
+        :param numpy.ndarray evicted: data points which have been dropped
+            from the head of history since the last update.
+
+        :raise ValueError: if finite outer edges cannot be found.
+        """
+        new = np.asarray(new).ravel()
+        evicted = np.asarray(evicted).ravel()
+
+        bin_range = tuple(bin_range)
+        if bin_range != self._bin_range or n_bins != self._n_bins \
+                or self._n_seen + new.size - evicted.size != history.size:
+            self._rebuild(history, bin_range, n_bins)
+            return
+
+        self._n_seen = history.size
+        if evicted.size > 0 and not np.all(np.isfinite(bin_range)) and \
+                (np.min(evicted) <= self._v_min
+                 or np.max(evicted) >= self._v_max):
+            # the extremum could have been dropped
+            self._v_min, self._v_max = self._min_max(history)
+        elif new.size > 0:
+            self._v_min = min(self._v_min, np.min(new))
+            self._v_max = max(self._v_max, np.max(new))
+
+        edges = self._outer_edges()
+        if edges != self._edges:
+            self._rebuild(history, bin_range, n_bins)
+            return
+
+        self._remove(evicted)
+        self._add(new)
+
+    @staticmethod
+    def _min_max(history):
+        if history.size > 0:
+            return np.min(history), np.max(history)
+        return np.inf, -np.inf
+
+    def _outer_edges(self):
+        if self._n_seen == 0:
+            arr = np.array([])
+        else:
+            arr = np.array([self._v_min, self._v_max])
+        return _get_outer_edges(arr, self._bin_range)
+
+    def _rebuild(self, history, bin_range, n_bins):
+        history = np.asarray(history).ravel()
+
+        self._bin_range = bin_range
+        self._n_bins = n_bins
+        self._n_seen = history.size
+        self._v_min, self._v_max = self._min_max(history)
+
+        self._edges = self._outer_edges()
+        # raise ValueError here if the outer edges are not finite
+        self._hist = np.histogram(
+            [], bins=n_bins, range=self._edges)[0]
+        self._sketch = np.zeros(self._N_SKETCH_BINS, dtype=self._hist.dtype)
+        self._count = 0
+        self._mean = 0.
+        self._m2 = 0.
+
+        self._add(history)
+
+    def _add(self, data):
+        v_min, v_max = self._edges
+        filtered = data[(data >= v_min) & (data <= v_max)]
+        n = filtered.size
+        if n == 0:
+            return
+
+        self._hist += np.histogram(
+            filtered, bins=self._n_bins, range=self._edges)[0]
+        self._sketch += np.histogram(
+            filtered, bins=self._N_SKETCH_BINS, range=self._edges)[0]
+
+        # merge moments (Chan et al.)
+        mean = np.mean(filtered)
+        m2 = np.sum((filtered - mean) ** 2)
+        count = self._count + n
+        delta = mean - self._mean
+        self._mean += delta * n / count
+        self._m2 += m2 + delta ** 2 * self._count * n / count
+        self._count = count
+
+    def _remove(self, data):
+        v_min, v_max = self._edges
+        filtered = data[(data >= v_min) & (data <= v_max)]
+        n = filtered.size
+        if n == 0:
+            return
+
+        self._hist -= np.histogram(
+            filtered, bins=self._n_bins, range=self._edges)[0]
+        self._sketch -= np.histogram(
+            filtered, bins=self._N_SKETCH_BINS, range=self._edges)[0]
+
+        # inverse of merging moments
+        count = self._count - n
+        if count == 0:
+            self._count, self._mean, self._m2 = 0, 0., 0.
+            return
+        mean = np.mean(filtered)
+        m2 = np.sum((filtered - mean) ** 2)
+        mean_rest = (self._count * self._mean - n * mean) / count
+        delta = mean - mean_rest
+        self._m2 = max(
+            self._m2 - m2 - delta ** 2 * count * n / self._count, 0.)
+        self._mean = mean_rest
+        self._count = count
+
+    def _median(self):
+        cum = np.cumsum(self._sketch)
+        target = 0.5 * self._count
+        i = int(np.searchsorted(cum, target))
+        prev = cum[i - 1] if i > 0 else 0
+        v_min, v_max = self._edges
+        width = (v_max - v_min) / self._N_SKETCH_BINS
+        return v_min + width * (i + (target - prev) / self._sketch[i])
+
+    def stats(self):
+        """Return the histogram and statistics.
+
+        :return tuple: (hist, bin_centers, mean, median, std), which is
+            the same as the return of hist_with_stats.
+        """
+        v_min, v_max = self._edges
+        bin_edges = np.linspace(v_min, v_max, self._n_bins + 1)
+        bin_centers = (bin_edges[1:] + bin_edges[:-1]) / 2.0
+
+        if self._count == 0:
+            return self._hist.copy(), bin_centers, np.nan, np.nan, np.nan
+
+        return (self._hist.copy(), bin_centers, self._mean, self._median(),
+                np.sqrt(self._m2 / self._count))
@@ -260,6 +260,68 @@ class TestSequenceData(unittest.TestCase):
         hist = SimplePairSequence.from_array([0, 1, 2], [1, 2, 3])
         self.assertEqual(3, len(hist))
 
+    def testSequenceExtend(self):
+        MAX_LENGTH = 10
+
+        hist = SimpleSequence(max_len=MAX_LENGTH)
+        vec_hist = SimpleVectorSequence(2, max_len=MAX_LENGTH, order='F')
+        pair_hist = SimplePairSequence(max_len=MAX_LENGTH)
+        gt = []
+        i = 0
+        # chunks which are shorter than, equal to and longer than max_len
+        for n in [3, 0, 1, 6, 4, 10, 7, 25, 2, 9, 1]:
+            items = np.arange(i, i + n, dtype=np.float64)
+            i += n
+            gt.extend(items)
+
+            hist.extend(items)
+            vec_hist.extend(np.stack([items, -items], axis=-1))
+            pair_hist.extend_pairs(items, 2 * items)
+
+            expected = gt[-MAX_LENGTH:]
+            self.assertEqual(len(expected), len(hist))
+            np.testing.assert_array_equal(expected, hist.data())
+            np.testing.assert_array_equal(expected, vec_hist.data()[:, 0])
+            np.testing.assert_array_equal(expected, -vec_hist.data()[:, 1])
+            ax, ay = pair_hist.data()
+            np.testing.assert_array_equal(expected, ax)
+            np.testing.assert_array_equal(2 * np.array(expected), ay)
+
+            # mix with append
+            gt.append(i)
+            hist.append(i)
+            vec_hist.append([i, -i])
+            pair_hist.append((i, 2 * i))
+            i += 1
+            np.testing.assert_array_equal(gt[-MAX_LENGTH:], hist.data())
+            np.testing.assert_array_equal(gt[-MAX_LENGTH:], vec_hist.data()[:, 0])
+            np.testing.assert_array_equal(gt[-MAX_LENGTH:], pair_hist.data()[0])
+
+        # data is a view of the internal buffer
+        self.assertTrue(np.shares_memory(hist.data(), hist._x))
+
+        # the returned views are never modified by later updates
+        views = []
+        for n in [1, 3, 0, 12, 1, 1, 5]:
+            views.append((hist.data(), hist.data().copy()))
+            if n == 0:
+                hist.reset()
+            elif n == 1:
+                hist.append(i)
+            else:
+                hist.extend(np.arange(i, i + n))
+            i += n
+        for view, gt_view in views:
+            np.testing.assert_array_equal(gt_view, view)
+
+        pair_hist.extend([(1, 2), (3, 4)])
+        self.assertTupleEqual((3, 4), pair_hist[-1])
+
+        with self.assertRaises(ValueError):
+            vec_hist.extend([[1, 2, 3]])
+        with self.assertRaises(ValueError):
+            pair_hist.extend_pairs([1, 2], [1])
+
     def testOneWayAccuPairSequence(self):
         MAX_LENGTH = 100
 
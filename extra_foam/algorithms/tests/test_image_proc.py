@@ -5,7 +5,9 @@ import pytest
 import numpy as np
 
 from extra_foam.algorithms import (
-    correct_image_data, mask_image_data, movingAvgImageData, nanmean_image_data
+    correct_image_data, downsample_image, mask_image_data, movingAvgImageData,
+    map_image_to_color, pack_lut,
+    nanmean_image_data
 )
 
 
@@ -249,6 +251,58 @@ class TestImageProc(unittest.TestCase):
                                                dtype=np.float32), img)
 
 
+    def testDownsampleImage(self):
+        with self.assertRaises(ValueError):
+            downsample_image(np.ones((2, 2, 2)), 2)
+
+        img = np.array([[1, 2, 3, 4, 5],
+                        [3, np.nan, 5, 6, 7],
+                        [np.nan, np.nan, 1, 1, 2]], dtype=np.float32)
+
+        # no copy
+        self.assertIs(img, downsample_image(img, 1))
+
+        for dtype in (np.float32, np.float64):
+            ds = downsample_image(img.astype(dtype), 2)
+            self.assertEqual(dtype, ds.dtype)
+            np.testing.assert_array_almost_equal(
+                np.array([[2, 4.5, 6], [np.nan, 1, 2]]), ds)
+
+        for dtype in (np.uint8, np.uint16, np.int32):
+            ds = downsample_image(np.array([[1, 2], [3, 5]], dtype=dtype), 2)
+            self.assertEqual(np.float32, ds.dtype)
+            np.testing.assert_array_equal([[2.75]], ds)
+
+    def testMapImageToColor(self):
+        with self.assertRaises(ValueError):
+            pack_lut(np.ones((4, 2), dtype=np.uint8))
+
+        lut = pack_lut(np.array([[0, 0, 0], [255, 128, 1]], dtype=np.uint8))
+        self.assertEqual(np.uint32, lut.dtype)
+        np.testing.assert_array_equal([0xff000000, 0xffff8001], lut)
+        np.testing.assert_array_equal(
+            [0x01020304],
+            pack_lut(np.array([[2, 3, 4, 1]], dtype=np.uint8)))
+
+        with self.assertRaises(ValueError):
+            map_image_to_color(np.ones((2, 2, 2)), (0, 1), lut)
+
+        img = np.array([[-1, 0, 0.9], [1, 2, np.nan]])
+        expected = np.array([[lut[0], lut[0], lut[1]],
+                             [lut[1], lut[1], 0]])
+        for dtype in (np.float32, np.float64):
+            np.testing.assert_array_equal(
+                expected, map_image_to_color(img.astype(dtype), (0, 1), lut))
+
+        for dtype in (np.uint8, np.uint16, np.int32):
+            out = np.empty((2, 2), dtype=np.uint32)
+            ret = map_image_to_color(
+                np.array([[0, 1], [2, 3]], dtype=dtype), (1, 3), lut, out=out)
+            self.assertIs(out, ret)
+            np.testing.assert_array_equal(
+                [[lut[0], lut[0]], [lut[1], lut[1]]], out)
+
+
 class TestMaskImageData:
     @pytest.mark.parametrize("keep_nan, mt, dtype",
                              [(False, 0, np.float32), (True, np.nan, np.float32)])
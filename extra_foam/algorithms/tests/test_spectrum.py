@@ -1,8 +1,11 @@
 import pytest
 
 import numpy as np
+from scipy.stats import binned_statistic
 
-from extra_foam.algorithms.spectrum import compute_spectrum_1d
+from extra_foam.algorithms.spectrum import (
+    compute_binned_statistics_1d, compute_spectrum_1d, StreamingSpectrum
+)
 
 
 class TestSpectrum:
@@ -41,3 +44,98 @@ class TestSpectrum:
 
         _, edges, _ = compute_spectrum_1d(x, y, n_bins=5, edge2center=False)
         np.testing.assert_array_almost_equal([0., 1.8, 3.6, 5.4, 7.2, 9.], edges)
+
+        # test multiple y
+        stats, centers, counts = compute_spectrum_1d(x, [y, 2 * y], n_bins=5)
+        np.testing.assert_array_equal([np.ones(5), 2 * np.ones(5)], stats)
+        np.testing.assert_array_equal(2 * np.ones(5), counts)
+
+        with pytest.raises(ValueError):
+            compute_spectrum_1d(x, [y[:-1], y[:-1]], n_bins=5)
+
+    @pytest.mark.parametrize("bin_range", [None, (0.2, 0.7), (-1, 2)])
+    def testComputeBinnedStatistics1D(self, bin_range):
+        x = np.random.rand(1000)
+        x[:100] = 0.5  # data on the edges
+        y = np.random.rand(3, 1000)
+        ret = compute_binned_statistics_1d(
+            x, y, n_bins=8, bin_range=bin_range, with_std=True)
+
+        scipy_range = None if bin_range is None else [bin_range]
+        for i in range(3):
+            mean_gt, edges_gt, _ = binned_statistic(
+                x, y[i], 'mean', 8, range=scipy_range)
+            sum_gt, _, _ = binned_statistic(x, y[i], 'sum', 8, range=scipy_range)
+            std_gt, _, _ = binned_statistic(x, y[i], 'std', 8, range=scipy_range)
+            counts_gt, _, _ = binned_statistic(
+                x, y[i], 'count', 8, range=scipy_range)
+
+            np.testing.assert_array_equal(edges_gt, ret.edges)
+            np.testing.assert_array_equal(counts_gt, ret.count)
+            np.testing.assert_allclose(sum_gt, ret.sum[i])
+            np.testing.assert_allclose(mean_gt, ret.mean[i])
+            np.testing.assert_allclose(std_gt, ret.std[i])
+
+        # 1D y
+        ret = compute_binned_statistics_1d(x, y[0], n_bins=8, bin_range=bin_range)
+        assert ret.mean.shape == (8,)
+        assert ret.std is None
+
+    def _check_streaming_spectrum(self, spectrum, x, ys, n_bins):
+        stats, centers, counts = spectrum.spectra(n_bins)
+        for i, y in enumerate(ys):
+            stats_gt, centers_gt, counts_gt = compute_spectrum_1d(
+                x, y, n_bins=n_bins)
+            np.testing.assert_allclose(stats_gt, stats[i], rtol=1e-10)
+            np.testing.assert_array_equal(centers_gt, centers)
+            np.testing.assert_array_equal(counts_gt, counts)
+
+    def testStreamingSpectrum(self):
+        spectrum = StreamingSpectrum(2, max_len=100)
+        spectrum.window = 40
+
+        self._check_streaming_spectrum(spectrum, [], [[], []], 5)
+
+        x_all, y1_all, y2_all = [], [], []
+        # x is constant within a chunk, e.g. energy in a train
+        for i, n in enumerate([1, 3, 10, 0, 20, 15, 8, 50, 5, 120, 9, 6, 30]):
+            x = np.full(n, i % 7, dtype=np.float64)
+            y1 = np.random.rand(n)
+            y2 = np.random.rand(n)
+            spectrum.extend(x, [y1, y2])
+
+            x_all.extend(x)
+            y1_all.extend(y1)
+            y2_all.extend(y2)
+            w = spectrum.window
+            x_gt, y1_gt, y2_gt = x_all[-w:], y1_all[-w:], y2_all[-w:]
+
+            x_w, ys_w = spectrum.data()
+            np.testing.assert_array_equal(x_gt, x_w)
+            np.testing.assert_array_equal([y1_gt, y2_gt], ys_w)
+            self._check_streaming_spectrum(spectrum, x_gt, [y1_gt, y2_gt], 4)
+
+            if i == 6:
+                # number of bins changes
+                self._check_streaming_spectrum(spectrum, x_gt, [y1_gt, y2_gt], 3)
+            if i == 8:
+                # window changes
+                spectrum.window = 60
+                x_gt, y1_gt, y2_gt = x_all[-60:], y1_all[-60:], y2_all[-60:]
+                self._check_streaming_spectrum(spectrum, x_gt, [y1_gt, y2_gt], 4)
+
+        # window is limited by the maximum length
+        spectrum.window = 1000
+        assert 100 == len(spectrum)
+
+        # nan in y
+        spectrum.extend([1, 2], [[np.nan, 1], [2, 3]])
+        stats, _, _ = spectrum.spectra(4)
+        assert np.isnan(stats[0]).any()
+        spectrum.extend(np.ones(100), [np.ones(100), np.ones(100)])
+        self._check_streaming_spectrum(
+            spectrum, np.ones(100), [np.ones(100), np.ones(100)], 4)
+
+        spectrum.reset()
+        assert 0 == len(spectrum)
+        self._check_streaming_spectrum(spectrum, [], [[], []], 5)
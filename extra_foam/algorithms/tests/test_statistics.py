@@ -1,13 +1,18 @@
 import pytest
 
 import math
+from unittest.mock import patch
 
 import numpy as np
 
+from extra_foam.algorithms.data_structures import SimpleSequence
 from extra_foam.algorithms.statistics_py import (
     hist_with_stats, nanhist_with_stats, compute_statistics, _get_outer_edges,
-    nanmean, nansum, quick_min_max
+    _nanhist_with_stats_py,
+    nanmean, nansum, nanstd, nanvar, quick_min_max, StreamingHistogram,
+    compute_roi_foms, compute_asic_moments, ImageHistogram
 )
+from extra_foam.config import RoiFom
 
 
 class TestStatistics:
@@ -32,13 +37,57 @@ class TestStatistics:
         assert quick_min_max(arr) == (1., 2.)
         assert quick_min_max(arr, q=0.9) == (1, 2)
 
+    @pytest.mark.parametrize("dtype", [np.float32, np.float64, np.uint16])
+    def testImageHistogram(self, dtype):
+        arr = np.array([[np.nan, 1, 2, 3, 4], [5, 6, 7, 8, np.nan]])
+        arr = np.nan_to_num(arr, nan=0).astype(dtype) \
+            if dtype == np.uint16 else arr.astype(dtype)
+
+        h = ImageHistogram(arr, n_bins=70)
+        assert h.hist.sum() == np.count_nonzero(~np.isnan(arr.astype(float)))
+        lb, ub = quick_min_max(arr.astype(np.float32))
+        assert (h.lb, h.ub) == (lb, ub)
+        assert h.levels() == (lb, ub)
+        # error is within the width of a bin
+        width = (h.ub - h.lb) / 70
+        tol = 1.001 * width
+        for q in (0.9, 0.7, 0.3):
+            expected = quick_min_max(arr.astype(np.float32), q=q)
+            levels = h.levels(q=q)
+            assert expected[0] - tol <= levels[0] <= expected[0]
+            assert expected[1] <= levels[1] <= expected[1] + tol
+
+        with pytest.raises(ValueError):
+            h.levels(q=1.1)
+
+        hist, centers = h.rebin(20)
+        assert len(hist) == len(centers) == 18
+        assert hist.sum() == h.hist.sum()
+        np.testing.assert_array_almost_equal(h.lb + 2 * width, centers[0])
+        hist, centers = h.rebin(1000)
+        np.testing.assert_array_equal(h.hist, hist)
+
+    def testImageHistogramEmpty(self):
+        with pytest.raises(ValueError):
+            ImageHistogram(np.ones(3))
+
+        for arr in (np.ones((0, 2)), np.full((2, 2), np.nan)):
+            h = ImageHistogram(arr)
+            assert h.hist is None
+            assert h.levels(q=0.99) is None
+            assert h.rebin(10) == (None, None)
+
+        h = ImageHistogram(np.ones((2, 2)))
+        assert h.levels() == (0.5, 1.5)
+
     def _assert_array_almost_equal(self, a, b):
         np.testing.assert_array_almost_equal(a, b)
         if isinstance(a, np.ndarray):
             assert a.dtype == b.dtype
 
     @pytest.mark.parametrize("dtype", [np.float32, np.float64])
-    @pytest.mark.parametrize("f_cpp, f_py", [(nanmean, np.nanmean), (nansum, np.nansum)])
+    @pytest.mark.parametrize("f_cpp, f_py", [(nanmean, np.nanmean), (nansum, np.nansum),
+                                             (nanvar, np.nanvar), (nanstd, np.nanstd)])
     def testCppStatistics(self, f_cpp, f_py, dtype):
         a1d = np.array([np.nan, 1, 2], dtype=dtype)
         a2d = np.array([[np.nan, 1, 2], [3, 6, np.nan]], dtype=dtype)
@@ -67,6 +116,27 @@ class TestStatistics:
             self._assert_array_almost_equal(f_py(a3d, axis=(-2, -1)), f_cpp(a3d, axis=(-2, -1)))
             self._assert_array_almost_equal(f_py(a4d, axis=(-2, -1)), f_cpp(a4d, axis=(-2, -1)))
 
+    @pytest.mark.parametrize("dtype", [np.float32, np.float64])
+    def testNormalizedNanVarStd(self, dtype):
+        a3d = np.random.rand(4, 20, 30).astype(dtype) + 1.
+        a3d[:, ::3, ::4] = np.nan
+
+        with np.warnings.catch_warnings():
+            np.warnings.simplefilter("ignore", category=RuntimeWarning)
+
+            for axis in [None, 0, (-2, -1), (0, 2)]:
+                self._assert_array_almost_equal(
+                    np.nanvar(a3d, axis=axis) / np.nanmean(a3d, axis=axis) ** 2,
+                    nanvar(a3d, axis=axis, normalized=True))
+                self._assert_array_almost_equal(
+                    np.nanstd(a3d, axis=axis) / np.nanmean(a3d, axis=axis),
+                    nanstd(a3d, axis=axis, normalized=True))
+
+            # non-contiguous input
+            roi = a3d[:, 2:15, 3:25:2]
+            self._assert_array_almost_equal(np.nanvar(roi, axis=(-2, -1)),
+                                            nanvar(roi, axis=(-2, -1)))
+
     def testNanhistWithStats(self):
         # case 1
         roi = np.array([[np.nan, 1, 2], [3, 6, np.nan]], dtype=np.float32)
@@ -110,6 +180,47 @@ class TestStatistics:
         with pytest.raises(ValueError):
             nanhist_with_stats(roi, (-np.inf, np.inf), 4)
 
+    @pytest.mark.parametrize("dtype", [np.float32, np.float64])
+    @pytest.mark.parametrize("bin_range", [(-np.inf, np.inf), (-0.5, 1.0),
+                                           (-np.inf, 0.5), (0.5, np.inf)])
+    def testNanhistWithStatsCppVsPy(self, dtype, bin_range):
+        roi = np.random.randn(3, 20, 30).astype(dtype)
+        roi[:, ::3, ::2] = np.nan
+        for data in (roi, roi[0], roi[0, 1], roi[:, 2:10, 5:9]):
+            ret = nanhist_with_stats(data, bin_range, 8)
+            ret_gt = _nanhist_with_stats_py(data, bin_range, 8)
+            np.testing.assert_array_equal(ret_gt[0], ret[0])
+            np.testing.assert_array_almost_equal(ret_gt[1], ret[1])
+            for v, v_gt in zip(ret[2:], ret_gt[2:]):
+                assert v_gt == pytest.approx(v, rel=1e-5)
+
+    @pytest.mark.parametrize("dtype", [np.float32, np.float64])
+    def testNanhistWithStatsBoundary(self, dtype):
+        bin_range, n_bins = (0.1, 0.7), 6
+        # the bin edges and their neighbours in the data type, which
+        # spread over more than one block of a 1D input
+        edges = np.linspace(*bin_range, n_bins + 1).astype(dtype)
+        data = np.concatenate([
+            edges,
+            np.nextafter(edges, dtype(-np.inf)),
+            np.nextafter(edges, dtype(np.inf)),
+            np.random.rand(10000).astype(dtype),
+        ])
+        data[::7] = np.nan
+
+        hist, bin_centers, mean, median, std = nanhist_with_stats(
+            data, bin_range, n_bins)
+        hist_gt, edges_gt = np.histogram(
+            data[~np.isnan(data)], bins=n_bins, range=bin_range)
+        np.testing.assert_array_equal(hist_gt, hist)
+        np.testing.assert_array_almost_equal(
+            (edges_gt[1:] + edges_gt[:-1]) / 2, bin_centers)
+
+        filtered = data[(data >= bin_range[0]) & (data <= bin_range[1])]
+        assert np.median(filtered) == pytest.approx(median)
+        assert np.mean(filtered, dtype=np.float64) == pytest.approx(mean)
+        assert np.std(filtered, dtype=np.float64) == pytest.approx(std)
+
     def testHistWithStats(self):
         data = np.array([0, 1, 2, 3, 6, 0], dtype=np.float32)  # 1D
         hist, bin_centers, mean, median, std = hist_with_stats(data, (1, 3), 4)
@@ -143,6 +254,150 @@ class TestStatistics:
         with pytest.raises(ValueError):
             hist_with_stats(roi, (-np.inf, np.inf), 4)
 
+        # case 5 (nan is not ignored unless the bin range is finite)
+        roi = np.array([[np.nan, 2, 3], [4, 5, 6]], dtype=np.float32)
+        for bin_range in [(-np.inf, np.inf), (-np.inf, 5), (3, np.inf)]:
+            with pytest.raises(ValueError):
+                hist_with_stats(roi, bin_range, 4)
+        hist, _, mean, _, _ = hist_with_stats(roi, (3, 5), 2)
+        np.testing.assert_array_equal([1, 2], hist)
+        assert 4 == mean
+
+    @pytest.mark.parametrize("bin_range", [(-np.inf, np.inf), (0.2, 0.8),
+                                           (-np.inf, 0.5), (0.3, np.inf)])
+    def testStreamingHistogram(self, bin_range):
+        hist = StreamingHistogram()
+        history = np.array([])
+        for i in range(40):
+            new = np.random.rand(50)
+            history = np.concatenate([history, new])
+            hist.update(new, history, bin_range, 5)
+
+            ret = hist.stats()
+            ret_gt = hist_with_stats(history, bin_range, 5)
+            np.testing.assert_array_equal(ret_gt[0], ret[0])
+            np.testing.assert_array_almost_equal(ret_gt[1], ret[1])
+            assert ret_gt[2] == pytest.approx(ret[2])
+            assert ret_gt[4] == pytest.approx(ret[4])
+        # the median is estimated from the sketch
+        assert ret_gt[3] == pytest.approx(ret[3], abs=0.01)
+
+        # history and accumulator are out of sync
+        history = history[100:]
+        hist.update([], history, bin_range, 5)
+        np.testing.assert_array_equal(
+            hist_with_stats(history, bin_range, 5)[0], hist.stats()[0])
+
+        # bin range changes
+        hist.update([], history, (0.1, 0.9), 4)
+        np.testing.assert_array_equal(
+            hist_with_stats(history, (0.1, 0.9), 4)[0], hist.stats()[0])
+
+        # empty after filtering
+        hist.reset()
+        hist.update([0, 1], np.array([0, 1]), (2, 3), 2)
+        hist_gt, bin_centers, mean, median, std = hist.stats()
+        np.testing.assert_array_equal([0, 0], hist_gt)
+        np.testing.assert_array_equal([2.25, 2.75], bin_centers)
+        assert np.isnan(mean) and np.isnan(median) and np.isnan(std)
+
+        # finite outer edges cannot be found
+        hist.reset()
+        with pytest.raises(ValueError):
+            hist.update([1, np.inf], np.array([1, np.inf]), (-np.inf, np.inf), 4)
+
+    @pytest.mark.parametrize("bin_range", [(-np.inf, np.inf), (0.2, 0.8),
+                                           (-np.inf, 0.5), (0.3, np.inf)])
+    def testStreamingHistogramBoundedHistory(self, bin_range):
+        hist = StreamingHistogram()
+        history = SimpleSequence(max_len=120)
+        with patch.object(hist, "_rebuild", wraps=hist._rebuild) as rebuild:
+            for i in range(40):
+                new = np.random.rand(50)
+                n_evicted = max(len(history) + new.size - 120, 0)
+                evicted = history.data()[:n_evicted].copy()
+                history.extend(new)
+                hist.update(new, history.data(), bin_range, 5, evicted)
+
+                ret = hist.stats()
+                ret_gt = hist_with_stats(history.data(), bin_range, 5)
+                np.testing.assert_array_equal(ret_gt[0], ret[0])
+                np.testing.assert_array_almost_equal(ret_gt[1], ret[1])
+                assert ret_gt[2] == pytest.approx(ret[2])
+                assert ret_gt[4] == pytest.approx(ret[4])
+
+            if np.all(np.isfinite(bin_range)):
+                # the history is only visited at the beginning
+                rebuild.assert_called_once()
+
+        # the whole history is dropped
+        evicted = history.data().copy()
+        history.reset()
+        history.extend([0.4])
+        hist.update([0.4], history.data(), bin_range, 5, evicted)
+        np.testing.assert_array_equal(
+            hist_with_stats(history.data(), bin_range, 5)[0], hist.stats()[0])
+        assert 0.4 == pytest.approx(hist.stats()[2])
+        assert 0 == pytest.approx(hist.stats()[4])
+
+    @pytest.mark.parametrize("dtype", [np.float32, np.float64, np.uint16])
+    def testComputeRoiFoms(self, dtype):
+        handlers = {
+            RoiFom.SUM: np.nansum,
+            RoiFom.MEAN: np.nanmean,
+            RoiFom.MEDIAN: np.nanmedian,
+            RoiFom.MAX: np.nanmax,
+            RoiFom.MIN: np.nanmin,
+            RoiFom.STD: np.nanstd,
+            RoiFom.VAR: np.nanvar,
+            RoiFom.N_STD: lambda x, axis: np.nanstd(x, axis=axis) / np.nanmean(x, axis=axis),
+            RoiFom.N_VAR: lambda x, axis: np.nanvar(x, axis=axis) / np.nanmean(x, axis=axis) ** 2,
+        }
+
+        data = (100 * np.random.rand(4, 20, 16)).astype(dtype)
+        if dtype != np.uint16:
+            data[0, 2:6, 3:7] = np.nan
+        image_mask = np.zeros((20, 16), dtype=bool)
+        image_mask[5:8, 4:6] = True
+
+        rects = [(0, 0, 16, 20), (3, 2, 4, 5), (10, 12, 5, 3), (1, 1, 1, 1)]
+        types = list(handlers)
+        for threshold_mask in [None, (20, 80)]:
+            for fom_type in types:
+                foms = compute_roi_foms(data, rects, [fom_type] * len(rects),
+                                        image_mask=image_mask,
+                                        threshold_mask=threshold_mask)
+                assert foms.shape == (len(rects), 4)
+
+                for rect, fom in zip(rects, foms):
+                    x, y, w, h = rect
+                    roi = data[:, y:y + h, x:x + w].astype(np.float64)
+                    roi[:, image_mask[y:y + h, x:x + w]] = np.nan
+                    if threshold_mask is not None:
+                        roi[(roi < threshold_mask[0]) | (roi > threshold_mask[1])] = np.nan
+
+                    with np.warnings.catch_warnings():
+                        np.warnings.simplefilter("ignore", category=RuntimeWarning)
+                        fom_gt = handlers[fom_type](roi, axis=(-2, -1))
+                    np.testing.assert_allclose(fom_gt, fom, rtol=1e-5)
+
+        # different FOM types in a single call
+        foms = compute_roi_foms(data, rects[:2], [RoiFom.SUM, RoiFom.MAX])
+        np.testing.assert_allclose(np.nansum(data, axis=(-2, -1)), foms[0], rtol=1e-5)
+        np.testing.assert_allclose(np.nanmax(data[:, 2:7, 3:7], axis=(-2, -1)), foms[1])
+
+        # input data are not modified
+        data_cp = data.copy()
+        compute_roi_foms(data, rects, [RoiFom.SUM] * len(rects),
+                         image_mask=image_mask, threshold_mask=(20, 80))
+        np.testing.assert_array_equal(data_cp, data)
+
+        with pytest.raises(ValueError, match="out of the image boundary"):
+            compute_roi_foms(data, [(10, 0, 7, 2)], [RoiFom.SUM])
+
+        with pytest.raises(ValueError, match="Unknown FOM type"):
+            compute_roi_foms(data, [(0, 0, 2, 2)], [0])
+
     def testFindActualRange(self):
         arr = np.array([1, 2, 3, 4])
         assert (-1.5, 2.5) == _get_outer_edges(arr, (-1.5, 2.5))
@@ -194,3 +449,39 @@ class TestStatistics:
 
         data = np.array([1, 1, 2, 1, 1])
         assert (1.2, 1.0, 0.4) == compute_statistics(data)
+
+    @pytest.mark.parametrize("dtype", [np.float32, np.float64, np.uint16])
+    def testComputeAsicMoments(self, dtype):
+        n_pulses, n_modules, h, w = 5, 3, 8, 12
+        data = (10 * np.random.rand(n_pulses, n_modules, h, w)).astype(dtype)
+        asic_shape = (4, 6)
+
+        # reference
+        ref = data.astype(np.float64).reshape(n_pulses, n_modules, 2, 4, 2, 6)
+        ref = ref.transpose(1, 2, 4, 0, 3, 5).reshape(n_modules, 2, 2, -1)
+        mean = ref.mean(axis=-1)
+
+        for arr in (data, [data[:, i] for i in range(n_modules)]):
+            ret = compute_asic_moments(arr, asic_shape, saturation=8)
+            assert ret.shape == (n_modules, 2, 2, 4)
+            np.testing.assert_array_equal(ref.shape[-1], ret[..., 0])
+            np.testing.assert_array_almost_equal(mean, ret[..., 1])
+            np.testing.assert_array_almost_equal(
+                ((ref - mean[..., None]) ** 2).sum(axis=-1), ret[..., 2],
+                decimal=3)
+            np.testing.assert_array_equal((ref >= 8).sum(axis=-1),
+                                          ret[..., 3])
+
+        if dtype is not np.uint16:
+            # nan is ignored
+            data[:, 0, 0, 0] = np.nan
+            ret = compute_asic_moments(data, asic_shape)
+            assert ret[0, 0, 0, 0] == ref.shape[-1] - n_pulses
+            assert not np.isnan(ret[0, 0, 0, 1])
+            np.testing.assert_array_equal(0, ret[..., 3])
+
+        with pytest.raises(ValueError):
+            compute_asic_moments(data, (3, 5))
+
+        with pytest.raises(ValueError):
+            compute_asic_moments([data[:, 0], data[:, 1, :4]], asic_shape)
@@ -77,12 +77,16 @@ class AnalysisType(IntEnum):
     ROI_NORM = 12
     ROI_PROJ = 21
     AZIMUTHAL_INTEG = 41
+    # transformed image, which is only needed for display
+    IMAGE_TRANSFORM = 61
     PULSE = 2700
     PUMP_PROBE_PULSE = 2701
     ROI_FOM_PULSE = 2711
     ROI_NORM_PULSE = 2712
     ROI_PROJ_PULSE = 2721
     AZIMUTHAL_INTEG_PULSE = 2741
+    # images of pulses of interest, which are only needed for display
+    PULSE_OF_INTEREST = 2751
 
 
 class GeomAssembler(IntEnum):
@@ -44,6 +44,7 @@ class Metadata(metaclass=MetaMetadata):
 
     CONNECTION = "meta:connection"
     EXTENSION = "meta:extension"
+    RESULT_SINK = "meta:result_sink"
 
     ANALYSIS_TYPE = "meta:analysis_type"
 
@@ -126,6 +127,41 @@ class MetaProxy(_AbstractProxy):
             return self.hincrease_by(Metadata.ANALYSIS_TYPE, analysis_type, -1)
         return 0
 
+    def has_extension_client(self):
+        """Check if any extension client is receiving the processed data."""
+        return self.hget(Metadata.EXTENSION, "client") == '1'
+
+    def set_extension_client(self, state):
+        """Set whether any extension client is receiving the processed data.
+
+        :param bool state: True for at least one client receiving data.
+        """
+        return self.hset(Metadata.EXTENSION, "client", int(state))
+
+    def has_result_sink(self, field=None):
+        """Check if the processed data are written to file.
+
+        :param str field: path of a field in the processed data. If given,
+            check whether this field is written.
+        """
+        cfg = self.hget_all(Metadata.RESULT_SINK)
+        if not cfg or not cfg.get("filepath"):
+            return False
+        return field is None or field in cfg.get("fields", "").split(",")
+
+    def has_consumer(self, analysis_type):
+        """Check if the result of the given analysis is consumed.
+
+        The result is consumed by a GUI widget, which registers the
+        analysis type while it is displayed, by an extension client,
+        which receives all the processed data, or by the result sink.
+
+        :param AnalysisType analysis_type: analysis type.
+        """
+        if self.has_analysis(analysis_type):
+            return True
+        return self.has_extension_client() or self.has_result_sink()
+
     @redis_except_handler
     def add_data_source(self, item):
         """Add a data source.
@@ -17,6 +17,7 @@ from ..config import config
 
 MAX_TRAIN_ID = 999999999
 MAX_PERFORMANCE_MONITOR_POINTS = 10 * 60 * 5  # 5 minutes at 10 Hz
+MAX_LATENCY_POINTS = 100
 
 
 class MonProxy(_AbstractProxy):
@@ -26,6 +27,8 @@ class MonProxy(_AbstractProxy):
     N_PROCESSED = "mon:n_processed"
     N_DROPPED = "mon:n_dropped"
     N_PROCESSED_P = "mon:n_processed_pulses"
+    N_SKIPPED = "mon:n_skipped"
+    LATENCY = "mon:latency"
     PERFORMANCE = "mon:train_id"
     TIMESTAMP_SOURCES = "mon:timestamp_sources"
     AVAILABLE_SOURCES = "mon:available_sources"
@@ -66,7 +69,51 @@ class MonProxy(_AbstractProxy):
         return pipe.execute_command(
             "SET", self.N_PROCESSED, 0).execute_command(
             "SET", self.N_DROPPED, 0).execute_command(
-            "SET", self.N_PROCESSED_P, 0).execute()
+            "SET", self.N_PROCESSED_P, 0).execute_command(
+            "DEL", self.N_SKIPPED).execute_command(
+            "DEL", self.LATENCY).execute()
+
+    @redis_except_handler
+    def add_skipped(self, name):
+        """Increase the count of skipped computation of the given name.
+
+        A computation is skipped if its result is not consumed.
+
+        :param str name: name of the computation.
+        """
+        return self._db.execute_command("HINCRBY", self.N_SKIPPED, name, 1)
+
+    @redis_except_handler
+    def add_latency(self, latency):
+        """Add the end-to-end latency of a train.
+
+        Only the latest MAX_LATENCY_POINTS latencies are kept.
+
+        :param float latency: time in seconds from sending the train by
+            the file server to receiving the processed data by the GUI.
+        """
+        pipe = self._db.pipeline()
+        pipe.execute_command("LPUSH", self.LATENCY, latency)
+        pipe.execute_command("LTRIM", self.LATENCY, 0, MAX_LATENCY_POINTS - 1)
+        return pipe.execute()
+
+    @redis_except_handler
+    def get_latency(self):
+        """Get the latest end-to-end latencies in seconds.
+
+        :return: None if the connection failed; otherwise, a list of
+            latencies with the latest first.
+        """
+        return [float(v) for v in
+                self._db.execute_command("LRANGE", self.LATENCY, 0, -1)]
+
+    def get_skip_count(self):
+        """Get the count of skipped computation.
+
+        :return: None if the connection failed;
+                 otherwise, a dictionary of name and count pairs.
+        """
+        return self.hget_all(self.N_SKIPPED)
 
     @redis_except_handler
     def get_latest_tids(self, num=MAX_PERFORMANCE_MONITOR_POINTS):
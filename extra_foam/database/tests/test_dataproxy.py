@@ -80,6 +80,38 @@ class TestDataProxy(unittest.TestCase):
         self._meta.unregister_analysis(type3)
         self.assertEqual('0', self._meta.hget(Metadata.ANALYSIS_TYPE, type3))
 
+    def testConsumer(self):
+        tp = AnalysisType.PULSE_OF_INTEREST
+
+        self.assertFalse(self._meta.has_extension_client())
+        self.assertFalse(self._meta.has_consumer(tp))
+
+        # consumed by a GUI widget
+        self._meta.register_analysis(tp)
+        self.assertTrue(self._meta.has_consumer(tp))
+        self._meta.unregister_analysis(tp)
+        self.assertFalse(self._meta.has_consumer(tp))
+
+        # consumed by an extension client
+        self._meta.set_extension_client(True)
+        self.assertTrue(self._meta.has_extension_client())
+        self.assertTrue(self._meta.has_consumer(tp))
+        self._meta.set_extension_client(False)
+        self.assertFalse(self._meta.has_consumer(tp))
+
+        # consumed by the result sink
+        self.assertFalse(self._meta.has_result_sink())
+        self._meta.hmset(Metadata.RESULT_SINK,
+                         {"filepath": "results.h5", "fields": "roi.fom,ai.fom"})
+        self.assertTrue(self._meta.has_result_sink())
+        self.assertTrue(self._meta.has_result_sink("ai.fom"))
+        self.assertFalse(self._meta.has_result_sink("pulse.ai.fom"))
+        self.assertTrue(self._meta.has_consumer(tp))
+        self._meta.hmset(Metadata.RESULT_SINK,
+                         {"filepath": "", "fields": "roi.fom,ai.fom"})
+        self.assertFalse(self._meta.has_result_sink("ai.fom"))
+        self.assertFalse(self._meta.has_consumer(tp))
+
     def testMetaMetadata(self):
         class Dummy(metaclass=MetaMetadata):
             DATA_SOURCE = "meta:data_source"
@@ -117,6 +149,19 @@ class TestDataProxy(unittest.TestCase):
         self.assertEqual('1', n_drop)
         self.assertEqual('20', n_proc_p)
 
+    def testSkipCount(self):
+        mon = self._mon
+        mon.reset_process_count()
+        self.assertDictEqual({}, mon.get_skip_count())
+
+        mon.add_skipped("A")
+        mon.add_skipped("B")
+        mon.add_skipped("A")
+        self.assertDictEqual({'A': '2', 'B': '1'}, mon.get_skip_count())
+
+        mon.reset_process_count()
+        self.assertDictEqual({}, mon.get_skip_count())
+
     def testSnapshotOperation(self):
         data = {
             Metadata.IMAGE_PROC: {"aaa": '1', "bbb": "(-1, 1)", "ccc": "sea"},
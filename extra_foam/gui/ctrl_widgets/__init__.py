@@ -14,6 +14,7 @@ from .histogram_ctrl_widget import HistogramCtrlWidget
 from .filter_ctrl_widget import FomFilterCtrlWidget
 from .data_source_widget import DataSourceWidget
 from .extension_ctrl_widget import ExtensionCtrlWidget
+from .result_sink_ctrl_widget import ResultSinkCtrlWidget
 from .smart_widgets import (
     SmartBoundaryLineEdit, SmartLineEdit, SmartSliceLineEdit,
     SmartStringLineEdit
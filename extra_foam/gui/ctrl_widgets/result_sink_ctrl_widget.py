@@ -0,0 +1,100 @@
+"""
+Distributed under the terms of the BSD 3-Clause License.
+
+The full license is in the file LICENSE, distributed with this software.
+
+Author: Jun Zhu <jun.zhu@xfel.eu>
+Copyright (C) European X-Ray Free-Electron Laser Facility GmbH.
+All rights reserved.
+"""
+import os.path as osp
+
+from PyQt5.QtCore import Qt, pyqtSlot
+from PyQt5.QtWidgets import (
+    QCheckBox, QGridLayout, QLabel, QListWidget, QListWidgetItem
+)
+
+from .base_ctrl_widgets import _AbstractGroupBoxCtrlWidget
+from .smart_widgets import SmartStringLineEdit
+from ... import ROOT_PATH
+from ...pipeline.f_sink import RESULT_FIELDS
+
+# fields written by default
+_DEFAULT_FIELDS = ("xgm.intensity", "roi.fom", "ai.fom", "pp.fom")
+
+
+class ResultSinkCtrlWidget(_AbstractGroupBoxCtrlWidget):
+    """Widget for setting up writing results to file.
+
+    The setup takes effect when the pipeline is started.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__("Result sink setup", *args, **kwargs)
+
+        self._enable_cb = QCheckBox("Write results")
+        self._filepath_le = SmartStringLineEdit(
+            osp.join(ROOT_PATH, "results.h5"))
+
+        self._fields_lw = QListWidget()
+        for f in RESULT_FIELDS:
+            item = QListWidgetItem(f)
+            item.setFlags(Qt.ItemIsEnabled | Qt.ItemIsUserCheckable)
+            if f.startswith("pulse.") and not self._pulse_resolved:
+                item.setFlags(Qt.ItemIsUserCheckable)
+            item.setCheckState(
+                Qt.Checked if f in _DEFAULT_FIELDS else Qt.Unchecked)
+            self._fields_lw.addItem(item)
+
+        self._non_reconfigurable_widgets = [
+            self._enable_cb,
+            self._filepath_le,
+            self._fields_lw,
+        ]
+
+        self.initUI()
+        self.initConnections()
+
+    def initUI(self):
+        """Overload."""
+        layout = QGridLayout()
+        AR = Qt.AlignRight
+
+        layout.addWidget(self._enable_cb, 0, 0, 1, 2)
+        layout.addWidget(QLabel("File"), 1, 0, AR)
+        layout.addWidget(self._filepath_le, 1, 1)
+        layout.addWidget(QLabel("Fields"), 2, 0, Qt.AlignRight | Qt.AlignTop)
+        layout.addWidget(self._fields_lw, 2, 1)
+
+        self.setLayout(layout)
+
+    def initConnections(self):
+        """Overload."""
+        self._enable_cb.toggled.connect(self._onSinkChange)
+        self._filepath_le.value_changed_sgn.connect(self._onSinkChange)
+        self._fields_lw.itemChanged.connect(self._onSinkChange)
+
+    def updateMetaData(self):
+        """Overload."""
+        self._onSinkChange()
+        return True
+
+    def loadMetaData(self):
+        """Override."""
+        pass
+
+    def fields(self):
+        """Return the checked fields."""
+        ret = []
+        for i in range(self._fields_lw.count()):
+            item = self._fields_lw.item(i)
+            if item.checkState() == Qt.Checked and \
+                    item.flags() & Qt.ItemIsEnabled:
+                ret.append(item.text())
+        return ret
+
+    @pyqtSlot()
+    def _onSinkChange(self):
+        filepath = self._filepath_le.text() \
+            if self._enable_cb.isChecked() else ""
+        self._mediator.onResultSinkChange(filepath, self.fields())
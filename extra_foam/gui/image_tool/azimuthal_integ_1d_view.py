@@ -13,6 +13,7 @@ from .base_view import _AbstractImageToolView, create_imagetool_view
 from ..ctrl_widgets import AzimuthalIntegCtrlWidget
 from ..misc_widgets import FColor
 from ..plot_widgets import ImageViewF, PlotWidgetF
+from ..windows import _DisplayedAnalysisMixin
 from ...algorithms import find_peaks_1d
 from ...config import AnalysisType, plot_labels
 
@@ -56,13 +57,15 @@ class AzimuthalInteg1dPlot(PlotWidgetF):
 
 
 @create_imagetool_view(AzimuthalIntegCtrlWidget)
-class AzimuthalInteg1dView(_AbstractImageToolView):
+class AzimuthalInteg1dView(_DisplayedAnalysisMixin, _AbstractImageToolView):
     """AzimuthalInteg1dView class.
 
     Widget for visualizing the current image as well as the 1D azimuthal
     integration result. A ctrl widget is included to set up the parameters
     for azimuthal integration.
     """
+    _displayed_analysis_types = (AnalysisType.AZIMUTHAL_INTEG,)
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
@@ -104,14 +107,8 @@ class AzimuthalInteg1dView(_AbstractImageToolView):
     def updateF(self, data, auto_update):
         """Override."""
         if auto_update or self._corrected.image is None:
-            self._corrected.setImage(data.image.masked_mean)
+            self._corrected.setImage(
+                data.image.masked_mean,
+                histogram=data.image.masked_mean_hist)
             self._q_view.setImage(data.ai.q_map, auto_levels=True)
             self._azimuthal_integ_1d_curve.updateF(data)
-
-    def onActivated(self):
-        """Override."""
-        self._mediator.registerAnalysis(AnalysisType.AZIMUTHAL_INTEG)
-
-    def onDeactivated(self):
-        """Override."""
-        self._mediator.unregisterAnalysis(AnalysisType.AZIMUTHAL_INTEG)
@@ -7,6 +7,8 @@ Author: Jun Zhu <jun.zhu@xfel.eu>
 Copyright (C) European X-Ray Free-Electron Laser Facility GmbH.
 All rights reserved.
 """
+import numpy as np
+
 from PyQt5.QtCore import Qt, QTimer
 from PyQt5.QtGui import QColor
 from PyQt5.QtWidgets import QGridLayout, QLabel, QLCDNumber, QPushButton
@@ -43,6 +45,12 @@ class BulletinView(_AbstractImageToolView):
         #       pulses in a train is not only decided by the data received,
         #       but also depends on the pulse slicer.
         self._n_processed_pulses = QLCDNumber(self._LCD_DIGITS)
+        # computations skipped since their results are not consumed
+        self._n_skipped = QLCDNumber(self._LCD_DIGITS)
+        # mean end-to-end latency of the latest trains stamped by the
+        # file server
+        self._latency = QLCDNumber(self._LCD_DIGITS)
+        self._latency.display(None)
 
         self._reset_process_count_btn = QPushButton("Reset process count")
 
@@ -67,6 +75,8 @@ class BulletinView(_AbstractImageToolView):
         self._setLcdStyle(self._n_processed_trains)
         self._setLcdStyle(self._n_dropped_trains)
         self._setLcdStyle(self._n_processed_pulses)
+        self._setLcdStyle(self._n_skipped)
+        self._setLcdStyle(self._latency)
 
         layout = QGridLayout()
         AR = Qt.AlignRight
@@ -88,7 +98,11 @@ class BulletinView(_AbstractImageToolView):
         layout.addWidget(self._n_dropped_trains, 7, 1)
         layout.addWidget(QLabel("# of processed pulses: "), 8, 0, AR)
         layout.addWidget(self._n_processed_pulses, 8, 1)
-        layout.addWidget(self._reset_process_count_btn, 9, 1)
+        layout.addWidget(QLabel("# of skipped computations: "), 9, 0, AR)
+        layout.addWidget(self._n_skipped, 9, 1)
+        layout.addWidget(QLabel("Latency (ms): "), 10, 0, AR)
+        layout.addWidget(self._latency, 10, 1)
+        layout.addWidget(self._reset_process_count_btn, 11, 1)
         self.setLayout(layout)
 
     def initConnections(self):
@@ -119,5 +133,23 @@ class BulletinView(_AbstractImageToolView):
         self._n_dropped_trains.display(n_dropped)
         self._n_processed_pulses.display(n_processed_pulses)
 
+        skipped = self._mon.get_skip_count()
+        if skipped is not None:
+            self._n_skipped.display(sum(int(v) for v in skipped.values()))
+            self._n_skipped.setToolTip(
+                "\n".join(f"{k}: {v}" for k, v in sorted(skipped.items())))
+
+        latency = self._mon.get_latency()
+        if latency:
+            latency = 1000. * np.array(latency)
+            self._latency.display(f"{latency.mean():.1f}")
+            self._latency.setToolTip(
+                f"Mean of the latest {len(latency)} trains\n"
+                f"Median: {np.median(latency):.1f} ms\n"
+                f"Max: {latency.max():.1f} ms")
+        elif latency is not None:
+            self._latency.display(None)
+            self._latency.setToolTip("")
+
     def _resetProcessCount(self):
         self._mon.reset_process_count()
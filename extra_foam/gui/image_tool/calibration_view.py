@@ -69,7 +69,9 @@ class CalibrationView(_AbstractImageToolView):
     def updateF(self, data, auto_update):
         """Override."""
         if auto_update or self._corrected.image is None:
-            self._corrected.setImage(data.image.masked_mean)
+            self._corrected.setImage(
+                data.image.masked_mean,
+                histogram=data.image.masked_mean_hist)
             self._dark.setImage(data.image.dark_mean)
             self._offset.setImage(data.image.offset_mean)
             self._gain.setImage(data.image.gain_mean)
@@ -44,4 +44,6 @@ class GeometryView(_AbstractImageToolView):
     def updateF(self, data, auto_update):
         """Override."""
         if auto_update or self._corrected.image is None:
-            self._corrected.setImage(data.image.masked_mean)
+            self._corrected.setImage(
+                data.image.masked_mean,
+                histogram=data.image.masked_mean_hist)
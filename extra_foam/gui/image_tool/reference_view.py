@@ -60,7 +60,9 @@ class ReferenceView(_AbstractImageToolView):
     def updateF(self, data, auto_update):
         """Override."""
         if auto_update or self._corrected.image is None:
-            self._corrected.setImage(data.image.masked_mean)
+            self._corrected.setImage(
+                data.image.masked_mean,
+                histogram=data.image.masked_mean_hist)
             # Removing and displaying of the currently displayed image
             # is deferred.
             self._reference.setImage(data.image.reference)
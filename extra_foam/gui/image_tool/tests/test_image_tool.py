@@ -422,6 +422,11 @@ class TestImageTool(unittest.TestCase, _TestDataMixin):
             view._reset_process_count_btn.clicked.emit()
             reset.assert_called_once()
 
+        with patch.object(view._mon, "get_skip_count",
+                          return_value={"A": '2', "B": '3'}):
+            view._updateProcessCount()
+            self.assertEqual(5, int(view._n_skipped.intValue()))
+
     def testCalibrationCtrlWidget(self):
         widget = self.image_tool._calibration_view._ctrl_widget
 
@@ -1027,17 +1032,26 @@ class TestImageTool(unittest.TestCase, _TestDataMixin):
         tab.setCurrentIndex(TabIndex.AZIMUTHAL_INTEG_1D)
         self.assertEqual('1', self._meta.hget(Metadata.ANALYSIS_TYPE, AnalysisType.AZIMUTHAL_INTEG))
 
+        # the analysis is only registered when it is displayed
+        self.image_tool.hide()
+        self.assertEqual('0', self._meta.hget(Metadata.ANALYSIS_TYPE, AnalysisType.AZIMUTHAL_INTEG))
+        self.image_tool.show()
+        self.assertEqual('1', self._meta.hget(Metadata.ANALYSIS_TYPE, AnalysisType.AZIMUTHAL_INTEG))
+
         # switch to "geometry"
         tab.tabBarClicked.emit(TabIndex.GEOMETRY)
         tab.setCurrentIndex(TabIndex.GEOMETRY)
+        self.assertEqual('0', self._meta.hget(Metadata.ANALYSIS_TYPE, AnalysisType.AZIMUTHAL_INTEG))
 
         # switch to "image transform"
         tab.tabBarClicked.emit(TabIndex.IMAGE_TRANSFORM)
         tab.setCurrentIndex(TabIndex.IMAGE_TRANSFORM)
+        self.assertEqual('1', self._meta.hget(Metadata.ANALYSIS_TYPE, AnalysisType.IMAGE_TRANSFORM))
 
         # switch back to "overview"
         tab.tabBarClicked.emit(TabIndex.OVERVIEW)
         tab.setCurrentIndex(TabIndex.OVERVIEW)
+        self.assertEqual('0', self._meta.hget(Metadata.ANALYSIS_TYPE, AnalysisType.IMAGE_TRANSFORM))
         self.assertTrue(mask_ctrl_widget.draw_mask_btn.isEnabled())
         self.assertTrue(mask_ctrl_widget.erase_mask_btn.isEnabled())
 
@@ -14,15 +14,17 @@ from .base_view import _AbstractImageToolView, create_imagetool_view
 from ..misc_widgets import FColor
 from ..ctrl_widgets import ImageTransformCtrlWidget
 from ..plot_widgets import ImageViewF, RingItem
-from ...config import ImageTransformType
+from ..windows import _DisplayedAnalysisMixin
+from ...config import AnalysisType, ImageTransformType
 
 
 @create_imagetool_view(ImageTransformCtrlWidget)
-class TransformView(_AbstractImageToolView):
+class TransformView(_DisplayedAnalysisMixin, _AbstractImageToolView):
     """TransformView class.
 
     Widget for image transform and feature extraction.
     """
+    _displayed_analysis_types = (AnalysisType.IMAGE_TRANSFORM,)
 
     transform_type_changed_sgn = pyqtSignal(int)
 
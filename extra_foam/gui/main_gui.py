@@ -21,7 +21,7 @@ from threading import Event
 from PyQt5.QtCore import (
     pyqtSignal, pyqtSlot, QObject, Qt, QThread, QTimer
 )
-from PyQt5.QtGui import QIcon
+from PyQt5.QtGui import QGuiApplication, QIcon
 from PyQt5.QtWidgets import (
     QAction, QFrame, QMainWindow, QScrollArea, QSplitter,
     QTabWidget, QVBoxLayout, QWidget
@@ -30,7 +30,7 @@ from redis import ConnectionError
 
 from .ctrl_widgets import (
     AnalysisCtrlWidget, ExtensionCtrlWidget, FomFilterCtrlWidget,
-    DataSourceWidget
+    DataSourceWidget, ResultSinkCtrlWidget
 )
 from .misc_widgets import AnalysisSetupManager, GuiLogger
 from .image_tool import ImageToolWindow
@@ -101,7 +101,8 @@ class MainGUI(QMainWindow):
         self._pause_ev = pause_ev
         self._close_ev = close_ev
         self._input_update_ev = Event()
-        self._input = MpInQueue(self._input_update_ev, pause_ev, close_ev)
+        self._input = MpInQueue(self._input_update_ev, pause_ev, close_ev,
+                                final=True)
 
         self._pulse_resolved = config["PULSE_RESOLVED"]
         self._require_geometry = config["REQUIRE_GEOMETRY"]
@@ -132,6 +133,7 @@ class MainGUI(QMainWindow):
 
         self._source_cw = self.createCtrlWidget(DataSourceWidget)
         self._extension_cw = self.createCtrlWidget(ExtensionCtrlWidget)
+        self._result_sink_cw = self.createCtrlWidget(ResultSinkCtrlWidget)
 
         self._ctrl_panel_cw = QTabWidget()
         self._analysis_cw = QWidget()
@@ -221,6 +223,11 @@ class MainGUI(QMainWindow):
         self._running = False
         self._plot_timer = QTimer()
         self._plot_timer.timeout.connect(self.updateAll)
+        # minimum interval (in seconds) between two updates of plots
+        self._plot_update_interval = 0.
+        self._prev_plot_update = 0.
+        # train ID of the data last displayed in each window
+        self._displayed_tids = WeakKeyDictionary()
 
         # For checking the connection to the Redis server
         self._redis_timer = QTimer()
@@ -287,6 +294,7 @@ class MainGUI(QMainWindow):
         self._left_cw_container.setWidgetResizable(True)
 
         self._left_cw.addTab(self._extension_cw, "Extension")
+        self._left_cw.addTab(self._result_sink_cw, "Result sink")
 
     def initRightUI(self):
         self.initCtrlUI()
@@ -326,14 +334,30 @@ class MainGUI(QMainWindow):
 
     @profiler("Update Plots", process_time=True)
     def updateAll(self):
-        """Update all the plots in the main and child windows."""
+        """Update the plots in the displayed windows.
+
+        Plots are updated at most once per refresh of the display. Windows
+        which are not displayed are skipped and will be updated with the
+        latest data once they are displayed again.
+        """
         if not self._running:
             return
 
         try:
             processed = self._input.get()
+            if processed.t_sent is not None:
+                # the clocks of the file server and the GUI are assumed
+                # to be synchronized
+                self._mon_proxy.add_latency(time.time() - processed.t_sent)
             self._queue.append(processed)
         except Empty:
+            pass
+
+        if len(self._queue) == 0:
+            return
+
+        now = time.monotonic()
+        if now - self._prev_plot_update < self._plot_update_interval:
             return
 
         # clear the previous plots no matter what comes next
@@ -342,8 +366,14 @@ class MainGUI(QMainWindow):
 
         data = self._queue[0]
 
-        self._image_tool.updateWidgetsF()
+        updated = False
+        if self._requireUpdate(self._image_tool, data.tid):
+            self._image_tool.updateWidgetsF()
+            updated = True
         for w in itertools.chain(self._plot_windows):
+            if not self._requireUpdate(w, data.tid):
+                continue
+            updated = True
             try:
                 w.updateWidgetsF()
             except Exception as e:
@@ -352,7 +382,38 @@ class MainGUI(QMainWindow):
                              + repr(e))
                 logger.error(f"[Update plots] {repr(e)}")
 
-        logger.debug(f"Plot train with ID: {data.tid}")
+        if updated:
+            self._prev_plot_update = now
+            logger.debug(f"Plot train with ID: {data.tid}")
+
+    def _requireUpdate(self, window, tid):
+        """Check whether a window should be updated with the given train.
+
+        Book-keep the train ID if True.
+        """
+        if self._displayed_tids.get(window) == tid \
+                or not self._isDisplayed(window):
+            return False
+        self._displayed_tids[window] = tid
+        return True
+
+    @staticmethod
+    def _isDisplayed(window):
+        """Return True if the window could be seen on the screen."""
+        if not window.isVisible() or window.isMinimized():
+            return False
+        # A window completely covered by other windows is not exposed
+        # on some platforms.
+        handle = window.windowHandle()
+        return handle is None or handle.isExposed()
+
+    @staticmethod
+    def _displayRefreshInterval():
+        """Return the refresh interval of the display in seconds."""
+        screen = QGuiApplication.primaryScreen()
+        if screen is None or screen.refreshRate() <= 0:
+            return 0.
+        return 1. / screen.refreshRate()
 
     def pingRedisServer(self):
         try:
@@ -433,6 +494,7 @@ class MainGUI(QMainWindow):
         ProcessWorker interface.
         """
         self._thread_logger_t.start()
+        self._plot_update_interval = self._displayRefreshInterval()
         self._plot_timer.start(config["GUI_PLOT_UPDATE_TIMER"])
         self._redis_timer.start(config["REDIS_PING_ATTEMPT_INTERVAL"])
         self._input.start()
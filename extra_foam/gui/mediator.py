@@ -62,6 +62,10 @@ class Mediator(QObject):
     def onExtensionEndpointChange(self, endpoint: str):
         self._meta.hset(mt.EXTENSION, "endpoint", endpoint)
 
+    def onResultSinkChange(self, filepath: str, fields: list):
+        self._meta.hmset(mt.RESULT_SINK, {
+            "filepath": filepath, "fields": ",".join(fields)})
+
     def onBridgeConnectionsChange(self, connections: dict):
         # key = endpoint, value = source type
         pipe = self._meta.pipeline()
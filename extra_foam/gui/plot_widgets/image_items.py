@@ -9,6 +9,7 @@ All rights reserved.
 """
 import abc
 from collections.abc import Callable
+import math
 import weakref
 
 import numpy as np
@@ -23,7 +24,10 @@ from ..pyqtgraph import Point
 from ..pyqtgraph import functions as fn
 
 from ..misc_widgets import FColor
-from ...algorithms import quick_min_max
+from ...algorithms import (
+    compute_image_histogram, downsample_image, ImageHistogram,
+    map_image_to_color, pack_lut, quick_min_max
+)
 from ...config import config, MaskState
 from ...ipc import ImageMaskPub
 
@@ -41,6 +45,12 @@ class ImageItem(pg.GraphicsObject):
     draw_region_changed_sgn = pyqtSignal(int, int)  # (x, y)
     draw_finished_sgn = pyqtSignal()
 
+    # used if no lookup table is given
+    _GRAY_LUT = np.repeat(np.arange(256, dtype=np.uint8)[:, None], 3, axis=1)
+
+    # maximum number of bins of the displayed histogram
+    _N_HISTOGRAM_BINS = 500
+
     def __init__(self, image=None, parent=None):
         super().__init__(parent=parent)
 
@@ -49,12 +59,22 @@ class ImageItem(pg.GraphicsObject):
 
         self._levels = None  # [min, max]
         self._auto_level_quantile = 0.99
+        # levels and histogram which were calculated elsewhere
+        self._image_levels = None
+        self._image_histogram = None
         self._lut = None
-        self._ds_rate = (1., 1.)  # down-sample rates
 
-        # In some cases, a modified lookup table is used to handle both
-        # rescaling and LUT more efficiently
-        self._fast_lut = None
+        # downsampled images keyed by the downsampling factor
+        self._pyramid = dict()
+        # (downsampling factor, (row start, row end, column start,
+        # column end) of the rendered region in the downsampled image)
+        self._lod = None
+        self._qimage_rect = None  # region of the image being rendered
+
+        # (lookup table, packed lookup table)
+        self._packed_lut = (None, None)
+        # color buffer which backs the rendered image
+        self._argb = None
 
         self.setImage(image, auto_levels=True)
 
@@ -83,7 +103,6 @@ class ImageItem(pg.GraphicsObject):
         """
         if self._levels != levels:
             self._levels = levels
-            self._fast_lut = None
             self.setImage(auto_levels=False)
 
     def getLevels(self):
@@ -92,7 +111,6 @@ class ImageItem(pg.GraphicsObject):
     def setLookupTable(self, lut, update=True):
         if lut is not self._lut:
             self._lut = lut
-            self._fast_lut = None
             if update:
                 self.setImage(auto_levels=False)
 
@@ -102,7 +120,21 @@ class ImageItem(pg.GraphicsObject):
         self.informViewBoundsChanged()
         self.update()
 
-    def setImage(self, image=None, auto_levels=False):
+    def setImage(self, image=None, auto_levels=False, *,
+                 levels=None, histogram=None):
+        """Set the image to be displayed.
+
+        :param numpy.ndarray image: image data. None for re-rendering the
+            current image.
+        :param bool auto_levels: True for setting the levels
+            automatically.
+        :param tuple levels: (min, max) used as the automatic levels
+            instead of calculating them from the image.
+        :param tuple/ImageHistogram histogram: (hist, bin_centers)
+            returned by histogram instead of calculating it from the image.
+            If it is an ImageHistogram, the automatic levels are also
+            estimated from it unless levels is given.
+        """
         image_changed = False
         if image is None:
             if self._image is None:
@@ -114,18 +146,25 @@ class ImageItem(pg.GraphicsObject):
 
             image = image.view(np.ndarray)
 
-            if self._image is None or image.dtype != self._image.dtype:
-                self._fast_lut = None
-
             self._image = image
+            self._pyramid.clear()
+            if isinstance(histogram, ImageHistogram):
+                if levels is None:
+                    levels = histogram.levels(self._auto_level_quantile)
+                histogram = histogram.rebin(self._N_HISTOGRAM_BINS)
+            self._image_levels = levels
+            self._image_histogram = histogram
 
             if shape_changed:
                 self.prepareGeometryChange()
                 self.informViewBoundsChanged()
 
         if auto_levels:
-            self._levels = quick_min_max(
-                self._image, q=self._auto_level_quantile)
+            if self._image_levels is None:
+                self._levels = quick_min_max(
+                    self._image, q=self._auto_level_quantile)
+            else:
+                self._levels = self._image_levels
 
         self._qimage = None
         self.update()
@@ -180,8 +219,50 @@ class ImageItem(pg.GraphicsObject):
         else:
             lut = self._lut
 
-        # Downsample
+        lod = self._levelOfDetail()
+        self._lod = lod
+        if lod is None:
+            self._qimage = None
+            return
+
+        factor, (r0, r1, c0, c1) = lod
+        image = self._pyramidLevel(factor)[r0:r1, c0:c1]
+        if image.size == 0:
+            self._qimage = None
+            return
+
+        h0, w0 = self._image.shape[:2]
+        self._qimage_rect = QRectF(c0 * factor, r0 * factor,
+                                   min(c1 * factor, w0) - c0 * factor,
+                                   min(r1 * factor, h0) - r0 * factor)
+
+        levels = self._levels
+        if levels is None or image.ndim != 2:
+            argb, alpha = fn.makeARGB(image, lut=lut, levels=levels)
+            self._qimage = fn.makeQImage(argb, alpha, transpose=False)
+            return
 
+        h, w = image.shape
+        if self._argb is None or self._argb.shape != (h, w):
+            self._argb = np.empty((h, w), dtype=np.uint32)
+        map_image_to_color(
+            image, levels, self._packLut(lut), out=self._argb)
+        # The QImage shares the memory of the buffer, which is kept alive
+        # until the next rendering.
+        self._qimage = QImage(
+            self._argb.ctypes.data, w, h, 4 * w, QImage.Format_ARGB32)
+
+    def _levelOfDetail(self):
+        """Return the level of detail which matches the view.
+
+        The downsampling factor is a power of 2 so that the levels can be
+        shared when zooming. Only the visible region of the image at that
+        level is rendered.
+
+        :return: (downsampling factor, (row start, row end, column start,
+            column end) in the downsampled image). None if the view is too
+            small to render anything.
+        """
         # reduce dimensions of image based on screen resolution
         o = self.mapToDevice(QPointF(0, 0))
         x = self.mapToDevice(QPointF(1, 0))
@@ -194,48 +275,53 @@ class ImageItem(pg.GraphicsObject):
         w = Point(x-o).length()
         h = Point(y-o).length()
         if w == 0 or h == 0:
-            self._qimage = None
             return
 
-        xds = max(1, int(1.0 / w))
-        yds = max(1, int(1.0 / h))
-        # TODO: replace fn.downsample
-        image = fn.downsample(self._image, xds, axis=1)
-        image = fn.downsample(image, yds, axis=0)
-        self._ds_rate = (xds, yds)
+        # The resolution is not lower than the screen in both axes.
+        ds = max(1, int(1.0 / max(w, h)))
+        factor = 1 << (ds.bit_length() - 1)
 
-        # Check if downsampling reduced the image size to zero due to inf values.
-        if image.size == 0:
-            return
+        h0, w0 = self._image.shape[:2]
+        n_rows, n_cols = -(-h0 // factor), -(-w0 // factor)
+        rect = self.viewRect()
+        if rect is None:
+            return factor, (0, n_rows, 0, n_cols)
 
-        # if the image data is a small int, then we can combine levels + lut
-        # into a single lut for better performance
-        levels = self._levels
-        if levels is not None and image.dtype in (np.ubyte, np.uint16):
-            if self._fast_lut is None:
-                eflsize = 2**(image.itemsize*8)
-                ind = np.arange(eflsize)
-                minlev, maxlev = levels
-                levdiff = maxlev - minlev
-                # avoid division by 0
-                levdiff = 1 if levdiff == 0 else levdiff
-                if lut is None:
-                    efflut = fn.rescaleData(
-                        ind, scale=255./levdiff, offset=minlev, dtype=np.ubyte)
-                else:
-                    lutdtype = np.min_scalar_type(lut.shape[0]-1)
-                    efflut = fn.rescaleData(
-                        ind, scale=(lut.shape[0]-1)/levdiff,
-                        offset=minlev, dtype=lutdtype, clip=(0, lut.shape[0]-1))
-                    efflut = lut[efflut]
+        rect = rect.intersected(self.boundingRect())
+        r0 = min(max(0, int(math.floor(rect.top())) // factor), n_rows)
+        r1 = min(max(r0, -(-int(math.ceil(rect.bottom())) // factor)), n_rows)
+        c0 = min(max(0, int(math.floor(rect.left())) // factor), n_cols)
+        c1 = min(max(c0, -(-int(math.ceil(rect.right())) // factor)), n_cols)
+        return factor, (r0, r1, c0, c1)
 
-                self._fast_lut = efflut
-            lut = self._fast_lut
-            levels = None
+    def _pyramidLevel(self, factor):
+        """Return the image downsampled by the given factor.
 
-        # TODO: replace fn.makeARGB and fn.makeQImage
-        argb, alpha = fn.makeARGB(image, lut=lut, levels=levels)
-        self._qimage = fn.makeQImage(argb, alpha, transpose=False)
+        The downsampled images are cached until the image is changed.
+        """
+        if factor == 1:
+            return self._image
+
+        level = self._pyramid.get(factor)
+        if level is None:
+            if self._image.ndim == 2:
+                level = downsample_image(self._image, factor)
+            else:
+                level = fn.downsample(self._image, factor, axis=1)
+                level = fn.downsample(level, factor, axis=0)
+            self._pyramid[factor] = level
+        return level
+
+    def _packLut(self, lut):
+        """Return the packed lookup table.
+
+        The packed table is cached since the lookup table is rarely changed.
+        """
+        if lut is None:
+            lut = self._GRAY_LUT
+        if lut is not self._packed_lut[0]:
+            self._packed_lut = (lut, pack_lut(lut))
+        return self._packed_lut[1]
 
     def paint(self, p, *args):
         """Override."""
@@ -247,45 +333,16 @@ class ImageItem(pg.GraphicsObject):
             if self._qimage is None:
                 return
 
-        p.drawImage(QRectF(0, 0, *self._image.shape[::-1]), self._qimage)
+        p.drawImage(self._qimage_rect, self._qimage)
 
     def histogram(self):
         """Return estimated histogram of image pixels.
 
         :returns: (hist, bin_centers)
         """
-        if self._image is None or self._image.size == 0:
-            return None, None
-
-        step = (max(1, int(np.ceil(self._image.shape[0] / 200))),
-                max(1, int(np.ceil(self._image.shape[1] / 200))))
-
-        sliced_data = self._image[::step[0], ::step[1]]
-
-        lb, ub = np.nanmin(sliced_data), np.nanmax(sliced_data)
-
-        if np.isnan(lb) or np.isnan(ub):
-            # the data are all-nan
-            return None, None
-
-        if lb == ub:
-            # degenerate image, arange will fail
-            lb -= 0.5
-            ub += 0.5
-
-        n_bins = 500
-        if sliced_data.dtype.kind in "ui":
-            # step >= 1
-            step = np.ceil((ub - lb) / n_bins)
-            # len(bins) >= 2
-            bins = np.arange(lb, ub + 0.01 * step, step, dtype=np.int)
-        else:
-            # for float data, let numpy select the bins.
-            bins = np.linspace(lb, ub, n_bins)
-
-        hist, bin_edges = np.histogram(sliced_data, bins=bins)
-
-        return hist, (bin_edges[:-1] + bin_edges[1:]) / 2.
+        if self._image_histogram is not None:
+            return self._image_histogram
+        return compute_image_histogram(self._image)
 
     def setPxMode(self, state):
         """Set ItemIgnoresTransformations flag.
@@ -316,17 +373,10 @@ class ImageItem(pg.GraphicsObject):
 
     def viewTransformChanged(self):
         """Override."""
-        o = self.mapToDevice(QPointF(0, 0))
-        x = self.mapToDevice(QPointF(1, 0))
-        y = self.mapToDevice(QPointF(0, 1))
-        w = Point(x-o).length()
-        h = Point(y-o).length()
-        if w == 0 or h == 0:
-            self._qimage = None
+        if self._image is None:
             return
-        xds = max(1, int(1.0 / w))
-        yds = max(1, int(1.0 / h))
-        if (xds, yds) != self._ds_rate:
+
+        if self._levelOfDetail() != self._lod:
             self._qimage = None
             self.update()
 
@@ -109,6 +109,8 @@ class ImageViewF(QWidget):
 
         self._is_initialized = False
         self._image = None
+        # keyword arguments used to display the current image
+        self._image_kwargs = dict()
 
         self.initUI()
 
@@ -173,7 +175,7 @@ class ImageViewF(QWidget):
         self._updateImageImp(*args, **kwargs)
 
     def _updateImageImp(self, img, *, auto_range=False, auto_levels=False,
-                        scale=None, pos=None):
+                        scale=None, pos=None, levels=None, histogram=None):
         """Update the current displayed image.
 
         :param np.ndarray img: the image to be displayed.
@@ -184,6 +186,10 @@ class ImageViewF(QWidget):
         :param tuple/list pos: the origin of the displayed image in (x, y).
         :param tuple/list scale: the origin of the displayed image image in
             (x_scale, y_scale).
+        :param tuple levels: pre-calculated (min, max) used when
+            auto_levels is True.
+        :param tuple histogram: pre-calculated (hist, bin_centers) of the
+            image.
         """
         if img is None:
             self.clear()
@@ -192,8 +198,11 @@ class ImageViewF(QWidget):
         if not isinstance(img, np.ndarray):
             raise TypeError("Image data must be a numpy array!")
 
-        self._image_item.setImage(img, auto_levels=auto_levels)
+        self._image_item.setImage(img, auto_levels=auto_levels,
+                                  levels=levels, histogram=histogram)
         self._image = img
+        self._image_kwargs = {"scale": scale, "pos": pos,
+                              "levels": levels, "histogram": histogram}
 
         self._image_item.resetTransform()
 
@@ -219,7 +228,7 @@ class ImageViewF(QWidget):
         """Re-display the current image."""
         if self._image is None:
             return
-        self._updateImageImp(self._image, **kwargs)
+        self._updateImageImp(self._image, **{**self._image_kwargs, **kwargs})
 
     def setMouseHoverValueRoundingDecimals(self, v):
         self._mouse_hover_v_rounding_decimals = v
@@ -74,6 +74,7 @@ class ImageAnalysis(ImageViewF):
             geom.position_all_modules(self._mask_in_modules, out=assembled)
             self._mask_item.setMask(assembled)
 
+        kwargs.setdefault("histogram", image_data.masked_mean_hist)
         self._updateImageImp(image, **kwargs)
         if image is not None:
             self._mask_item.maybeInitializeMask(image.shape)
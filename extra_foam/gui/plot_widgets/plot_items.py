@@ -7,6 +7,7 @@ Author: Jun Zhu <jun.zhu@xfel.eu>
 Copyright (C) European X-Ray Free-Electron Laser Facility GmbH.
 All rights reserved.
 """
+import math
 import struct
 from collections import OrderedDict
 
@@ -19,12 +20,56 @@ from PyQt5.QtCore import pyqtSignal, QByteArray, QDataStream, QRectF, Qt
 
 from .. import pyqtgraph as pg
 from ..pyqtgraph import functions as fn
+from ..pyqtgraph import Point
 
 from ..misc_widgets import FColor
 
 
+def _decimate_min_max(x, y, x0, dx):
+    """Decimate a curve by keeping the extrema in each bin of x.
+
+    Each bin is represented by its first point, minimum, maximum and last
+    point, which renders the same as the original curve if the bin width
+    does not exceed a pixel.
+
+    :param numpy.ndarray x: x data in ascending order.
+    :param numpy.ndarray y: y data.
+    :param float x0: left edge of the first bin.
+    :param float dx: bin width.
+
+    :return: (x, y, index of the first point in the last bin).
+    """
+    indices = np.floor((x - x0) / dx)
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(indices)) + 1))
+    ends = np.append(starts[1:], len(x)) - 1
+
+    n = len(starts)
+    xd = np.empty(4 * n, dtype=np.float64)
+    yd = np.empty(4 * n, dtype=np.float64)
+    xd[0::4] = xd[1::4] = x[starts]
+    xd[2::4] = xd[3::4] = x[ends]
+    yd[0::4] = y[starts]
+    yd[1::4] = np.minimum.reduceat(y, starts)
+    yd[2::4] = np.maximum.reduceat(y, starts)
+    yd[3::4] = y[ends]
+    return xd, yd, starts[-1]
+
+
+def _same_value(a, b):
+    """Return whether two scalars are equal, treating nan as equal."""
+    return a == b or (a != a and b != b)
+
+
 class CurvePlotItem(pg.PlotItem):
-    """CurvePlotItem."""
+    """CurvePlotItem.
+
+    Long curves with x in ascending order are decimated to the extrema in
+    each pixel column before being converted to a path. The path is
+    extended instead of being rebuilt if new points are appended.
+    """
+
+    # curves shorter than this are never decimated
+    _MIN_DECIMATION_SIZE = 2000
 
     def __init__(self, x=None, y=None, *,
                  pen=None, name=None, check_finite=True, parent=None):
@@ -38,6 +83,17 @@ class CurvePlotItem(pg.PlotItem):
 
         self._check_finite = check_finite
 
+        # True if the transformed data could be decimated
+        self._decimable = False
+        # bin width in x with which the graph was prepared
+        self._bin_width = None
+        # (number of points, last x, last y, bin width, head, number of
+        # points in head, whether x is in ascending order) of the
+        # transformed data. The head is a path of all the points if the
+        # bin width is None. Otherwise, it is the decimated (x, y) of all
+        # the bins except the last one.
+        self._path_cache = None
+
         self.setData(x, y)
 
     def setData(self, x, y):
@@ -64,7 +120,76 @@ class CurvePlotItem(pg.PlotItem):
     def _prepareGraph(self):
         """Override."""
         x, y = self.transformedData()
-        self._graph = self.array2Path(x, y)
+        n = len(x)
+
+        # The cached points are assumed to be unchanged if the data only
+        # grew and the last cached point is still in place.
+        cache = self._path_cache
+        if cache is not None and n > cache[0] >= 2 \
+                and _same_value(x[cache[0] - 1], cache[1]) \
+                and _same_value(y[cache[0] - 1], cache[2]):
+            n_cached, ascending = cache[0], cache[6]
+        else:
+            cache, n_cached, ascending = None, 0, True
+        # check the order of the new points only
+        i0 = max(n_cached, 1)
+        ascending = ascending and bool(np.all(x[i0:] >= x[i0 - 1:-1]))
+
+        self._bin_width = self._binWidth()
+        self._decimable = n >= self._MIN_DECIMATION_SIZE and ascending
+        dx = None
+        if self._decimable and self._bin_width is not None:
+            # decimate only if it reduces the number of points
+            if 4 * (x[-1] - x[0]) / self._bin_width < n:
+                dx = self._bin_width
+
+        if cache is not None and cache[3] == dx:
+            head, n_head = cache[4], cache[5]
+        else:
+            head, n_head = None, 0
+
+        if dx is None:
+            if head is None:
+                head = self.array2Path(x, y)
+            else:
+                # The tail starts from the last point of the head, which
+                # is not duplicated by connectPath.
+                head.connectPath(
+                    self.array2Path(x[n_head - 1:], y[n_head - 1:]))
+            self._graph = head
+            n_head = n
+        else:
+            if head is None:
+                head = (np.empty(0), np.empty(0))
+            xd, yd, last = _decimate_min_max(
+                x[n_head:], y[n_head:], x[0], dx)
+            xd = np.concatenate((head[0], xd))
+            yd = np.concatenate((head[1], yd))
+            self._graph = self.array2Path(xd, yd)
+            # the last bin could still receive new points
+            head = (xd[:-4], yd[:-4])
+            n_head += last
+
+        self._path_cache = None if n == 0 else \
+            (n, x[-1], y[-1], dx, head, n_head, ascending)
+
+    def _binWidth(self):
+        """Return the bin width for decimation.
+
+        The pixel width in x is rounded down to a power of 2 so that the
+        decimated bins can be reused until the view is zoomed by 2.
+        """
+        width = self.pixelLength(Point(1, 0))
+        if not width:
+            return
+        return 2. ** math.floor(math.log2(width))
+
+    def viewTransformChanged(self):
+        """Override."""
+        if self._decimable and self._graph is not None and \
+                self._binWidth() != self._bin_width:
+            self._graph = None
+            self.update()
 
     @staticmethod
     def array2Path(x, y):
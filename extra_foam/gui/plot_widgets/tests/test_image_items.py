@@ -1,7 +1,9 @@
 import unittest
 
+import numpy as np
+
 from extra_foam.gui import mkQApp
-from extra_foam.gui.plot_widgets import PlotWidgetF, RingItem
+from extra_foam.gui.plot_widgets import ImageViewF, PlotWidgetF, RingItem
 from extra_foam.gui.plot_widgets.image_items import (
     ImageItem
 )
@@ -20,6 +22,40 @@ class TestImageItem(unittest.TestCase):
 
         # TODO: check test in TestImageView
 
+    def testLevelOfDetail(self):
+        widget = ImageViewF()
+        widget.resize(400, 400)
+        item = widget._image_item
+
+        widget.setImage(np.random.rand(2000, 3000).astype(np.float32))
+        item.render()
+        factor, region = item._lod
+        # the image is larger than the view
+        self.assertGreater(factor, 1)
+        self.assertEqual(0, factor & (factor - 1))
+        self.assertTupleEqual((0, -(-2000 // factor), 0, -(-3000 // factor)),
+                              region)
+        self.assertListEqual([factor], list(item._pyramid))
+        self.assertEqual(region[3], item._qimage.width())
+        self.assertEqual(region[1], item._qimage.height())
+
+        # only the visible region is rendered at full resolution
+        item.getViewBox().setRange(
+            xRange=(1000, 1100), yRange=(500, 600), padding=0)
+        item.render()
+        factor, (r0, r1, c0, c1) = item._lod
+        self.assertEqual(1, factor)
+        # the aspect ratio is locked
+        self.assertTrue(r0 <= 500 and r1 >= 600)
+        self.assertTrue(c0 <= 1000 and c1 >= 1100)
+        self.assertLess((r1 - r0) * (c1 - c0), 2000 * 3000 / 100)
+        self.assertEqual(c1 - c0, item._qimage.width())
+        self.assertEqual(c0, item._qimage_rect.left())
+
+        # downsampled images are dropped with the image
+        widget.setImage(np.random.rand(2000, 3000).astype(np.float32))
+        self.assertDictEqual({}, item._pyramid)
+
 
 class TestGeometryItem(unittest.TestCase):
     @classmethod
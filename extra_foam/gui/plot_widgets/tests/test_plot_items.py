@@ -7,7 +7,8 @@ from PyQt5.QtCore import QByteArray, QDataStream, QIODevice, QPointF, QRectF
 from extra_foam.gui import mkQApp
 from extra_foam.gui.plot_widgets.plot_widget_base import PlotWidgetF
 from extra_foam.gui.plot_widgets.plot_items import (
-    CurvePlotItem, BarGraphItem, ScatterPlotItem, StatisticsBarItem
+    CurvePlotItem, BarGraphItem, ScatterPlotItem, StatisticsBarItem,
+    _decimate_min_max
 )
 from extra_foam.logger import logger
 
@@ -70,6 +71,50 @@ class TestPlotItems:
         item2.setData(x, y)
         assert QRectF(1., 0., 4., 5.) == item2.boundingRect()
 
+    def testDecimateMinMax(self):
+        x = np.array([0, 0.5, 0.9, 1.0, 1.2, 3.5])
+        y = np.array([1, 5, -2, 3, 4, 0])
+        xd, yd, last = _decimate_min_max(x, y, 0, 1)
+        np.testing.assert_array_equal(
+            [0, 0, 0.9, 0.9, 1, 1, 1.2, 1.2, 3.5, 3.5, 3.5, 3.5], xd)
+        np.testing.assert_array_equal(
+            [1, -2, 5, -2, 3, 3, 4, 4, 0, 0, 0, 0], yd)
+        assert 5 == last
+
+    def testCurvePlotItemDecimation(self):
+        n = 100000
+        x = np.arange(n, dtype=np.float64)
+        y = np.random.rand(n)
+        item = CurvePlotItem(x, y)
+        self._widget.addItem(item)
+
+        # the shape of the curve is kept
+        assert QRectF(0, y.min(), n - 1, y.max() - y.min()) == \
+            item.boundingRect()
+        n_elements = item._graph.elementCount()
+        assert n_elements < n / 10
+
+        # the decimated bins are reused when new points are appended
+        x_new = np.arange(n + 10, dtype=np.float64)
+        y_new = np.concatenate((y, np.random.rand(10)))
+        head = item._path_cache[4]
+        item.setData(x_new, y_new)
+        item.boundingRect()
+        np.testing.assert_array_equal(
+            head[0], item._path_cache[4][0][:len(head[0])])
+        assert abs(item._graph.elementCount() - n_elements) <= 8
+
+        # the curve is not decimated if x is not in ascending order
+        item.setData(x[::-1], y)
+        item.boundingRect()
+        assert n == item._graph.elementCount()
+        # the path is extended if new points are appended
+        graph = item._graph
+        item.setData(np.append(x[::-1], -1), np.append(y, 0))
+        item.boundingRect()
+        assert graph is item._graph
+        assert n + 1 == item._graph.elementCount()
+
     @pytest.mark.parametrize("dtype", [np.float, np.int64, np.uint16])
     def testCurvePlotItem(self, dtype):
         x = np.arange(10).astype(dtype)
@@ -1,4 +1,4 @@
-from .base_window import _AbstractWindowMixin
+from .base_window import _AbstractWindowMixin, _DisplayedAnalysisMixin
 from .pump_probe_w import PumpProbeWindow
 from .binning_w import BinningWindow
 from .correlation_w import CorrelationWindow
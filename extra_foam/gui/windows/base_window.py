@@ -45,7 +45,39 @@ class _AbstractWindowMixin:
         raise NotImplementedError
 
 
-class _AbstractPlotWindow(QMainWindow, _AbstractWindowMixin):
+class _DisplayedAnalysisMixin:
+    """Register analysis types only when the widget is displayed.
+
+    It tells the pipeline which analyses are needed for display, so that
+    the pipeline can skip them if no widget displaying them is shown.
+    """
+    _displayed_analysis_types = ()
+
+    def _registerDisplayedAnalysis(self, state):
+        if getattr(self, "_displayed_analysis_registered", False) == state:
+            return
+        self._displayed_analysis_registered = state
+
+        mediator = Mediator()
+        for analysis_type in self._displayed_analysis_types:
+            if state:
+                mediator.registerAnalysis(analysis_type)
+            else:
+                mediator.unregisterAnalysis(analysis_type)
+
+    def showEvent(self, event):
+        """Override."""
+        self._registerDisplayedAnalysis(True)
+        super().showEvent(event)
+
+    def hideEvent(self, event):
+        """Override."""
+        self._registerDisplayedAnalysis(False)
+        super().hideEvent(event)
+
+
+class _AbstractPlotWindow(_DisplayedAnalysisMixin, QMainWindow,
+                          _AbstractWindowMixin):
     """Base class for plot windows.
 
     Abstract plot window consist of plot widgets.
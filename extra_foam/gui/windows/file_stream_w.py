@@ -13,9 +13,11 @@ from contextlib import closing
 import socket
 
 from PyQt5.QtCore import Qt, QTimer, pyqtSignal
-from PyQt5.QtGui import QColor, QFontMetrics, QIntValidator, QValidator
+from PyQt5.QtGui import (
+    QColor, QDoubleValidator, QFontMetrics, QIntValidator, QValidator
+)
 from PyQt5.QtWidgets import (
-    QComboBox, QFileDialog, QGridLayout, QHBoxLayout,
+    QCheckBox, QComboBox, QFileDialog, QGridLayout, QHBoxLayout,
     QHeaderView, QGroupBox, QLabel, QLineEdit, QLCDNumber, QProgressBar,
     QPushButton, QSlider, QSplitter, QTableWidget, QTableWidgetItem,
     QVBoxLayout, QWidget
@@ -92,10 +94,44 @@ class _FileStreamCtrlWidget(QWidget):
         validator = QIntValidator()
         validator.setBottom(1)
         self.tid_stride_le.setValidator(validator)
+        # 0 for reading the trains from files in every loop
+        self.cache_memory_le = QLineEdit("0")
+        self.cache_memory_le.setToolTip(
+            "Memory for caching trains to be replayed when streaming "
+            "repeatedly (MB)")
+        validator = QIntValidator()
+        validator.setBottom(0)
+        self.cache_memory_le.setValidator(validator)
+
+        # load generator: empty for streaming as fast as possible
+        self.target_rate_le = QLineEdit()
+        self.target_rate_le.setToolTip("Target stream rate (Hz)")
+        self.target_rate_le.setValidator(QDoubleValidator(0.1, 1000., 1))
+        self.burst_le = QLineEdit("1")
+        self.burst_le.setToolTip(
+            "Number of trains streamed back to back at the target rate")
+        validator = QIntValidator()
+        validator.setBottom(1)
+        self.burst_le.setValidator(validator)
+        # empty for the original number of pulses
+        self.n_pulses_le = QLineEdit()
+        self.n_pulses_le.setToolTip(
+            "Number of pulses per train which the detector data are "
+            "scaled to")
+        validator = QIntValidator()
+        validator.setBottom(1)
+        self.n_pulses_le.setValidator(validator)
+        self.stamp_sent_cb = QCheckBox("Stamp latency")
+        self.stamp_sent_cb.setToolTip(
+            "Stamp the time when a train is sent to measure the "
+            "end-to-end latency")
 
         self.stream_rate_lb = QLabel(f"{0.0:<12.1f}")
         self.stream_rate_lb.setFixedWidth(
             self.stream_rate_lb.sizeHint().width())
+        self.stream_throughput_lb = QLabel(f"{0.0:<12.1f}")
+        self.stream_throughput_lb.setFixedWidth(
+            self.stream_throughput_lb.sizeHint().width())
 
         self.tid_progress_br = QProgressBar()
 
@@ -128,6 +164,11 @@ class _FileStreamCtrlWidget(QWidget):
             self.tid_start_sld,
             self.tid_end_sld,
             self.tid_stride_le,
+            self.cache_memory_le,
+            self.target_rate_le,
+            self.burst_le,
+            self.n_pulses_le,
+            self.stamp_sent_cb,
             self.load_run_btn,
             self.mode_cb,
             self.port_le,
@@ -142,7 +183,7 @@ class _FileStreamCtrlWidget(QWidget):
 
         ctrl_layout = QGridLayout()
         ctrl_layout.addWidget(self.load_run_btn, 0, 0)
-        ctrl_layout.addWidget(self.data_folder_le, 0, 1, 1, 11)
+        ctrl_layout.addWidget(self.data_folder_le, 0, 1, 1, 16)
 
         ctrl_layout.addWidget(QLabel("Port: "), 1, 0, AR)
         ctrl_layout.addWidget(self.port_le, 1, 1)
@@ -156,6 +197,20 @@ class _FileStreamCtrlWidget(QWidget):
         ctrl_layout.addWidget(QLabel("Rate: "), 1, 9, AR)
         ctrl_layout.addWidget(self.stream_rate_lb, 1, 10)
         ctrl_layout.addWidget(QLabel("Hz"), 1, 11, AR)
+        ctrl_layout.addWidget(self.stream_throughput_lb, 1, 12)
+        ctrl_layout.addWidget(QLabel("MB/s"), 1, 13, AR)
+        ctrl_layout.addWidget(QLabel("Cache: "), 1, 14, AR)
+        ctrl_layout.addWidget(self.cache_memory_le, 1, 15)
+        ctrl_layout.addWidget(QLabel("MB"), 1, 16, AR)
+
+        ctrl_layout.addWidget(QLabel("Target rate: "), 2, 0, AR)
+        ctrl_layout.addWidget(self.target_rate_le, 2, 1)
+        ctrl_layout.addWidget(QLabel("Hz"), 2, 2)
+        ctrl_layout.addWidget(QLabel("Burst: "), 2, 5, AR)
+        ctrl_layout.addWidget(self.burst_le, 2, 6)
+        ctrl_layout.addWidget(QLabel("# of pulses: "), 2, 7, AR)
+        ctrl_layout.addWidget(self.n_pulses_le, 2, 8)
+        ctrl_layout.addWidget(self.stamp_sent_cb, 2, 9, 1, 3)
 
         progress = QWidget()
         progress_layout = QGridLayout()
@@ -293,6 +348,21 @@ class _FileStreamCtrlWidget(QWidget):
         return (self.tid_start_sld.value(), self.tid_end_sld.value() + 1,
                 int(self.tid_stride_le.text()))
 
+    def getCacheMemory(self):
+        memory = int(self.cache_memory_le.text())
+        return memory if memory > 0 else None
+
+    def getLoadConfig(self):
+        """Return the keyword arguments of the load generator."""
+        rate = float(self.target_rate_le.text() or 0)
+        n_pulses = int(self.n_pulses_le.text() or 0)
+        return {
+            'target_rate': rate if rate > 0 else None,
+            'burst': max(1, int(self.burst_le.text() or 1)),
+            'n_pulses': n_pulses if n_pulses > 0 else None,
+            'stamp_sent': self.stamp_sent_cb.isChecked(),
+        }
+
     def _getSourceListFromTable(self, table):
         ret = []
         for i in range(table.rowCount()):
@@ -331,6 +401,7 @@ class FileStreamWindow(_AbstractSatelliteWindow):
 
         self._latest_tid = Value('i', -1)
         self._rate = Value('f', 0.0)
+        self._throughput = Value('f', 0.0)
 
         self._cw = QWidget()
 
@@ -415,6 +486,8 @@ class FileStreamWindow(_AbstractSatelliteWindow):
 
         self._ctrl_widget.stream_rate_lb.setText(
             f"{round(self._rate.value, 1)}")
+        self._ctrl_widget.stream_throughput_lb.setText(
+            f"{round(self._throughput.value, 1)}")
 
     def startFileServer(self, repeat=False):
         ctrl_widget = self._ctrl_widget
@@ -455,6 +528,9 @@ class FileStreamWindow(_AbstractSatelliteWindow):
                 'control_sources': control_srcs,
                 'repeat_stream': repeat,
                 'require_all': False,
+                'shared_throughput': self._throughput,
+                'cache_memory': ctrl_widget.getCacheMemory(),
+                **ctrl_widget.getLoadConfig(),
             })
 
         self._file_server.start()
@@ -476,6 +552,7 @@ class FileStreamWindow(_AbstractSatelliteWindow):
         self.file_server_stopped_sgn.emit()
         self._latest_tid.value = -1
         self._rate.value = 0
+        self._throughput.value = 0
         self._ctrl_widget.resetDisplay()
 
     def closeEvent(self, QCloseEvent):
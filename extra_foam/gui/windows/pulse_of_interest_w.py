@@ -15,7 +15,7 @@ from PyQt5.QtWidgets import QSplitter
 from .base_window import _AbstractPlotWindow
 from ..misc_widgets import FColor
 from ..plot_widgets import HistMixin, ImageViewF, PlotWidgetF, TimedPlotWidgetF
-from ...config import config
+from ...config import AnalysisType, config
 
 
 class PoiImageView(ImageViewF):
@@ -117,6 +117,8 @@ class PulseOfInterestWindow(_AbstractPlotWindow):
     """PulseOfInterestWindow class."""
     _title = "Pulse-of-interest"
 
+    _displayed_analysis_types = (AnalysisType.PULSE_OF_INTEREST,)
+
     _TOTAL_W, _TOTAL_H = config['GUI_PLOT_WINDOW_SIZE']
 
     def __init__(self, *args, **kwargs):
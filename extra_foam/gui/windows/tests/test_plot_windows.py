@@ -279,6 +279,14 @@ class TestPlotWindows(unittest.TestCase):
         self.assertEqual(2, counter[PoiFomHist])
         self.assertEqual(2, counter[PoiRoiHist])
 
+        # POI images are only required when the window is displayed
+        meta = self.pulse_worker._image_proc._meta
+        self.assertTrue(meta.has_analysis(AnalysisType.PULSE_OF_INTEREST))
+        win.hide()
+        self.assertFalse(meta.has_analysis(AnalysisType.PULSE_OF_INTEREST))
+        win.show()
+        self.assertTrue(meta.has_analysis(AnalysisType.PULSE_OF_INTEREST))
+
         win.updateWidgetsF()
 
     def _checkPumpProbeCtrlWidget(self, win):
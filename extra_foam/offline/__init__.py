@@ -1,4 +1,5 @@
 from .file_server import (
     gather_sources, load_runs, run_info, serve_files
 )
+from .batch_runner import process_run, read_session, read_setup
 from .offline_config import StreamMode
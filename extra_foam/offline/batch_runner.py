@@ -0,0 +1,589 @@
+"""
+Distributed under the terms of the BSD 3-Clause License.
+
+The full license is in the file LICENSE, distributed with this software.
+
+Author: Jun Zhu <jun.zhu@xfel.eu>
+Copyright (C) European X-Ray Free-Electron Laser Facility GmbH.
+All rights reserved.
+"""
+import argparse
+from fnmatch import fnmatch
+import functools
+import math
+import multiprocessing as mp
+import os
+import os.path as osp
+import socket
+from threading import Event, Thread
+import time
+
+import h5py
+import numpy as np
+import psutil
+import redis
+import yaml
+
+from .file_server import generate_meta, load_runs, _read_train
+from ..config import config, DataSource
+from ..database import Metadata as mt
+from ..database import MetaProxy, SourceCatalog
+from ..geometries import module_indices
+from ..ipc import init_redis_connection, redis_connection
+from ..logger import logger
+from ..pipeline.data_model import ImageData
+from ..pipeline.exceptions import StopPipelineError
+from ..pipeline.f_sink import ResultWriter
+from ..pipeline.f_transformer import DataTransformer
+from ..pipeline.f_worker import (
+    create_processors, run_tasks, PULSE_PROCESSORS, TRAIN_PROCESSORS
+)
+from ..pipeline.processors.base_processor import _RedisParserMixin
+from ..utils import profiler
+
+
+# train-level processors which accumulate over trains and thus must see
+# the trains in order
+_MERGED_PROCESSORS = (
+    'histogram', 'correlation1_proc', 'correlation2_proc', 'binning_proc'
+)
+
+# the rest train-level processors run in the worker processes
+_CHUNK_PROCESSORS = PULSE_PROCESSORS + tuple(
+    opt for opt in TRAIN_PROCESSORS if opt[0] not in _MERGED_PROCESSORS)
+
+# Redis hashes which make up the analysis setup of a session
+_SESSION_KEYS = tuple(mt.processor_keys) + (
+    mt.ANALYSIS_TYPE, mt.DATA_SOURCE_ITEMS)
+
+_REDIS_HOST = '127.0.0.1'
+
+# maximum number of trains processed by a worker process at a time
+_CHUNK_SIZE = 100
+
+
+def split_train_ids(train_ids, n_chunks):
+    """Split train IDs into contiguous chunks.
+
+    :param list train_ids: train IDs.
+    :param int n_chunks: maximum number of chunks.
+
+    :return list: non-empty lists of train IDs.
+    """
+    return [list(chunk) for chunk in np.array_split(
+        np.asarray(train_ids), max(1, min(n_chunks, len(train_ids))))
+        if len(chunk) > 0]
+
+
+def strip_data(data):
+    """Strip the images and the detector data off the processed data.
+
+    Only the results needed by the merged processors and in the output
+    file are sent back from the worker processes.
+
+    :param dict data: data passed around processors.
+    """
+    catalog, processed = data['catalog'], data['processed']
+    data['raw'].pop(catalog.main_detector, None)
+    data.pop('assembled', None)
+
+    processed.pp.image_on = None
+    processed.pp.image_off = None
+    processed.ai.q_map = None
+    processed.pulse.ai.q_map = None
+
+    image = processed.image
+    stripped = ImageData()
+    # the number of pulses and POI indices are used by the histogram
+    stripped.images = [None] * image.n_images
+    stripped.sliced_indices = image.sliced_indices
+    stripped.poi_indices = image.poi_indices
+    processed.image = stripped
+
+    return data
+
+
+def _source_catalog():
+    """Build the source catalog from the data source items in Redis."""
+    catalog = SourceCatalog()
+    parser = _RedisParserMixin
+    items = MetaProxy().hget_all(mt.DATA_SOURCE_ITEMS)
+    for item in items.values():
+        ctg, name, modules, ppt, slicer, vrange, ktype = item.split(";")
+        catalog.add_item(
+            ctg,
+            name,
+            parser.str2list(modules, handler=int) if modules else None,
+            ppt,
+            parser.str2slice(slicer) if slicer else None,
+            parser.str2tuple(vrange) if vrange else None,
+            int(ktype)
+        )
+    return catalog
+
+
+def _select_sources(rd, catalog, exclude=()):
+    """Select the sources in a run which are required by the catalog.
+
+    :param iterable exclude: sources which are not selected.
+
+    :return DataCollection: None if no source is found.
+    """
+    if rd is None:
+        return None
+
+    patterns = set()
+    for item in catalog.values():
+        if item.modules:
+            prefix, suffix = item.name.split("*")
+            patterns.update(f"{prefix}{i}{suffix}" for i in item.modules)
+        else:
+            patterns.add(item.name)
+
+    srcs = [src for src in rd.all_sources if src not in exclude
+            and any(fnmatch(src, p) for p in patterns)]
+    if not srcs:
+        return None
+    return rd.select(srcs)
+
+
+def _init_worker(detector, topic, host, port, password):
+    config.load(detector, topic)
+    init_redis_connection(host, port, password=password)
+
+
+@functools.lru_cache(maxsize=1)
+def _open_run(path):
+    """Open a run in a worker process.
+
+    :param str path: path of the run directory.
+
+    :return tuple: (DataCollection of calibrated data, DataCollection of
+        raw data or None, DataTransformer). None if no source is found.
+    """
+    catalog = _source_catalog()
+    rd_cal, rd_raw = load_runs(path)
+    rd_cal = _select_sources(rd_cal, catalog)
+    rd_raw = _select_sources(
+        rd_raw, catalog, () if rd_cal is None else rd_cal.all_sources)
+    if rd_cal is None:
+        rd_cal, rd_raw = rd_raw, None
+    if rd_cal is None:
+        return None
+    return rd_cal, rd_raw, DataTransformer(catalog)
+
+
+def _process_trains(args):
+    """Entry point of a worker process.
+
+    Trains are processed by the pulse-level processors and the train-level
+    processors which do not accumulate over trains.
+
+    :param tuple args: (path of the run directory, train IDs).
+
+    :return list: stripped data of the processed trains.
+    """
+    path, train_ids = args
+
+    run = _open_run(path)
+    if run is None:
+        return []
+    rd_cal, rd_raw, transformer = run
+
+    tasks = [instance for _, instance in create_processors(_CHUNK_PROCESSORS)]
+
+    ret = []
+    for tid in train_ids:
+        try:
+            _, train_data, _ = _read_train(rd_cal, rd_raw, tid)
+        except Exception as e:
+            logger.error(f"[{tid}] {repr(e)}")
+            continue
+
+        correlated, _, dropped = transformer.correlate(
+            (train_data, generate_meta(train_data.keys(), tid)),
+            source_type=DataSource.FILE)
+        for _, err in dropped:
+            logger.error(err)
+        if not correlated:
+            continue
+
+        try:
+            run_tasks(tasks, correlated)
+        except StopPipelineError:
+            continue
+
+        ret.append(strip_data(correlated))
+    return ret
+
+
+def _find_free_port():
+    with socket.socket() as s:
+        s.bind((_REDIS_HOST, 0))
+        return s.getsockname()[1]
+
+
+def _start_redis_server(port, password):
+    """Start a private Redis server for the processors."""
+    executable = config["REDIS_EXECUTABLE"]
+    if not osp.isfile(executable):
+        raise FileNotFoundError(
+            f"Redis executable file {executable} not found!")
+
+    process = psutil.Popen([executable,
+                            "--port", str(port),
+                            "--loglevel", "warning",
+                            "--save", "",
+                            "--requirepass", password])
+
+    client = redis.Redis(_REDIS_HOST, port, password=password)
+    for _ in range(config["REDIS_MAX_PING_ATTEMPTS"] * 10):
+        try:
+            client.ping()
+            return process
+        except redis.ConnectionError:
+            time.sleep(0.1)
+
+    process.kill()
+    raise ConnectionError(
+        f"Failed to start a Redis server at {_REDIS_HOST}:{port}")
+
+
+def read_session(host, port, password):
+    """Read the analysis setup of a running session.
+
+    :return dict: content of the Redis hashes which make up the setup.
+    """
+    client = redis.Redis(host, port, password=password,
+                         decode_responses=True)
+    try:
+        return {k: client.hgetall(k) for k in _SESSION_KEYS}
+    except redis.ConnectionError:
+        raise ConnectionError(
+            f"No EXtra-foam session found at {host}:{port}")
+
+
+def _source_item(ctg, src, *, modules=(), slicer='', ktype=None):
+    """Return a data source item in the format stored in Redis.
+
+    :param str src: data source in the form 'device_id property'.
+    """
+    name, ppt = src.split(" ", 1)
+    if ktype is None:
+        # only pipeline data have output channels
+        ktype = 1 if ':' in name else 0
+    return f"{ctg};{name};{list(modules)};{ppt};{slicer};;{ktype}"
+
+
+def read_setup(name, run_sources, sources=()):
+    """Read an analysis setup saved to file by the analysis setup manager.
+
+    Data sources are not part of a saved setup. They are made up of the
+    main detector source found in the run, the sources of correlation and
+    binning in the setup and the given sources.
+
+    :param str name: name of the setup.
+    :param iterable run_sources: all the sources in the run.
+    :param iterable sources: other data sources in the form
+        'device_id property'.
+
+    :return dict: same as read_session.
+
+    :raise ValueError: if the setup or the main detector source is not
+        found.
+    """
+    filepath = config.setup_file
+    if not osp.isfile(filepath):
+        raise ValueError(f"Setup file {filepath} not found!")
+    with open(filepath, 'r') as fp:
+        setups = yaml.load(fp, Loader=yaml.Loader) or dict()
+    if name not in setups:
+        raise ValueError(f"Analysis setup '{name}' not found in {filepath}!")
+
+    session = {k: dict() for k in _SESSION_KEYS}
+    for k, v in setups[name].items():
+        k_root = k.rsplit(':', maxsplit=1)[0]
+        if k_root in mt.processor_keys:
+            session[k_root] = {f: str(value) for f, value in v.items()}
+
+    det = config["DETECTOR"]
+    n_modules = config["NUMBER_OF_MODULES"]
+    items = session[mt.DATA_SOURCE_ITEMS]
+    for src, ppts in config.pipeline_sources.get(det, dict()).items():
+        if ppts and any(fnmatch(s, src) for s in run_sources):
+            modules = module_indices(n_modules, detector=det) \
+                if n_modules > 1 and '*' in src else ()
+            slicer = "[None, None]" if config["PULSE_RESOLVED"] else ''
+            items[f"{src} {ppts[0]}"] = _source_item(
+                det, f"{src} {ppts[0]}",
+                modules=modules, slicer=slicer, ktype=1)
+            break
+    else:
+        raise ValueError(f"Source of {det} not found in the run!")
+
+    others = list(sources)
+    for k in (mt.CORRELATION_PROC, mt.BINNING_PROC):
+        others.extend(v for f, v in session[k].items()
+                      if f.startswith("source") and v)
+    ctg = config["SOURCE_USER_DEFINED_CATEGORY"]
+    for src in others:
+        items.setdefault(src, _source_item(ctg, src))
+
+    return session
+
+
+def _write_session(session):
+    """Write the analysis setup into the private Redis server."""
+    db = redis_connection()
+    pipe = db.pipeline()
+    for k, v in session.items():
+        pipe.delete(k)
+        if v:
+            pipe.hset(k, mapping=v)
+    pipe.execute()
+
+    # all the results are required in batch mode
+    MetaProxy().set_extension_client(True)
+
+
+class _LogForwarder:
+    """Forward the logs of the processors published in Redis."""
+
+    def __init__(self):
+        self._sub = redis_connection().pubsub(ignore_subscribe_messages=True)
+        self._sub.psubscribe("log:*")
+        self._stop = Event()
+        self._thread = Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            msg = self._sub.get_message(timeout=0.1)
+            if msg is not None:
+                level = msg['channel'].split(':', 1)[1]
+                getattr(logger, level, logger.info)(msg['data'])
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._stop.set()
+        self._thread.join()
+        self._sub.close()
+
+
+class BatchResultWriter:
+    """Write the results of the processed trains to HDF5.
+
+    FOMs and VFOMs are written per train by ResultWriter. The results
+    accumulated over trains, i.e. correlation, binning and histogram, are
+    written once from the last train when closing.
+    """
+
+    def __init__(self, filepath):
+        """Initialization.
+
+        :param str filepath: path of the HDF5 file, which is overwritten.
+        """
+        self._writer = ResultWriter(filepath, mode='w', buffer_size=1000,
+                                    flush_interval=float('inf'))
+        self._last = None
+        self._n = 0
+
+    def __len__(self):
+        return self._n
+
+    def append(self, processed):
+        """Append the results of a train.
+
+        :param ProcessedData processed: processed data.
+        """
+        self._n += 1
+        self._last = processed
+        try:
+            self._writer.append(processed)
+        except ValueError as e:
+            logger.warning(f"Failed to write results: {str(e)}")
+
+    def close(self):
+        """Write the accumulated results and close the file."""
+        filepath = self._writer.filepath
+        self._writer.close()
+        if self._last is not None:
+            with h5py.File(filepath, 'a') as fp:
+                self._write_accumulated(fp, self._last)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @staticmethod
+    def _create_datasets(group, item, names):
+        for name in names:
+            v = getattr(item, name)
+            if v is not None:
+                group.create_dataset(name, data=np.asarray(v))
+
+    def _write_accumulated(self, fp, processed):
+        for i, item in enumerate(processed.corr, 1):
+            if item.source:
+                grp = fp.create_group(f"correlation/{i}")
+                grp.attrs['source'] = item.source
+                grp.attrs['resolution'] = item.resolution
+                self._create_datasets(
+                    grp, item, ('x', 'y', 'x_slave', 'y_slave'))
+
+        for i, item in enumerate(processed.bin, 1):
+            if item.source:
+                grp = fp.create_group(f"binning/{i}")
+                grp.attrs['source'] = item.source
+                self._create_datasets(
+                    grp, item, ('centers', 'counts', 'stats', 'x', 'heat'))
+        if processed.bin.heat is not None:
+            self._create_datasets(
+                fp.require_group("binning"), processed.bin,
+                ('heat', 'heat_count'))
+
+        hist = processed.hist
+        if hist.hist is not None:
+            self._create_datasets(
+                fp.create_group("histogram"), hist,
+                ('hist', 'bin_centers', 'mean', 'median', 'std'))
+
+
+@profiler("Batch processing")
+def process_run(path, filepath, *, session, n_workers=None, tid_range=None,
+                chunk_size=_CHUNK_SIZE):
+    """Process a run with an analysis setup.
+
+    The trains are split into small contiguous chunks which are processed
+    in parallel by the pulse-level and train-level processors. The
+    processors which accumulate over trains then run in the main process
+    with the trains in order as soon as the chunks are returned.
+
+    Note: the states of the processors in the worker processes, e.g.
+    moving averages and the pairing of on/off trains in pump-probe
+    analysis, restart at the chunk boundaries.
+
+    :param str path: path of the run directory.
+    :param str filepath: path of the output HDF5 file.
+    :param dict session: analysis setup returned by read_session or
+        read_setup.
+    :param int n_workers: number of worker processes. Default to the
+        number of CPUs.
+    :param tuple tid_range: (first, last) train IDs, inclusive.
+    :param int chunk_size: maximum number of trains in a chunk.
+
+    :return int: number of processed trains.
+    """
+    rd_cal, _ = load_runs(path)
+    train_ids = rd_cal.train_ids
+    if tid_range is not None:
+        first, last = tid_range
+        train_ids = [tid for tid in train_ids if first <= tid <= last]
+    if not train_ids:
+        raise ValueError("No train to process!")
+
+    if n_workers is None:
+        n_workers = os.cpu_count()
+    chunks = split_train_ids(
+        train_ids, max(n_workers, math.ceil(len(train_ids) / chunk_size)))
+
+    port = _find_free_port()
+    password = config["REDIS_PASSWORD"]
+    server = _start_redis_server(port, password)
+    try:
+        init_redis_connection(_REDIS_HOST, port, password=password)
+        _write_session(session)
+
+        tasks = [instance for name, instance
+                 in create_processors(TRAIN_PROCESSORS)
+                 if name in _MERGED_PROCESSORS]
+        # Files opened in this process must not be inherited by the
+        # worker processes.
+        ctx = mp.get_context("spawn")
+        with ctx.Pool(min(n_workers, len(chunks)),
+                      initializer=_init_worker,
+                      initargs=(config["DETECTOR"], config["TOPIC"],
+                                _REDIS_HOST, port, password)) as pool, \
+                _LogForwarder(), BatchResultWriter(filepath) as writer:
+            # chunks are returned in order one by one
+            for ret in pool.imap(_process_trains,
+                                 [(path, chunk) for chunk in chunks],
+                                 chunksize=1):
+                for data in ret:
+                    try:
+                        run_tasks(tasks, data)
+                    except StopPipelineError:
+                        continue
+                    writer.append(data['processed'])
+
+        logger.info(f"{len(writer)} out of {len(train_ids)} trains "
+                    f"processed and written to {filepath}")
+        return len(writer)
+    finally:
+        server.kill()
+        server.wait()
+
+
+def batch_process():
+    parser = argparse.ArgumentParser(prog="extra-foam-batch")
+    parser.add_argument("detector",
+                        help="detector name (case insensitive)",
+                        choices=[det.upper() for det in config.detectors],
+                        type=lambda s: s.upper())
+    parser.add_argument("topic",
+                        help="name of the instrument",
+                        choices=config.topics,
+                        type=lambda s: s.upper())
+    parser.add_argument("run",
+                        help="path of the (calibrated) run directory")
+    parser.add_argument("output",
+                        help="path of the output HDF5 file")
+    parser.add_argument("--n_workers",
+                        help="number of worker processes",
+                        default=None,
+                        type=int)
+    parser.add_argument("--tid_range",
+                        help="first and last train IDs to process",
+                        nargs=2,
+                        default=None,
+                        type=int)
+    setup_group = parser.add_mutually_exclusive_group()
+    setup_group.add_argument("--redis_address",
+                             help="address of the Redis server of the "
+                                  "EXtra-foam session whose analysis setup "
+                                  "is used",
+                             default="127.0.0.1",
+                             type=lambda s: s.lower())
+    setup_group.add_argument("--setup",
+                             help="name of an analysis setup saved to file "
+                                  "by EXtra-foam, which is used instead of "
+                                  "the setup of a session",
+                             default=None)
+    parser.add_argument("--source",
+                        help="data source in the form 'device_id property' "
+                             "used with --setup (can be repeated)",
+                        action="append",
+                        default=[])
+
+    args = parser.parse_args()
+
+    detector = config.parse_detector_name(args.detector)
+    config.load(detector, args.topic)
+
+    if args.setup is None:
+        session = read_session(args.redis_address, config["REDIS_PORT"],
+                               config["REDIS_PASSWORD"])
+    else:
+        rd_cal, rd_raw = load_runs(args.run)
+        run_sources = set(rd_cal.all_sources)
+        if rd_raw is not None:
+            run_sources.update(rd_raw.all_sources)
+        session = read_setup(args.setup, run_sources, args.source)
+    process_run(args.run, args.output,
+                session=session,
+                n_workers=args.n_workers,
+                tid_range=args.tid_range)
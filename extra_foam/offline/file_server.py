@@ -7,21 +7,43 @@ Author: Jun Zhu <jun.zhu@xfel.eu>
 Copyright (C) European X-Ray Free-Electron Laser Facility GmbH.
 All rights reserved.
 """
+import multiprocessing as mp
+import os
 import os.path as osp
 import re
 import random
-from time import time
+from time import monotonic, sleep, time
 from collections import deque
+from functools import partial
+from queue import Full, Queue
+from threading import Thread
+
+import msgpack
+import numpy as np
+import zmq
 
 from extra_data import by_id, RunDirectory
-from extra_data.export import ZMQStreamer
+from karabo_bridge import serialize
 
 from .offline_config import StreamMode
+from ..pipeline.f_shmem import SharedMemoryReceiver, SharedMemorySender
+from ..pipeline.f_transformer import SENT_TIMESTAMP
 from ..utils import profiler
 
 
 _ALL_PROPERTIES = "*"
 
+# timeout for waiting for a free shared memory slot, in second
+_READER_SEND_TIMEOUT = 0.1
+
+_pack = msgpack.Packer(use_bin_type=True).pack
+
+# properties whose first axis is pulse, in the order of priority
+_PULSE_RESOLVED_PROPERTIES = (
+    "image.data",  # AGIPD, LPD, DSSC
+    "data.adc",  # JungFrau
+)
+
 
 def run_info(rd):
     """Return the basic information of a run.
@@ -158,6 +180,487 @@ def generate_meta(devices, tid):
     return meta
 
 
+def _nbytes(train_data):
+    """Return the total size of the arrays in a train in bytes."""
+    n = 0
+    for src_data in train_data.values():
+        for v in src_data.values():
+            if isinstance(v, np.ndarray):
+                n += v.nbytes
+    return n
+
+
+def _scale_pulses(train_data, n_pulses):
+    """Repeat or truncate the pulses of the detector data in a train.
+
+    The number of pulses of a source is given by the first axis of its
+    3D image data. All the arrays of the image data group, e.g. "image.*"
+    for "image.data", which have the same length in the first axis are
+    changed in place to have n_pulses along the first axis.
+
+    :param dict train_data: detector data of a train.
+    :param int n_pulses: number of pulses.
+    """
+    for src_data in train_data.values():
+        for key in _PULSE_RESOLVED_PROPERTIES:
+            image = src_data.get(key)
+            if isinstance(image, np.ndarray) and image.ndim == 3:
+                break
+        else:
+            continue
+
+        n = image.shape[0]
+        if n == 0 or n == n_pulses:
+            continue
+
+        indices = np.arange(n_pulses) % n
+        prefix = key.split('.', 1)[0] + '.'
+        for k, v in src_data.items():
+            if k.startswith(prefix) and isinstance(v, np.ndarray) \
+                    and v.ndim > 0 and v.shape[0] == n:
+                src_data[k] = v[indices]
+
+
+def _read_train(rd_cal, rd_raw, tid, n_pulses=None):
+    """Read a train and merge the calibrated and raw data.
+
+    :param int n_pulses: number of pulses which the detector data are
+        scaled to. None for no scaling.
+
+    :return tuple: (train ID, train data, size of the data in bytes)
+    """
+    _, train_data = rd_cal.train_from_id(tid)
+    if n_pulses is not None:
+        _scale_pulses(train_data, n_pulses)
+    if rd_raw is not None:
+        try:
+            # get raw data corresponding to the train id
+            _, raw_train_data = rd_raw.train_from_id(tid)
+            # Merge calibrated and raw data
+            train_data.update(raw_train_data)
+        except ValueError:
+            # Value Error is raised by EXtra-data when any raw data
+            # is not found.
+            pass
+    return tid, train_data, _nbytes(train_data)
+
+
+def _read_trains_worker(rd_cal, rd_raw, train_ids, conn, n_slots, stop,
+                        n_pulses=None):
+    """Entry point of a reading process.
+
+    :param list train_ids: IDs of the trains read by this process.
+    :param Connection conn: connection for sending the trains.
+    :param int n_slots: number of trains which can be read ahead.
+    :param Event stop: set if the trains are no longer needed.
+    :param int n_pulses: see _read_train.
+    """
+    ppid = os.getppid()
+    sender = SharedMemorySender(conn, n_slots=n_slots)
+    try:
+        for tid in train_ids:
+            if stop.is_set():
+                return
+
+            try:
+                data = _read_train(rd_cal, rd_raw, tid, n_pulses)
+            except Exception as e:
+                sender.send_message('error', f"[{tid}] {repr(e)}")
+                break
+
+            while not sender.send(data, timeout=_READER_SEND_TIMEOUT):
+                if stop.is_set() or os.getppid() != ppid:
+                    # the file server is gone
+                    return
+
+        # the slots must be kept until the last trains are received
+        while not sender.flush(timeout=_READER_SEND_TIMEOUT):
+            if stop.is_set() or os.getppid() != ppid:
+                return
+    except (BrokenPipeError, EOFError, OSError):
+        pass
+    finally:
+        sender.close()
+
+
+def prefetch_trains(rd_cal, rd_raw, train_ids, *, n_workers=4, n_prefetch=4,
+                    n_pulses=None):
+    """Read trains ahead in a pool of processes.
+
+    The trains are distributed to the processes in turn, so that upcoming
+    trains, which are usually in different sequence files, are read and
+    merged in parallel while the consumer is busy with the previous ones.
+    The trains are passed back via shared memory and are yielded in the
+    order of train_ids. At most about n_prefetch trains are read ahead.
+
+    The reading processes are spawned rather than forked, so that they
+    do not inherit the open file handles. The runs are pickled without
+    the handles and the files are re-opened in each process.
+
+    :param DataCollection rd_cal: calibrated run data.
+    :param DataCollection rd_raw: raw run data to be merged. None for no
+        merging.
+    :param iterable train_ids: IDs of the trains to read.
+    :param int n_workers: number of reading processes.
+    :param int n_prefetch: maximum number of trains read ahead.
+    :param int n_pulses: number of pulses which the detector data are
+        scaled to. None for no scaling.
+
+    :return: a generator of (train ID, train data, size of the data in
+        bytes).
+
+    :raise RuntimeError: if a train cannot be read.
+    """
+    # convert numpy integers, which cannot be serialized by msgpack
+    train_ids = [int(tid) for tid in train_ids]
+    n_workers = max(1, min(n_workers, len(train_ids)))
+    n_slots = max(1, n_prefetch // n_workers)
+
+    ctx = mp.get_context("spawn")
+    stop = ctx.Event()
+    workers = []
+    for i in range(n_workers):
+        conn, worker_conn = ctx.Pipe()
+        proc = ctx.Process(
+            target=_read_trains_worker,
+            args=(rd_cal, rd_raw, train_ids[i::n_workers], worker_conn,
+                  n_slots, stop, n_pulses),
+            daemon=True)
+        proc.start()
+        worker_conn.close()
+        workers.append((proc, conn, SharedMemoryReceiver(conn)))
+
+    try:
+        for i in range(len(train_ids)):
+            proc, conn, receiver = workers[i % n_workers]
+            while not conn.poll(_READER_SEND_TIMEOUT):
+                if not proc.is_alive():
+                    raise RuntimeError(
+                        f"Reading process {proc.pid} exited unexpectedly")
+            msg = conn.recv()
+            if msg[0] == 'error':
+                raise RuntimeError(f"Failed to read train {msg[1]}")
+            yield receiver.decode(msg)
+    finally:
+        stop.set()
+        for proc, conn, receiver in workers:
+            proc.join(timeout=1.)
+            if proc.is_alive():
+                proc.terminate()
+            receiver.close()
+            conn.close()
+
+
+class _FrameStreamer:
+    """REP server in a thread which sends serialized messages.
+
+    The trains are serialized before being fed, so that the messages can
+    be cached and replayed without being serialized again.
+    """
+    def __init__(self, port, *, maxlen=10, protocol_version='2.2',
+                 dummy_timestamps=False, stamp_sent=False):
+        """Initialization.
+
+        :param int port: TCP port to bind.
+        :param int maxlen: maximum number of messages waiting to be sent.
+        :param str protocol_version: version of the bridge protocol.
+        :param bool dummy_timestamps: True for generating timestamps from
+            the time when the data are serialized.
+        :param bool stamp_sent: True for stamping the time when a message
+            is sent in the metadata of its sources.
+        """
+        self.serialize = partial(serialize,
+                                 protocol_version=protocol_version,
+                                 dummy_timestamps=dummy_timestamps)
+        self._stamp_sent = stamp_sent
+
+        self._ctx = zmq.Context()
+        self._socket = self._ctx.socket(zmq.REP)
+        self._socket.setsockopt(zmq.LINGER, 0)
+        self._socket.set_hwm(1)
+        self._socket.bind(f"tcp://*:{port}")
+
+        self._stopper_r = self._ctx.socket(zmq.PAIR)
+        self._stopper_r.bind("inproc://file-server-stop")
+        self._stopper_w = self._ctx.socket(zmq.PAIR)
+        self._stopper_w.connect("inproc://file-server-stop")
+
+        self._poller = zmq.Poller()
+        self._poller.register(self._socket, zmq.POLLIN)
+        self._poller.register(self._stopper_r, zmq.POLLIN)
+
+        self._buffer = Queue(maxsize=maxlen)
+        self._thread = Thread(target=self._run, daemon=True)
+
+    @property
+    def endpoint(self):
+        return self._socket.getsockopt_string(zmq.LAST_ENDPOINT)
+
+    def feed(self, frames, headers=None, block=True, timeout=None):
+        """Push a serialized message to the sending queue.
+
+        :param list frames: serialized message.
+        :param list headers: source headers of the message.
+        :param bool block: True for blocking until a free slot is
+            available or timeout is reached.
+        :param float timeout: timeout in seconds.
+
+        :raise queue.Full: if there is no free slot.
+        """
+        self._buffer.put((frames, headers), block=block, timeout=timeout)
+
+    def _send(self, frames, headers):
+        """Send a message when it is requested.
+
+        :return bool: True if the server was stopped.
+        """
+        while True:
+            events = dict(self._poller.poll())
+
+            if self._stopper_r in events:
+                self._stopper_r.recv()
+                return True
+
+            msg = self._socket.recv()
+            if msg == b'next':
+                break
+            self._socket.send(b'Error: bad request %b' % msg)
+
+        if self._stamp_sent and headers:
+            # stamped as late as possible
+            t_sent = time()
+            frames, _ = _rewrite_meta(frames, headers, {
+                src: {**meta, SENT_TIMESTAMP: t_sent}
+                for _, src, meta in headers})
+
+        self._socket.send_multipart(frames, copy=False)
+        return False
+
+    def _run(self):
+        while True:
+            item = self._buffer.get()
+            if item is None or self._send(*item):
+                break
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopper_w.send(b'')
+        try:
+            # release the thread waiting for a message
+            self._buffer.put_nowait(None)
+        except Full:
+            pass
+        self._thread.join()
+        self._ctx.destroy(linger=0)
+
+
+def _source_headers(frames):
+    """Return the source headers in a message.
+
+    :param list frames: message serialized with the bridge protocol 2.2,
+        which consists of pairs of header and payload.
+
+    :return list: (index, source name, metadata) of the headers.
+    """
+    headers = []
+    for i in range(0, len(frames), 2):
+        header = msgpack.unpackb(frames[i], raw=False)
+        if header['content'] == 'msgpack':
+            headers.append((i, header['source'], header['metadata']))
+    return headers
+
+
+def _rewrite_meta(frames, headers, meta):
+    """Return a copy of a serialized message with new metadata.
+
+    Only the source headers are re-packed and the payloads are shared.
+
+    :param dict meta: new metadata of the sources.
+
+    :return tuple: (frames, source headers)
+    """
+    frames = list(frames)
+    new_headers = []
+    for i, src, _ in headers:
+        frames[i] = _pack({
+            'source': src, 'content': 'msgpack', 'metadata': meta[src]
+        })
+        new_headers.append((i, src, meta[src]))
+    return frames, new_headers
+
+
+class _TrainCache:
+    """Trains kept in memory as serialized messages for replaying.
+
+    Trains are added in order until either bound is reached, so that
+    the cache always holds the leading trains of a stream.
+    """
+    def __init__(self, max_trains=None, max_bytes=None):
+        """Initialization.
+
+        :param int max_trains: maximum number of trains. None for no
+            limit.
+        :param int max_bytes: maximum size of the messages in bytes. None
+            for no limit.
+        """
+        self._max_trains = max_trains
+        self._max_bytes = max_bytes
+
+        # (train ID, [(frames, source headers)], size of the train data)
+        self._trains = []
+        self._nbytes = 0
+        self._full = False
+
+    @property
+    def nbytes(self):
+        return self._nbytes
+
+    def add(self, tid, messages, nbytes):
+        """Add a train.
+
+        :param int tid: train ID.
+        :param list messages: serialized messages of the train and
+            their source headers.
+        :param int nbytes: size of the train data in bytes.
+
+        :return bool: False if the cache is full.
+        """
+        if self._full:
+            return False
+
+        size = sum(memoryview(f).nbytes for frames, _ in messages
+                   for f in frames)
+        if (self._max_trains is not None
+                and len(self._trains) >= self._max_trains) or \
+                (self._max_bytes is not None
+                 and self._nbytes + size > self._max_bytes):
+            self._full = True
+            return False
+
+        self._trains.append((tid, messages, nbytes))
+        self._nbytes += size
+        return True
+
+    def replay(self, counter, shuffle=False):
+        """Iterate over the cached trains with train IDs shifted.
+
+        :param int counter: offset of the train IDs.
+        :param bool shuffle: True for shuffling the messages in a train.
+
+        :return: a generator of (train ID, messages, size of the train
+            data in bytes).
+        """
+        for tid, messages, nbytes in self._trains:
+            if shuffle:
+                messages = random.sample(messages, len(messages))
+            yield tid, [_rewrite_meta(frames, headers, generate_meta(
+                [src for _, src, _ in headers], tid + counter))
+                        for frames, headers in messages], nbytes
+
+    def __len__(self):
+        return len(self._trains)
+
+
+def _serialize_train(serialize, train_data, tid, counter, mode):
+    """Serialize a train into messages to be streamed.
+
+    :param callable serialize: serializer of the bridge protocol.
+    :param int counter: offset of the train ID. Fake metadata with the
+        shifted train ID is generated if it is not zero.
+    :param StreamMode mode: stream mode.
+
+    :return list: serialized messages and their source headers.
+    """
+    if not train_data:
+        return []
+
+    if mode == StreamMode.NORMAL:
+        # Generate fake meta data with monotonically increasing train IDs
+        # only after the actual trains in corrected data are exhausted
+        meta = generate_meta(
+            train_data.keys(), tid+counter) if counter > 0 else None
+        frames = serialize(train_data, meta)
+        return [(frames, _source_headers(frames))]
+
+    # StreamMode.RANDOM_SHUFFLE
+    keys = list(train_data.keys())
+    random.shuffle(keys)
+    messages = []
+    for k in keys:
+        meta = generate_meta([k], tid+counter) if counter > 0 else None
+        frames = serialize({k: train_data[k]}, meta)
+        messages.append((frames, _source_headers(frames)))
+    return messages
+
+
+class _Pacer:
+    """Pace a stream at a target rate.
+
+    Trains are released in bursts at the same average rate. The stream
+    does not try to catch up if it falls behind the schedule.
+    """
+    def __init__(self, rate, burst=1):
+        """Initialization.
+
+        :param float rate: target rate in Hz.
+        :param int burst: number of trains released back to back.
+        """
+        self._interval = burst / rate
+        self._burst = burst
+
+        self._count = 0
+        self._next = None
+
+    def wait(self):
+        """Wait until the next train is due."""
+        if self._count == 0:
+            now = monotonic()
+            if self._next is not None and self._next > now:
+                sleep(self._next - now)
+            else:
+                self._next = now
+            self._next += self._interval
+        self._count = (self._count + 1) % self._burst
+
+
+class _StreamMonitor:
+    """Monitor the rate and throughput of a stream."""
+    def __init__(self, buffer_size, shared_tid, shared_rate,
+                 shared_throughput):
+        self._buffer_size = buffer_size
+        self._shared_tid = shared_tid
+        self._shared_rate = shared_rate
+        self._shared_throughput = shared_throughput
+
+        self._n_buffered = 0
+        # (time, size of the train in bytes)
+        self._t_sent = deque(maxlen=10)
+
+    def update(self, tid, nbytes):
+        """Update with a train which has just been fed."""
+        t_sent = self._t_sent
+        if self._n_buffered <= self._buffer_size:
+            # Do not count the first trains which are buffered immediately
+            # but may not be sent.
+            self._n_buffered += 1
+        else:
+            t_sent.append((time(), nbytes))
+
+        # update processing rate and throughput
+        n = len(t_sent) - 1
+        if n > 0:
+            dt = t_sent[-1][0] - t_sent[0][0]
+            self._shared_rate.value = n / dt
+            if self._shared_throughput is not None:
+                self._shared_throughput.value = sum(
+                    v for _, v in list(t_sent)[1:]) / dt / 1e6
+
+        # update the train ID just sent
+        self._shared_tid.value = tid
+
+
 def serve_files(run_data, port, shared_tid, shared_rate, *,
                 tid_range=None,
                 mode=StreamMode.NORMAL,
@@ -167,6 +670,15 @@ def serve_files(run_data, port, shared_tid, shared_rate, *,
                 require_all=True,
                 repeat_stream=False,
                 buffer_size=2,
+                shared_throughput=None,
+                n_workers=4,
+                n_prefetch=4,
+                cache_trains=None,
+                cache_memory=None,
+                target_rate=None,
+                burst=1,
+                n_pulses=None,
+                stamp_sent=False,
                 **kwargs):
     """Stream data from files through a TCP socket.
 
@@ -203,7 +715,37 @@ def serve_files(run_data, port, shared_tid, shared_rate, *,
         iterator is empty. Trainids will be monotonically increasing.
         Default: False
     buffer_size: int
-        ZMQStreamer buffer size.
+        Maximum number of messages waiting to be sent.
+    shared_throughput: Value
+        The stream throughput in MB/s.
+    n_workers: int
+        Number of processes reading the files.
+    n_prefetch: int
+        Maximum number of trains read ahead.
+    cache_trains: int
+        Maximum number of trains cached in the first loop when
+        repeat_stream is True. None for no limit.
+    cache_memory: float
+        Maximum size of the trains cached in the first loop in MB when
+        repeat_stream is True. None for no limit.
+        The cached trains are replayed in the following loops without
+        reading and serializing them again, i.e. only the leading trains
+        are streamed repeatedly if not all the trains fit into the cache.
+        If both cache_trains and cache_memory are None, the trains are
+        read from the files in every loop.
+    target_rate: float
+        Target stream rate in Hz. None for streaming as fast as possible.
+    burst: int
+        Number of trains streamed back to back when target_rate is given.
+        The average rate is kept.
+    n_pulses: int
+        Number of pulses which the detector data in every train are
+        scaled to by repeating or truncating the pulses. None for no
+        scaling.
+    stamp_sent: bool
+        True for stamping the time when a train is sent in the metadata
+        of every source, from which the pipeline reports the end-to-end
+        latency.
     """
     rd_cal, rd_raw = run_data
     num_trains = len(rd_cal.train_ids)
@@ -211,59 +753,56 @@ def serve_files(run_data, port, shared_tid, shared_rate, *,
     if rd_raw is None:
         rd_raw = rd_cal
 
-    streamer = ZMQStreamer(port, maxlen=buffer_size, **kwargs)
+    # select once instead of for every train
+    rd_cal = rd_cal.select(
+        "*" if detector_sources is None else detector_sources,
+        require_all=require_all).select_trains(
+        by_id[tid_range[0]:tid_range[1]:tid_range[2]])
+    rd_raw = rd_raw.select(instrument_sources + control_sources)
+
+    if kwargs.get('protocol_version', '2.2') != '2.2':
+        # messages are manipulated frame by frame
+        raise ValueError("Only the bridge protocol 2.2 is supported!")
+
+    cache = None
+    if repeat_stream and (cache_trains is not None
+                          or cache_memory is not None):
+        cache = _TrainCache(
+            cache_trains,
+            None if cache_memory is None else int(cache_memory * 1e6))
+
+    streamer = _FrameStreamer(
+        port, maxlen=buffer_size, stamp_sent=stamp_sent, **kwargs)
     streamer.start()  # run "REP" socket in a thread
 
+    pacer = None if target_rate is None else _Pacer(target_rate, burst)
+    monitor = _StreamMonitor(
+        buffer_size, shared_tid, shared_rate, shared_throughput)
     counter = 0
-    n_buffered = 0
-    t_sent = deque(maxlen=10)
     while True:
-        for tid, train_data in rd_cal.trains(
-                devices=detector_sources,
-                train_range=by_id[tid_range[0]:tid_range[1]:tid_range[2]],
-                require_all=require_all):
-            if rd_raw is not None:
-                try:
-                    # get raw data corresponding to the train id
-                    _, raw_train_data = rd_raw.train_from_id(
-                        tid, devices=instrument_sources + control_sources)
-                    # Merge calibrated and raw data
-                    train_data.update(raw_train_data)
-                except ValueError:
-                    # Value Error is raised by EXtra-data when any raw data
-                    # is not found.
-                    pass
-
-            if train_data:
-                if mode == StreamMode.NORMAL:
-                    # Generate fake meta data with monotonically increasing
-                    # train IDs only after the actual trains in corrected data
-                    # are exhausted
-                    meta = generate_meta(
-                        train_data.keys(), tid+counter) if counter > 0 else None
-                    streamer.feed(train_data, metadata=meta)
-                elif mode == StreamMode.RANDOM_SHUFFLE:
-                    keys = list(train_data.keys())
-                    random.shuffle(keys)
-                    for k in keys:
-                        meta = generate_meta(
-                            [k], tid+counter) if counter > 0 else None
-                        streamer.feed({k: train_data[k]}, metadata=meta)
-
-            if n_buffered <= buffer_size:
-                # Do not count the first trains which are buffered immediately but
-                # may not be sent.
-                n_buffered += 1
-            else:
-                t_sent.append(time())
-
-            # update processing rate
-            n = len(t_sent) - 1
-            if n > 0:
-                shared_rate.value = n / (t_sent[-1] - t_sent[0])
-
-            # update the train ID just sent
-            shared_tid.value = tid
+        if counter > 0 and cache:
+            # replay the cached trains at full speed
+            for tid, messages, nbytes in cache.replay(
+                    counter, shuffle=mode == StreamMode.RANDOM_SHUFFLE):
+                if pacer is not None:
+                    pacer.wait()
+                for frames, headers in messages:
+                    streamer.feed(frames, headers)
+                monitor.update(tid, nbytes)
+        else:
+            for tid, train_data, nbytes in prefetch_trains(
+                    rd_cal, rd_raw, rd_cal.train_ids,
+                    n_workers=n_workers, n_prefetch=n_prefetch,
+                    n_pulses=n_pulses):
+                messages = _serialize_train(
+                    streamer.serialize, train_data, tid, counter, mode)
+                if cache is not None and counter == 0:
+                    cache.add(tid, messages, nbytes)
+                if pacer is not None:
+                    pacer.wait()
+                for frames, headers in messages:
+                    streamer.feed(frames, headers)
+                monitor.update(tid, nbytes)
 
         if not repeat_stream:
             break
@@ -0,0 +1,184 @@
+from unittest.mock import MagicMock, patch, PropertyMock
+
+import h5py
+import numpy as np
+import pytest
+import yaml
+
+from extra_foam.config import config, ConfigWrapper
+from extra_foam.database import Metadata as mt
+from extra_foam.database import SourceCatalog
+from extra_foam.offline.batch_runner import (
+    _open_run, _process_trains, BatchResultWriter, read_setup,
+    split_train_ids, strip_data
+)
+from extra_foam.pipeline.data_model import ProcessedData
+from extra_foam.pipeline.exceptions import StopPipelineError
+
+
+_DET_SRC = "SPB_DET_AGIPD1M-1/CORR/0CH0:output"
+_CTRL_SRC = "SPB_IRU_MOTORS/MDL/DATA_SELECT"
+
+
+class _FakeRun:
+    all_sources = frozenset([_DET_SRC, _CTRL_SRC, "UNUSED"])
+
+    def select(self, srcs):
+        assert "UNUSED" not in srcs
+        return self
+
+    def train_from_id(self, tid):
+        if tid == 3:
+            raise ValueError
+        return tid, {
+            _DET_SRC: {"image.data": np.ones((4, 8, 8), dtype=np.float32)},
+            _CTRL_SRC: {"actualPosition.value": float(tid)},
+        }
+
+
+def _create_catalog():
+    catalog = SourceCatalog()
+    catalog.add_item(config["DETECTOR"], _DET_SRC, None, "image.data",
+                     None, None, 1)
+    catalog.add_item("Motor", _CTRL_SRC, None, "actualPosition",
+                     None, None, 0)
+    return catalog
+
+
+class TestBatchRunner:
+    def testSplitTrainIds(self):
+        assert split_train_ids([1, 2, 3, 4, 5], 2) == [[1, 2, 3], [4, 5]]
+        assert split_train_ids([1, 2], 4) == [[1], [2]]
+        assert split_train_ids([1, 2], 0) == [[1, 2]]
+        assert split_train_ids([], 4) == []
+
+    def testStripData(self):
+        catalog = _create_catalog()
+        processed = ProcessedData(1001)
+        image = processed.image
+        image.images = [None, np.ones((8, 8)), np.ones((8, 8)), None]
+        image.mean = np.ones((8, 8))
+        image.poi_indices = [1, 2]
+        processed.pp.image_on = np.ones((8, 8))
+        processed.pp.image_off = np.ones((8, 8))
+        processed.pp.fom = 1.
+        processed.ai.q_map = np.ones((8, 8))
+        processed.ai.fom = 1.
+        data = {
+            'catalog': catalog,
+            'raw': {catalog.main_detector: np.ones((4, 8, 8)),
+                    f"{_CTRL_SRC} actualPosition": 1.},
+            'assembled': {'data': np.ones((4, 8, 8)),
+                          'sliced': np.ones((4, 8, 8))},
+            'processed': processed,
+        }
+
+        strip_data(data)
+        assert 'assembled' not in data
+        assert list(data['raw']) == [f"{_CTRL_SRC} actualPosition"]
+        processed = data['processed']
+        assert processed.pp.image_on is None
+        assert processed.pp.image_off is None
+        assert processed.pp.fom == 1.
+        assert processed.ai.q_map is None
+        assert processed.ai.fom == 1.
+        image = data['processed'].image
+        assert image.n_images == 4
+        assert image.images == [None] * 4
+        assert image.poi_indices == [1, 2]
+        assert image.mean is None
+
+    @patch('extra_foam.ipc.ProcessLogger.debug')
+    @patch('extra_foam.ipc.ProcessLogger.error')
+    @patch("extra_foam.offline.batch_runner.load_runs",
+           return_value=(_FakeRun(), None))
+    @patch("extra_foam.offline.batch_runner._source_catalog",
+           side_effect=_create_catalog)
+    def testProcessTrains(self, catalog, load_runs, error, debug):
+        proc = MagicMock()
+
+        def run_once(data):
+            if data['processed'].tid == 2:
+                raise StopPipelineError
+
+        proc.run_once.side_effect = run_once
+        _open_run.cache_clear()
+        with patch("extra_foam.offline.batch_runner.create_processors",
+                   return_value=[("proc", proc)]):
+            ret = _process_trains(("/run", [1, 2, 3, 4]))
+            ret += _process_trains(("/run", [5]))
+
+        # train 2 is dropped by the processor and train 3 cannot be read
+        assert [d['processed'].tid for d in ret] == [1, 4, 5]
+        assert proc.run_once.call_count == 4
+        for data in ret:
+            assert list(data['raw']) == [f"{_CTRL_SRC} actualPosition"]
+        # the run is opened once in a worker process
+        load_runs.assert_called_once_with("/run")
+        _open_run.cache_clear()
+
+    def testResultWriter(self, tmp_path):
+        filepath = str(tmp_path / "results.h5")
+        with BatchResultWriter(filepath) as writer:
+            for tid in (1001, 1002):
+                processed = ProcessedData(tid)
+                processed.roi.fom = tid
+                processed.corr[0].source = _CTRL_SRC
+                processed.corr[0].x = np.arange(tid - 1000)
+                processed.corr[0].y = np.arange(tid - 1000)
+                writer.append(processed)
+            assert len(writer) == 2
+
+        with h5py.File(filepath, 'r') as fp:
+            np.testing.assert_array_equal([1001, 1002], fp["tid"][()])
+            np.testing.assert_array_equal([1001, 1002], fp["roi/fom"][()])
+
+            # accumulated results are taken from the last train
+            grp = fp["correlation/1"]
+            assert grp.attrs['source'] == _CTRL_SRC
+            np.testing.assert_array_equal(np.arange(2), grp["y"][()])
+            assert "x_slave" not in grp
+            assert "correlation/2" not in fp
+            assert "binning" not in fp
+
+        # the file is overwritten
+        with BatchResultWriter(filepath) as writer:
+            writer.append(ProcessedData(1003))
+        with h5py.File(filepath, 'r') as fp:
+            np.testing.assert_array_equal([1003], fp["tid"][()])
+            assert "correlation" not in fp
+
+    def testReadSetup(self, tmp_path):
+        config.load('AGIPD', 'SPB')
+
+        setup_file = str(tmp_path / "setup.yaml")
+        with open(setup_file, 'w') as fp:
+            yaml.dump({"scan": {
+                f"{mt.GLOBAL_PROC}:scan": {"ma_window": "1"},
+                f"{mt.CORRELATION_PROC}:scan": {
+                    "source1": f"{_CTRL_SRC} actualPosition", "source2": ""},
+            }}, fp, Dumper=yaml.Dumper)
+
+        det_src = "SPB_DET_AGIPD1M-1/DET/*CH0:xtdf"
+        run_sources = {"SPB_DET_AGIPD1M-1/DET/0CH0:xtdf", _CTRL_SRC}
+        with patch.object(ConfigWrapper, "setup_file",
+                          new_callable=PropertyMock, return_value=setup_file):
+            with pytest.raises(ValueError, match="'abc' not found"):
+                read_setup("abc", run_sources)
+
+            with pytest.raises(ValueError, match="not found in the run"):
+                read_setup("scan", {_CTRL_SRC})
+
+            session = read_setup("scan", run_sources, ["XGM:output data.x"])
+
+        assert session[mt.GLOBAL_PROC] == {"ma_window": "1"}
+        assert session[mt.IMAGE_PROC] == dict()
+
+        items = session[mt.DATA_SOURCE_ITEMS]
+        assert len(items) == 3
+        assert items[f"{det_src} image.data"] == \
+            f"AGIPD;{det_src};{list(range(16))};image.data;[None, None];;1"
+        ctg = config["SOURCE_USER_DEFINED_CATEGORY"]
+        assert items[f"{_CTRL_SRC} actualPosition"] == \
+            f"{ctg};{_CTRL_SRC};[];actualPosition;;;0"
+        assert items["XGM:output data.x"] == f"{ctg};XGM:output;[];data.x;;;1"
@@ -1,10 +1,34 @@
 from unittest.mock import MagicMock, patch
 
+import numpy as np
 import pytest
+import zmq
+
+from karabo_bridge.serializer import deserialize, serialize
 
 from extra_foam.offline import (
     run_info, gather_sources, load_runs
 )
+from extra_foam.offline.file_server import (
+    _FrameStreamer, _Pacer, _rewrite_meta, _scale_pulses, _serialize_train, _source_headers,
+    _TrainCache, prefetch_trains
+)
+from extra_foam.pipeline.f_transformer import SENT_TIMESTAMP
+from extra_foam.offline.offline_config import StreamMode
+
+
+class _FakeRun:
+    def __init__(self, src, missing=()):
+        self._src = src
+        self._missing = missing
+
+    def train_from_id(self, tid):
+        if tid in self._missing:
+            raise ValueError
+        if tid < 0:
+            raise KeyError
+        return tid, {self._src: {"data": np.full((32, 32), tid),
+                                 "metadata": {"timestamp.tid": tid}}}
 
 
 class TestFileServer:
@@ -32,6 +56,188 @@ class TestFileServer:
                 assert ('proc', 'raw') == load_runs("/a/proc/path")
                 assert ('proc', None) == load_runs("/a/proc/raise/path")
 
+    def testPrefetchTrains(self):
+        rd_cal = _FakeRun("A")
+        rd_raw = _FakeRun("B", missing=(2, 5))
+
+        ret = list(prefetch_trains(rd_cal, rd_raw, np.arange(10),
+                                   n_workers=3, n_prefetch=3))
+        assert [tid for tid, _, _ in ret] == list(range(10))
+        for tid, data, nbytes in ret:
+            assert type(tid) is int
+            np.testing.assert_array_equal(np.full((32, 32), tid),
+                                          data["A"]["data"])
+            if tid in (2, 5):
+                assert list(data) == ["A"]
+                assert nbytes == 32 * 32 * 8
+            else:
+                assert sorted(data) == ["A", "B"]
+                assert nbytes == 2 * 32 * 32 * 8
+
+        # the consumer stops early
+        gen = prefetch_trains(rd_cal, None, range(100), n_workers=2)
+        assert next(gen)[0] == 0
+        gen.close()
+
+        with pytest.raises(RuntimeError, match="-1"):
+            list(prefetch_trains(rd_cal, None, [0, -1, 2], n_workers=2))
+
+    def testTrainCache(self):
+        def train(tid):
+            return {"A": {"data": np.full((32, 32), tid), "ppt": tid,
+                          "metadata": {"timestamp.tid": tid}},
+                    "B": {"ppt": 2 * tid,
+                          "metadata": {"timestamp.tid": tid}}}
+
+        train_size = 32 * 32 * 8
+        cache = _TrainCache(max_trains=3)
+        for tid in range(5):
+            messages = _serialize_train(
+                serialize, train(tid), tid, 0, StreamMode.NORMAL)
+            assert cache.add(tid, messages, train_size) is (tid < 3)
+        assert len(cache) == 3
+        assert cache.nbytes > 3 * train_size
+
+        ret = list(cache.replay(100))
+        assert [tid for tid, _, _ in ret] == [0, 1, 2]
+        for tid, messages, nbytes in ret:
+            assert nbytes == train_size
+            assert len(messages) == 1
+            frames, headers = messages[0]
+            assert [src for _, src, _ in headers] == ["A", "B"]
+            data, meta = deserialize(frames)
+            assert sorted(data) == ["A", "B"]
+            for src in ("A", "B"):
+                assert meta[src]["timestamp.tid"] == tid + 100
+            np.testing.assert_array_equal(np.full((32, 32), tid),
+                                          data["A"]["data"])
+            assert data["A"]["ppt"] == tid
+            assert data["B"]["ppt"] == 2 * tid
+
+        # the payloads are shared between replays
+        frames0 = next(cache.replay(100))[1][0][0]
+        frames1 = next(cache.replay(200))[1][0][0]
+        assert frames0[-1] is frames1[-1]
+        assert frames0[0] != frames1[0]
+
+        # bounded by memory
+        messages = _serialize_train(
+            serialize, train(0), 0, 0, StreamMode.RANDOM_SHUFFLE)
+        assert len(messages) == 2
+        cache = _TrainCache(max_bytes=2.5 * train_size)
+        assert cache.add(0, messages, train_size)
+        assert cache.add(1, messages, train_size)
+        assert not cache.add(2, messages, train_size)
+        # no more trains are added once the cache is full
+        assert not cache.add(3, [], 0)
+        for tid, messages, _ in cache.replay(1, shuffle=True):
+            assert len(messages) == 2
+            data = dict()
+            for frames, _ in messages:
+                src_data, meta = deserialize(frames)
+                for src in src_data:
+                    assert meta[src]["timestamp.tid"] == tid + 1
+                data.update(src_data)
+            assert sorted(data) == ["A", "B"]
+
+    def testScalePulses(self):
+        def train():
+            return {
+                "A": {"image.data": np.arange(4)[:, None, None] * np.ones((4, 2, 2)),
+                      "image.pulseId": np.arange(4),
+                      "header.reserved": np.arange(4),
+                      "metadata": {}},
+                # train-resolved detector
+                "B": {"data.image.pixels": np.ones((4, 4))},
+            }
+
+        data = train()
+        _scale_pulses(data, 10)
+        assert data["A"]["image.data"].shape == (10, 2, 2)
+        np.testing.assert_array_equal(np.arange(10) % 4,
+                                      data["A"]["image.data"][:, 0, 0])
+        np.testing.assert_array_equal(np.arange(10) % 4,
+                                      data["A"]["image.pulseId"])
+        # not in the group of the image data
+        np.testing.assert_array_equal(np.arange(4),
+                                      data["A"]["header.reserved"])
+        assert data["B"]["data.image.pixels"].shape == (4, 4)
+
+        data = train()
+        _scale_pulses(data, 2)
+        assert data["A"]["image.data"].shape == (2, 2, 2)
+        np.testing.assert_array_equal([0, 1], data["A"]["image.pulseId"])
+
+    def testPacer(self):
+        with patch("extra_foam.offline.file_server.monotonic") as monotonic:
+            with patch("extra_foam.offline.file_server.sleep") as sleep:
+                t = [0.]
+                monotonic.side_effect = lambda: t[0]
+                sleep.side_effect = lambda dt: t.__setitem__(0, t[0] + dt)
+
+                # 10 Hz in bursts of 2 trains
+                pacer = _Pacer(10, burst=2)
+                times = []
+                for _ in range(6):
+                    pacer.wait()
+                    times.append(t[0])
+                np.testing.assert_array_almost_equal(
+                    [0, 0, 0.2, 0.2, 0.4, 0.4], times)
+
+                # no catching up after falling behind
+                t[0] += 1.
+                pacer.wait()
+                pacer.wait()
+                assert t[0] == pytest.approx(1.4)
+                pacer.wait()
+                assert t[0] == pytest.approx(1.6)
+
+    def testStampSent(self):
+        frames = serialize({"A": {"data": np.ones(2), "metadata": {}},
+                            "B": {"ppt": 1, "metadata": {}}},
+                           {"A": {"timestamp.tid": 1},
+                            "B": {"timestamp.tid": 1}})
+        headers = _source_headers(frames)
+        assert [(i, src) for i, src, _ in headers] == [(0, "A"), (4, "B")]
+
+        new_frames, new_headers = _rewrite_meta(frames, headers, {
+            src: {**meta, SENT_TIMESTAMP: 1.5} for _, src, meta in headers})
+        assert new_headers == _source_headers(new_frames)
+        # payloads are shared
+        assert all(new_frames[i] is frames[i] for i in (1, 2, 3, 5))
+        _, meta = deserialize(new_frames)
+        for src in ("A", "B"):
+            assert meta[src] == {"timestamp.tid": 1, SENT_TIMESTAMP: 1.5}
+
+    def testFrameStreamer(self):
+        streamer = _FrameStreamer(45457, maxlen=2, stamp_sent=True)
+        streamer.start()
+
+        ctx = zmq.Context()
+        try:
+            sock = ctx.socket(zmq.REQ)
+            sock.connect("tcp://localhost:45457")
+
+            for tid in (1, 2):
+                frames = streamer.serialize(
+                    {"A": {"ppt": tid, "metadata": {}}},
+                    {"A": {"timestamp.tid": tid}})
+                streamer.feed(frames, _source_headers(frames))
+
+            # the message is kept for the next valid request
+            sock.send(b'abc')
+            assert sock.recv() == b'Error: bad request abc'
+            for tid in (1, 2):
+                sock.send(b'next')
+                data, meta = deserialize(sock.recv_multipart(copy=False))
+                assert data["A"]["ppt"] == tid
+                assert meta["A"]["timestamp.tid"] == tid
+                assert SENT_TIMESTAMP in meta["A"]
+        finally:
+            ctx.destroy(linger=0)
+            # stopped while waiting for data
+            streamer.stop()
+
     def testGatherSources(self):
         ret = gather_sources(None, None)
         assert ret == (dict(), dict(), dict())
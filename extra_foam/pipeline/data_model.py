@@ -412,6 +412,8 @@ class ImageData:
         mean (numpy.ndarray): average image over the train.
         masked_mean (numpy.ndarray): average image over the train with
             both image mask and threshold mask applied.
+        masked_mean_hist (ImageHistogram): histogram of masked_mean for
+            display.
         n_images (int): number of images in the train.
         sliced_indices (list): a list of indices which is selected by
             pulse slicer. The slicing is applied before applying any pulse
@@ -445,7 +447,8 @@ class ImageData:
     """
 
     __slots__ = ["_pixel_size",
-                 "images", "mean", "masked_mean", "featured",
+                 "images", "mean", "masked_mean", "masked_mean_hist",
+                 "featured",
                  "sliced_indices", "poi_indices",
                  "gain_mean", "offset_mean",
                  "n_dark_pulses", "dark_mean", "dark_count",
@@ -459,6 +462,7 @@ class ImageData:
         self.images = None
         self.mean = None
         self.masked_mean = None
+        self.masked_mean_hist = None
         self.featured = None
 
         self.sliced_indices = None
@@ -878,6 +882,8 @@ class ProcessedData:
 
     Attributes:
         tid (int): train ID.
+        t_sent (float): time when the train was sent by the file server
+            in seconds since the epoch. None if unknown.
         image (ImageData): image data.
         xgm (XgmData): XGM train-resolved data.
         ai (AzimuthalIntegrationData): azimuthal integration train-resolved data.
@@ -901,7 +907,7 @@ class ProcessedData:
             self.digitizer = DigitizerData()
             self.hist = HistogramDataPulse()
 
-    __slots__ = ['_tid', 'pidx', 'image',
+    __slots__ = ['_tid', 't_sent', 'pidx', 'image',
                  'xgm', 'roi', 'ai', 'pp',
                  'hist', 'corr', 'bin',
                  'pulse']
@@ -909,6 +915,7 @@ class ProcessedData:
     def __init__(self, tid):
         """Initialization."""
         self._tid = tid  # train ID
+        self.t_sent = None
 
         self.pidx = PulseIndexMask()
 
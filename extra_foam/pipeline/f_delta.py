@@ -0,0 +1,355 @@
+"""
+Distributed under the terms of the BSD 3-Clause License.
+
+The full license is in the file LICENSE, distributed with this software.
+
+Author: Jun Zhu <jun.zhu@xfel.eu>
+Copyright (C) European X-Ray Free-Electron Laser Facility GmbH.
+All rights reserved.
+"""
+import copy
+
+import numpy as np
+
+
+# Paths of the accumulating histories in ProcessedData. An integer in the
+# path is an index and a string is an attribute name.
+
+# correlation: append-only histories
+_APPEND_FIELDS = (
+    *[('corr', '_common', i, attr) for i in range(2)
+      for attr in ('x', 'y', 'x_slave', 'y_slave')],
+    ('corr', '_pp', 'x'),
+    ('corr', '_pp', 'y'),
+)
+# binning and histogram: a few bins are updated per train
+_UPDATE_FIELDS = (
+    ('bin', '_common', 0, 'stats'),
+    ('bin', '_common', 0, 'counts'),
+    ('bin', '_common', 0, 'heat'),
+    ('bin', 'heat'),
+    ('bin', 'heat_count'),
+    ('hist', 'hist'),
+)
+_HISTORY_FIELDS = _APPEND_FIELDS + _UPDATE_FIELDS
+
+
+def _get(obj, key):
+    return obj[key] if isinstance(key, int) else getattr(obj, key)
+
+
+def _set(obj, key, v):
+    if isinstance(key, int):
+        obj[key] = v
+    else:
+        setattr(obj, key, v)
+
+
+def _copy_parent(path, copies):
+    """Shallow copy the containers along the path.
+
+    :param tuple path: path of the value.
+    :param dict copies: copies of the containers keyed by their paths.
+        It must contain the copy of the root object keyed by ().
+
+    :return: the copy of the container of the value.
+    """
+    parent = copies[()]
+    for i in range(1, len(path)):
+        prefix = path[:i]
+        if prefix not in copies:
+            child = copy.copy(_get(parent, path[i - 1]))
+            _set(parent, path[i - 1], child)
+            copies[prefix] = child
+        parent = copies[prefix]
+    return parent
+
+
+def _make_tuple(cls, items):
+    # namedtuple, e.g. the y data of OneWayAccuPairSequence
+    return cls._make(items) if hasattr(cls, '_make') else tuple(items)
+
+
+def _changed(a, b):
+    """Return the flat indices of elements which are different."""
+    neq = a != b
+    if a.dtype.kind == 'f':
+        neq &= ~(np.isnan(a) & np.isnan(b))
+    return np.flatnonzero(neq)
+
+
+def _view_offset(base, v):
+    """Return the offset of v from base in number of elements.
+
+    :return: None if they are not 1D views of the same buffer.
+    """
+    if base.base is None or base.base is not v.base \
+            or base.ndim != 1 or v.ndim != 1 \
+            or base.strides != v.strides or base.strides[0] <= 0:
+        return
+    d = v.__array_interface__['data'][0] - base.__array_interface__['data'][0]
+    k, r = divmod(d, base.strides[0])
+    return k if r == 0 else None
+
+
+def _equal(a, b):
+    if np.array_equal(a, b):
+        return True
+    if a.dtype.kind == 'f':
+        return bool(np.all((a == b) | (np.isnan(a) & np.isnan(b))))
+    return False
+
+
+class _OutOfSyncError(Exception):
+    """Raised when the base array of a delta is not available."""
+    pass
+
+
+class ArrayDelta:
+    """Encoded array of an accumulating history.
+
+    Attributes:
+        kind (int): FULL, PATCH or SHIFT.
+        seq (int): sequence number of the message which carries it.
+        base_seq (int): sequence number of the message which carries the
+            array this delta is applied to. None for FULL.
+        data: FULL - the array;
+              PATCH - (flat indices, values) of the changed elements;
+              SHIFT - (start, stop, tail), where the new array is
+                      base[start:stop] followed by tail.
+    """
+    FULL = 0
+    PATCH = 1
+    SHIFT = 2
+
+    __slots__ = ['kind', 'seq', 'base_seq', 'data']
+
+    def __init__(self, kind, seq, base_seq, data):
+        self.kind = kind
+        self.seq = seq
+        self.base_seq = base_seq
+        self.data = data
+
+    def apply(self, base):
+        """Reconstruct the new array from the base array."""
+        if self.kind == self.FULL:
+            return self.data
+
+        if self.kind == self.PATCH:
+            indices, values = self.data
+            ret = base.copy()
+            np.put(ret, indices, values)
+            return ret
+
+        start, stop, tail = self.data
+        return np.concatenate((base[start:stop], tail))
+
+
+class DeltaEncoder:
+    """Encode the accumulating histories in ProcessedData as deltas.
+
+    The histories (e.g. correlation, binning and histogram) in
+    ProcessedData are replaced by the new points or the changed bins
+    with respect to those in the previous message, so that the amount
+    of data being sent does not grow with the length of the history.
+
+    The encoder must be placed at the point beyond which the messages
+    are delivered in order and without being dropped.
+
+    An append-only history is expected to be a view of a buffer in which
+    the points are never moved or overwritten, e.g. the data of a
+    SimplePairSequence. The new points are then found from its offset in
+    the buffer with respect to the last sent view, without comparing or
+    copying the whole history. Otherwise, the history is compared with
+    the last sent one.
+    """
+    # send full arrays periodically, so that the receiver can recover
+    # from any lost message
+    _KEY_FRAME_INTERVAL = 50
+    # maximum number of points dropped from the front of a history
+    # between two messages which can be encoded as a shift
+    _MAX_SHIFT = 16
+
+    def __init__(self):
+        self._seq = 0
+        # last sent array and the sequence number of the message
+        self._prev = dict()
+
+    def reset(self):
+        """Send full arrays in the next message."""
+        self._prev.clear()
+
+    def encode(self, processed):
+        """Return an encoded copy of the ProcessedData.
+
+        The original ProcessedData is not modified since it could be
+        shared with other consumers.
+        """
+        self._seq += 1
+        if self._seq % self._KEY_FRAME_INTERVAL == 0:
+            self._prev.clear()
+
+        out = copy.copy(processed)
+        copies = {(): out}
+        for path in _APPEND_FIELDS:
+            self._encode_field(processed, path, copies, True)
+        for path in _UPDATE_FIELDS:
+            self._encode_field(processed, path, copies, False)
+
+        return out
+
+    def _encode_field(self, processed, path, copies, append):
+        v = processed
+        for key in path:
+            v = _get(v, key)
+
+        encoded = self._encode_value(path, v, append)
+        if encoded is not v:
+            _set(_copy_parent(path, copies), path[-1], encoded)
+
+    def _encode_value(self, key, v, append):
+        if isinstance(v, np.ndarray):
+            return self._encode_array(key, v, append)
+
+        if isinstance(v, tuple):
+            return _make_tuple(type(v), [
+                self._encode_value(key + (i,), item, append)
+                for i, item in enumerate(v)])
+
+        self._prev.pop(key, None)
+        return v
+
+    def _encode_array(self, key, v, append):
+        seq = self._seq
+        prev = self._prev.get(key)
+        if append:
+            # The sent points of the view are never modified except the
+            # last one, which is always sent again.
+            self._prev[key] = (v, seq)
+        else:
+            # The bins could be updated in place by the processor before
+            # the message is serialized. Therefore, a snapshot is used to
+            # keep the encoder and the decoder in sync.
+            v = v.copy()
+            self._prev[key] = (v, seq)
+
+        if prev is not None:
+            base, base_seq = prev
+            delta = self._diff(base, v)
+            if delta is not None:
+                kind, data = delta
+                return ArrayDelta(kind, seq, base_seq, data)
+
+        # a snapshot since the view could still be updated in place
+        return ArrayDelta(ArrayDelta.FULL, seq, None,
+                          v.copy() if append else v)
+
+    def _diff(self, base, v):
+        if base.dtype != v.dtype or base.ndim != v.ndim:
+            return
+
+        if v.ndim != 1:
+            return self._diff_patch(base, v)
+
+        offset = _view_offset(base, v)
+        if offset is not None:
+            return self._diff_shift(base, v, offset)
+
+        if v is not base and base.base is not None \
+                and base.base is v.base:
+            # moved within the same buffer, which could have overwritten
+            # the old points
+            return
+
+        return self._diff_patch(base, v) or self._diff_shift(base, v)
+
+    @staticmethod
+    def _diff_patch(base, v):
+        if base.shape == v.shape:
+            indices = _changed(base, v)
+            if len(indices) <= v.size // 4:
+                return ArrayDelta.PATCH, (indices, v.ravel()[indices])
+
+    def _diff_shift(self, base, v, offset=None):
+        """Encode v as the points of base starting at an offset followed
+        by the new points.
+
+        :param int offset: offset of v with respect to base. If None, it
+            is found by comparing the arrays.
+        """
+        m, n = len(base), len(v)
+        if offset is None:
+            candidates = range(min(m, self._MAX_SHIFT) + 1)
+        elif 0 <= offset <= self._MAX_SHIFT:
+            candidates = (offset,)
+        else:
+            return
+
+        for k in candidates:
+            # The last overlapping point is always sent since it
+            # could have been updated, e.g. OneWayAccuPairSequence.
+            j = min(m - k, n) - 1
+            if j <= 0 or j < n // 4:
+                break
+            if offset is not None or _equal(base[k:k + j], v[:j]):
+                return ArrayDelta.SHIFT, (k, k + j, v[j:].copy())
+
+
+class DeltaDecoder:
+    """Reconstruct the accumulating histories encoded by DeltaEncoder.
+
+    The decoder keeps a mirror of the histories. The arrays handed out
+    are shared with the mirror and must be treated as read-only.
+    """
+    def __init__(self):
+        self._mirror = dict()
+
+    def reset(self):
+        """Clear the mirrored histories."""
+        self._mirror.clear()
+
+    def decode(self, processed):
+        """Decode the ProcessedData in place.
+
+        :return: the decoded ProcessedData or None if the message cannot
+            be decoded because any of the previous messages was lost.
+            The histories will be rebuilt at the next key frame.
+        """
+        synced = True
+        for path in _HISTORY_FIELDS:
+            parent = processed
+            for key in path[:-1]:
+                parent = _get(parent, key)
+
+            try:
+                v = self._decode_value(path, _get(parent, path[-1]))
+            except _OutOfSyncError:
+                synced = False
+                v = None
+            _set(parent, path[-1], v)
+
+        return processed if synced else None
+
+    def _decode_value(self, key, v):
+        if isinstance(v, ArrayDelta):
+            return self._decode_array(key, v)
+
+        if isinstance(v, tuple):
+            return _make_tuple(type(v), [self._decode_value(key + (i,), item)
+                                         for i, item in enumerate(v)])
+
+        self._mirror.pop(key, None)
+        return v
+
+    def _decode_array(self, key, delta):
+        base = None
+        if delta.kind != ArrayDelta.FULL:
+            prev = self._mirror.get(key)
+            if prev is None or prev[1] != delta.base_seq:
+                self._mirror.pop(key, None)
+                raise _OutOfSyncError
+            base = prev[0]
+
+        v = delta.apply(base)
+        self._mirror[key] = (v, delta.seq)
+        return v
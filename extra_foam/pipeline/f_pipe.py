@@ -12,6 +12,9 @@ import multiprocessing as mp
 from queue import Empty, Full
 import time
 
+from .f_delta import DeltaDecoder, DeltaEncoder
+from .f_shmem import SharedMemoryArena, SharedMemoryArenaReader
+from .f_sink import ResultWriterProcess
 from .f_transformer import DataTransformer
 from .f_zmq import BridgeProxy, FoamZmqServer
 from .f_queue import SimpleQueue
@@ -25,6 +28,27 @@ from ..database import (
 from ..database import Metadata as mt
 
 
+# Paths of the fields in ProcessedData which could hold large arrays.
+# They are delivered to the GUI via shared memory.
+_SHM_FIELDS = (
+    ('image', 'images'),
+    ('image', 'mean'),
+    ('image', 'masked_mean'),
+    ('image', 'masked_mean_ma'),
+    ('image', 'gain_mean'),
+    ('image', 'offset_mean'),
+    ('image', 'dark_mean'),
+    ('image', 'image_mask'),
+    ('image', 'image_mask_in_modules'),
+    ('image', 'mask'),
+    ('image', 'reference'),
+    ('image', 'transformed'),
+    ('ai', 'q_map'),
+    ('pp', 'image_on'),
+    ('pp', 'image_off'),
+)
+
+
 class _PipeBase(ABC):
     """Abstract Pipe class.
 
@@ -49,6 +73,8 @@ class _PipeBase(ABC):
 
         self._cache = SimpleQueue(maxsize=1)
 
+        self._thread = None
+
         self._meta = MetaProxy()
         self._mon = MonProxy()
 
@@ -60,7 +86,12 @@ class _PipeBase(ABC):
         the internal queue and send it to the client.
         """
         self.clear()
-        self.run()
+        self._thread = self.run()
+
+    def join(self, timeout=None):
+        """Wait until the pipe thread finishes after closing."""
+        if self._thread is not None:
+            self._thread.join(timeout)
 
     @abstractmethod
     def run(self):
@@ -236,12 +267,30 @@ class KaraboBridge(_PipeInBase, _RedisParserMixin):
 
 
 class MpInQueue(_PipeInBase):
-    """A pipe which uses a multi-processing queue to receive data."""
+    """A pipe which uses a multi-processing queue to receive data.
+
+    If it is the final pipe, it receives ProcessedData from the final
+    MpOutQueue, rebuilds the accumulating histories from the deltas and
+    maps the large arrays from the shared memory. Full histories are
+    requested from the MpOutQueue whenever the deltas cannot be applied,
+    e.g. after the decoder was reset.
+    """
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
         self._client = mp.Queue(maxsize=config["PIPELINE_MAX_QUEUE_SIZE"])
 
+        self._decoder = None
+        self._arena = None
+        if self._final:
+            self._decoder = DeltaDecoder()
+            # for releasing the blocks in the shared memory
+            self._arena_conn, conn = mp.Pipe(duplex=False)
+            self._arena = SharedMemoryArenaReader(conn)
+            # for requesting full histories
+            self._resync_conn, self._resync_sender = mp.Pipe(duplex=False)
+            self._resync_requested = False
+
     @run_in_thread(daemon=True)
     def run(self):
         """Override."""
@@ -250,11 +299,23 @@ class MpInQueue(_PipeInBase):
             if self.updating:
                 data_in = None
                 self.clear()
+                if self._decoder is not None:
+                    self._decoder.reset()
+                    self._request_resync()
                 self.finish_updating()
 
             if data_in is None:
                 try:
                     data_in = self._client.get_nowait()
+                    if self._decoder is not None:
+                        self._arena.decode(data_in, _SHM_FIELDS)
+                        # None if the histories are out of sync
+                        data_in = self._decoder.decode(data_in)
+                        if data_in is None:
+                            if not self._resync_requested:
+                                self._request_resync()
+                        else:
+                            self._resync_requested = False
                 except Empty:
                     pass
 
@@ -268,39 +329,74 @@ class MpInQueue(_PipeInBase):
             time.sleep(0.001)
 
         self._client.cancel_join_thread()
+        if self._arena is not None:
+            self._arena.close()
+
+    def _request_resync(self):
+        """Ask the MpOutQueue to send full histories in the next message."""
+        try:
+            self._resync_sender.send(None)
+            self._resync_requested = True
+        except (BrokenPipeError, OSError):
+            pass
 
     def connect(self, pipe_out):
         """Override."""
         if isinstance(pipe_out, MpOutQueue):
-            pipe_out.accept(self._client)
+            if self._final:
+                pipe_out.accept(self._client, self._arena_conn,
+                                self._resync_conn)
+            else:
+                pipe_out.accept(self._client)
         else:
             raise NotImplementedError(f"Cannot connect {self.__class__} "
                                       f"(input) to {type(pipe_out)} (output)")
 
 
 class MpOutQueue(_PipeOutBase):
-    """A pipe which uses a multi-processing queue to dispatch data."""
+    """A pipe which uses a multi-processing queue to dispatch data.
+
+    If it is the final pipe, only ProcessedData is dispatched. The
+    accumulating histories in it are sent as deltas and the large arrays
+    are published in the shared memory, where the unchanged ones are
+    referenced instead of being copied again.
+    """
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
         self._client = None
+        self._arena_conn = None
+        self._resync_conn = None
+
+        self._encoder = DeltaEncoder() if self._final else None
 
     @run_in_thread(daemon=True)
     def run(self):
         """Override."""
+        arena = None
+        if self._final:
+            arena = SharedMemoryArena(self._arena_conn)
+
         data_out = None
         while not self.closing:
             if self.updating:
                 data_out = None
                 self.clear()
+                if self._encoder is not None:
+                    self._encoder.reset()
                 self.finish_updating()
 
+            if self._resync_requested():
+                self._encoder.reset()
+
             if data_out is None:
                 try:
                     data = self._cache.get_nowait()
 
                     if self._final:
-                        data_out = data['processed']
+                        data_out = arena.encode(
+                            self._encoder.encode(data['processed']),
+                            _SHM_FIELDS)
 
                         tid = data_out.tid
                         n_pulses = data_out.pidx.n_kept(data_out.n_pulses)
@@ -323,25 +419,61 @@ class MpOutQueue(_PipeOutBase):
                 try:
                     self._client.put_nowait(data_out)
                     data_out = None
+                    if arena is not None:
+                        arena.commit()
                 except Full:
                     pass
 
             time.sleep(0.001)
 
         self._client.cancel_join_thread()
-
-    def accept(self, connection):
-        """Override."""
+        if arena is not None:
+            arena.close()
+
+    def _resync_requested(self):
+        """Return whether full histories are requested by the MpInQueue."""
+        conn = self._resync_conn
+        if conn is None or not conn.poll():
+            return False
+        try:
+            while conn.poll():
+                conn.recv()
+        except (EOFError, OSError):
+            self._resync_conn = None
+        return True
+
+    def accept(self, connection, arena_conn=None, resync_conn=None):
+        """Override.
+
+        :param Connection arena_conn: connection from which the blocks
+            in the shared memory are released. Required by the final pipe.
+        :param Connection resync_conn: connection from which the requests
+            for full histories are received. Required by the final pipe.
+        """
         self._client = connection
+        self._arena_conn = arena_conn
+        self._resync_conn = resync_conn
 
 
 class ZmqOutQueue(_PipeOutBase):
-    """A pipe which uses ZeroMQ to dispatch data."""
+    """A pipe which uses ZeroMQ to dispatch data.
+
+    It also tells the processors whether any extension client is
+    receiving data.
+    """
+    # an extension client is regarded as gone if it has not requested
+    # data for so long
+    _CLIENT_EXPIRY = 2.  # second
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
         self._server = None
 
+        # time when the last data was sent to a client
+        self._last_sent = None
+        self._has_client = None
+
     def _update_server(self):
         if self._server is None:
             self._server = FoamZmqServer()
@@ -354,6 +486,15 @@ class ZmqOutQueue(_PipeOutBase):
         logger.debug(f"Instantiate an extension server bound to "
                      f"{endpoint}")
 
+        self._last_sent = None
+
+    def _update_client_state(self):
+        has_client = self._last_sent is not None and \
+            time.monotonic() - self._last_sent < self._CLIENT_EXPIRY
+        if has_client != self._has_client:
+            self._has_client = has_client
+            self._meta.set_extension_client(has_client)
+
     @run_in_thread(daemon=True)
     def run(self):
         """Override."""
@@ -376,10 +517,110 @@ class ZmqOutQueue(_PipeOutBase):
                 try:
                     self._server.send(data_out)
                     data_out = None
+                    self._last_sent = time.monotonic()
                 except TimeoutError:
                     pass
 
+            self._update_client_state()
+
             time.sleep(0.001)
 
     def accept(self, connection):
         pass
+
+
+class FileOutQueue(_PipeOutBase):
+    """A pipe which writes the selected results to file.
+
+    The selected results are extracted in its own thread and written in
+    blocks of trains in a separate process. Trains are dropped only if
+    the writing falls behind by more than the size of its queue.
+    """
+    _MAX_PENDING = 100  # number of trains
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        self._cache = SimpleQueue(maxsize=self._MAX_PENDING)
+
+        self._writer = None
+
+    def _close_writer(self):
+        if self._writer is None:
+            return
+
+        # write the trains received before the update
+        while True:
+            try:
+                self._write(self._cache.get_nowait())
+            except Empty:
+                break
+
+        if self._writer is not None:
+            self._writer.close()
+            self._log_errors()
+        self._writer = None
+
+    def _update_writer(self):
+        self._close_writer()
+
+        cfg = self._meta.hget_all(mt.RESULT_SINK)
+        filepath = cfg.get("filepath", "")
+        if not filepath:
+            return
+
+        fields = [f for f in cfg.get("fields", "").split(",") if f]
+        try:
+            self._writer = ResultWriterProcess(filepath, fields)
+            logger.info(f"Results are written to {filepath}")
+        except Exception as e:
+            logger.error(f"Failed to open result file {filepath}: {repr(e)}")
+
+    def _log_errors(self):
+        for msg in self._writer.errors():
+            logger.error(msg)
+
+    def _write(self, data):
+        if self._writer is None:
+            return
+
+        while True:
+            try:
+                self._writer.append(data['processed'], timeout=0.1)
+                return
+            except Full:
+                self._log_errors()
+                if not self._writer.is_alive():
+                    # e.g. failed to open the file
+                    self._writer.close()
+                    self._writer = None
+                    return
+            except Exception as e:
+                logger.error(f"Failed to write results: {repr(e)}")
+                return
+
+    @run_in_thread(daemon=True)
+    def run(self):
+        """Override."""
+        self._update_writer()
+        while not self.closing:
+            if self.updating:
+                self._update_writer()
+                self.finish_updating()
+
+            try:
+                self._write(self._cache.get_nowait())
+            except Empty:
+                if self._writer is not None:
+                    self._log_errors()
+                time.sleep(0.001)
+
+        self._close_writer()
+
+    def put(self, item):
+        """Override."""
+        if self._writer is not None:
+            super().put(item)
+
+    def accept(self, connection):
+        pass
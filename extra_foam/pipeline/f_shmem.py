@@ -0,0 +1,491 @@
+"""
+Distributed under the terms of the BSD 3-Clause License.
+
+The full license is in the file LICENSE, distributed with this software.
+
+Author: Jun Zhu <jun.zhu@xfel.eu>
+Copyright (C) European X-Ray Free-Electron Laser Facility GmbH.
+All rights reserved.
+"""
+from collections import namedtuple
+import copy
+import mmap
+from multiprocessing.util import Finalize
+import os
+import tempfile
+import weakref
+
+import numpy as np
+
+from .f_delta import _copy_parent, _equal, _get, _set
+
+
+_SHM_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+
+# alignment of arrays in the shared memory in bytes
+_ALIGNMENT = 64
+# arrays smaller than this size in bytes are sent in the header
+_MIN_SHM_NBYTES = 1024
+
+# placeholder of an array in the header
+_ShmArray = namedtuple('_ShmArray', ['offset', 'dtype', 'shape'])
+# placeholder of an array published in a SharedMemoryArena
+_ShmRef = namedtuple('_ShmRef', ['path', 'version', 'dtype', 'shape'])
+
+
+def _make_sequence(cls, items):
+    # namedtuple
+    return cls._make(items) if hasattr(cls, '_make') else cls(items)
+
+
+def _aligned(n):
+    return (n + _ALIGNMENT - 1) // _ALIGNMENT * _ALIGNMENT
+
+
+def _unlink(path):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+class SharedMemorySlot:
+    """A growable shared memory block for passing data between processes.
+
+    The memory is backed by a file in /dev/shm, so that the other process
+    can attach to it by path. Numpy arrays in the data are copied into
+    the memory and the rest of the data forms a small header, which is
+    expected to be sent via a pipe.
+
+    The file of an owned slot is removed when the slot is closed, garbage
+    collected or at the latest when the owner process exits.
+    """
+    def __init__(self, path=None):
+        """Initialization.
+
+        :param str path: path of an existing slot to attach to. If None,
+            a new slot is created and owned by this instance.
+        """
+        if path is None:
+            fd, path = tempfile.mkstemp(prefix="extra-foam-", dir=_SHM_DIR)
+            # also run at the exit of a forked process, which skips the
+            # atexit hooks, but never in the children of the owner
+            self._finalizer = Finalize(self, _unlink, args=(path,),
+                                       exitpriority=0)
+        else:
+            fd = os.open(path, os.O_RDWR)
+            self._finalizer = None
+
+        self._fd = fd
+        self._path = path
+        self._size = 0
+        self._buf = None
+
+    @property
+    def path(self):
+        return self._path
+
+    def _map(self, size):
+        if self._buf is not None:
+            self._buf.close()
+        self._buf = mmap.mmap(self._fd, size)
+        self._size = size
+
+    def _encode(self, obj, arrays, offset):
+        if isinstance(obj, np.ndarray) and not obj.dtype.hasobject \
+                and obj.nbytes >= _MIN_SHM_NBYTES:
+            arrays.append((offset, obj))
+            item = _ShmArray(offset, obj.dtype.str, obj.shape)
+            return item, _aligned(offset + obj.nbytes)
+
+        if type(obj) is dict:
+            ret = dict()
+            for k, v in obj.items():
+                ret[k], offset = self._encode(v, arrays, offset)
+            return ret, offset
+
+        if isinstance(obj, (list, tuple)):
+            ret = []
+            for v in obj:
+                item, offset = self._encode(v, arrays, offset)
+                ret.append(item)
+            return _make_sequence(type(obj), ret), offset
+
+        return obj, offset
+
+    def write(self, obj):
+        """Write data into the slot.
+
+        Only the arrays in (nested) dict, list and tuple (including
+        namedtuple) are written into the shared memory.
+
+        :return: (header, size) which is required by read.
+        """
+        arrays = []
+        header, size = self._encode(obj, arrays, 0)
+
+        if size > self._size:
+            # grow with some headroom to avoid frequent remapping
+            new_size = max(size, 2 * self._size)
+            os.ftruncate(self._fd, new_size)
+            self._map(new_size)
+
+        for offset, arr in arrays:
+            np.ndarray(arr.shape, dtype=arr.dtype, buffer=self._buf,
+                       offset=offset)[...] = arr
+
+        return header, size
+
+    def _decode(self, obj, copy):
+        if type(obj) is _ShmArray:
+            offset, dtype, shape = obj
+            arr = np.ndarray(shape, dtype=dtype, buffer=self._buf,
+                             offset=offset)
+            return arr.copy() if copy else arr
+
+        if type(obj) is dict:
+            return {k: self._decode(v, copy) for k, v in obj.items()}
+
+        if isinstance(obj, (list, tuple)):
+            return _make_sequence(type(obj),
+                                  [self._decode(v, copy) for v in obj])
+
+        return obj
+
+    def read(self, header, size, *, copy=True):
+        """Read data from the slot.
+
+        :param bool copy: True for copying the arrays out of the shared
+            memory, so that the slot can be re-used as soon as this method
+            returns. Otherwise, the arrays are views of the shared memory
+            and the slot must not be written or closed until they are
+            released.
+        """
+        if size > self._size:
+            self._map(os.fstat(self._fd).st_size)
+        return self._decode(header, copy)
+
+    def close(self):
+        """Release the memory and remove the file if owned."""
+        if self._buf is not None:
+            self._buf.close()
+            self._buf = None
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+            if self._finalizer is not None:
+                self._finalizer()
+
+
+class SharedMemorySender:
+    """Send data via shared memory slots over a duplex connection.
+
+    The header of the data is sent through the connection and the slot
+    is released when the receiver acknowledges.
+    """
+    def __init__(self, conn, n_slots=2):
+        self._conn = conn
+        self._slots = [SharedMemorySlot() for _ in range(n_slots)]
+        self._free = list(range(n_slots))
+
+    def _collect_acks(self, timeout):
+        conn = self._conn
+        if not conn.poll(timeout):
+            return
+        while True:
+            idx = conn.recv()
+            self._free.append(idx)
+            if not conn.poll():
+                break
+
+    def send(self, obj, timeout=None):
+        """Send data.
+
+        :param float timeout: maximum time waiting for a free slot. None
+            for waiting forever.
+
+        :return bool: whether the data was sent.
+        """
+        self._collect_acks(0)
+        if not self._free:
+            self._collect_acks(timeout)
+            if not self._free:
+                return False
+
+        idx = self._free.pop()
+        slot = self._slots[idx]
+        header, size = slot.write(obj)
+        self._conn.send(('data', idx, slot.path, size, header))
+        return True
+
+    def flush(self, timeout=None):
+        """Wait until all the data sent are released by the receiver.
+
+        :param float timeout: maximum time waiting for each release. None
+            for waiting forever.
+
+        :return bool: whether all the data were released.
+        """
+        while len(self._free) < len(self._slots):
+            if not self._conn.poll(timeout):
+                return False
+            self._collect_acks(0)
+        return True
+
+    def send_message(self, *msg):
+        """Send a message which does not go through the shared memory."""
+        self._conn.send(msg)
+
+    def close(self):
+        for slot in self._slots:
+            slot.close()
+
+
+class SharedMemoryReceiver:
+    """Receive data sent by SharedMemorySender."""
+    def __init__(self, conn):
+        self._conn = conn
+        self._slots = dict()
+
+    def decode(self, msg):
+        """Decode a 'data' message and release the slot."""
+        _, idx, path, size, header = msg
+        slot = self._slots.get(path)
+        if slot is None:
+            slot = self._slots[path] = SharedMemorySlot(path)
+        try:
+            return slot.read(header, size)
+        finally:
+            self._conn.send(idx)
+
+    def release(self, msg):
+        """Release the slot of a 'data' message without decoding."""
+        self._conn.send(msg[1])
+
+    def close(self):
+        for slot in self._slots.values():
+            slot.close()
+        self._slots.clear()
+
+
+class SharedMemoryArena:
+    """Publish arrays in shared memory with content versioning.
+
+    Each array is identified by the path of its field in the published
+    object and is written into a block of shared memory only if its
+    content has changed since it was last published. Otherwise, the
+    block is referenced by version in the published object.
+
+    A block which is no longer the latest version of an array is re-used
+    after SharedMemoryArenaReader releases it via the connection.
+    """
+    # the arrays are sent in the object if there are so many blocks
+    # which have not been released, e.g. the reader is gone
+    _MAX_BLOCKS = 64
+
+    def __init__(self, conn):
+        """Initialization.
+
+        :param Connection conn: connection from which the paths of the
+            released blocks are received.
+        """
+        self._conn = conn
+
+        self._version = 0
+        # key: block path, value: SharedMemorySlot
+        self._blocks = dict()
+        self._free = []
+        # key: field path, value: _ShmRef of the latest version
+        self._current = dict()
+        # blocks which have not been sent to the reader
+        self._unsent = set()
+
+    def _collect_released(self):
+        while self._conn.poll():
+            self._free.append(self._conn.recv())
+
+    def _retire(self, ref):
+        if ref.path in self._unsent:
+            # never seen by the reader
+            self._unsent.discard(ref.path)
+            self._free.append(ref.path)
+
+    def _publish(self, key, arr):
+        ref = self._current.get(key)
+        if ref is not None:
+            if ref.dtype == arr.dtype.str and ref.shape == arr.shape:
+                block = self._blocks[ref.path]
+                if _equal(block.read(
+                        _ShmArray(0, ref.dtype, ref.shape),
+                        arr.nbytes, copy=False), arr):
+                    return ref
+            del self._current[key]
+            self._retire(ref)
+
+        if self._free:
+            block = self._blocks[self._free.pop()]
+        elif len(self._blocks) < self._MAX_BLOCKS:
+            block = SharedMemorySlot()
+            self._blocks[block.path] = block
+        else:
+            return arr
+
+        block.write(arr)
+        self._version += 1
+        ref = _ShmRef(block.path, self._version, arr.dtype.str, arr.shape)
+        self._current[key] = ref
+        self._unsent.add(block.path)
+        return ref
+
+    def _encode(self, key, v, keys):
+        if isinstance(v, np.ndarray) and not v.dtype.hasobject \
+                and v.nbytes >= _MIN_SHM_NBYTES:
+            keys.add(key)
+            return self._publish(key, v)
+
+        if isinstance(v, (list, tuple)):
+            ret = [self._encode(key + (i,), item, keys)
+                   for i, item in enumerate(v)]
+            if all(a is b for a, b in zip(ret, v)):
+                return v
+            return _make_sequence(type(v), ret)
+
+        return v
+
+    def encode(self, obj, fields):
+        """Return a copy of the object with arrays replaced by references.
+
+        The original object is not modified since it could be shared with
+        other consumers.
+
+        :param obj: object to be published.
+        :param tuple fields: paths of the fields which could hold large
+            arrays or lists of large arrays. An integer in the path is an
+            index and a string is an attribute name.
+        """
+        self._collect_released()
+
+        out = copy.copy(obj)
+        copies = {(): out}
+        keys = set()
+        for path in fields:
+            v = obj
+            for key in path:
+                v = _get(v, key)
+
+            encoded = self._encode(path, v, keys)
+            if encoded is not v:
+                _set(_copy_parent(path, copies), path[-1], encoded)
+
+        for key in list(self._current):
+            if key not in keys:
+                self._retire(self._current.pop(key))
+
+        return out
+
+    def commit(self):
+        """Mark the blocks in the last encoded object as sent."""
+        self._unsent.clear()
+
+    def close(self):
+        for block in self._blocks.values():
+            block.close()
+        self._blocks.clear()
+
+
+class SharedMemoryArenaReader:
+    """Map the arrays published by SharedMemoryArena.
+
+    The arrays are read-only views of the shared memory. A block is
+    released once a newer version of its array has been received and
+    the view handed out has been garbage collected.
+    """
+    def __init__(self, conn):
+        """Initialization.
+
+        :param Connection conn: connection to which the paths of the
+            released blocks are sent.
+        """
+        self._conn = conn
+
+        # key: block path, value: SharedMemorySlot
+        self._blocks = dict()
+        # key: field path, value: (_ShmRef, view)
+        self._current = dict()
+        # (block path, weak reference of the view)
+        self._retired = []
+
+    def _map(self, key, ref):
+        cur = self._current.get(key)
+        if cur is not None:
+            if cur[0] == ref:
+                return cur[1]
+            self._retire(key)
+
+        block = self._blocks.get(ref.path)
+        if block is None:
+            block = self._blocks[ref.path] = SharedMemorySlot(ref.path)
+        nbytes = int(np.prod(ref.shape)) * np.dtype(ref.dtype).itemsize
+        view = block.read(_ShmArray(0, ref.dtype, ref.shape), nbytes,
+                          copy=False)
+        view.flags.writeable = False
+        self._current[key] = (ref, view)
+        return view
+
+    def _retire(self, key):
+        ref, view = self._current.pop(key)
+        self._retired.append((ref.path, weakref.ref(view)))
+
+    def _decode(self, key, v, keys):
+        if type(v) is _ShmRef:
+            keys.add(key)
+            return self._map(key, v)
+
+        if isinstance(v, (list, tuple)):
+            return _make_sequence(
+                type(v), [self._decode(key + (i,), item, keys)
+                          for i, item in enumerate(v)])
+
+        return v
+
+    def decode(self, obj, fields):
+        """Decode the object encoded by SharedMemoryArena in place.
+
+        :param obj: encoded object.
+        :param tuple fields: the same as the one used for encoding.
+        """
+        keys = set()
+        for path in fields:
+            parent = obj
+            for key in path[:-1]:
+                parent = _get(parent, key)
+            _set(parent, path[-1],
+                 self._decode(path, _get(parent, path[-1]), keys))
+
+        for key in list(self._current):
+            if key not in keys:
+                self._retire(key)
+
+        self.release()
+        return obj
+
+    def release(self):
+        """Release the blocks which are no longer used."""
+        retired = []
+        for path, ref in self._retired:
+            if ref() is None:
+                self._conn.send(path)
+            else:
+                retired.append((path, ref))
+        self._retired = retired
+
+    def close(self):
+        self._current.clear()
+        self._retired.clear()
+        for block in self._blocks.values():
+            try:
+                block.close()
+            except BufferError:
+                # views are still in use
+                pass
+        self._blocks.clear()
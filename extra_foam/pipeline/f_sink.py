@@ -0,0 +1,346 @@
+"""
+Distributed under the terms of the BSD 3-Clause License.
+
+The full license is in the file LICENSE, distributed with this software.
+
+Author: Jun Zhu <jun.zhu@xfel.eu>
+Copyright (C) European X-Ray Free-Electron Laser Facility GmbH.
+All rights reserved.
+"""
+import collections.abc
+import multiprocessing as mp
+from queue import Full
+from time import monotonic
+
+import h5py
+import numpy as np
+
+
+# Paths of the fields in ProcessedData which can be written to file.
+# The dataset of a field is named after its path with '.' replaced by '/'.
+RESULT_FIELDS = (
+    "xgm.intensity",
+    "xgm.x",
+    "xgm.y",
+    "roi.fom",
+    "roi.fom_slave",
+    "roi.norm",
+    "roi.proj.y",
+    "roi.proj.fom",
+    "ai.y",
+    "ai.fom",
+    "pp.y",
+    "pp.fom",
+    "pulse.xgm.intensity",
+    "pulse.roi.fom",
+    "pulse.roi.norm",
+    "pulse.ai.fom",
+    "pulse.digitizer.A.pulse_integral",
+    "pulse.digitizer.B.pulse_integral",
+    "pulse.digitizer.C.pulse_integral",
+    "pulse.digitizer.D.pulse_integral",
+    "pulse.digitizer.ADC.pulse_integral",
+)
+
+# VFOMs whose x axes are written along with them
+_VFOM_FIELDS = ("roi.proj.y", "ai.y", "pp.y")
+
+
+def get_field(obj, path):
+    """Get the value of a field by its path.
+
+    :param obj: ProcessedData instance.
+    :param str path: attribute names or keys separated by '.'.
+    """
+    for key in path.split('.'):
+        if isinstance(obj, collections.abc.Mapping):
+            obj = obj[key]
+        else:
+            obj = getattr(obj, key)
+    return obj
+
+
+def get_results(processed, fields):
+    """Get the results of a train.
+
+    :param ProcessedData processed: processed data.
+    :param iterable fields: paths of the fields.
+
+    :return dict: results keyed by the paths of the fields, including the
+        x axes of the VFOMs.
+    """
+    ret = dict()
+    for f in fields:
+        ret[f] = get_field(processed, f)
+        if f in _VFOM_FIELDS:
+            x = f[:-1] + 'x'
+            ret[x] = get_field(processed, x)
+    return ret
+
+
+def _check_fields(fields):
+    invalid = [f for f in fields if f not in RESULT_FIELDS]
+    if invalid:
+        raise ValueError(f"Unknown result fields: {invalid}")
+
+
+def _dataset_name(path):
+    return path.replace('.', '/')
+
+
+class ResultWriter:
+    """Write results in ProcessedData to an HDF5 file by train ID.
+
+    The results are buffered in memory and appended to the file in blocks
+    of trains. All the datasets grow along the first axis together with
+    the dataset of train IDs 'tid'. They are chunked by block and
+    compressed.
+
+    Missing values are NaN. A field whose length changes from train to
+    train, e.g. a pulse-resolved FOM, is padded with NaN to the longest
+    one. When an existing file is appended to, the datasets of the fields
+    not written are still extended with NaN.
+    """
+    def __init__(self, filepath, fields=RESULT_FIELDS, *, mode='a',
+                 buffer_size=100, flush_interval=5., compression_opts=1):
+        """Initialization.
+
+        :param str filepath: path of the HDF5 file.
+        :param iterable fields: paths of the fields to write, which must
+            be in RESULT_FIELDS.
+        :param str mode: 'a' for appending to an existing file and 'w'
+            for overwriting it.
+        :param int buffer_size: maximum number of trains buffered.
+        :param float flush_interval: maximum time in seconds before the
+            buffered trains are written.
+        :param int compression_opts: gzip compression level.
+        """
+        fields = tuple(fields)
+        _check_fields(fields)
+
+        self._fields = fields
+        self._buffer_size = buffer_size
+        self._flush_interval = flush_interval
+        self._compression_opts = compression_opts
+
+        self._file = h5py.File(filepath, mode)
+        if "tid" in self._file:
+            self._tid_ds = self._file["tid"]
+        else:
+            self._tid_ds = self._file.create_dataset(
+                "tid", shape=(0,), maxshape=(None,), dtype=np.uint64,
+                chunks=(buffer_size,))
+
+        self._tids = []
+        self._buffer = {f: [] for f in fields}
+        # latest x axes of the VFOMs
+        self._axes = dict()
+        self._last_flush = monotonic()
+
+    @property
+    def filepath(self):
+        return self._file.filename
+
+    def __len__(self):
+        """Return the number of trains written and buffered."""
+        return len(self._tid_ds) + len(self._tids)
+
+    def append(self, processed):
+        """Append the results of a train.
+
+        :param ProcessedData processed: processed data.
+        """
+        self.append_results(processed.tid,
+                            get_results(processed, self._fields))
+
+    def append_results(self, tid, results):
+        """Append the results of a train.
+
+        :param int tid: train ID.
+        :param dict results: results returned by get_results.
+        """
+        self._tids.append(tid)
+        for f in self._fields:
+            self._buffer[f].append(results.get(f))
+            if f in _VFOM_FIELDS:
+                x = results.get(f[:-1] + 'x')
+                if x is not None:
+                    self._axes[f[:-1] + 'x'] = x
+
+        if len(self._tids) >= self._buffer_size or \
+                monotonic() - self._last_flush >= self._flush_interval:
+            self.flush()
+
+    def flush(self):
+        """Write the buffered trains."""
+        self._last_flush = monotonic()
+        if not self._tids:
+            return
+
+        n0 = len(self._tid_ds)
+        n1 = n0 + len(self._tids)
+        self._tid_ds.resize((n1,))
+        self._tid_ds[n0:] = self._tids
+
+        errors = []
+        for f in RESULT_FIELDS:
+            name = _dataset_name(f)
+            values = self._buffer.get(f, ())
+            try:
+                self._write_block(name, values, n0, n1)
+            except ValueError as e:
+                errors.append(str(e))
+                ds = self._file.get(name)
+                if ds is not None:
+                    # keep aligned with the train IDs
+                    ds.resize(n1, axis=0)
+            if values:
+                values.clear()
+        self._tids.clear()
+
+        for path, x in self._axes.items():
+            name = _dataset_name(path)
+            if name in self._file:
+                del self._file[name]
+            self._file.create_dataset(name, data=np.asarray(x))
+
+        self._file.flush()
+
+        if errors:
+            raise ValueError("; ".join(errors))
+
+    def _write_block(self, name, values, n0, n1):
+        arrays = [None if v is None else np.asarray(v, dtype=np.float64)
+                  for v in values]
+        valid = [a for a in arrays if a is not None]
+
+        ds = self._file.get(name)
+        if not valid:
+            if ds is not None:
+                # filled with NaN
+                ds.resize(n1, axis=0)
+            return
+
+        ndim = valid[0].ndim
+        if any(a.ndim != ndim for a in valid) or \
+                (ds is not None and ds.ndim != ndim + 1):
+            raise ValueError(f"Dimensions of '{name}' changed")
+        shape = [max(a.shape[i] for a in valid) for i in range(ndim)]
+
+        if ds is None:
+            ds = self._file.create_dataset(
+                name, shape=(n1, *shape), maxshape=(None,) * (ndim + 1),
+                chunks=(self._buffer_size, *[max(1, n) for n in shape]),
+                dtype=np.float64, fillvalue=np.nan,
+                compression='gzip', compression_opts=self._compression_opts)
+        else:
+            shape = [max(n, m) for n, m in zip(shape, ds.shape[1:])]
+            ds.resize((n1, *shape))
+
+        block = np.full((n1 - n0, *shape), np.nan)
+        for i, a in enumerate(arrays):
+            if a is not None:
+                block[(i, *[slice(0, n) for n in a.shape])] = a
+        ds[n0:n1] = block
+
+    def close(self):
+        """Write the buffered trains and close the file."""
+        try:
+            self.flush()
+        finally:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def _write_results(filepath, fields, kwargs, queue, errors):
+    """Entry point of the process of ResultWriterProcess."""
+    try:
+        writer = ResultWriter(filepath, fields, **kwargs)
+    except Exception as e:
+        errors.put(f"Failed to open result file {filepath}: {repr(e)}")
+        return
+
+    while True:
+        item = queue.get()
+        if item is None:
+            break
+
+        try:
+            writer.append_results(*item)
+        except Exception as e:
+            errors.put(f"Failed to write results: {repr(e)}")
+
+    try:
+        writer.close()
+    except Exception as e:
+        errors.put(f"Failed to write results: {repr(e)}")
+
+
+class ResultWriterProcess:
+    """Write results to an HDF5 file by ResultWriter in another process.
+
+    Writing and compressing the data hold the GIL. Therefore, only the
+    results of the selected fields are extracted in the calling process
+    and sent to the writer process.
+    """
+    _MAX_PENDING = 100  # number of trains
+
+    def __init__(self, filepath, fields, **kwargs):
+        """Initialization.
+
+        :param str filepath: path of the HDF5 file.
+        :param iterable fields: paths of the fields to write, which must
+            be in RESULT_FIELDS.
+        :param kwargs: keyword arguments of ResultWriter.
+        """
+        fields = tuple(fields)
+        _check_fields(fields)
+        self._fields = fields
+
+        # the calling process could be multi-threaded
+        ctx = mp.get_context("spawn")
+        self._queue = ctx.Queue(maxsize=self._MAX_PENDING)
+        self._errors = ctx.SimpleQueue()
+        self._process = ctx.Process(
+            target=_write_results,
+            args=(filepath, fields, kwargs, self._queue, self._errors),
+            daemon=True)
+        self._process.start()
+
+    def is_alive(self):
+        return self._process.is_alive()
+
+    def append(self, processed, timeout=None):
+        """Append the results of a train.
+
+        :param ProcessedData processed: processed data.
+        :param float timeout: timeout in seconds when the writer process
+            falls behind.
+
+        :raise queue.Full: if timeout.
+        """
+        self._queue.put((processed.tid, get_results(processed, self._fields)),
+                        timeout=timeout)
+
+    def errors(self):
+        """Return the error messages from the writer process."""
+        ret = []
+        while not self._errors.empty():
+            ret.append(self._errors.get())
+        return ret
+
+    def close(self):
+        """Write the pending trains and wait for the writer process."""
+        while self._process.is_alive():
+            try:
+                self._queue.put(None, timeout=0.1)
+                break
+            except Full:
+                pass
+        self._process.join()
+        self._queue.close()
@@ -13,6 +13,9 @@ from ..pipeline.data_model import ProcessedData
 from ..config import config, DataSource
 
 
+# metadata key of the time when a train was sent by the file server
+SENT_TIMESTAMP = 'timestamp.sent'
+
 class DataTransformer:
     """DataTransformer class.
 
@@ -132,18 +135,24 @@ class DataTransformer:
         if tid > 0:
             # update cached data
             cached = self._cached.setdefault(
-                tid, {'meta': dict(), 'raw': dict()})
+                tid, {'meta': dict(), 'raw': dict(), 'sent': None})
 
             cached['meta'].update(meta)
             cached['raw'].update(raw)
+            sent = self._sent_timestamp(data[1])
+            if sent is not None and (cached['sent'] is None
+                                     or sent < cached['sent']):
+                cached['sent'] = sent
 
             matched, found_all = self._check_cached(cached['meta'])
             if found_all:
+                processed = ProcessedData(tid)
+                processed.t_sent = cached['sent']
                 correlated = {
                     'catalog': catalog.__copy__(),
                     'meta': cached['meta'],
                     'raw': cached['raw'],
-                    'processed': ProcessedData(tid)
+                    'processed': processed
                 }
                 self._correlated_tid = tid
                 while True:
@@ -162,6 +171,18 @@ class DataTransformer:
 
         return correlated, matched, dropped
 
+    @staticmethod
+    def _sent_timestamp(meta):
+        """Return the earliest time when the sources were sent.
+
+        :param dict meta: raw metadata.
+
+        :return: None if the time is not stamped.
+        """
+        stamps = [v[SENT_TIMESTAMP] for v in meta.values()
+                  if SENT_TIMESTAMP in v]
+        return min(stamps) if stamps else None
+
     def _not_found_message(self, tid, found):
         not_found = []
         for src in self._catalog.keys():
@@ -15,7 +15,9 @@ import traceback
 import time
 
 from .exceptions import StopPipelineError, ProcessingError
-from .f_pipe import KaraboBridge, MpInQueue, MpOutQueue, ZmqOutQueue
+from .f_pipe import (
+    FileOutQueue, KaraboBridge, MpInQueue, MpOutQueue, ZmqOutQueue
+)
 from .processors import (
     DigitizerProcessor,
     AzimuthalIntegProcessorPulse, AzimuthalIntegProcessorTrain,
@@ -38,6 +40,81 @@ from ..database import Metadata as mt
 from ..database import MetaProxy, MonProxy
 
 
+# (name, processor type[, arguments]) of the processors in the pipeline
+PULSE_PROCESSORS = (
+    ('xgm_proc', XgmProcessor),
+    ('digitizer_proc', DigitizerProcessor),
+    ('ctrl_data_proc', CtrlDataProcessor),
+    ('image_proc', ImageProcessor),
+    ('image_roi', ImageRoiPulse),
+    ('ai_proc', AzimuthalIntegProcessorPulse),
+    ('filter', FomPulseFilter),
+    ('pp_proc', PumpProbeProcessor),
+    ('image_transform_proc', ImageTransformProcessor),
+)
+
+TRAIN_PROCESSORS = (
+    ('image_roi', ImageRoiTrain),
+    ('ai_proc', AzimuthalIntegProcessorTrain),
+    ('filter', FomTrainFilter),
+    ('histogram', HistogramProcessor),
+    ('correlation1_proc', CorrelationProcessor, (1,)),
+    ('correlation2_proc', CorrelationProcessor, (2,)),
+    ('binning_proc', BinningProcessor),
+)
+
+
+def create_processors(opts):
+    """Instantiate processors.
+
+    :param iterable opts: (name, processor type[, arguments]) of the
+        processors.
+
+    :return list: (name, instance) of the processors.
+    """
+    processors = []
+    for opt in opts:
+        args = ()
+        if len(opt) == 2:
+            name, instance_type = opt
+        else:
+            name, instance_type, args = opt
+
+        processors.append((name, instance_type(*args)))
+    return processors
+
+
+def run_tasks(tasks, data):
+    """Run a chain of processors for once.
+
+    StopPipelineError is re-raised while the other exceptions are
+    logged and the following processors still run.
+
+    :param list tasks: processors.
+    :param dict data: a dictionary which is passed around processors.
+    """
+    for task in tasks:
+        try:
+            task.run_once(data)
+        except StopPipelineError as e:
+            exc_type, exc_value, exc_traceback = sys.exc_info()
+            logger.debug(repr(traceback.format_tb(exc_traceback))
+                         + repr(e))
+            logger.error(repr(e))
+            raise
+        except ProcessingError as e:
+            exc_type, exc_value, exc_traceback = sys.exc_info()
+            logger.debug(repr(traceback.format_tb(exc_traceback))
+                         + repr(e))
+            logger.error(repr(e))
+        except Exception as e:
+            exc_type, exc_value, exc_traceback = sys.exc_info()
+            logger.debug(f"Unexpected Exception!: " +
+                         repr(traceback.format_tb(exc_traceback)) +
+                         repr(e))
+            logger.error(repr(e))
+
+
 class ProcessWorker(mp.Process):
     """Base worker class for heavy online data analysis."""
 
@@ -56,6 +133,8 @@ class ProcessWorker(mp.Process):
         # pipeline extension for special suite, jupyter notebook and
         # other plugins
         self._extension = None
+        # writing results to file
+        self._sink = None
 
         self._tasks = []
 
@@ -64,6 +143,7 @@ class ProcessWorker(mp.Process):
         self._input_update_ev = Event()
         self._output_update_ev = Event()
         self._extension_update_ev = Event()
+        self._sink_update_ev = Event()
 
         # the time when the previous data processing was finished
         self._prev_processed_time = None
@@ -72,14 +152,7 @@ class ProcessWorker(mp.Process):
         self._mon = MonProxy()
 
     def _set_processors(self, opts):
-        for opt in opts:
-            args = ()
-            if len(opt) == 2:
-                name, instance_type = opt
-            else:
-                name, instance_type, args = opt
-
-            instance = instance_type(*args)
+        for name, instance in create_processors(opts):
             self.__setattr__(f"_{name}", instance)
             self._tasks.append(instance)
 
@@ -102,6 +175,8 @@ class ProcessWorker(mp.Process):
         self._output.start()
         if self._extension is not None:
             self._extension.start()
+        if self._sink is not None:
+            self._sink.start()
 
         data_out = None
         while not self.closing:
@@ -152,36 +227,29 @@ class ProcessWorker(mp.Process):
                     except Full:
                         pass
 
+                if self._sink is not None and sent:
+                    try:
+                        self._sink.put(data_out)
+                    except Full:
+                        logger.warning(f"Train {data_out['processed'].tid} "
+                                       f"not written: result sink is full")
+
                 if sent:
                     data_out = None
 
             time.sleep(0.001)
 
+        # the final output pipe releases its shared memory on exit
+        self._output.join()
+        if self._sink is not None:
+            self._sink.join()
+
     def _run_tasks(self, data):
         """Run all tasks for once:
 
         :param dict data: a dictionary which is passed around processors.
         """
-        for task in self._tasks:
-            try:
-                task.run_once(data)
-            except StopPipelineError as e:
-                exc_type, exc_value, exc_traceback = sys.exc_info()
-                logger.debug(repr(traceback.format_tb(exc_traceback))
-                             + repr(e))
-                logger.error(repr(e))
-                raise
-            except ProcessingError as e:
-                exc_type, exc_value, exc_traceback = sys.exc_info()
-                logger.debug(repr(traceback.format_tb(exc_traceback))
-                             + repr(e))
-                logger.error(repr(e))
-            except Exception as e:
-                exc_type, exc_value, exc_traceback = sys.exc_info()
-                logger.debug(f"Unexpected Exception!: " +
-                             repr(traceback.format_tb(exc_traceback)) +
-                             repr(e))
-                logger.error(repr(e))
+        run_tasks(self._tasks, data)
 
     @property
     def closing(self):
@@ -198,6 +266,7 @@ class ProcessWorker(mp.Process):
         self._input_update_ev.set()
         self._output_update_ev.set()
         self._extension_update_ev.set()
+        self._sink_update_ev.set()
 
 
 class PulseWorker(ProcessWorker):
@@ -209,17 +278,7 @@ class PulseWorker(ProcessWorker):
         self._input = KaraboBridge(self._input_update_ev, pause_ev, close_ev)
         self._output = MpOutQueue(self._output_update_ev, pause_ev, close_ev)
 
-        self._set_processors([
-            ('xgm_proc', XgmProcessor),
-            ('digitizer_proc', DigitizerProcessor),
-            ('ctrl_data_proc', CtrlDataProcessor),
-            ('image_proc', ImageProcessor),
-            ('image_roi', ImageRoiPulse),
-            ('ai_proc', AzimuthalIntegProcessorPulse),
-            ('filter', FomPulseFilter),
-            ('pp_proc', PumpProbeProcessor),
-            ('image_transform_proc', ImageTransformProcessor)
-        ])
+        self._set_processors(PULSE_PROCESSORS)
 
 
 class TrainWorker(ProcessWorker):
@@ -233,13 +292,6 @@ class TrainWorker(ProcessWorker):
                                   final=True)
         self._extension = ZmqOutQueue(
             self._extension_update_ev, pause_ev, close_ev)
+        self._sink = FileOutQueue(self._sink_update_ev, pause_ev, close_ev)
 
-        self._set_processors([
-            ('image_roi', ImageRoiTrain),
-            ('ai_proc', AzimuthalIntegProcessorTrain),
-            ('filter', FomTrainFilter),
-            ('histogram', HistogramProcessor),
-            ('correlation1_proc', CorrelationProcessor, (1,)),
-            ('correlation2_proc', CorrelationProcessor, (2,)),
-            ('binning_proc', BinningProcessor)
-        ])
+        self._set_processors(TRAIN_PROCESSORS)
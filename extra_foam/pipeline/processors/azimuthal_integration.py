@@ -158,6 +158,13 @@ class AzimuthalIntegProcessorPulse(_AzimuthalIntegProcessorBase):
         if not self._meta.has_analysis(AnalysisType.AZIMUTHAL_INTEG_PULSE):
             return
 
+        # pulse-resolved azimuthal integration is only consumed by
+        # extension clients and the result sink
+        if not self._meta.has_extension_client() and \
+                not self._meta.has_result_sink("pulse.ai.fom"):
+            self._mon.add_skipped("Azimuthal integration (pulse)")
+            return
+
         processed = data['processed']
         assembled = data['assembled']['sliced']
 
@@ -15,7 +15,7 @@ import numpy as np
 from ..exceptions import (
     ProcessingError, SkipTrainError, UnknownParameterError
 )
-from ...database import MetaProxy
+from ...database import MetaProxy, MonProxy
 from ...algorithms import normalize_auc
 from ...config import AnalysisType, config, Normalizer
 
@@ -343,6 +343,20 @@ class _BaseProcessor(_BaseProcessorMixin, _RedisParserMixin,
         self._pulse_resolved = config["PULSE_RESOLVED"]
 
         self._meta = MetaProxy()
+        self._mon = MonProxy()
+
+    def _is_consumed(self, analysis_type, name):
+        """Check if the result of the given analysis is consumed.
+
+        The computation is counted as skipped if not.
+
+        :param AnalysisType analysis_type: analysis type.
+        :param str name: name of the computation.
+        """
+        if self._meta.has_consumer(analysis_type):
+            return True
+        self._mon.add_skipped(name)
+        return False
 
     def _update_analysis(self, analysis_type, *, register=True):
         """Update analysis type.
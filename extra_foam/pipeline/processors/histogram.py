@@ -11,7 +11,7 @@ import math
 
 from .base_processor import _BaseProcessor
 from ..exceptions import ProcessingError, UnknownParameterError
-from ...algorithms import hist_with_stats, SimpleSequence
+from ...algorithms import SimpleSequence, StreamingHistogram
 from ...ipc import process_logger as logger
 from ...database import Metadata as mt
 from ...config import AnalysisType
@@ -27,6 +27,10 @@ class HistogramProcessor(_BaseProcessor):
     Attributes:
         analysis_type (AnalysisType): binning analysis type.
         _fom (SimpleSequence): accumulative pulse-/train-resolved FOMs.
+        _fom_hist (StreamingHistogram): streaming histogram of all the
+            accumulative FOMs.
+        _poi_hists (dict): streaming histograms of the accumulative FOMs
+            of POI pulses, keyed by pulse index.
         _n_bins (int): number of bins for calculating histogram.
         _bin_range (tuple): range of bins for calculating histogram.
         _pulse_resolved (bool): True for calculating pulse-resolved FOMs,
@@ -42,6 +46,9 @@ class HistogramProcessor(_BaseProcessor):
 
         self.analysis_type = AnalysisType.UNDEFINED
         self._fom = SimpleSequence(max_len=self._MAX_POINTS)
+        self._fom_hist = StreamingHistogram()
+        self._poi_hists = dict()
+        self._poi_n_pulses = None
         self._n_bins = None
         self._bin_range = (-math.inf, math.inf)
         self._pulse_resolved = False
@@ -83,8 +90,13 @@ class HistogramProcessor(_BaseProcessor):
 
         if self._reset:
             self._fom.reset()
+            self._fom_hist.reset()
+            self._poi_hists.clear()
             self._reset = False
 
+        new_fom = []
+        evicted = []
+
         if self._pulse_resolved:
             if analysis_type == AnalysisType.ROI_FOM_PULSE:
                 fom = processed.pulse.roi.fom
@@ -94,7 +106,8 @@ class HistogramProcessor(_BaseProcessor):
                 else:
                     processed.pulse.hist.pulse_foms = \
                         fom if self._pulse_resolved else None
-                    self._fom.extend(fom)
+                    evicted = self._extend_fom(fom)
+                    new_fom = fom
             elif analysis_type == AnalysisType.PUMP_PROBE_PULSE:
                 raise ProcessingError(f"[Histogram] Pulse-resolved pump-probe "
                                       f"FOM is not supported!")
@@ -102,7 +115,7 @@ class HistogramProcessor(_BaseProcessor):
                 raise UnknownParameterError(
                     f"[Histogram] Unknown analysis type: {analysis_type}")
 
-            self._process_poi(processed)
+            self._process_poi(processed, new_fom, evicted)
 
         else:
             if analysis_type == AnalysisType.ROI_FOM:
@@ -110,7 +123,8 @@ class HistogramProcessor(_BaseProcessor):
                 if fom is None:
                     logger.error("[Histogram] ROI FOM is not available")
                 else:
-                    self._fom.append(fom)
+                    evicted = self._extend_fom([fom])
+                    new_fom = [fom]
             elif analysis_type == AnalysisType.PUMP_PROBE:
                 fom = processed.pp.fom
                 if fom is None:
@@ -122,7 +136,8 @@ class HistogramProcessor(_BaseProcessor):
                         logger.error("[Histogram] Pump-probe FOM is not available")
                 else:
                     self._pp_fail_flag = 0
-                    self._fom.append(fom)
+                    evicted = self._extend_fom([fom])
+                    new_fom = [fom]
             else:
                 raise UnknownParameterError(
                     f"[Histogram] Unknown analysis type: {self.analysis_type}")
@@ -132,24 +147,50 @@ class HistogramProcessor(_BaseProcessor):
         if data.size != 0:
             th = processed.hist
             try:
+                self._fom_hist.update(
+                    new_fom, data, self._bin_range, self._n_bins, evicted)
                 th.hist, th.bin_centers, th.mean, th.median, th.std = \
-                    hist_with_stats(data, self._bin_range, self._n_bins)
+                    self._fom_hist.stats()
             except ValueError as e:
                 raise ProcessingError(f"[Histogram] {str(e)}")
 
-    def _process_poi(self, processed):
+    def _extend_fom(self, fom):
+        """Extend the FOM history.
+
+        :return numpy.ndarray: FOMs dropped from the head of the history.
+        """
+        n_evicted = len(self._fom) + len(fom) - self._MAX_POINTS
+        evicted = self._fom.data()[:max(n_evicted, 0)].copy()
+        self._fom.extend(fom)
+        return evicted
+
+    def _process_poi(self, processed, new_fom, evicted):
         """Calculate histograms of FOMs of POI pulses."""
         n_pulses = processed.n_pulses
         image_data = processed.image
+
+        if n_pulses != self._poi_n_pulses or \
+                (n_pulses > 0 and len(evicted) % n_pulses != 0):
+            # the history of a POI is not well defined any more
+            self._poi_hists.clear()
+            self._poi_n_pulses = n_pulses
+
+        for i in list(self._poi_hists):
+            if i not in image_data.poi_indices:
+                del self._poi_hists[i]
+
         for i in image_data.poi_indices:
             if i >= n_pulses:
                 return
 
             poi_fom = self._fom.data()[i::n_pulses]
             if poi_fom.size != 0:
+                poi_hist = self._poi_hists.setdefault(i, StreamingHistogram())
                 try:
-                    processed.pulse.hist[i] = hist_with_stats(
-                        poi_fom, self._bin_range, self._n_bins)
+                    poi_hist.update(new_fom[i:i+1], poi_fom,
+                                    self._bin_range, self._n_bins,
+                                    evicted[i::n_pulses])
+                    processed.pulse.hist[i] = poi_hist.stats()
                 except ValueError as e:
                     raise ProcessingError(f"[Histogram] {str(e)}")
 
@@ -19,7 +19,7 @@ from ...ipc import (
 )
 from ...ipc import process_logger as logger
 from ...utils import profiler
-from ...config import config, _MAX_INT32
+from ...config import AnalysisType, config, _MAX_INT32
 
 from extra_foam.algorithms import (
     correct_image_data, mask_image_data, nanmean_image_data
@@ -202,7 +202,8 @@ class ImageProcessor(_BaseProcessor):
         # Avoid sending all images around
         image_data.images = [None] * n_sliced
         image_data.poi_indices = self._poi_indices
-        self._update_pois(image_data, sliced_assembled)
+        if self._meta.has_consumer(AnalysisType.PULSE_OF_INTEREST):
+            self._update_pois(image_data, sliced_assembled)
 
     def _record_dark(self, assembled):
         if self._dark is None:
@@ -22,7 +22,7 @@ from ...utils import profiler
 from ...config import AnalysisType, Normalizer, RoiCombo, RoiFom, RoiProjType
 
 from extra_foam.algorithms import (
-    intersection, mask_image_data, nanstd, nanvar
+    compute_roi_foms, intersection, nanstd, nanvar
 )
 
 
@@ -180,26 +180,57 @@ class ImageRoiPulse(_RoiProcessorBase):
         roi.geom4.geometry = intersection(self._geom4, img_geom)
 
         if self._pulse_resolved:
-            self._process_norm(assembled, processed)
-            self._process_fom(assembled, processed)
+            foms = self._compute_foms(assembled, processed)
+            self._process_norm(foms, processed)
+            self._process_fom(foms, processed)
             self._process_hist(processed)
 
-    def _compute_fom(self, roi, fom_type, image_mask, threshold_mask):
-        if roi is None:
-            return
+    def _compute_foms(self, assembled, processed):
+        """Calculate pulse-resolved FOMs of all the required ROIs.
 
-        try:
-            handler = self._fom_handlers[fom_type]
-        except KeyError:
-            raise UnknownParameterError(
-                f"[ROI][FOM] Unknown FOM type: {fom_type}")
+        FOMs of ROIs for both the FOM and the normalizer are calculated
+        in a single pass over the pulse stack.
 
-        mask_image_data(roi,
-                        image_mask=image_mask,
-                        threshold_mask=threshold_mask)
-        return handler(roi, axis=(-2, -1))
+        :return dict: FOMs of valid ROIs keyed by the ROI geometry names.
+        """
+        roi = processed.roi
 
-    def _process_norm(self, assembled, processed):
+        requested = []
+        if self._meta.has_analysis(AnalysisType.ROI_FOM_PULSE):
+            if self._fom_type not in self._fom_handlers:
+                raise UnknownParameterError(
+                    f"[ROI][FOM] Unknown FOM type: {self._fom_type}")
+            if self._fom_combo != RoiCombo.ROI2:
+                requested.append(('geom1', self._fom_type))
+            if self._fom_combo != RoiCombo.ROI1:
+                requested.append(('geom2', self._fom_type))
+
+        if self._meta.has_analysis(AnalysisType.ROI_NORM_PULSE):
+            if self._norm_type not in self._fom_handlers:
+                raise UnknownParameterError(
+                    f"[ROI][normalizer] Unknown FOM type: {self._norm_type}")
+            if self._norm_combo != RoiCombo.ROI4:
+                requested.append(('geom3', self._norm_type))
+            if self._norm_combo != RoiCombo.ROI3:
+                requested.append(('geom4', self._norm_type))
+
+        names, rects, fom_types = [], [], []
+        for name, fom_type in requested:
+            x, y, w, h = getattr(roi, name).geometry
+            if w > 0 and h > 0:
+                names.append(name)
+                rects.append((x, y, w, h))
+                fom_types.append(fom_type)
+
+        if not names:
+            return dict()
+
+        foms = compute_roi_foms(assembled, rects, fom_types,
+                                image_mask=processed.image.image_mask,
+                                threshold_mask=processed.image.threshold_mask)
+        return dict(zip(names, foms))
+
+    def _process_norm(self, foms, processed):
         """Calculate pulse-resolved ROI normalizers.
 
         Always calculate.
@@ -207,27 +238,14 @@ class ImageRoiPulse(_RoiProcessorBase):
         if not self._meta.has_analysis(AnalysisType.ROI_NORM_PULSE):
             return
 
-        threshold_mask = processed.image.threshold_mask
-        image_mask = processed.image.image_mask
-
-        roi = processed.roi
-
-        roi3 = roi.geom3.rect(assembled)
-        mask3 = None if image_mask is None else roi.geom3.rect(image_mask)
-        roi4 = roi.geom4.rect(assembled)
-        mask4 = None if image_mask is None else roi.geom4.rect(image_mask)
+        norm3 = foms.get('geom3')
+        norm4 = foms.get('geom4')
 
         if self._norm_combo == RoiCombo.ROI3:
-            processed.pulse.roi.norm = self._compute_fom(
-                roi3, self._norm_type, mask3, threshold_mask)
+            processed.pulse.roi.norm = norm3
         elif self._norm_combo == RoiCombo.ROI4:
-            processed.pulse.roi.norm = self._compute_fom(
-                roi4, self._norm_type, mask4, threshold_mask)
+            processed.pulse.roi.norm = norm4
         else:
-            norm3 = self._compute_fom(
-                roi3, self._norm_type, mask3, threshold_mask)
-            norm4 = self._compute_fom(
-                roi4, self._norm_type, mask4, threshold_mask)
             if norm3 is not None and norm4 is not None:
                 if self._norm_combo == RoiCombo.ROI3_SUB_ROI4:
                     processed.pulse.roi.norm = norm3 - norm4
@@ -243,7 +261,7 @@ class ImageRoiPulse(_RoiProcessorBase):
         #       check whether they have activated and set a valid ROI region
         #       when they need ROI information in their analysis.
 
-    def _process_fom(self, assembled, processed):
+    def _process_fom(self, foms, processed):
         """Calculate pulse-resolved ROI FOMs.
 
         Always calculate.
@@ -251,27 +269,14 @@ class ImageRoiPulse(_RoiProcessorBase):
         if not self._meta.has_analysis(AnalysisType.ROI_FOM_PULSE):
             return
 
-        threshold_mask = processed.image.threshold_mask
-        image_mask = processed.image.image_mask
-
-        roi = processed.roi
-
-        roi1 = roi.geom1.rect(assembled)
-        mask1 = None if image_mask is None else roi.geom1.rect(image_mask)
-        roi2 = roi.geom2.rect(assembled)
-        mask2 = None if image_mask is None else roi.geom2.rect(image_mask)
+        fom1 = foms.get('geom1')
+        fom2 = foms.get('geom2')
 
         if self._fom_combo == RoiCombo.ROI1:
-            processed.pulse.roi.fom = self._compute_fom(
-                roi1, self._fom_type, mask1, threshold_mask)
+            processed.pulse.roi.fom = fom1
         elif self._fom_combo == RoiCombo.ROI2:
-            processed.pulse.roi.fom = self._compute_fom(
-                roi2, self._fom_type, mask2, threshold_mask)
+            processed.pulse.roi.fom = fom2
         else:
-            fom1 = self._compute_fom(
-                roi1, self._fom_type, mask1, threshold_mask)
-            fom2 = self._compute_fom(
-                roi2, self._fom_type, mask2, threshold_mask)
             if fom1 is not None and fom2 is not None:
                 if self._fom_combo == RoiCombo.ROI1_SUB_ROI2:
                     processed.pulse.roi.fom = fom1 - fom2
@@ -291,10 +296,17 @@ class ImageRoiPulse(_RoiProcessorBase):
         if self._hist_combo == RoiCombo.UNDEFINED:
             return
 
+        if not self._is_consumed(AnalysisType.PULSE_OF_INTEREST,
+                                 "ROI histogram (pulse)"):
+            return
+
         roi_data = processed.roi
         image_data = processed.image
         for idx in image_data.poi_indices:
             img = image_data.images[idx]
+            if img is None:
+                # the consumer left after the images were processed
+                continue
             roi1 = roi_data.geom1.rect(img)
             roi2 = roi_data.geom2.rect(img)
             try:
@@ -11,7 +11,7 @@ from .base_processor import _BaseProcessor
 from ..data_model import MovingAverageArray
 from ...database import Metadata as mt
 from ...utils import profiler
-from ...config import ImageTransformType
+from ...config import AnalysisType, ImageTransformType
 
 from extra_foam.algorithms import (
     edge_detect, fourier_transform_2d
@@ -92,6 +92,12 @@ class ImageTransformProcessor(_BaseProcessor):
         image.masked_mean_ma = masked_ma
         image.transform_type = transform_type
 
+        if transform_type in (ImageTransformType.FOURIER_TRANSFORM,
+                              ImageTransformType.EDGE_DETECTION) and \
+                not self._is_consumed(AnalysisType.IMAGE_TRANSFORM,
+                                      "Image transform"):
+            return
+
         if transform_type == ImageTransformType.FOURIER_TRANSFORM:
             fft = self._fft
             image.transformed = fourier_transform_2d(
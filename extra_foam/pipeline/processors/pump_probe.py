@@ -15,7 +15,9 @@ from ...config import AnalysisType, PumpProbeMode
 from ...database import Metadata as mt
 from ...utils import profiler
 
-from extra_foam.algorithms import mask_image_data, nanmean_image_data
+from extra_foam.algorithms import (
+    ImageHistogram, mask_image_data, nanmean_image_data
+)
 
 
 class PumpProbeProcessor(_BaseProcessor):
@@ -143,6 +145,8 @@ class PumpProbeProcessor(_BaseProcessor):
         processed.image.mean = images_mean
         processed.image.mask = mask
         processed.image.masked_mean = masked_mean
+        # the levels and the histogram displayed in the GUI
+        processed.image.masked_mean_hist = ImageHistogram(masked_mean)
 
         # apply mask to the averaged on/off images
         # Note: due to the in-place masking, the pump-probe code the the
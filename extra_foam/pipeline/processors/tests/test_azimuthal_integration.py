@@ -112,3 +112,55 @@ class TestAzimuthalIntegProcessorTrain(_TestDataMixin):
             assert len(pp.x) == proc._integ_points
             assert len(pp.y) == proc._integ_points
             assert pp.fom is not None and pp.fom != 0
+
+
+class TestAzimuthalIntegProcessorPulse(_TestDataMixin):
+    @pytest.fixture(autouse=True)
+    def setUp(self):
+        proc = AzimuthalIntegProcessorPulse()
+
+        proc._sample_dist = 0.2
+        proc._pixel1 = 2e-4
+        proc._pixel2 = 2e-4
+        proc._poni1 = 0
+        proc._poni2 = 0
+        proc._wavelength = 5e-10
+
+        proc._integ_method = 'BBox'
+        proc._integ_range = (0, 0.2)
+        proc._integ_points = 64
+
+        proc._fom_integ_range = (-np.inf, np.inf)
+
+        self._proc = proc
+
+    def testAzimuthalIntegration(self):
+        proc = self._proc
+        proc._mon.add_skipped = MagicMock()
+
+        shape = (4, 128, 64)
+        data, processed = self.data_with_assembled(1001, shape)
+        ai = processed.pulse.ai
+        with patch.object(proc._meta, 'has_analysis',
+                          side_effect=lambda x: x == AnalysisType.AZIMUTHAL_INTEG_PULSE):
+            # not consumed by any extension client or the result sink
+            with patch.object(proc._meta, 'has_extension_client', return_value=False):
+                with patch.object(proc._meta, 'has_result_sink',
+                                  return_value=False) as has_result_sink:
+                    proc.process(data)
+                    assert ai.x is None
+                    assert ai.y is None
+                    proc._mon.add_skipped.assert_called_once()
+                    has_result_sink.assert_called_once_with("pulse.ai.fom")
+
+                # consumed by the result sink
+                with patch.object(proc._meta, 'has_result_sink', return_value=True):
+                    proc.process(data)
+                    assert len(ai.fom) == shape[0]
+                    ai.x = ai.y = ai.fom = None
+
+            with patch.object(proc._meta, 'has_extension_client', return_value=True):
+                proc.process(data)
+                assert len(ai.x) == proc._integ_points
+                assert len(ai.y) == shape[0]
+                assert len(ai.fom) == shape[0]
@@ -177,3 +177,31 @@ class TestHistogramProcessor(_TestDataMixin):
         np.testing.assert_array_equal(fom_gt * 2, proc._fom)
         np.testing.assert_array_almost_equal([13.,  19.,  25.,  31.,  37.], processed.hist.bin_centers)
         np.testing.assert_array_almost_equal([6, 6, 0, 4, 4], processed.hist.hist)
+
+    @patch.object(HistogramProcessor, "_MAX_POINTS", 4)
+    def testFomHistogramBoundedHistory(self):
+        proc = HistogramProcessor()
+        proc._n_bins = 5
+        proc._pulse_resolved = False
+        proc.analysis_type = AnalysisType.ROI_FOM
+        data, processed = self.simple_data(1001, (2, 2))
+
+        fom_gt = [10, 20, 30, 40, 20, 30, 20, 10, 40, 10]
+        with patch.object(proc._fom_hist, "_rebuild",
+                          wraps=proc._fom_hist._rebuild) as rebuild:
+            for i, fom in enumerate(fom_gt):
+                processed.roi.fom = fom
+                proc.process(data)
+
+                history = fom_gt[max(i - 3, 0):i + 1]
+                np.testing.assert_array_equal(history, proc._fom)
+                hist, bin_edges = np.histogram(history, bins=5)
+                np.testing.assert_array_equal(hist, processed.hist.hist)
+                np.testing.assert_array_almost_equal(
+                    (bin_edges[1:] + bin_edges[:-1]) / 2.,
+                    processed.hist.bin_centers)
+                assert np.mean(history) == pytest.approx(processed.hist.mean)
+                assert np.std(history) == pytest.approx(processed.hist.std)
+
+            # dropped FOMs are subtracted unless the outer edges change
+            assert rebuild.call_count < len(fom_gt)
@@ -12,6 +12,7 @@ from unittest.mock import MagicMock, patch
 
 import numpy as np
 
+from extra_foam.config import AnalysisType
 from extra_foam.pipeline.processors.image_processor import ImageProcessor, _IMAGE_DTYPE
 from extra_foam.pipeline.exceptions import ImageProcessingError, ProcessingError
 from extra_foam.pipeline.tests import _TestDataMixin
@@ -442,6 +443,11 @@ class TestImageProcessorPr(_ImageProcessorTestBase):
 
     def testPOI(self):
         proc = self._proc
+        patcher = patch.object(proc._meta, 'has_analysis', side_effect=lambda x:
+                               x == AnalysisType.PULSE_OF_INTEREST)
+        has_analysis = patcher.start()
+        self.addCleanup(patcher.stop)
+
         data, processed = self.data_with_assembled(1, (4, 2, 2))
         imgs_gt_unsliced = data['assembled']['data'].copy()
 
@@ -464,6 +470,12 @@ class TestImageProcessorPr(_ImageProcessorTestBase):
         np.testing.assert_array_equal(imgs_gt_unsliced[2], imgs[2])
         np.testing.assert_array_equal(imgs_gt_unsliced[3], imgs[3])
 
+        # POI images are not processed if they are not displayed
+        has_analysis.side_effect = lambda x: False
+        proc.process(data)
+        self.assertListEqual([None] * 4, processed.image.images)
+        has_analysis.side_effect = lambda x: x == AnalysisType.PULSE_OF_INTEREST
+
         # --------------------
         # Test invalid indices
         # --------------------
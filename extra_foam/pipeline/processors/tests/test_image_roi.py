@@ -240,6 +240,18 @@ class TestImageRoiPulse(_TestDataMixin):
                     proc.process(data)
                     error.assert_called_once()
 
+        # POI histograms are not consumed
+        proc._mon.add_skipped = MagicMock()
+        with patch.object(proc._meta, 'has_analysis', side_effect=lambda x: x != AnalysisType.PULSE_OF_INTEREST):
+            with patch.object(proc._meta, 'has_extension_client', return_value=False), \
+                    patch.object(proc._meta, 'has_result_sink', return_value=False):
+                with patch("extra_foam.pipeline.processors.image_roi.nanhist_with_stats") as hist_with_stats:
+                    data, processed = self._get_data(poi_indices=[0, 2])
+                    proc._hist_combo = RoiCombo.ROI1
+                    proc.process(data)
+                    hist_with_stats.assert_not_called()
+                    proc._mon.add_skipped.assert_called_once()
+
     def testOnTrainResolvedDetector(self):
         proc = self._proc
         proc._pulse_resolved = False
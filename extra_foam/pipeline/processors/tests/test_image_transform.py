@@ -7,14 +7,14 @@ Author: Ebad Kamil <ebad.kamil@xfel.eu>, Jun Zhu <jun.zhu@xfel.eu>
 Copyright (C) European X-Ray Free-Electron Laser Facility GmbH.
 All rights reserved.
 """
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
 import pytest
 
 import numpy as np
 
 from extra_foam.pipeline.processors.image_transform import ImageTransformProcessor
 from extra_foam.pipeline.tests import _TestDataMixin
-from extra_foam.config import ImageTransformType
+from extra_foam.config import AnalysisType, ImageTransformType
 
 np.warnings.filterwarnings("ignore", category=RuntimeWarning)
 
@@ -23,6 +23,7 @@ class TestImageTransform(_TestDataMixin):
     def setup_method(self):
         self._proc = ImageTransformProcessor()
         self._proc._set_ma_window(2)
+        self._proc._meta.has_consumer = MagicMock(return_value=True)
 
     def teardown_method(self):
         self._proc._reset_ma()
@@ -82,3 +83,20 @@ class TestImageTransform(_TestDataMixin):
                                         sigma=ed.sigma,
                                         threshold=ed.threshold)
             assert image.transform_type == ImageTransformType.EDGE_DETECTION
+
+    @patch("extra_foam.pipeline.processors.image_transform.fourier_transform_2d")
+    def testNotConsumed(self, mocked_f):
+        proc = self._proc
+        proc._transform_type = ImageTransformType.FOURIER_TRANSFORM
+        proc._meta.has_consumer.return_value = False
+        proc._mon.add_skipped = MagicMock()
+
+        data, processed = self.data_with_assembled(1001, (4, 10, 10))
+        image = processed.image
+        proc.process(data)
+        # moving average continues
+        np.testing.assert_array_equal(proc._masked_ma, image.masked_mean_ma)
+        mocked_f.assert_not_called()
+        assert image.transformed is None
+        proc._meta.has_consumer.assert_called_with(AnalysisType.IMAGE_TRANSFORM)
+        proc._mon.add_skipped.assert_called_once()
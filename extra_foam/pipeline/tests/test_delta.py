@@ -0,0 +1,149 @@
+import unittest
+from unittest.mock import patch
+import multiprocessing as mp
+import pickle
+
+import numpy as np
+
+from extra_foam.algorithms import OneWayAccuPairSequence, SimplePairSequence
+from extra_foam.pipeline.data_model import ProcessedData
+from extra_foam.pipeline.f_delta import ArrayDelta, DeltaDecoder, DeltaEncoder
+from extra_foam.pipeline.f_pipe import MpInQueue, MpOutQueue
+
+
+class TestDelta(unittest.TestCase):
+    def setUp(self):
+        self._encoder = DeltaEncoder()
+        self._decoder = DeltaDecoder()
+
+    def _transfer(self, processed):
+        encoded = self._encoder.encode(processed)
+        return encoded, self._decoder.decode(pickle.loads(pickle.dumps(encoded)))
+
+    def testCorrelation(self):
+        seq = SimplePairSequence(max_len=10)
+        for i in range(30):
+            seq.append((i, 2 * i))
+            processed = ProcessedData(i)
+            processed.corr[0].x, processed.corr[0].y = seq.data()
+
+            encoded, decoded = self._transfer(processed)
+
+            # the original data is not modified
+            self.assertIsInstance(processed.corr[0].x, np.ndarray)
+            if i > 1:
+                self.assertEqual(ArrayDelta.SHIFT, encoded.corr[0].x.kind)
+                # only the new point and the last point are sent
+                self.assertEqual(2, len(encoded.corr[0].x.data[2]))
+
+            np.testing.assert_array_equal(seq.data()[0], decoded.corr[0].x)
+            np.testing.assert_array_equal(seq.data()[1], decoded.corr[0].y)
+            self.assertIsNone(decoded.corr[0].x_slave)
+
+        # reset
+        seq.reset()
+        seq.append((100, 200))
+        processed = ProcessedData(100)
+        processed.corr[0].x, processed.corr[0].y = seq.data()
+        _, decoded = self._transfer(processed)
+        np.testing.assert_array_equal([100], decoded.corr[0].x)
+
+    def testCorrelationViewOffset(self):
+        seq = SimplePairSequence(max_len=1000)
+        for i in range(20):
+            # constant values cannot tell the number of dropped points
+            seq.append((1, 1))
+            processed = ProcessedData(i)
+            processed.corr[0].x, processed.corr[0].y = seq.data()
+
+            with patch("extra_foam.pipeline.f_delta._equal") as equal:
+                encoded, decoded = self._transfer(processed)
+            if i > 1:
+                # found from the offset in the buffer without comparing
+                equal.assert_not_called()
+                self.assertEqual(ArrayDelta.SHIFT, encoded.corr[0].x.kind)
+            np.testing.assert_array_equal(seq.data()[0], decoded.corr[0].x)
+
+        # the full history is a snapshot of the view
+        self._encoder.reset()
+        encoded, _ = self._transfer(processed)
+        self.assertFalse(np.shares_memory(processed.corr[0].x,
+                                          encoded.corr[0].x.data))
+
+    def testAccumulativeCorrelation(self):
+        seq = OneWayAccuPairSequence(0.5, max_len=5)
+        for i, x in enumerate([0, 0.1, 0.2, 1, 1.1, 2, 2.1, 2.2, 3, 3.1,
+                               4, 4.1, 5, 5.1, 6, 6.1, 6.2]):
+            seq.append((x, i))
+            processed = ProcessedData(i)
+            processed.corr.pp.x, processed.corr.pp.y = seq.data()
+
+            _, decoded = self._transfer(processed)
+
+            x_gt, y_gt = seq.data()
+            np.testing.assert_array_equal(x_gt, decoded.corr.pp.x)
+            self.assertIsInstance(decoded.corr.pp.y, type(y_gt))
+            for v, v_gt in zip(decoded.corr.pp.y, y_gt):
+                np.testing.assert_array_equal(v_gt, v)
+
+    def testBinning(self):
+        heat = np.full((4, 5), np.nan)
+        for i in range(10):
+            heat[i % 4, i % 5] = i
+            processed = ProcessedData(i)
+            processed.bin.heat = heat
+
+            encoded, decoded = self._transfer(processed)
+
+            if i > 0:
+                self.assertEqual(ArrayDelta.PATCH, encoded.bin.heat.kind)
+            np.testing.assert_array_equal(heat, decoded.bin.heat)
+
+        # shape changed
+        processed = ProcessedData(10)
+        processed.bin.heat = np.ones((2, 2))
+        encoded, decoded = self._transfer(processed)
+        self.assertEqual(ArrayDelta.FULL, encoded.bin.heat.kind)
+        np.testing.assert_array_equal(np.ones((2, 2)), decoded.bin.heat)
+
+    def testLostMessage(self):
+        seq = SimplePairSequence(max_len=100)
+        for i in range(2 * DeltaEncoder._KEY_FRAME_INTERVAL):
+            seq.append((i, i))
+            processed = ProcessedData(i)
+            processed.corr[1].x, processed.corr[1].y = seq.data()
+
+            if i == 10:
+                # lost
+                self._encoder.encode(processed)
+                continue
+
+            _, decoded = self._transfer(processed)
+            if 10 < i < DeltaEncoder._KEY_FRAME_INTERVAL - 1:
+                self.assertIsNone(decoded)
+            else:
+                np.testing.assert_array_equal(seq.data()[0], decoded.corr[1].x)
+
+        # reset both
+        self._encoder.reset()
+        self._decoder.reset()
+        _, decoded = self._transfer(processed)
+        np.testing.assert_array_equal(seq.data()[1], decoded.corr[1].y)
+
+
+@patch("extra_foam.pipeline.f_pipe.MonProxy")
+@patch("extra_foam.pipeline.f_pipe.MetaProxy")
+class TestMpQueueResync(unittest.TestCase):
+    def testResync(self, meta, mon):
+        events = [mp.Event() for _ in range(3)]
+        pipe_in = MpInQueue(*events, final=True)
+        pipe_out = MpOutQueue(*events, final=True)
+        pipe_in.connect(pipe_out)
+
+        self.assertFalse(pipe_out._resync_requested())
+        # e.g. the decoder was reset
+        pipe_in._request_resync()
+        pipe_in._request_resync()
+        self.assertTrue(pipe_out._resync_requested())
+        # the requests are consumed
+        self.assertFalse(pipe_out._resync_requested())
@@ -0,0 +1,167 @@
+import unittest
+from collections import namedtuple
+import multiprocessing as mp
+import os
+
+import numpy as np
+
+from extra_foam.pipeline.f_shmem import (
+    SharedMemoryArena, SharedMemoryArenaReader, SharedMemoryReceiver,
+    SharedMemorySender, SharedMemorySlot
+)
+
+
+_Item = namedtuple('_Item', ['a', 'b'])
+
+
+def _publish_and_exit(conn):
+    arena = SharedMemoryArena(conn)
+    encoded = arena.encode(_Data(np.arange(1000), None, []), (('a',),))
+    # exit without closing the arena
+    conn.send(encoded.a.path)
+
+
+class _Data:
+    def __init__(self, a, b, images):
+        self.a = a
+        self.b = b
+        self.images = images
+
+
+class TestSharedMemory(unittest.TestCase):
+    def testSlot(self):
+        writer = SharedMemorySlot()
+        reader = SharedMemorySlot(writer.path)
+
+        data = {
+            "raw": {"a b": np.arange(1000, dtype=np.float32),
+                    "c d": np.ones((2, 3))},
+            "list": [np.zeros((64, 64), dtype=np.uint16), 1, "abc"],
+            "item": _Item(np.arange(512, dtype=np.int64), None),
+            "processed": None,
+        }
+        header, size = writer.write(data)
+        # small arrays are kept in the header
+        self.assertIsInstance(header["raw"]["c d"], np.ndarray)
+
+        ret = reader.read(header, size)
+        np.testing.assert_array_equal(data["raw"]["a b"], ret["raw"]["a b"])
+        self.assertEqual(np.float32, ret["raw"]["a b"].dtype)
+        np.testing.assert_array_equal(data["raw"]["c d"], ret["raw"]["c d"])
+        np.testing.assert_array_equal(data["list"][0], ret["list"][0])
+        self.assertListEqual([1, "abc"], ret["list"][1:])
+        self.assertIsInstance(ret["item"], _Item)
+        np.testing.assert_array_equal(data["item"].a, ret["item"].a)
+        self.assertIsNone(ret["processed"])
+
+        # the slot grows
+        big = np.random.rand(256, 256)
+        header, size = writer.write({"big": big})
+        ret = reader.read(header, size)
+        np.testing.assert_array_equal(big, ret["big"])
+
+        # the data read is not affected by the next write
+        writer.write({"big": np.zeros_like(big)})
+        np.testing.assert_array_equal(big, ret["big"])
+
+        reader.close()
+        writer.close()
+        self.assertFalse(os.path.exists(writer.path))
+
+    def testSlotCleanup(self):
+        # the file is removed when an owned slot is garbage collected
+        writer = SharedMemorySlot()
+        reader = SharedMemorySlot(writer.path)
+        path = writer.path
+        del writer
+        self.assertFalse(os.path.exists(path))
+        reader.close()
+
+        # the blocks of an arena are removed when its process exits
+        conn1, conn2 = mp.Pipe()
+        proc = mp.Process(target=_publish_and_exit, args=(conn2,))
+        proc.start()
+        path = conn1.recv()
+        proc.join()
+        self.assertFalse(os.path.exists(path))
+
+    def testSenderReceiver(self):
+        conn1, conn2 = mp.Pipe()
+        sender = SharedMemorySender(conn1, n_slots=2)
+        receiver = SharedMemoryReceiver(conn2)
+
+        arrays = [np.full(1000, i) for i in range(3)]
+        self.assertTrue(sender.send(arrays[0]))
+        self.assertTrue(sender.send(arrays[1]))
+        # no free slot
+        self.assertFalse(sender.send(arrays[2], timeout=0.01))
+
+        receiver.release(conn2.recv())
+        np.testing.assert_array_equal(arrays[1], receiver.decode(conn2.recv()))
+        self.assertTrue(sender.send(arrays[2], timeout=0.01))
+        np.testing.assert_array_equal(arrays[2], receiver.decode(conn2.recv()))
+
+        sender.send_message('log', 'info', 'abc')
+        self.assertTupleEqual(('log', 'info', 'abc'), conn2.recv())
+
+        receiver.close()
+        sender.close()
+
+    def testArena(self):
+        conn_recv, conn_send = mp.Pipe(duplex=False)
+        arena = SharedMemoryArena(conn_recv)
+        reader = SharedMemoryArenaReader(conn_send)
+        fields = (('a',), ('b',), ('images',))
+
+        a = np.random.rand(64, 64)
+        data = _Data(a, np.arange(10), [None, np.ones((32, 32))])
+        encoded = arena.encode(data, fields)
+        arena.commit()
+        # the original data is not modified
+        self.assertIs(a, data.a)
+        self.assertIsNot(a, encoded.a)
+        # small arrays are kept in the object
+        self.assertIs(data.b, encoded.b)
+        ref_a, ref_image = encoded.a, encoded.images[1]
+
+        # the object is decoded in place
+        decoded = reader.decode(encoded, fields)
+        np.testing.assert_array_equal(a, decoded.a)
+        self.assertFalse(decoded.a.flags.writeable)
+        self.assertIsNone(decoded.images[0])
+        np.testing.assert_array_equal(np.ones((32, 32)), decoded.images[1])
+
+        # an unchanged array is referenced by version
+        data = _Data(a.copy(), None, [None, np.zeros((32, 32))])
+        encoded2 = arena.encode(data, fields)
+        arena.commit()
+        self.assertEqual(ref_a, encoded2.a)
+        self.assertNotEqual(ref_image, encoded2.images[1])
+        decoded2 = reader.decode(encoded2, fields)
+        self.assertIs(decoded.a, decoded2.a)
+        np.testing.assert_array_equal(np.zeros((32, 32)), decoded2.images[1])
+        # the old version is still available
+        np.testing.assert_array_equal(np.ones((32, 32)), decoded.images[1])
+
+        # the block of the old version is released after the view is gone
+        self.assertFalse(conn_recv.poll())
+        del encoded, decoded
+        reader.release()
+        self.assertTrue(conn_recv.poll())
+        # and then re-used
+        data = _Data(a, None, [np.full((32, 32), 2.)])
+        encoded3 = arena.encode(data, fields)
+        arena.commit()
+        self.assertEqual(ref_image.path, encoded3.images[0].path)
+        decoded3 = reader.decode(encoded3, fields)
+        np.testing.assert_array_equal(np.full((32, 32), 2.),
+                                      decoded3.images[0])
+        np.testing.assert_array_equal(np.zeros((32, 32)), decoded2.images[1])
+
+        # a block which has not been sent is re-used without being released
+        path = arena.encode(_Data(2 * a, None, []), fields).a.path
+        encoded4 = arena.encode(_Data(3 * a, None, []), fields)
+        self.assertEqual(path, encoded4.a.path)
+
+        reader.close()
+        arena.close()
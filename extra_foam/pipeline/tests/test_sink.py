@@ -0,0 +1,181 @@
+import unittest
+from unittest.mock import MagicMock, patch
+import os.path as osp
+import tempfile
+from threading import Event
+import time
+
+import h5py
+import numpy as np
+
+from extra_foam.pipeline.data_model import ProcessedData
+from extra_foam.pipeline.f_pipe import FileOutQueue
+from extra_foam.pipeline.f_sink import (
+    get_field, get_results, ResultWriter, ResultWriterProcess
+)
+
+
+def _processed(tid, n_pulses=2):
+    processed = ProcessedData(tid)
+    processed.roi.fom = float(tid)
+    processed.ai.x = np.arange(4)
+    processed.ai.y = np.full(4, tid)
+    processed.pulse.roi.fom = np.arange(n_pulses)
+    return processed
+
+
+class TestResultWriter(unittest.TestCase):
+    def setUp(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self._filepath = osp.join(self._tmp_dir.name, "results.h5")
+
+    def tearDown(self):
+        self._tmp_dir.cleanup()
+
+    def testGetField(self):
+        processed = _processed(1001)
+        processed.pulse.digitizer['B'].pulse_integral = np.ones(3)
+        self.assertEqual(1001., get_field(processed, "roi.fom"))
+        np.testing.assert_array_equal(
+            np.ones(3),
+            get_field(processed, "pulse.digitizer.B.pulse_integral"))
+
+        results = get_results(processed, ["roi.fom", "ai.y"])
+        self.assertEqual({"roi.fom", "ai.y", "ai.x"}, set(results))
+        np.testing.assert_array_equal(np.arange(4), results["ai.x"])
+
+    def testGeneral(self):
+        with self.assertRaises(ValueError):
+            ResultWriter(self._filepath, ["image.images"])
+
+        fields = ["roi.fom", "ai.y", "pulse.roi.fom", "pp.fom"]
+        with ResultWriter(self._filepath, fields, buffer_size=2) as writer:
+            writer.append(_processed(1001, n_pulses=2))
+            # buffered
+            self.assertEqual(0, len(writer._tid_ds))
+            writer.append(_processed(1002, n_pulses=3))
+            # a train without any result
+            writer.append(ProcessedData(1003))
+            self.assertEqual(3, len(writer))
+
+        with h5py.File(self._filepath, 'r') as fp:
+            np.testing.assert_array_equal([1001, 1002, 1003], fp["tid"][()])
+            np.testing.assert_array_equal([1001, 1002, np.nan],
+                                          fp["roi/fom"][()])
+            # pulse-resolved FOMs are padded
+            np.testing.assert_array_equal(
+                [[0, 1, np.nan], [0, 1, 2], [np.nan] * 3],
+                fp["pulse/roi/fom"][()])
+            self.assertEqual((3, 4), fp["ai/y"].shape)
+            self.assertEqual("gzip", fp["ai/y"].compression)
+            # the x axis is written once
+            np.testing.assert_array_equal(np.arange(4), fp["ai/x"][()])
+            # no value
+            self.assertNotIn("pp/fom", fp)
+            self.assertNotIn("xgm/intensity", fp)
+
+        # append to the existing file with different fields
+        with ResultWriter(self._filepath, ["pp.fom"]) as writer:
+            processed = ProcessedData(1004)
+            processed.pp.fom = 1.
+            writer.append(processed)
+
+        with h5py.File(self._filepath, 'r') as fp:
+            np.testing.assert_array_equal([1001, 1002, 1003, 1004],
+                                          fp["tid"][()])
+            np.testing.assert_array_equal([np.nan] * 3 + [1.],
+                                          fp["pp/fom"][()])
+            np.testing.assert_array_equal([1001, 1002, np.nan, np.nan],
+                                          fp["roi/fom"][()])
+            self.assertEqual((4, 3), fp["pulse/roi/fom"].shape)
+
+    def testDimensionChanged(self):
+        writer = ResultWriter(self._filepath, ["roi.fom", "ai.fom"],
+                              buffer_size=1)
+        processed = _processed(1001)
+        processed.ai.fom = 1.
+        writer.append(processed)
+
+        processed = _processed(1002)
+        processed.ai.fom = np.ones(2)
+        with self.assertRaises(ValueError):
+            writer.append(processed)
+        writer.close()
+
+        with h5py.File(self._filepath, 'r') as fp:
+            # the other fields are still written and all are aligned
+            np.testing.assert_array_equal([1001, 1002], fp["roi/fom"][()])
+            np.testing.assert_array_equal([1., np.nan], fp["ai/fom"][()])
+
+
+class TestResultWriterProcess(unittest.TestCase):
+    def setUp(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self._filepath = osp.join(self._tmp_dir.name, "results.h5")
+
+    def tearDown(self):
+        self._tmp_dir.cleanup()
+
+    def testGeneral(self):
+        with self.assertRaises(ValueError):
+            ResultWriterProcess(self._filepath, ["image.images"])
+
+        writer = ResultWriterProcess(self._filepath, ["roi.fom", "ai.y"])
+        for tid in (1001, 1002):
+            writer.append(_processed(tid))
+        writer.close()
+        self.assertFalse(writer.is_alive())
+        self.assertListEqual([], writer.errors())
+
+        with h5py.File(self._filepath, 'r') as fp:
+            np.testing.assert_array_equal([1001, 1002], fp["tid"][()])
+            np.testing.assert_array_equal([1001, 1002], fp["roi/fom"][()])
+            np.testing.assert_array_equal(np.arange(4), fp["ai/x"][()])
+
+        # failed to open the file
+        writer = ResultWriterProcess(
+            osp.join(self._tmp_dir.name, "abc", "results.h5"), ["roi.fom"])
+        writer.close()
+        errors = writer.errors()
+        self.assertEqual(1, len(errors))
+        self.assertIn("Failed to open result file", errors[0])
+
+
+class TestFileOutQueue(unittest.TestCase):
+    def setUp(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self._filepath = osp.join(self._tmp_dir.name, "results.h5")
+
+    def tearDown(self):
+        self._tmp_dir.cleanup()
+
+    @patch('extra_foam.ipc.ProcessLogger.info')
+    @patch('extra_foam.ipc.ProcessLogger.error')
+    def testGeneral(self, error, info):
+        update_ev, pause_ev, close_ev = Event(), Event(), Event()
+        sink = FileOutQueue(update_ev, pause_ev, close_ev)
+        sink._meta = MagicMock()
+
+        # disabled
+        sink._meta.hget_all.return_value = {"filepath": "", "fields": ""}
+        sink.start()
+        sink.put({"processed": _processed(1000)})
+        self.assertTrue(sink._cache.empty())
+
+        sink._meta.hget_all.return_value = {
+            "filepath": self._filepath, "fields": "roi.fom,ai.y"}
+        update_ev.set()
+        while update_ev.is_set():
+            time.sleep(0.001)
+
+        for tid in (1001, 1002):
+            sink.put({"processed": _processed(tid)})
+
+        close_ev.set()
+        sink.join()
+        error.assert_not_called()
+
+        with h5py.File(self._filepath, 'r') as fp:
+            np.testing.assert_array_equal([1001, 1002], fp["tid"][()])
+            np.testing.assert_array_equal([1001, 1002], fp["roi/fom"][()])
+            self.assertNotIn("pulse", fp)
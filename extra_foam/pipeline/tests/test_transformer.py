@@ -1,6 +1,6 @@
 import unittest
 
-from extra_foam.pipeline.f_transformer import DataTransformer
+from extra_foam.pipeline.f_transformer import DataTransformer, SENT_TIMESTAMP
 from extra_foam.config import DataSource
 from extra_foam.database import SourceItem
 from extra_foam.pipeline.tests import _RawDataMixin
@@ -139,6 +139,25 @@ class TestDataTransformer(_RawDataMixin, unittest.TestCase):
                              dropped)
         self.assertListEqual([1003], list(trans._cached.keys()))
 
+    def testSentTimestamp(self):
+        catalog = self._create_catalog({"ABC": [("abc", "ppt", 1)],
+                                        "EFG": [("efg", "ppt", 1)]})
+
+        trans = DataTransformer(catalog)
+
+        # not stamped
+        trans.correlate(self._gen_kb_data(1001, {"abc": [("ppt", 1)]}))
+        correlated, _, _ = trans.correlate(
+            self._gen_kb_data(1001, {"efg": [("ppt", 1)]}))
+        self.assertIsNone(correlated['processed'].t_sent)
+
+        # the earliest time when the sources were sent
+        for src, t_sent in [("abc", 10.), ("efg", 5.)]:
+            data = self._gen_kb_data(1002, {src: [("ppt", 1)]})
+            data[1][src][SENT_TIMESTAMP] = t_sent
+            correlated, _, _ = trans.correlate(data)
+        self.assertEqual(5., correlated['processed'].t_sent)
+
     def testCacheIsFull(self):
         catalog = self._create_catalog({"ABC": [("abc", "ppt", 1)],
                                         "Motor": [("efg", "ppt", 0)]})
@@ -0,0 +1,340 @@
+"""
+Distributed under the terms of the BSD 3-Clause License.
+
+The full license is in the file LICENSE, distributed with this software.
+
+Author: Jun Zhu <jun.zhu@xfel.eu>
+Copyright (C) European X-Ray Free-Electron Laser Facility GmbH.
+All rights reserved.
+"""
+import argparse
+import fcntl
+from getpass import getuser
+import hashlib
+import os
+import os.path as osp
+import pickle
+import stat
+import subprocess
+import sys
+import tempfile
+import time
+
+import zmq
+
+from karabo_bridge import Client as KaraboBridgeClient
+
+from extra_foam.database import SourceCatalog
+from extra_foam.pipeline.data_model import ProcessedData
+from extra_foam.pipeline.f_transformer import DataTransformer
+
+from . import logger
+from .config import config
+
+
+def _runtime_dir():
+    """Return a directory which is only accessible by the current user.
+
+    The broker and the apps exchange pickled data via the socket in it.
+
+    :raise PermissionError: if the directory is accessible by others.
+    """
+    path = os.environ.get("XDG_RUNTIME_DIR")
+    if not path or not osp.isdir(path):
+        path = osp.join(tempfile.gettempdir(), f"extra-foam-{getuser()}")
+        try:
+            os.mkdir(path, 0o700)
+        except FileExistsError:
+            pass
+
+    st = os.lstat(path)
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() \
+            or st.st_mode & 0o077:
+        raise PermissionError(
+            f"{path} must be a directory which is owned and only "
+            f"accessible by the current user")
+    return path
+
+
+def _broker_path(endpoint):
+    """Return the base path of the files of the broker for an endpoint."""
+    digest = hashlib.md5(endpoint.encode()).hexdigest()[:16]
+    return osp.join(_runtime_dir(), f"extra-foam-broker-{digest}")
+
+
+def broker_frontend(endpoint):
+    """Return the local address of the broker for a bridge endpoint."""
+    return f"ipc://{_broker_path(endpoint)}"
+
+
+def _try_lock(endpoint):
+    """Try to acquire the lock which is held by a running broker.
+
+    :return: the locked file object or None if the lock is held by
+        another process.
+    """
+    f = open(_broker_path(endpoint) + ".lock", "w")
+    try:
+        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        f.close()
+        return
+    return f
+
+
+def start_bridge_broker(endpoint):
+    """Start a broker for the bridge endpoint if there is none running.
+
+    The broker runs in a separate session so that it outlives the app
+    which started it. It exits when it has not been used by any app for
+    a while.
+
+    :return str: local address of the broker.
+    """
+    f = _try_lock(endpoint)
+    if f is not None:
+        f.close()
+        # If two apps get here at the same time, the broker which is
+        # started later exits since it cannot acquire the lock.
+        subprocess.Popen(
+            [sys.executable, "-m", __name__, endpoint],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            start_new_session=True)
+
+    return broker_frontend(endpoint)
+
+
+class BridgeBroker:
+    """Share a single bridge connection between local apps.
+
+    The broker requests data from the bridge server on behalf of all the
+    connected apps. The data are correlated once for each distinct set
+    of requested sources and each app is served with only its sources.
+    Therefore, a source missing for one app does not hold up the others.
+    """
+    _client_instance_type = KaraboBridgeClient
+
+    # timeout of polling requests from apps in milliseconds
+    _POLL_TIMEOUT = 100
+    # an app is forgotten if it has not sent any request for so long
+    _CLIENT_EXPIRY = 10.  # second
+
+    def __init__(self, endpoint, *, frontend=None, idle_timeout=None):
+        """Initialization.
+
+        :param str endpoint: endpoint of the bridge server.
+        :param str frontend: local address the apps connect to.
+        :param float idle_timeout: the broker exits after it has not been
+            used by any app for so long. None for running forever.
+        """
+        self._endpoint = endpoint
+        self._frontend = broker_frontend(endpoint) \
+            if frontend is None else frontend
+        self._idle_timeout = idle_timeout
+
+        # key: app identity, value: (key of the set of requested sources,
+        #                             source items, time of last request)
+        self._clients = dict()
+        # key: key of a set of requested sources, value: DataTransformer
+        self._transformers = dict()
+        # apps waiting for data
+        self._pending = set()
+
+        self._running = False
+
+    def stop(self):
+        self._running = False
+
+    @staticmethod
+    def _sources_key(items):
+        # source items are not hashable
+        return tuple(sorted(repr(item) for item in items))
+
+    def _register(self, identity, items):
+        """Register a request from an app."""
+        old = self._clients.get(identity)
+        key = self._sources_key(items)
+        self._clients[identity] = (key, items, time.monotonic())
+        self._pending.add(identity)
+        if old is None or old[0] != key:
+            self._update_transformers()
+
+    def _expire(self):
+        """Forget the apps which have not sent any request for long."""
+        now = time.monotonic()
+        expired = [identity for identity, (_, _, t) in self._clients.items()
+                   if now - t > self._CLIENT_EXPIRY]
+        for identity in expired:
+            del self._clients[identity]
+            self._pending.discard(identity)
+        if expired:
+            self._update_transformers()
+
+    def _update_transformers(self):
+        """Keep one transformer for each distinct set of sources."""
+        transformers = dict()
+        for key, items, _ in self._clients.values():
+            if key in transformers:
+                continue
+            transformer = self._transformers.get(key)
+            if transformer is None:
+                catalog = SourceCatalog()
+                for item in items:
+                    catalog.add_item(item)
+                transformer = DataTransformer(catalog)
+            transformers[key] = transformer
+        self._transformers = transformers
+
+        logger.info(f"{len(transformers)} set(s) of sources requested by "
+                    f"{len(self._clients)} app(s)")
+
+    def _reply(self, socket, key, correlated):
+        """Send correlated data to the waiting apps of a set of sources."""
+        msg = pickle.dumps((correlated['processed'].tid,
+                            correlated['meta'],
+                            correlated['raw']),
+                           protocol=pickle.HIGHEST_PROTOCOL)
+        for identity in [identity for identity in self._pending
+                         if self._clients[identity][0] == key]:
+            socket.send_multipart([identity, b'', msg], copy=False)
+            self._pending.discard(identity)
+
+    def _correlate(self, socket, data):
+        for key, transformer in self._transformers.items():
+            try:
+                correlated, _, dropped = transformer.correlate(data)
+                for tid, err in dropped:
+                    logger.debug(err)
+            except Exception as e:
+                logger.error(str(e))
+                continue
+
+            if correlated:
+                self._reply(socket, key, correlated)
+
+    def run(self):
+        """Serve the apps until stopped or idle."""
+        ctx = zmq.Context()
+        socket = ctx.socket(zmq.ROUTER)
+        socket.setsockopt(zmq.LINGER, 0)
+        socket.bind(self._frontend)
+
+        self._running = True
+        last_active = time.monotonic()
+        try:
+            with self._client_instance_type(
+                    self._endpoint,
+                    timeout=config["CLIENT_TIME_OUT"]) as client:
+                logger.info(f"Broker of {self._endpoint} started at "
+                            f"{self._frontend}")
+
+                while self._running:
+                    timeout = 0 if self._pending else self._POLL_TIMEOUT
+                    while socket.poll(timeout):
+                        identity, _, msg = socket.recv_multipart()
+                        self._register(identity, pickle.loads(msg))
+                        timeout = 0
+                    self._expire()
+
+                    if not self._clients:
+                        if self._idle_timeout is not None and \
+                                time.monotonic() - last_active > \
+                                self._idle_timeout:
+                            break
+                        continue
+                    last_active = time.monotonic()
+
+                    if not self._pending:
+                        continue
+
+                    try:
+                        data = client.next()
+                    except TimeoutError:
+                        continue
+
+                    self._correlate(socket, data)
+        finally:
+            ctx.destroy(linger=0)
+            logger.info(f"Broker of {self._endpoint} stopped")
+
+
+class BridgeBrokerClient:
+    """Client of BridgeBroker.
+
+    It keeps the same interface as karabo_bridge.Client except that the
+    data received are already correlated.
+    """
+    def __init__(self, frontend, catalog, timeout=None):
+        """Initialization.
+
+        :param str frontend: local address of the broker.
+        :param SourceCatalog catalog: requested sources.
+        :param float timeout: timeout of next in seconds.
+        """
+        self._catalog = catalog
+        self._request = pickle.dumps(tuple(catalog.values()))
+
+        self._ctx = zmq.Context()
+        # A DEALER socket is used since the request is re-sent after
+        # timeout, which also tells the broker that the app is alive.
+        self._socket = self._ctx.socket(zmq.DEALER)
+        self._socket.setsockopt(zmq.LINGER, 0)
+        self._socket.connect(frontend)
+
+        self._timeout = None if timeout is None else int(timeout * 1000)
+
+    def next(self):
+        """Request next correlated data.
+
+        :return: correlated data with the same structure as the one
+            returned by DataTransformer.correlate.
+
+        :raise TimeoutError: If timeout is reached before receiving data.
+        """
+        socket = self._socket
+        if not socket.poll(0):
+            socket.send_multipart([b'', self._request])
+            if not socket.poll(self._timeout):
+                raise TimeoutError(
+                    f"No data received from "
+                    f"{socket.getsockopt_string(zmq.LAST_ENDPOINT)} "
+                    f"in the last {self._timeout} ms")
+
+        _, msg = socket.recv_multipart(copy=False)
+        tid, meta, raw = pickle.loads(msg)
+        return {
+            'catalog': self._catalog.__copy__(),
+            'meta': meta,
+            'raw': raw,
+            'processed': ProcessedData(tid),
+        }
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._ctx.destroy(linger=0)
+
+
+def application():
+    parser = argparse.ArgumentParser(prog="extra-foam-bridge-broker")
+    parser.add_argument("endpoint", help="Endpoint of the bridge server")
+    parser.add_argument("--idle-timeout", type=float, default=30.,
+                        help="Exit after not being used for the given "
+                             "time in seconds")
+
+    args = parser.parse_args()
+
+    lock = _try_lock(args.endpoint)
+    if lock is None:
+        # another broker is running
+        return
+
+    with lock:
+        BridgeBroker(args.endpoint, idle_timeout=args.idle_timeout).run()
+
+
+if __name__ == "__main__":
+
+    application()
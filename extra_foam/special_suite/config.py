@@ -21,6 +21,10 @@ class Config(collections.abc.Mapping):
         "MAX_N_PULSES_PER_TRAIN": 2700,
         "EXTENSION_PORT": _core_config["EXTENSION_PORT"],
         "USE_KARABO_GATE_CLIENT": False,
+        # run the worker of each app in a separate process
+        "USE_WORKER_PROCESS": False,
+        # share a single bridge connection between apps on the same host
+        "USE_BRIDGE_BROKER": False,
         "DEFAULT_CLIENT_PORT": 45454,
         "CLIENT_TIME_OUT": 0.1,  # second
         # initial (width, height) of a special analysis window
@@ -102,26 +102,14 @@ class GotthardProcessor(QThreadWorker):
 
     def onLoadDarkRun(self, dirpath):
         """Override."""
-        run = self._loadRunDirectoryST(dirpath)
-        if run is not None:
-            try:
-                arr = run.get_array(self._output_channel, self._ppt)
-                shape = arr.shape
-                if arr.ndim != 3:
-                    self.log.error(f"Data must be a 3D array! "
-                                   f"Actual shape: {shape}")
-                    return
-
-                self.log.info(f"Found dark data with shape {shape}")
-                # FIXME: performance
-                self._dark_ma = np.mean(
-                    arr.values, axis=0, dtype=_PIXEL_DTYPE)
-                self._dark_mean_ma = np.mean(
-                    self._dark_ma[self._pulse_slicer],
-                    axis=0, dtype=_PIXEL_DTYPE)
-            except Exception as e:
-                self.log.error(f"Unexpect exception when getting data array: "
-                               f"{repr(e)}")
+        self._reduceRunST(dirpath, self._output_channel, self._ppt,
+                          self._onDarkRunReduced, ndim=3)
+
+    def _onDarkRunReduced(self, mean, var, shape):
+        self.log.info(f"Found dark data with shape {shape}")
+        self._dark_ma = mean.astype(_PIXEL_DTYPE)
+        self._dark_mean_ma = np.mean(
+            self._dark_ma[self._pulse_slicer], axis=0, dtype=_PIXEL_DTYPE)
 
     def onRemoveDark(self):
         """Override."""
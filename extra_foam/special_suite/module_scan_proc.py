@@ -7,24 +7,205 @@ Author: Jun Zhu <jun.zhu@xfel.eu>
 Copyright (C) European X-Ray Free-Electron Laser Facility GmbH.
 All rights reserved.
 """
+import math
+
+import numpy as np
+
+from extra_foam.algorithms import compute_asic_moments, SimpleVectorSequence
+from extra_foam.pipeline.processors.binning import _BinMixin
+from extra_foam.pipeline.exceptions import ProcessingError
+
 from .special_analysis_base import profiler, QThreadWorker
 
+_DEFAULT_N_BINS = 20
+_DEFAULT_BIN_RANGE = "-inf, inf"
+_DEFAULT_N_MODULES = 16
+# AGIPD: a module has 8 x 2 ASICs with 64 x 64 pixels each
+_DEFAULT_ASIC_SHAPE = "64, 64"
+# 14-bit ADC of AGIPD
+_DEFAULT_SATURATION = 16383.
+
+
+def _merge_moments(moments, indices, n_bins):
+    """Merge the moments which fall into the same bin.
+
+    :param numpy.ndarray moments: (count, mean, sum of squared deviations,
+        number of saturated pixels) in the last axis.
+    :param numpy.ndarray indices: bin indices along the first axis of
+        moments. Negative indices are ignored.
+    :param int n_bins: number of bins.
+
+    :return numpy.ndarray: merged moments. Shape = (n_bins, ..., 4)
+    """
+    valid = indices >= 0
+    moments, indices = moments[valid], indices[valid]
+
+    shape = moments.shape[1:-1]
+    size = int(np.prod(shape))
+    flat_indices = (indices[:, np.newaxis] * size + np.arange(size)).ravel()
+
+    def bin_sum(v):
+        return np.bincount(flat_indices, weights=v.ravel(),
+                           minlength=n_bins * size).reshape(n_bins, *shape)
+
+    count = moments[..., 0]
+    mean = np.nan_to_num(moments[..., 1])
+
+    total = bin_sum(count)
+    empty = total == 0
+    bin_mean = bin_sum(count * mean) / np.where(empty, 1, total)
+
+    out = np.empty((n_bins, *shape, 4), dtype=np.float64)
+    out[..., 0] = total
+    # Chan et al.
+    out[..., 2] = bin_sum(moments[..., 2]
+                          + count * (mean - bin_mean[indices]) ** 2)
+    out[..., 3] = bin_sum(moments[..., 3])
+    bin_mean[empty] = np.nan
+    out[..., 1] = bin_mean
+    return out
+
+
+def _subtract_moments(moments, part):
+    """Remove the moments of a part from the merged moments.
+
+    It reverses _merge_moments for a single part.
+
+    :param numpy.ndarray moments: merged moments. Shape = (..., 4)
+    :param numpy.ndarray part: moments of a part which has been merged
+        into moments. Shape = (..., 4)
+
+    :return numpy.ndarray: moments of the rest. Shape = (..., 4)
+    """
+    total, count = moments[..., 0], part[..., 0]
+    mean, part_mean = (np.nan_to_num(moments[..., 1]),
+                       np.nan_to_num(part[..., 1]))
+
+    rest = total - count
+    empty = rest <= 0
+    rest_mean = (total * mean - count * part_mean) / np.where(empty, 1, rest)
+
+    out = np.empty_like(moments)
+    out[..., 0] = np.where(empty, 0, rest)
+    # Chan et al.
+    m2 = moments[..., 2] - part[..., 2] - (part_mean - rest_mean) ** 2 \
+        * count * rest / np.where(total == 0, 1, total)
+    # the rounding errors could make it slightly negative
+    out[..., 2] = np.where(empty, 0, np.maximum(m2, 0))
+    out[..., 3] = np.where(empty, 0, moments[..., 3] - part[..., 3])
+    rest_mean[empty] = np.nan
+    out[..., 1] = rest_mean
+    return out
 
-class ModuleScanProcessor(QThreadWorker):
+
+class ModuleScanProcessor(QThreadWorker, _BinMixin):
     """Module scan processor.
 
+    The mean, standard deviation and number of saturated pixels of every
+    ASIC and every module are calculated over all the pulses in a train
+    in module space, and accumulated in bins of the scan variable.
+
     Attributes:
+        _det_src (str): output channel of the detector modules, with the
+            module index replaced by '*'.
+        _det_ppt (str): property of the detector modules.
+        _n_modules (int): number of modules.
+        _asic_shape (tuple): shape (y, x) of an ASIC.
+        _saturation (float): pixels with values not less than it are
+            counted as saturated.
+        _scan_device_id (str): device ID of the scan variable.
+        _scan_ppt (str): property of the scan variable.
+        _scan (SimpleVectorSequence): scan variable and ASIC moments of
+            each train.
+        _moments_shape (tuple): shape of the ASIC moments of a train.
+        _edges (numpy.array): edges of bins. shape = (_n_bins + 1,)
+        _bin_moments (numpy.array): (count, mean, sum of squared
+            deviations, number of saturated pixels) of every ASIC in each
+            bin. shape = (_n_bins, modules, asics in y, asics in x, 4)
+        _counts (numpy.array): number of trains in each bin.
+        _bin_range (tuple): bin range requested.
+        _actual_range (tuple): actual bin range used.
+        _n_bins (int): number of bins.
+        _rebin (bool): True for re-binning all the trains in history.
+
+    Once the history is full, the oldest train is removed from its bin
+    when a new train arrives, so that the bins always agree with the
+    history.
     """
+
+    # 10 trains/second * 60 seconds * 10 minutes
+    _MAX_TRAINS = 10 * 60 * 10
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
-        pass
+        self._det_src = ""
+        self._det_ppt = ""
+        self._n_modules = _DEFAULT_N_MODULES
+        self._asic_shape = self.str2range(_DEFAULT_ASIC_SHAPE, handler=int)
+        self._saturation = _DEFAULT_SATURATION
+
+        self._scan_device_id = ""
+        self._scan_ppt = ""
+
+        self._scan = None
+        self._moments_shape = None
+        self._edges = None
+        self._bin_moments = None
+        self._counts = None
+
+        self._bin_range = self.str2range(_DEFAULT_BIN_RANGE)
+        self._actual_range = None
+        self._auto_range = [True, True]
+        self._n_bins = _DEFAULT_N_BINS
+
+        self._rebin = True
+
+    def onDetectorSourceChanged(self, value: str):
+        self._det_src = value
+
+    def onDetectorPropertyChanged(self, value: str):
+        self._det_ppt = value
+
+    def onNModulesChanged(self, value: str):
+        self._n_modules = int(value)
+
+    def onAsicShapeChanged(self, value: str):
+        self._asic_shape = self.str2range(value, handler=int)
+
+    def onSaturationChanged(self, value: str):
+        self._saturation = float(value)
+
+    def onScanDeviceIdChanged(self, value: str):
+        self._scan_device_id = value
+
+    def onScanPropertyChanged(self, value: str):
+        self._scan_ppt = value
+
+    def onNBinsChanged(self, value: str):
+        n_bins = int(value)
+        if n_bins != self._n_bins:
+            self._n_bins = n_bins
+            self._rebin = True
+
+    def onBinRangeChanged(self, value: tuple):
+        if value != self._bin_range:
+            self._bin_range = value
+            self._auto_range[:] = [math.isinf(v) for v in value]
+            self._rebin = True
+
+    def _module_sources(self):
+        if "*" not in self._det_src:
+            return [self._det_src]
+        prefix, suffix = self._det_src.split("*", 1)
+        return [f"{prefix}{i}{suffix}" for i in range(self._n_modules)]
 
     def sources(self):
         """Override."""
-        return {
-
-        }
+        return [
+            *[(src, self._det_ppt, 1) for src in self._module_sources()],
+            (self._scan_device_id, self._scan_ppt, 0),
+        ]
 
     @profiler("Module scan Processor")
     def process(self, data):
@@ -33,7 +214,157 @@ class ModuleScanProcessor(QThreadWorker):
 
         tid = self.getTrainId(meta)
 
+        modules = []
+        for src in self._module_sources():
+            arr = self.getPropertyData(data, src, self._det_ppt)
+            if arr.ndim == 2:
+                # train-resolved detector
+                arr = arr[np.newaxis, ...]
+            elif arr.ndim != 3:
+                raise ProcessingError(
+                    f"[{tid}] Module data must be a 2D or 3D array! "
+                    f"Actual shape: {arr.shape}")
+            modules.append(arr)
+
+        try:
+            moments = compute_asic_moments(
+                modules, self._asic_shape, saturation=self._saturation)
+        except ValueError as e:
+            raise ProcessingError(f"[{tid}] {str(e)}")
+
+        scan_value = self.getPropertyData(
+            data, self._scan_device_id, self._scan_ppt)
+
+        evicted = self._update_scan(scan_value, moments)
+
+        actual_range = self.get_actual_range(
+            self._scan.data()[:, 0], self._bin_range, self._auto_range)
+        if actual_range != self._actual_range:
+            self._actual_range = actual_range
+            self._rebin = True
+
+        if self._rebin:
+            self._new_binning()
+            self._rebin = False
+        else:
+            self._update_binning(scan_value, moments, evicted)
+
         self.log.info(f"Train {tid} processed")
 
         return {
+            "asic_mean": self._moments2image(moments[..., 1]),
+            "asic_std": self._moments2image(self._std(moments)),
+            "centers": self.edges2centers(self._edges)[0],
+            "counts": self._counts,
+            **self._bin_statistics(),
         }
+
+    def _update_scan(self, scan_value, moments):
+        """Append a train to the history.
+
+        :return numpy.ndarray: the train dropped from the full history or
+            None.
+        """
+        evicted = None
+        if moments.shape != self._moments_shape:
+            # the history is cleared if the layout of modules changes
+            self._moments_shape = moments.shape
+            self._scan = SimpleVectorSequence(
+                moments.size + 1, max_len=self._MAX_TRAINS)
+            self._rebin = True
+        elif len(self._scan) == self._MAX_TRAINS:
+            # the view is not modified by the append
+            evicted = self._scan.data()[0]
+        self._scan.append(np.concatenate(([scan_value], moments.ravel())))
+        return evicted
+
+    @staticmethod
+    def _std(moments):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.sqrt(moments[..., 2] / moments[..., 0])
+
+    @staticmethod
+    def _moments2image(v):
+        """Tile the ASICs of all the modules in an image.
+
+        :param numpy.ndarray v: shape = (modules, asics in y, asics in x)
+
+        :return numpy.ndarray: modules are aligned along x.
+            shape = (asics in y, modules * asics in x)
+        """
+        n_modules, n_ay, n_ax = v.shape
+        return v.transpose(1, 0, 2).reshape(n_ay, n_modules * n_ax)
+
+    def _new_binning(self):
+        history = self._scan.data()
+        scan_values = history[:, 0]
+        n_bins = self._n_bins
+        lb, ub = self._actual_range
+        self._edges = np.linspace(lb, ub, n_bins + 1)
+
+        indices = np.searchsorted(self._edges, scan_values, side='right') - 1
+        indices[scan_values == ub] = n_bins - 1
+        indices[indices >= n_bins] = -1
+
+        moments = history[:, 1:].reshape(
+            len(history), *self._moments_shape)
+
+        self._bin_moments = _merge_moments(moments, indices, n_bins)
+        self._counts = np.bincount(
+            indices[indices >= 0], minlength=n_bins).astype(np.float64)
+
+    def _update_binning(self, scan_value, moments, evicted=None):
+        if evicted is not None:
+            iloc = self.searchsorted(self._edges, evicted[0])
+            if 0 <= iloc < self._n_bins:
+                self._counts[iloc] -= 1
+                self._bin_moments[iloc] = _subtract_moments(
+                    self._bin_moments[iloc],
+                    evicted[1:].reshape(self._moments_shape))
+
+        iloc = self.searchsorted(self._edges, scan_value)
+        if 0 <= iloc < self._n_bins:
+            self._counts[iloc] += 1
+            self._bin_moments[iloc] = _merge_moments(
+                np.stack([self._bin_moments[iloc], moments]),
+                np.array([0, 0]), 1)[0]
+
+    def _bin_statistics(self):
+        """Return the statistics of modules in each bin.
+
+        The statistics of a module are merged from its ASICs.
+        """
+        if self._bin_moments is None:
+            return {
+                "module_mean": None,
+                "module_std": None,
+                "module_saturated": None,
+            }
+
+        bm = self._bin_moments
+        n_bins, n_modules = bm.shape[:2]
+        # (modules, bins, asics, 4)
+        asics = bm.reshape(n_bins, n_modules, -1, 4).transpose(1, 0, 2, 3)
+        merged = _merge_moments(
+            asics.reshape(-1, 4),
+            np.repeat(np.arange(n_modules * n_bins), asics.shape[2]),
+            n_modules * n_bins).reshape(n_modules, n_bins, 4)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            saturated = merged[..., 3] / self._counts
+
+        return {
+            "module_mean": merged[..., 1],
+            "module_std": self._std(merged),
+            "module_saturated": saturated,
+        }
+
+    def reset(self):
+        """Override."""
+        self._scan = None
+        self._moments_shape = None
+        self._edges = None
+        self._bin_moments = None
+        self._counts = None
+
+        self._rebin = True
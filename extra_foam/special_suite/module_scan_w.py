@@ -7,25 +7,29 @@ Author: Jun Zhu <jun.zhu@xfel.eu>
 Copyright (C) European X-Ray Free-Electron Laser Facility GmbH.
 All rights reserved.
 """
-from string import Template
+from PyQt5.QtCore import QRegExp, Qt
+from PyQt5.QtGui import QDoubleValidator, QIntValidator, QRegExpValidator
+from PyQt5.QtWidgets import QSplitter
 
-from PyQt5.QtCore import Qt
-from PyQt5.QtGui import QIntValidator
-from PyQt5.QtWidgets import QGridLayout, QSplitter
-
-from .module_scan_proc import ModuleScanProcessor
+from .module_scan_proc import (
+    ModuleScanProcessor, _DEFAULT_ASIC_SHAPE, _DEFAULT_BIN_RANGE,
+    _DEFAULT_N_BINS, _DEFAULT_N_MODULES, _DEFAULT_SATURATION
+)
 from .special_analysis_base import (
-    create_special, QThreadFoamClient, _BaseAnalysisCtrlWidgetS,
+    create_special, QThreadKbClient, _BaseAnalysisCtrlWidgetS,
     _SpecialAnalysisBase
 )
 from ..gui.plot_widgets import (
-    HistMixin, ImageViewF, PlotWidgetF
+    ImageViewF, TimedImageViewF, TimedPlotWidgetF
 )
 from ..gui.misc_widgets import FColor
 from ..gui.ctrl_widgets.smart_widgets import (
-    SmartBoundaryLineEdit, SmartLineEdit, SmartSliceLineEdit
+    SmartBoundaryLineEdit, SmartLineEdit, SmartStringLineEdit
 )
 
+_MAX_N_BINS = 999
+_MAX_N_MODULES = 16
+
 
 class ModuleScanCtrlWidget(_BaseAnalysisCtrlWidgetS):
     """Detector module scan control widget."""
@@ -33,42 +37,145 @@ class ModuleScanCtrlWidget(_BaseAnalysisCtrlWidgetS):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
-        self._non_reconfigurable_widgets = [
-        ]
+        self.detector_src_le = SmartStringLineEdit(
+            "SPB_DET_AGIPD1M-1/DET/*CH0:xtdf")
+        self.detector_ppt_le = SmartStringLineEdit("image.data")
+        self.n_modules_le = SmartLineEdit(str(_DEFAULT_N_MODULES))
+        self.n_modules_le.setValidator(QIntValidator(1, _MAX_N_MODULES))
+        self.asic_shape_le = SmartLineEdit(_DEFAULT_ASIC_SHAPE)
+        # height, width
+        self.asic_shape_le.setValidator(
+            QRegExpValidator(QRegExp(r'^\s*[1-9]\d*\s*,\s*[1-9]\d*\s*$')))
+        self.saturation_le = SmartLineEdit(str(_DEFAULT_SATURATION))
+        self.saturation_le.setValidator(QDoubleValidator())
+
+        self.scan_device_id_le = SmartStringLineEdit(
+            "SPB_IRU_MOTORS/MDL/DATA_SELECT")
+        self.scan_ppt_le = SmartStringLineEdit("actualPosition")
+        self.label_le = SmartStringLineEdit("Scan variable (arb. u.)")
+
+        self.bin_range_le = SmartBoundaryLineEdit(_DEFAULT_BIN_RANGE)
+        self.n_bins_le = SmartLineEdit(str(_DEFAULT_N_BINS))
+        self.n_bins_le.setValidator(QIntValidator(1, _MAX_N_BINS))
+
+        self._non_reconfigurable_widgets.extend([
+            self.detector_src_le,
+            self.detector_ppt_le,
+            self.n_modules_le,
+            self.scan_device_id_le,
+            self.scan_ppt_le,
+        ])
 
         self.initUI()
         self.initConnections()
 
     def initUI(self):
         """Override."""
-        pass
+        layout = self.layout()
+
+        layout.addRow("Detector source: ", self.detector_src_le)
+        layout.addRow("Detector property: ", self.detector_ppt_le)
+        layout.addRow("# of modules: ", self.n_modules_le)
+        layout.addRow("ASIC shape: ", self.asic_shape_le)
+        layout.addRow("Saturation: ", self.saturation_le)
+        layout.addRow("Scan device ID: ", self.scan_device_id_le)
+        layout.addRow("Scan property: ", self.scan_ppt_le)
+        layout.addRow("Label: ", self.label_le)
+        layout.addRow("Bin range: ", self.bin_range_le)
+        layout.addRow("# of bins: ", self.n_bins_le)
 
     def initConnections(self):
         """Override."""
         pass
 
 
-class ModuleScanRoiFomPlot(PlotWidgetF):
-    """ModuleScanRoiFomPlot class.
+class ModuleScanAsicImageView(ImageViewF):
+    """ModuleScanAsicImageView class.
+
+    Visualize the mean of every ASIC in the current train. Modules are
+    aligned along x.
+    """
+    def __init__(self, *, parent=None):
+        """Initialization."""
+        super().__init__(hide_axis=False, parent=parent)
+
+        self.setTitle("ASIC mean")
+
+    def updateF(self, data):
+        """Override."""
+        self.setImage(data['asic_mean'])
+
+
+class ModuleScanHeatmap(TimedImageViewF):
+    """ModuleScanHeatmap class.
+
+    Visualize a statistic of every module in each bin.
+    """
+    def __init__(self, name, title, *, parent=None):
+        """Initialization."""
+        super().__init__(hide_axis=False, parent=parent)
+        self.invertY(False)
+        self.setAspectLocked(False)
+
+        self._name = name
+
+        self.setTitle(title)
+        self.setLabel('left', "Module")
+
+    def refresh(self):
+        """Override."""
+        data = self._data
+
+        centers = data["centers"]
+        heat = data[self._name]
+        if centers is None or heat is None:
+            return
+
+        self.setImage(heat,
+                      pos=[centers[0], 0],
+                      scale=[(centers[-1] - centers[0]) / len(centers), 1])
+
+    def onXLabelChanged(self, label):
+        self.setLabel('bottom', label)
 
-    Visualize ROI FOMs of all modules.
+
+class ModuleScanSaturationPlot(TimedPlotWidgetF):
+    """ModuleScanSaturationPlot class.
+
+    Visualize the average number of saturated pixels per train in each
+    bin.
     """
     def __init__(self, *, parent=None):
         """Initialization."""
         super().__init__(parent=parent)
 
-        self.setLabel('left', "ROI FOM")
-        self.setLabel('bottom', "Pixel")
+        self.setTitle("Saturated pixels")
+        self.setLabel('left', "Saturated pixels / train")
+        self.setLabel('right', "Count")
         self.addLegend(offset=(-40, 20))
 
-        self._mean = self.plotCurve(name="mean", pen=FColor.mkPen("p"))
+        self._saturated = self.plotCurve(
+            name="Total", pen=FColor.mkPen("r"))
+        self._count = self.plotBar(
+            name="Count", y2=True, brush=FColor.mkBrush('i', alpha=70))
 
-    def updateF(self, data):
+    def refresh(self):
         """Override."""
-        self._mean.setData(data['mean'])
+        data = self._data
+
+        centers = data["centers"]
+        saturated = data["module_saturated"]
+        if centers is None or saturated is None:
+            return
 
+        self._saturated.setData(centers, saturated.sum(axis=0))
+        self._count.setData(centers, data["counts"])
 
-@create_special(ModuleScanCtrlWidget, ModuleScanProcessor, QThreadFoamClient)
+    def onXLabelChanged(self, label):
+        self.setLabel('bottom', label)
+
+
+@create_special(ModuleScanCtrlWidget, ModuleScanProcessor, QThreadKbClient)
 class ModuleScanWindow(_SpecialAnalysisBase):
     """Main GUI for module scan."""
 
@@ -79,7 +186,12 @@ class ModuleScanWindow(_SpecialAnalysisBase):
     def __init__(self, topic):
         super().__init__(topic, with_dark=False)
 
-        self._scan_plot = ModuleScanRoiFomPlot(parent=self)
+        self._asic_image = ModuleScanAsicImageView(parent=self)
+        self._mean_heatmap = ModuleScanHeatmap(
+            "module_mean", "Module mean", parent=self)
+        self._std_heatmap = ModuleScanHeatmap(
+            "module_std", "Module std", parent=self)
+        self._saturation_plot = ModuleScanSaturationPlot(parent=self)
 
         self.initUI()
         self.initConnections()
@@ -87,15 +199,57 @@ class ModuleScanWindow(_SpecialAnalysisBase):
 
     def initUI(self):
         """Override."""
+        middle_panel = QSplitter(Qt.Vertical)
+        middle_panel.addWidget(self._asic_image)
+        middle_panel.addWidget(self._saturation_plot)
+
         right_panel = QSplitter(Qt.Vertical)
-        right_panel.addWidget(self._scan_plot)
+        right_panel.addWidget(self._mean_heatmap)
+        right_panel.addWidget(self._std_heatmap)
 
         cw = self.centralWidget()
+        cw.addWidget(middle_panel)
         cw.addWidget(right_panel)
-        cw.setSizes([self._TOTAL_W / 4, 3 * self._TOTAL_W / 4])
 
         self.resize(self._TOTAL_W, self._TOTAL_H)
 
     def initConnections(self):
         """Override."""
-        pass
+        self._ctrl_widget_st.detector_src_le.value_changed_sgn.connect(
+            self._worker_st.onDetectorSourceChanged)
+        self._ctrl_widget_st.detector_ppt_le.value_changed_sgn.connect(
+            self._worker_st.onDetectorPropertyChanged)
+        self._ctrl_widget_st.n_modules_le.value_changed_sgn.connect(
+            self._worker_st.onNModulesChanged)
+        self._ctrl_widget_st.asic_shape_le.value_changed_sgn.connect(
+            self._worker_st.onAsicShapeChanged)
+        self._ctrl_widget_st.saturation_le.value_changed_sgn.connect(
+            self._worker_st.onSaturationChanged)
+
+        self._ctrl_widget_st.detector_src_le.returnPressed.emit()
+        self._ctrl_widget_st.detector_ppt_le.returnPressed.emit()
+        self._ctrl_widget_st.n_modules_le.returnPressed.emit()
+        self._ctrl_widget_st.asic_shape_le.returnPressed.emit()
+        self._ctrl_widget_st.saturation_le.returnPressed.emit()
+
+        self._ctrl_widget_st.scan_device_id_le.value_changed_sgn.connect(
+            self._worker_st.onScanDeviceIdChanged)
+        self._ctrl_widget_st.scan_ppt_le.value_changed_sgn.connect(
+            self._worker_st.onScanPropertyChanged)
+
+        self._ctrl_widget_st.scan_device_id_le.returnPressed.emit()
+        self._ctrl_widget_st.scan_ppt_le.returnPressed.emit()
+
+        self._ctrl_widget_st.n_bins_le.value_changed_sgn.connect(
+            self._worker_st.onNBinsChanged)
+        self._ctrl_widget_st.bin_range_le.value_changed_sgn.connect(
+            self._worker_st.onBinRangeChanged)
+
+        self._ctrl_widget_st.n_bins_le.returnPressed.emit()
+        self._ctrl_widget_st.bin_range_le.returnPressed.emit()
+
+        for widget in (self._mean_heatmap, self._std_heatmap,
+                       self._saturation_plot):
+            self._ctrl_widget_st.label_le.value_changed_sgn.connect(
+                widget.onXLabelChanged)
+        self._ctrl_widget_st.label_le.returnPressed.emit()
@@ -7,15 +7,30 @@ Author: Jun Zhu <jun.zhu@xfel.eu>
 Copyright (C) European X-Ray Free-Electron Laser Facility GmbH.
 All rights reserved.
 """
+from concurrent.futures import ThreadPoolExecutor
+
+from extra_foam.algorithms import (
+    compute_image_histogram, downsample_image, quick_min_max
+)
+
 from .special_analysis_base import profiler, QThreadWorker
 
+# same as the one used in ImageItem
+_AUTO_LEVEL_QUANTILE = 0.99
+
 
 class MultiCamViewProcessor(QThreadWorker):
     """Multi-camera view processor.
 
+    The cameras are processed in parallel threads. Each image is
+    downsampled to the size of its view, and its levels and histogram
+    are calculated here instead of in the GUI.
+
     Attributes:
         _output_channels (list): list of output channel names.
         _properties (list): list of properties.
+        _display_shapes (list): list of shapes (h, w) of the views in
+            device pixels. None for no downsampling.
     """
     _N_CAMERAS = 4
 
@@ -24,6 +39,10 @@ class MultiCamViewProcessor(QThreadWorker):
 
         self._output_channels = [''] * self._N_CAMERAS
         self._properties = [''] * self._N_CAMERAS
+        self._display_shapes = [None] * self._N_CAMERAS
+
+        # threads are only created when the cameras are processed
+        self._executor = ThreadPoolExecutor(max_workers=self._N_CAMERAS)
 
     def onOutputChannelChanged(self, idx: int, value: str):
         self._output_channels[idx] = value
@@ -31,6 +50,16 @@ class MultiCamViewProcessor(QThreadWorker):
     def onPropertyChanged(self, idx: int, value: str):
         self._properties[idx] = value
 
+    def onDisplayShapeChanged(self, idx: int, value: tuple):
+        self._display_shapes[idx] = value
+
+    def runForeverST(self):
+        """Override."""
+        try:
+            super().runForeverST()
+        finally:
+            self._executor.shutdown()
+
     def sources(self):
         """Override."""
         srcs = []
@@ -39,6 +68,40 @@ class MultiCamViewProcessor(QThreadWorker):
                 srcs.append((ch, ppt, 1))
         return srcs
 
+    @staticmethod
+    def _downsampling_factor(shape, display_shape):
+        """Return the largest factor which does not make the image smaller
+        than its view.
+
+        The same factor is used for both axes to keep the aspect ratio.
+        """
+        if display_shape is None:
+            return 1
+        h, w = display_shape
+        if h <= 0 or w <= 0:
+            return 1
+        return max(1, min(shape[0] // h, shape[1] // w))
+
+    def _processCamera(self, tid, data, idx):
+        ch, ppt = self._output_channels[idx], self._properties[idx]
+        if not (ch and ppt):
+            return None
+
+        img = self.squeezeToImage(tid, self.getPropertyData(data, ch, ppt))
+        if img is None:
+            return None
+
+        factor = self._downsampling_factor(
+            img.shape, self._display_shapes[idx])
+        img = downsample_image(img, factor)
+
+        return {
+            "image": img,
+            "scale": factor,
+            "levels": quick_min_max(img, q=_AUTO_LEVEL_QUANTILE),
+            "histogram": compute_image_histogram(img),
+        }
+
     @profiler("Multi-camera views Processor")
     def process(self, data):
         """Override."""
@@ -46,16 +109,15 @@ class MultiCamViewProcessor(QThreadWorker):
 
         tid = self.getTrainId(meta)
 
+        rets = self._executor.map(
+            lambda i: self._processCamera(tid, data, i),
+            range(self._N_CAMERAS))
+
         channels = {i: None for i in range(self._N_CAMERAS)}
         images = {i: None for i in range(self._N_CAMERAS)}
-        for i, (ch, ppt) in enumerate(zip(self._output_channels,
-                                          self._properties)):
-            if ch and ppt:
-                images[i] = self.squeezeToImage(
-                    tid, self.getPropertyData(data, ch, ppt))
-            else:
-                images[i] = None
+        for i, (ch, ret) in enumerate(zip(self._output_channels, rets)):
             channels[i] = ch
+            images[i] = ret
 
         self.log.info(f"Train {tid} processed")
 
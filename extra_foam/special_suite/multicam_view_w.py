@@ -9,6 +9,7 @@ All rights reserved.
 """
 import functools
 
+from PyQt5.QtCore import pyqtSignal
 from PyQt5.QtWidgets import QGridLayout, QWidget
 
 from extra_foam.gui.ctrl_widgets.smart_widgets import SmartLineEdit
@@ -69,8 +70,13 @@ class MultiCamViewCtrlWidget(_BaseAnalysisCtrlWidgetS):
 class CameraView(ImageViewF):
     """CameraView class.
 
-    Visualize a single camera image.
+    Visualize a single camera image, which has been downsampled to the
+    size of the view by the worker.
     """
+
+    # (h, w) in device pixels
+    display_shape_changed_sgn = pyqtSignal(object)
+
     def __init__(self, index, *, parent=None):
         """Initialization."""
         super().__init__(has_roi=False, hide_axis=False, parent=parent)
@@ -79,9 +85,33 @@ class CameraView(ImageViewF):
 
     def updateF(self, data):
         """Override."""
-        self.setImage(data["images"][self._index])
+        camera = data["images"][self._index]
+        if camera is None:
+            self.setImage(None)
+        else:
+            # keep the coordinates of the original image
+            scale = camera["scale"]
+            self.setImage(camera["image"],
+                          scale=(scale, scale),
+                          levels=camera["levels"],
+                          histogram=camera["histogram"])
         self.setTitle(data["channels"][self._index])
 
+    def displayShape(self):
+        """Return the shape (h, w) of the view in device pixels.
+
+        The size of the whole widget instead of the image area is used
+        since the layout of the children has not been updated yet when
+        the widget is resized. It only results in less downsampling.
+        """
+        ratio = self.devicePixelRatioF()
+        return int(self.height() * ratio), int(self.width() * ratio)
+
+    def resizeEvent(self, event):
+        """Override."""
+        super().resizeEvent(event)
+        self.display_shape_changed_sgn.emit(self.displayShape())
+
 
 @create_special(MultiCamViewCtrlWidget, MultiCamViewProcessor, QThreadKbClient)
 class MultiCamViewWindow(_SpecialAnalysisBase):
@@ -127,3 +157,8 @@ class MultiCamViewWindow(_SpecialAnalysisBase):
             ppt.value_changed_sgn.connect(
                 functools.partial(self._worker_st.onPropertyChanged, i))
             ppt.returnPressed.emit()
+
+        for i, view in enumerate(self._views):
+            view.display_shape_changed_sgn.connect(
+                functools.partial(self._worker_st.onDisplayShapeChanged, i))
+            self._worker_st.onDisplayShapeChanged(i, view.displayShape())
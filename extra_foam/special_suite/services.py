@@ -24,6 +24,12 @@ def application():
                         type=lambda s: s.upper())
     parser.add_argument("--use-gate", action='store_true',
                         help="Use Karabo gate client (experimental feature)")
+    parser.add_argument("--worker-process", action='store_true',
+                        help="Run the data processing of each app in a "
+                             "separate process (experimental feature)")
+    parser.add_argument("--use-broker", action='store_true',
+                        help="Share a single bridge connection between "
+                             "apps on the same host (experimental feature)")
     parser.add_argument('--debug', action='store_true',
                         help="Run in debug mode")
 
@@ -37,7 +43,10 @@ def application():
 
     topic = args.topic
 
-    config.load(topic, USE_KARABO_GATE_CLIENT=args.use_gate)
+    config.load(topic,
+                USE_KARABO_GATE_CLIENT=args.use_gate,
+                USE_WORKER_PROCESS=args.worker_process,
+                USE_BRIDGE_BROKER=args.use_broker)
 
     app = mkQApp()
     app.setStyleSheet(
@@ -8,24 +8,29 @@ Copyright (C) European X-Ray Free-Electron Laser Facility GmbH.
 All rights reserved.
 """
 import abc
+from collections import deque
 import functools
+import multiprocessing as mp
+from multiprocessing.connection import wait as mp_wait
 from queue import Empty
 import sys
-from threading import Condition
+from threading import Condition, Thread
 import time
 import traceback
 from weakref import WeakKeyDictionary
 
 import numpy as np
 
-from PyQt5.QtCore import pyqtSignal, pyqtSlot, QObject, Qt, QThread, QTimer
+from PyQt5.QtCore import (
+    pyqtBoundSignal, pyqtSignal, pyqtSlot, QObject, Qt, QThread, QTimer
+)
 from PyQt5.QtGui import QColor, QIntValidator
 from PyQt5.QtWidgets import (
     QCheckBox, QFileDialog, QFormLayout, QFrame, QGridLayout, QLabel,
     QMainWindow, QPushButton, QSizePolicy, QSplitter
 )
 
-from extra_data import RunDirectory
+from extra_data import by_index, RunDirectory
 from karabo_bridge import Client as KaraboBridgeClient
 
 from extra_foam.algorithms import intersection
@@ -34,12 +39,16 @@ from extra_foam.gui.ctrl_widgets import _SingleRoiCtrlWidget, SmartLineEdit
 from extra_foam.gui.plot_widgets import ImageViewF
 from extra_foam.gui.misc_widgets import GuiLogger, set_button_color
 from extra_foam.pipeline.f_queue import SimpleQueue
+from extra_foam.pipeline.f_shmem import (
+    SharedMemoryReceiver, SharedMemorySender
+)
 from extra_foam.pipeline.f_transformer import DataTransformer
 from extra_foam.pipeline.f_zmq import FoamZmqClient, KaraboGateClient
 from extra_foam.pipeline.exceptions import ProcessingError
 
 from . import __version__
 from . import logger
+from .bridge_broker import BridgeBrokerClient, start_bridge_broker
 from .config import _IMAGE_DTYPE, config
 
 
@@ -269,6 +278,125 @@ class _ThreadLogger(QObject):
         self.error_sgn.connect(instance.onErrorReceivedST)
 
 
+class _RunReducer(Thread):
+    """Reduce the data of a property in a run in a background thread.
+
+    The trains are read in chunks of bounded size and the mean and
+    variance over trains are accumulated chunk by chunk. Therefore, the
+    memory usage does not grow with the length of the run.
+    """
+    # maximum size of a chunk in bytes
+    _MAX_CHUNK_BYTES = 128 * 1024 ** 2
+
+    def __init__(self, run, src, ppt, finished, log, *, ndim=None):
+        """Initialization.
+
+        :param DataCollection run: run data.
+        :param str src: device ID / output channel.
+        :param str ppt: property.
+        :param callable finished: called with (mean, variance, shape) of
+            the data when the reduction is finished.
+        :param _ThreadLogger log: logger.
+        :param int ndim: required number of dimensions of the data array
+            of the whole run. None for no requirement.
+        """
+        super().__init__(daemon=True)
+
+        self._run = run
+        self._src = src
+        self._ppt = ppt
+        self._finished = finished
+        self._log = log
+        self._ndim = ndim
+
+        self._aborted = False
+
+    def abort(self):
+        """Abort the reduction."""
+        self._aborted = True
+
+    def _read(self, start, stop):
+        return np.asarray(self._run.select_trains(
+            by_index[start:stop]).get_array(self._src, self._ppt).values)
+
+    def reduce(self):
+        """Reduce the data.
+
+        :return: (mean, variance, shape) of the data or None if aborted.
+        """
+        n_trains = len(self._run.train_ids)
+        if n_trains == 0:
+            raise ProcessingError("No train found in the run!")
+
+        arr = self._read(0, 1)
+        if self._ndim is not None and arr.ndim != self._ndim:
+            raise ProcessingError(
+                f"Data must be a {self._ndim}D array! Actual shape: "
+                f"{(n_trains, *arr.shape[1:])}")
+
+        # the deviations of a chunk are computed in float64
+        chunk_size = max(1, self._MAX_CHUNK_BYTES // max(
+            arr.nbytes, arr[:1].size * np.dtype(np.float64).itemsize, 1))
+
+        count = 0
+        mean = np.zeros(arr.shape[1:], dtype=np.float64)
+        m2 = np.zeros(arr.shape[1:], dtype=np.float64)
+        progress = 0
+        start, stop = 0, 1
+        while True:
+            n = len(arr)
+            if n > 0:
+                # merge moments (Chan et al.)
+                chunk_mean = np.mean(arr, axis=0, dtype=np.float64)
+                buf = np.subtract(arr, chunk_mean, dtype=np.float64)
+                np.square(buf, out=buf)
+                chunk_m2 = np.sum(buf, axis=0)
+                del buf
+                total = count + n
+                delta = chunk_mean - mean
+                mean += delta * (n / total)
+                m2 += chunk_m2 + delta ** 2 * (count * n / total)
+                count = total
+
+            new_progress = 10 * stop // n_trains
+            if new_progress > progress:
+                progress = new_progress
+                self._log.info(f"Reducing {self._src} {self._ppt}: "
+                               f"{10 * progress}% ({stop}/{n_trains} "
+                               f"trains)")
+
+            if stop >= n_trains:
+                break
+            if self._aborted:
+                return
+
+            start, stop = stop, min(stop + chunk_size, n_trains)
+            arr = self._read(start, stop)
+
+        if count == 0:
+            raise ProcessingError(f"No data found for {self._src} "
+                                  f"{self._ppt}!")
+
+        return mean, m2 / count, (count, *mean.shape)
+
+    def run(self):
+        """Override."""
+        try:
+            ret = self.reduce()
+        except Exception as e:
+            self._log.error(f"Failed to reduce the run data: {repr(e)}")
+            return
+
+        if ret is None:
+            self._log.info(f"Reducing {self._src} {self._ppt}: aborted")
+            return
+
+        try:
+            self._finished(*ret)
+        except Exception as e:
+            self._log.error(repr(e))
+
+
 class QThreadWorker(QObject):
     """Base class of worker running in a thread.
 
@@ -296,6 +424,11 @@ class QThreadWorker(QObject):
 
         self._roi_geom_st = None
 
+        self._run_reducer_st = None
+        # (finished, result) of the run reductions which have not been
+        # handed over to the processing thread
+        self._reduced_st = deque()
+
         self.log = _ThreadLogger()
 
     def onResetST(self):
@@ -323,6 +456,52 @@ class QThreadWorker(QObject):
         except Exception as e:
             self.log.error(repr(e))
 
+    def _reduceRunST(self, dirpath, src, ppt, finished, *, ndim=None):
+        """Reduce the data of a property in a run in a background thread.
+
+        This method should be called inside the onLoadDarkRun
+        implementation of the child class.
+
+        :param str dirpath: path of the run directory.
+        :param str src: device ID / output channel.
+        :param str ppt: property.
+        :param callable finished: called with (mean, variance, shape) of
+            the data along the train axis in the processing thread before
+            the next train is processed after the reduction is finished.
+        :param int ndim: required number of dimensions of the data array
+            of the whole run.
+
+        :return: the reducer thread or None if no reduction is started.
+        """
+        reducer = self._run_reducer_st
+        if reducer is not None and reducer.is_alive():
+            self.log.warning("Reduction of another run is in progress!")
+            return
+
+        run = self._loadRunDirectoryST(dirpath)
+        if run is None:
+            return
+
+        self._run_reducer_st = _RunReducer(
+            run, src, ppt,
+            lambda *ret: self._reduced_st.append((finished, ret)),
+            self.log, ndim=ndim)
+        self._run_reducer_st.start()
+        return self._run_reducer_st
+
+    def _applyReducedST(self):
+        """Hand the results of the finished run reductions over.
+
+        It is called in the processing thread so that the states set by
+        the 'finished' callbacks are never seen half-updated by 'process'.
+        """
+        while self._reduced_st:
+            finished, ret = self._reduced_st.popleft()
+            try:
+                finished(*ret)
+            except Exception as e:
+                self.log.error(repr(e))
+
     def onRoiGeometryChange(self, value: tuple):
         """EXtra-foam interface method."""
         idx, activated, locked, x, y, w, h = value
@@ -342,11 +521,34 @@ class QThreadWorker(QObject):
             self.reset()
             self._reset_st = False
 
+        self._applyReducedST()
+
         self.preprocess()
         processed = self.process(data)
         self.postprocess()
         return processed
 
+    def _processSafeST(self, data):
+        """Process data and log any exception.
+
+        :return: processed data or None if an exception was raised.
+        """
+        try:
+            return self._processImpST(data)
+
+        except ProcessingError as e:
+            exc_type, exc_value, exc_traceback = sys.exc_info()
+            self.log.debug(repr(traceback.format_tb(exc_traceback))
+                           + repr(e))
+            self.log.error(repr(e))
+
+        except Exception as e:
+            exc_type, exc_value, exc_traceback = sys.exc_info()
+            self.log.debug(f"Unexpected Exception!: " +
+                           repr(traceback.format_tb(exc_traceback)) +
+                           repr(e))
+            self.log.error(repr(e))
+
     def runForeverST(self):
         """Run processing in an infinite loop unless interrupted."""
         self._running_st = True
@@ -354,24 +556,7 @@ class QThreadWorker(QObject):
         while self._running_st:
             try:
                 data = self._input_st.get_nowait()
-                try:
-                    processed = self._processImpST(data)
-
-                except ProcessingError as e:
-                    exc_type, exc_value, exc_traceback = sys.exc_info()
-                    self.log.debug(repr(traceback.format_tb(exc_traceback))
-                                   + repr(e))
-                    self.log.error(repr(e))
-                    continue
-
-                except Exception as e:
-                    exc_type, exc_value, exc_traceback = sys.exc_info()
-                    self.log.debug(f"Unexpected Exception!: " +
-                                   repr(traceback.format_tb(exc_traceback)) +
-                                   repr(e))
-                    self.log.error(repr(e))
-                    continue
-
+                processed = self._processSafeST(data)
                 if processed is not None:
                     # keep the latest processed data in the output
                     self._output_st.put_pop(processed)
@@ -385,6 +570,8 @@ class QThreadWorker(QObject):
 
     def terminateRunST(self):
         """Terminate processing and notify other waiting threads."""
+        if self._run_reducer_st is not None:
+            self._run_reducer_st.abort()
         self._running_st = False
         with self._cv_st:
             self._cv_st.notify()
@@ -569,6 +756,245 @@ class QThreadWorker(QObject):
     ###################################################################
 
 
+class _ProcessLogger:
+    """Logging in the worker process.
+
+    Messages are posted to the ProcessWorkerProxy in the main process.
+    """
+    def __init__(self, sender):
+        self._sender = sender
+
+    def debug(self, msg):
+        self._sender.send_message('log', 'debug', msg)
+
+    def info(self, msg):
+        self._sender.send_message('log', 'info', msg)
+
+    def warning(self, msg):
+        self._sender.send_message('log', 'warning', msg)
+
+    def error(self, msg):
+        self._sender.send_message('log', 'error', msg)
+
+
+# timeout for sending processed data to the main process, in second
+_WORKER_SEND_TIMEOUT = 1.0
+
+
+def _run_worker_process(worker_klass, in_conn, out_conn, cmd_conn):
+    """Entry point of the worker process.
+
+    :param type worker_klass: QThreadWorker class.
+    :param Connection in_conn: connection for receiving data.
+    :param Connection out_conn: connection for sending processed data.
+    :param Connection cmd_conn: connection for receiving method calls.
+    """
+    receiver = SharedMemoryReceiver(in_conn)
+    sender = SharedMemorySender(out_conn)
+
+    worker = worker_klass(SimpleQueue(), Condition())
+    worker.log = _ProcessLogger(sender)
+    worker.reset()
+
+    try:
+        while True:
+            mp_wait([in_conn, cmd_conn])
+
+            while cmd_conn.poll():
+                try:
+                    msg = cmd_conn.recv()
+                except EOFError:
+                    # the main process is gone
+                    return
+                if msg is None:
+                    return
+                name, args = msg
+                try:
+                    getattr(worker, name)(*args)
+                except Exception as e:
+                    worker.log.error(f"[{name}] {repr(e)}")
+
+            # only the latest data is processed
+            latest = None
+            while in_conn.poll():
+                if latest is not None:
+                    receiver.release(latest)
+                latest = in_conn.recv()
+            if latest is None:
+                continue
+
+            processed = worker._processSafeST(receiver.decode(latest))
+            if processed is not None:
+                # drop the processed data if the main process is too busy
+                sender.send(processed, timeout=_WORKER_SEND_TIMEOUT)
+    finally:
+        receiver.close()
+        sender.close()
+
+
+class ProcessWorkerProxy(QObject):
+    """Run a QThreadWorker in a separate process.
+
+    It has the same interface as QThreadWorker and runs in the worker
+    thread of a window. Input data are passed to the worker process via
+    shared memory and the latest processed data are passed back in the
+    same way. Method calls like 'on*Changed' are forwarded to the worker
+    process as messages.
+
+    A local instance of the worker, which never processes data, is kept
+    to answer queries like 'sources'. Accessing any other method or
+    signal of the worker raises AttributeError.
+
+    The worker process is started with the 'spawn' method since the
+    main process is multi-threaded.
+    """
+
+    # methods which should only be executed in the worker process
+    _REMOTE_ONLY = frozenset(["onLoadDarkRun"])
+    # methods which are only executed by the local worker
+    _LOCAL_ONLY = frozenset(["sources"])
+
+    # timeout for waiting for a free shared memory slot, in second
+    _SEND_TIMEOUT = 0.1
+
+    def __init__(self, worker_klass, queue, condition, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        self._input_st = queue
+        self._cv_st = condition
+
+        self._output_st = SimpleQueue(maxsize=1)
+        self._running_st = False
+
+        self._local_st = worker_klass(queue, condition)
+
+        self.log = _ThreadLogger()
+
+        ctx = mp.get_context("spawn")
+        in_conn, worker_in_conn = ctx.Pipe()
+        self._out_conn_st, worker_out_conn = ctx.Pipe()
+        worker_cmd_conn, self._cmd_conn_st = ctx.Pipe(duplex=False)
+        self._sender_st = SharedMemorySender(in_conn)
+        self._receiver_st = SharedMemoryReceiver(self._out_conn_st)
+
+        self._process_st = ctx.Process(
+            target=_run_worker_process,
+            args=(worker_klass, worker_in_conn, worker_out_conn,
+                  worker_cmd_conn),
+            daemon=True)
+        self._process_st.start()
+        # so that the pipes will be broken if the worker process dies
+        worker_in_conn.close()
+        worker_out_conn.close()
+        worker_cmd_conn.close()
+
+        self._listener_st = Thread(target=self._listenST, daemon=True)
+        self._listener_st.start()
+
+    def __getattr__(self, name):
+        """Forward attribute access to the local worker.
+
+        The 'on*' methods are also called in the worker process.
+
+        :raise AttributeError: if the attribute is a signal or a method
+            which cannot be forwarded.
+        """
+        attr = getattr(self.__dict__.get('_local_st'), name)
+        if isinstance(attr, pyqtBoundSignal):
+            raise AttributeError(
+                f"Signal '{name}' of the worker is not available in "
+                f"the main process")
+        if not callable(attr) or name in self._LOCAL_ONLY:
+            return attr
+        if not name.startswith("on"):
+            raise AttributeError(
+                f"Method '{name}' of the worker cannot be called in "
+                f"the main process")
+
+        def forwarded(*args):
+            if name not in self._REMOTE_ONLY:
+                attr(*args)
+            self._callST(name, *args)
+        return forwarded
+
+    def _callST(self, name, *args):
+        try:
+            self._cmd_conn_st.send((name, args))
+        except (BrokenPipeError, OSError) as e:
+            self.log.error(f"Worker process is not available: {repr(e)}")
+
+    def _listenST(self):
+        """Receive processed data and log messages from the worker."""
+        while True:
+            try:
+                msg = self._out_conn_st.recv()
+            except (EOFError, OSError):
+                break
+
+            if msg[0] == 'data':
+                try:
+                    processed = self._receiver_st.decode(msg)
+                except (BrokenPipeError, OSError):
+                    break
+                # keep the latest processed data in the output
+                self._output_st.put_pop(processed)
+            else:
+                _, level, text = msg
+                getattr(self.log, level)(text)
+
+    def onResetST(self):
+        """Override."""
+        self._local_st.onResetST()
+        self._output_st.clear()
+        self._callST('onResetST')
+
+    def getOutputDataST(self):
+        """Get data from the output queue."""
+        return self._output_st.get_nowait()
+
+    def runForeverST(self):
+        """Send the input data to the worker process unless interrupted."""
+        self._running_st = True
+        while self._running_st:
+            try:
+                data = self._input_st.get_nowait()
+                while self._running_st and not self._sender_st.send(
+                        data, timeout=self._SEND_TIMEOUT):
+                    # check whether there is newer data
+                    try:
+                        data = self._input_st.get_nowait()
+                    except Empty:
+                        pass
+
+            except Empty:
+                with self._cv_st:
+                    self._cv_st.wait()
+
+            except (BrokenPipeError, OSError) as e:
+                self.log.error(f"Worker process is not available: "
+                               f"{repr(e)}")
+                break
+
+    def terminateRunST(self):
+        """Terminate processing and the worker process."""
+        self._running_st = False
+        with self._cv_st:
+            self._cv_st.notify()
+
+        if self._process_st.is_alive():
+            try:
+                self._cmd_conn_st.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+            self._process_st.join(timeout=1.0)
+            if self._process_st.is_alive():
+                self._process_st.terminate()
+                self._process_st.join()
+
+        self._sender_st.close()
+        self._receiver_st.close()
+
+
 class _BaseQThreadClient(QThread):
     def __init__(self, queue, condition, catalog, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -665,10 +1091,35 @@ class QThreadKbClient(_BaseQThreadClient):
         if config["USE_KARABO_GATE_CLIENT"]:
             self.__class__._client_instance_type = KaraboGateClient
 
+    def _runWithBrokerST(self):
+        """Receive correlated data via the local bridge broker."""
+        frontend = start_bridge_broker(self._endpoint_st)
+
+        with BridgeBrokerClient(frontend, self._catalog_st,
+                                timeout=config["CLIENT_TIME_OUT"]) as client:
+            self.log.info(f"Connected to {self._endpoint_st} via {frontend}")
+
+            while not self.isInterruptionRequested():
+                try:
+                    correlated = client.next()
+                except TimeoutError:
+                    continue
+
+                # keep the latest processed data in the output
+                self._output_st.put_pop(correlated)
+                with self._cv_st:
+                    self._cv_st.notify()
+
+        self.log.info(f"Disconnected with {self._endpoint_st}")
+
     def run(self):
         """Override."""
         self.onResetST()
 
+        if config["USE_BRIDGE_BROKER"]:
+            self._runWithBrokerST()
+            return
+
         kwargs = {
             "timeout": config["CLIENT_TIME_OUT"]
         }
@@ -789,7 +1240,11 @@ class _SpecialAnalysisBase(QMainWindow):
         catalog = SourceCatalog()
         queue = SimpleQueue(maxsize=1)
         self._client_st = self._client_instance_type(queue, cv, catalog)
-        self._worker_st = self._worker_instance_type(queue, cv)
+        if config["USE_WORKER_PROCESS"]:
+            self._worker_st = ProcessWorkerProxy(
+                self._worker_instance_type, queue, cv)
+        else:
+            self._worker_st = self._worker_instance_type(queue, cv)
         self._worker_thread_st = QThread()
         self._ctrl_widget_st = self._ctrl_instance_type(topic)
 
@@ -1,5 +1,8 @@
 import abc
 import unittest
+from unittest.mock import MagicMock
+
+from xarray import DataArray
 
 from extra_foam.gui.plot_widgets import TimedPlotWidgetF, TimedImageViewF
 
@@ -33,6 +36,20 @@ class _SpecialSuiteWindowTestBase(unittest.TestCase):
 
 
 class _SpecialSuiteProcessorTestBase:
+    @staticmethod
+    def _create_run(data):
+        """Mock a run which contains the given data array."""
+        run = MagicMock()
+        run.train_ids = list(range(len(data)))
+
+        def select_trains(selector):
+            ret = MagicMock()
+            ret.get_array.return_value = DataArray(data[selector.value])
+            return ret
+
+        run.select_trains.side_effect = select_trains
+        return run
+
     @abc.abstractmethod
     def _check_processed_data_structure(self, processed):
         raise NotImplementedError
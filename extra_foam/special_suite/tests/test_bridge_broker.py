@@ -0,0 +1,161 @@
+import unittest
+from unittest.mock import patch
+import os
+import os.path as osp
+import tempfile
+from threading import Thread
+import time
+
+import numpy as np
+
+from extra_foam.database import SourceCatalog
+from extra_foam.special_suite.bridge_broker import (
+    BridgeBroker, BridgeBrokerClient, broker_frontend, _runtime_dir
+)
+
+
+class _FakeBridgeClient:
+    n_requests = 0
+
+    def __init__(self, endpoint, timeout=None):
+        self._tid = 0
+
+    def next(self):
+        _FakeBridgeClient.n_requests += 1
+        self._tid += 1
+        tid = self._tid
+        raw = {
+            "A": {"ppt": np.full(10, tid)},
+            "B": {"ppt.value": tid},
+            "C:output": {"data": np.ones((4, 4))},
+        }
+        meta = {src: {"timestamp.tid": tid} for src in raw}
+        return raw, meta
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+
+def _create_catalog(sources):
+    catalog = SourceCatalog()
+    for name, ppt, ktype in sources:
+        catalog.add_item(None, name, None, ppt, None, None, ktype)
+    return catalog
+
+
+class TestBridgeBroker(unittest.TestCase):
+    def setUp(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self._frontend = f"ipc://{osp.join(self._tmp_dir.name, 'broker')}"
+
+        patcher = patch.object(BridgeBroker, "_client_instance_type",
+                               _FakeBridgeClient)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        _FakeBridgeClient.n_requests = 0
+        self._broker = BridgeBroker("tcp://localhost:12345",
+                                    frontend=self._frontend)
+        self._thread = Thread(target=self._broker.run)
+        self._thread.start()
+
+    def tearDown(self):
+        self._broker.stop()
+        self._thread.join()
+        self._tmp_dir.cleanup()
+
+    def _next(self, client, timeout=5.0):
+        t0 = time.monotonic()
+        while time.monotonic() - t0 < timeout:
+            try:
+                return client.next()
+            except TimeoutError:
+                continue
+        raise TimeoutError
+
+    def testGeneral(self):
+        catalog1 = _create_catalog([("A", "ppt", 0)])
+        catalog2 = _create_catalog([("B", "ppt", 0), ("C:output", "data", 1)])
+
+        with BridgeBrokerClient(self._frontend, catalog1, timeout=0.1) as c1, \
+                BridgeBrokerClient(self._frontend, catalog2, timeout=0.1) as c2:
+            # wait until both apps are registered
+            self._next(c1)
+            self._next(c2)
+            while len(self._broker._clients) < 2:
+                time.sleep(0.01)
+
+            for _ in range(5):
+                data1 = self._next(c1)
+                data2 = self._next(c2)
+
+                # each app sees only its sources
+                self.assertListEqual(["A ppt"], list(data1['raw']))
+                self.assertListEqual(["B ppt", "C:output data"],
+                                     sorted(data2['raw']))
+                self.assertListEqual(list(catalog1.keys()),
+                                     list(data1['catalog'].keys()))
+                tid = data1['processed'].tid
+                np.testing.assert_array_equal(np.full(10, tid),
+                                              data1['raw']['A ppt'])
+                self.assertEqual(tid, data1['meta']['A ppt']['train_id'])
+                self.assertEqual(data2['processed'].tid,
+                                 data2['raw']['B ppt'])
+
+            # the bridge is shared by the apps
+            self.assertLess(_FakeBridgeClient.n_requests, 5 * 2 + 4)
+
+        # apps which stopped requesting are forgotten
+        self._broker._CLIENT_EXPIRY = 0.1
+        time.sleep(0.5)
+        self.assertDictEqual({}, self._broker._clients)
+        self.assertDictEqual({}, self._broker._transformers)
+
+    def testMissingSource(self):
+        catalog1 = _create_catalog([("A", "ppt", 0)])
+        catalog2 = _create_catalog([("D", "ppt", 0)])
+
+        with BridgeBrokerClient(self._frontend, catalog1, timeout=0.1) as c1, \
+                BridgeBrokerClient(self._frontend, catalog2, timeout=0.1) as c2:
+            self._next(c1)
+            with self.assertRaises(TimeoutError):
+                c2.next()
+            while len(self._broker._clients) < 2:
+                time.sleep(0.01)
+            self.assertEqual(2, len(self._broker._transformers))
+
+            # the app whose sources are all found is not held up
+            for _ in range(5):
+                data1 = self._next(c1)
+                self.assertListEqual(["A ppt"], list(data1['raw']))
+
+            with self.assertRaises(TimeoutError):
+                c2.next()
+
+    def testIdleTimeout(self):
+        broker = BridgeBroker("tcp://localhost:12345",
+                              frontend=self._frontend + "_idle",
+                              idle_timeout=0.1)
+        t0 = time.monotonic()
+        broker.run()
+        self.assertLess(time.monotonic() - t0, 5.)
+
+    def testFrontend(self):
+        self.assertEqual(broker_frontend("tcp://localhost:12345"),
+                         broker_frontend("tcp://localhost:12345"))
+        self.assertNotEqual(broker_frontend("tcp://localhost:12345"),
+                            broker_frontend("tcp://localhost:12346"))
+
+    def testRuntimeDir(self):
+        with patch.dict(os.environ, {"XDG_RUNTIME_DIR": self._tmp_dir.name}):
+            os.chmod(self._tmp_dir.name, 0o700)
+            self.assertEqual(self._tmp_dir.name, _runtime_dir())
+            self.assertTrue(broker_frontend("tcp://localhost:12345")
+                            .startswith(f"ipc://{self._tmp_dir.name}"))
+
+            # accessible by others
+            os.chmod(self._tmp_dir.name, 0o755)
+            with self.assertRaises(PermissionError):
+                _runtime_dir()
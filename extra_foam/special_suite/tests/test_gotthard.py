@@ -1,10 +1,9 @@
 import unittest
-from unittest.mock import MagicMock, patch, PropertyMock
+from unittest.mock import patch, PropertyMock
 from collections import Counter
 
 import pytest
 import numpy as np
-from xarray import DataArray
 
 from PyQt5.QtCore import Qt
 from PyQt5.QtTest import QSignalSpy, QTest
@@ -195,23 +194,29 @@ class TestGotthardProcessor(_RawDataMixin, _SpecialSuiteProcessorTestBase):
         # nothing should happen
         proc.onLoadDarkRun("run/path")
 
-        data_collection = MagicMock()
-        load_run.return_value = data_collection
         with patch.object(proc.log, "error") as error:
-            # get_array returns a wrong shape
-            data_collection.get_array.return_value = DataArray(np.random.randn(4, 3))
+            # data has a wrong shape
+            load_run.return_value = self._create_run(np.random.randn(4, 3))
             proc.onLoadDarkRun("run/path")
+            proc._run_reducer_st.join()
             error.assert_called_once()
             assert "Data must be a 3D array" in error.call_args[0][0]
             error.reset_mock()
 
-            # get_array returns a correct shape
-            data_collection.get_array.return_value = DataArray(np.random.randn(4, 3, 2))
+            # data has a correct shape
+            data = np.random.randn(4, 3, 2)
+            load_run.return_value = self._create_run(data)
             with patch.object(proc.log, "info") as info:
                 proc.onLoadDarkRun("run/path")
-                info.assert_called_once()
-                assert "Found dark data with shape" in info.call_args[0][0]
+                proc._run_reducer_st.join()
+                # handed over in the processing thread
+                proc._applyReducedST()
+                assert "Found dark data with shape (4, 3, 2)" in info.call_args[0][0]
                 error.assert_not_called()
+            np.testing.assert_array_almost_equal(
+                data.mean(axis=0), proc._dark_ma, decimal=5)
+            np.testing.assert_array_almost_equal(
+                data.mean(axis=0).mean(axis=0), proc._dark_mean_ma, decimal=5)
 
     def testProcessingWhenRecordingDark(self):
         from extra_foam.special_suite.gotthard_proc import _PIXEL_DTYPE
@@ -1,15 +1,19 @@
-import unittest
-import unittest
-from unittest.mock import MagicMock, patch
+from unittest.mock import patch
 from collections import Counter
 
 import pytest
 import numpy as np
 
+from PyQt5.QtCore import Qt
+from PyQt5.QtTest import QTest
+
 from extra_foam.special_suite import logger, mkQApp
-from extra_foam.special_suite.module_scan_proc import ModuleScanProcessor
+from extra_foam.special_suite.module_scan_proc import (
+    ModuleScanProcessor, _merge_moments, _subtract_moments
+)
 from extra_foam.special_suite.module_scan_w import (
-    ModuleScanWindow
+    ModuleScanWindow, ModuleScanAsicImageView, ModuleScanHeatmap,
+    ModuleScanSaturationPlot
 )
 
 from . import _SpecialSuiteWindowTestBase, _SpecialSuiteProcessorTestBase
@@ -19,6 +23,21 @@ app = mkQApp()
 logger.setLevel('INFO')
 
 
+def _asic_moments(modules, asic_shape, saturation):
+    """Reference implementation of compute_asic_moments."""
+    data = np.stack(modules).astype(np.float64)
+    n_modules, n_pulses, h, w = data.shape
+    ah, aw = asic_shape
+    data = data.reshape(n_modules, n_pulses, h // ah, ah, w // aw, aw)
+    data = data.transpose(0, 2, 4, 1, 3, 5).reshape(
+        n_modules, h // ah, w // aw, -1)
+    mean = data.mean(axis=-1)
+    return np.stack([np.full(mean.shape, data.shape[-1], dtype=np.float64),
+                     mean,
+                     ((data - mean[..., None]) ** 2).sum(axis=-1),
+                     (data >= saturation).sum(axis=-1)], axis=-1)
+
+
 class TestModuleScan(_SpecialSuiteWindowTestBase):
     @classmethod
     def setUpClass(cls):
@@ -29,31 +48,199 @@ class TestModuleScan(_SpecialSuiteWindowTestBase):
         # explicitly close the MainGUI to avoid error in GuiLogger
         cls._win.close()
 
+    @staticmethod
+    def data4visualization(n_modules=4, n_bins=5):
+        """Override."""
+        return {
+            "asic_mean": np.ones((8, 2 * n_modules)),
+            "asic_std": np.ones((8, 2 * n_modules)),
+            "centers": np.arange(n_bins),
+            "counts": np.arange(n_bins),
+            "module_mean": np.ones((n_modules, n_bins)),
+            "module_std": np.ones((n_modules, n_bins)),
+            "module_saturated": np.ones((n_modules, n_bins)),
+        }
+
     def testWindow(self):
         win = self._win
 
-        self.assertEqual(1, len(win._plot_widgets_st))
+        self.assertEqual(4, len(win._plot_widgets_st))
         counter = Counter()
         for key in win._plot_widgets_st:
             counter[key.__class__] += 1
 
-        # self.assertEqual(1, counter[GotthardImageView])
-        # self.assertEqual(1, counter[GotthardAvgPlot])
-        # self.assertEqual(1, counter[GotthardPulsePlot])
-        # self.assertEqual(1, counter[GotthardHist])
-        #
-        # win.updateWidgetsST()
+        self.assertEqual(1, counter[ModuleScanAsicImageView])
+        self.assertEqual(2, counter[ModuleScanHeatmap])
+        self.assertEqual(1, counter[ModuleScanSaturationPlot])
+
+        self._check_update_plots()
 
     def testCtrl(self):
+        from extra_foam.special_suite.module_scan_proc import (
+            _DEFAULT_ASIC_SHAPE, _DEFAULT_BIN_RANGE, _DEFAULT_N_BINS,
+            _DEFAULT_N_MODULES, _DEFAULT_SATURATION
+        )
+
         win = self._win
-        widget = win._ctrl_widget_st
+        ctrl_widget = win._ctrl_widget_st
         proc = win._worker_st
 
+        # test default values
+        self.assertTrue(proc._det_src)
+        self.assertTrue(proc._det_ppt)
+        self.assertTrue(proc._scan_device_id)
+        self.assertTrue(proc._scan_ppt)
+        self.assertEqual(_DEFAULT_N_MODULES, proc._n_modules)
+        self.assertTupleEqual(
+            tuple(int(v) for v in _DEFAULT_ASIC_SHAPE.split(',')),
+            proc._asic_shape)
+        self.assertEqual(_DEFAULT_SATURATION, proc._saturation)
+        self.assertTupleEqual(
+            tuple(float(v) for v in _DEFAULT_BIN_RANGE.split(',')),
+            proc._bin_range)
+        self.assertEqual(_DEFAULT_N_BINS, proc._n_bins)
 
-class TestModuleScanProcessor:
+        # test set new values
+
+        widget = ctrl_widget.asic_shape_le
+        widget.clear()
+        QTest.keyClicks(widget, "32, 16")
+        QTest.keyPress(widget, Qt.Key_Enter)
+        self.assertTupleEqual((32, 16), proc._asic_shape)
+
+        widget = ctrl_widget.n_modules_le
+        widget.clear()
+        QTest.keyClicks(widget, "4")
+        QTest.keyPress(widget, Qt.Key_Enter)
+        self.assertEqual(4, proc._n_modules)
+
+        widget = ctrl_widget.bin_range_le
+        widget.clear()
+        QTest.keyClicks(widget, "-1, 1")
+        QTest.keyPress(widget, Qt.Key_Enter)
+        self.assertTupleEqual((-1, 1), proc._bin_range)
+
+        widget = ctrl_widget.n_bins_le
+        widget.clear()
+        QTest.keyClicks(widget, "1000")
+        QTest.keyPress(widget, Qt.Key_Enter)
+        self.assertEqual(100, proc._n_bins)  # maximum is 999
+
+
+class TestModuleScanProcessor(_SpecialSuiteProcessorTestBase):
     @pytest.fixture(autouse=True)
     def setUp(self):
         self._proc = ModuleScanProcessor(object(), object())
+        self._proc._det_src = "DET/*CH0:xtdf"
+        self._proc._det_ppt = "image.data"
+        self._proc._n_modules = 4
+        self._proc._asic_shape = (4, 8)
+        self._proc._saturation = 2.
+        self._proc._scan_device_id = "motor"
+        self._proc._scan_ppt = "position"
+
+    def _data(self, tid, scan_value):
+        raw = {f"DET/{i}CH0:xtdf image.data":
+               np.random.randn(5, 8, 16).astype(np.float32) + i
+               for i in range(4)}
+        raw["motor position"] = scan_value
+        return {"raw": raw, "meta": {"motor position": {"train_id": tid}}}
+
+    def testSources(self):
+        assert self._proc.sources() == [
+            ("DET/0CH0:xtdf", "image.data", 1),
+            ("DET/1CH0:xtdf", "image.data", 1),
+            ("DET/2CH0:xtdf", "image.data", 1),
+            ("DET/3CH0:xtdf", "image.data", 1),
+            ("motor", "position", 0),
+        ]
+
+    def testMergeMoments(self):
+        data = [np.random.randn(5, 8, 16) for _ in range(4)]
+        moments = np.stack([_asic_moments([d], (4, 8), 1.) for d in data])
+
+        merged = _merge_moments(moments, np.array([1, -1, 1, 0]), 3)
+        np.testing.assert_array_almost_equal(
+            _asic_moments([np.concatenate([data[0], data[2]])], (4, 8), 1.),
+            merged[1])
+        np.testing.assert_array_almost_equal(
+            _asic_moments([data[3]], (4, 8), 1.), merged[0])
+        # empty bin
+        np.testing.assert_array_equal(0, merged[2, ..., 0])
+        assert np.isnan(merged[2, ..., 1]).all()
+
+    def testSubtractMoments(self):
+        data = [np.random.randn(5, 8, 16) for _ in range(3)]
+        moments = np.stack([_asic_moments([d], (4, 8), 1.) for d in data])
+
+        merged = _merge_moments(moments, np.array([0, 0, 0]), 1)[0]
+        np.testing.assert_array_almost_equal(
+            _merge_moments(moments[1:], np.array([0, 0]), 1)[0],
+            _subtract_moments(merged, moments[0]))
+
+        # nothing is left
+        rest = _subtract_moments(moments[0], moments[0])
+        np.testing.assert_array_equal(0, rest[..., [0, 2, 3]])
+        assert np.isnan(rest[..., 1]).all()
+
+    @patch("extra_foam.special_suite.module_scan_proc.compute_asic_moments",
+           side_effect=_asic_moments)
+    def testProcessing(self, compute_asic_moments):
+        proc = self._proc
+        proc._n_bins = 4
+
+        train_data = [self._data(i, i % 5) for i in range(20)]
+        with patch.object(proc.log, "info"):
+            for data in train_data:
+                processed = proc.process(data)
+
+        assert processed["asic_mean"].shape == (2, 8)
+        np.testing.assert_array_equal([0.5, 1.5, 2.5, 3.5], processed["centers"])
+        np.testing.assert_array_equal([4, 4, 4, 8], processed["counts"])
+
+        # compare with the statistics of the module data in each bin
+        edges = np.linspace(0, 4, 5)
+        for b in range(4):
+            in_bin = [data["raw"] for data in train_data
+                      if edges[b] <= data["raw"]["motor position"] <=
+                      edges[b + 1] and (b == 3 or data["raw"][
+                          "motor position"] < edges[b + 1])]
+            for i in range(4):
+                v = np.concatenate([raw[f"DET/{i}CH0:xtdf image.data"]
+                                    for raw in in_bin]).astype(np.float64)
+                np.testing.assert_almost_equal(
+                    v.mean(), processed["module_mean"][i, b])
+                np.testing.assert_almost_equal(
+                    v.std(), processed["module_std"][i, b], decimal=5)
+                np.testing.assert_almost_equal(
+                    np.sum(v >= 2.) / len(in_bin),
+                    processed["module_saturated"][i, b])
+
+        # re-binning the history gives the same result as incremental
+        # binning
+        bin_moments = proc._bin_moments.copy()
+        proc._new_binning()
+        np.testing.assert_array_almost_equal(bin_moments, proc._bin_moments)
+
+        proc.reset()
+        assert proc._scan is None
+        assert proc._bin_moments is None
+
+    @patch("extra_foam.special_suite.module_scan_proc.compute_asic_moments",
+           side_effect=_asic_moments)
+    def testProcessingFullHistory(self, compute_asic_moments):
+        proc = self._proc
+        proc._n_bins = 4
+        proc._MAX_TRAINS = 6
+
+        with patch.object(proc.log, "info"):
+            for i in range(20):
+                processed = proc.process(self._data(i, i % 5))
 
-    def testGeneral(self):
-        pass
+        # the trains dropped from the history are removed from the bins
+        assert len(proc._scan) == 6
+        np.testing.assert_array_equal([1, 1, 1, 3], processed["counts"])
+        bin_moments = proc._bin_moments.copy()
+        proc._new_binning()
+        np.testing.assert_array_equal([1, 1, 1, 3], proc._counts)
+        np.testing.assert_array_almost_equal(bin_moments, proc._bin_moments)
@@ -38,7 +38,14 @@ class TestMultiCamViewWindow(_SpecialSuiteWindowTestBase):
         """Override."""
         return {
             "channels": {0: "camera1", 1: None, 2: None, 3: "camera2"},
-            "images": {0: np.ones((4, 5)), 1: None, 2: None, 3: np.ones((5, 6))}
+            "images": {
+                0: {"image": np.ones((4, 5)), "scale": 1, "levels": (1, 1),
+                    "histogram": (np.array([20]), np.array([1.]))},
+                1: None,
+                2: None,
+                3: {"image": np.ones((5, 6)), "scale": 2, "levels": (1, 1),
+                    "histogram": (None, None)},
+            }
         }
 
     def testWindow(self):
@@ -76,6 +83,13 @@ class TestMultiCamViewWindow(_SpecialSuiteWindowTestBase):
             QTest.keyPress(widget, Qt.Key_Enter)
             self.assertEqual(f"new/property{i}", proc._properties[i])
 
+        # display shapes are passed to the worker
+        for i, view in enumerate(win._views):
+            self.assertTupleEqual(view.displayShape(),
+                                  proc._display_shapes[i])
+            view.display_shape_changed_sgn.emit((300, 400 + i))
+            self.assertTupleEqual((300, 400 + i), proc._display_shapes[i])
+
 
 class TestMultiCamViewProcessor(_RawDataMixin, _SpecialSuiteProcessorTestBase):
     @pytest.fixture(autouse=True)
@@ -98,17 +112,65 @@ class TestMultiCamViewProcessor(_RawDataMixin, _SpecialSuiteProcessorTestBase):
             "camera3:output": [("data.adc", np.ones((4, 4, 1)))]
         })
 
+        executor = proc._executor
         processed = proc.process(data)
         self._check_processed_data_structure(processed)
+        # the thread pool is shared by trains
+        assert executor is proc._executor
 
         for i, gt in enumerate(proc._output_channels):
             assert gt == processed["channels"][i]
 
         assert processed["images"][0] is None
         assert processed["images"][1] is None
-        np.testing.assert_array_equal(np.ones((3, 3)), processed["images"][2])
-        np.testing.assert_array_equal(np.ones((4, 4)), processed["images"][3])
-        assert np.float32 == processed["images"][3].dtype
+        np.testing.assert_array_equal(np.ones((3, 3)),
+                                      processed["images"][2]["image"])
+        np.testing.assert_array_equal(np.ones((4, 4)),
+                                      processed["images"][3]["image"])
+        assert np.float32 == processed["images"][3]["image"].dtype
+        assert 1 == processed["images"][3]["scale"]
+        assert (1, 1) == processed["images"][3]["levels"]
+
+    @patch("extra_foam.special_suite.special_analysis_base.QThreadWorker.runForeverST")
+    def testShutdownExecutor(self, run_forever):
+        proc = self._proc
+        proc.runForeverST()
+        run_forever.assert_called_once()
+        with pytest.raises(RuntimeError):
+            proc._executor.submit(print)
+
+    @pytest.mark.parametrize("shape, display_shape, factor",
+                             [((2048, 2048), None, 1),
+                              ((2048, 2048), (0, 0), 1),
+                              ((2048, 2048), (4096, 4096), 1),
+                              ((2048, 2048), (500, 1000), 2),
+                              ((2048, 1024), (500, 300), 3)])
+    def testDownsamplingFactor(self, shape, display_shape, factor):
+        assert factor == self._proc._downsampling_factor(shape, display_shape)
+
+    @patch("extra_foam.special_suite.multicam_view_proc.downsample_image")
+    def testDownsampling(self, downsample_image):
+        proc = self._proc
+
+        proc._output_channels = ["camera1:output", "camera2:output", "", ""]
+        proc._properties = ["data.pixel", "data.pixel", "", ""]
+        proc._display_shapes = [(512, 512), None, None, None]
+
+        downsample_image.side_effect = lambda img, factor: img[::factor, ::factor]
+
+        img = np.arange(2048 * 2048, dtype=np.float32).reshape(2048, 2048)
+        data = self._gen_data(1234, {
+            "camera1:output": [("data.pixel", img)],
+            "camera2:output": [("data.pixel", img)],
+        })
+
+        processed = proc.process(data)
+        assert 4 == processed["images"][0]["scale"]
+        assert (512, 512) == processed["images"][0]["image"].shape
+        assert 1 == processed["images"][1]["scale"]
+        assert (2048, 2048) == processed["images"][1]["image"].shape
+        hist, centers = processed["images"][0]["histogram"]
+        assert len(hist) == len(centers)
 
     def _check_processed_data_structure(self, ret):
         """Override."""
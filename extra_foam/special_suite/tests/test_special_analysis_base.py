@@ -1,6 +1,10 @@
 import unittest
 from unittest.mock import MagicMock, patch
 import functools
+from threading import Condition, Thread
+import time
+
+from queue import Empty
 
 import numpy as np
 
@@ -8,14 +12,17 @@ from PyQt5.QtCore import Qt
 from PyQt5.QtTest import QSignalSpy, QTest
 from PyQt5.QtWidgets import QWidget
 
+from extra_foam.pipeline.f_queue import SimpleQueue
 from extra_foam.pipeline.tests import _RawDataMixin
 
 from extra_foam.special_suite import logger, mkQApp
 from extra_foam.gui.plot_widgets import ImageViewF, PlotWidgetF
 from extra_foam.special_suite.special_analysis_base import (
     _BaseAnalysisCtrlWidgetS, _SpecialAnalysisBase, create_special,
-    QThreadKbClient, QThreadFoamClient, QThreadWorker
+    ProcessingError, ProcessWorkerProxy, QThreadKbClient, QThreadFoamClient,
+    QThreadWorker, _RunReducer
 )
+from extra_foam.special_suite.tests import _SpecialSuiteProcessorTestBase
 
 
 app = mkQApp()
@@ -23,6 +30,25 @@ app = mkQApp()
 logger.setLevel('CRITICAL')
 
 
+class _ScaleProcessor(QThreadWorker):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        self._scale = 1
+
+    def onScaleChanged(self, value):
+        self._scale = value
+
+    def process(self, data):
+        """Override."""
+        if data["raw"] is None:
+            raise ProcessingError("raw data not found")
+        return {"image": self._scale * data["raw"], "tid": data["tid"]}
+
+    def sources(self):
+        return [("device1:output", "property1", 1)]
+
+
 class testSpecialAnalysisBase(_RawDataMixin, unittest.TestCase):
     @classmethod
     def setUpClass(cls):
@@ -365,3 +391,111 @@ class testSpecialAnalysisBase(_RawDataMixin, unittest.TestCase):
         worker._roi_geom_st = (-5, -6, 2, 3)
         roi = worker.getRoiData(img)
         np.testing.assert_array_equal(np.empty((3, 0, 0)), roi)
+
+
+class TestRunReducer(unittest.TestCase):
+    def testReduce(self):
+        data = np.random.randn(13, 4, 3).astype(np.float32)
+        run = _SpecialSuiteProcessorTestBase._create_run(data)
+        finished = MagicMock()
+        log = MagicMock()
+
+        # chunk size is bounded by the size of data in float64
+        with patch.object(_RunReducer, "_MAX_CHUNK_BYTES", 3 * data[0].size * 8):
+            reducer = _RunReducer(run, "src", "ppt", finished, log, ndim=3)
+            mean, var, shape = reducer.reduce()
+        self.assertTupleEqual((13, 4, 3), shape)
+        np.testing.assert_array_almost_equal(data.mean(axis=0), mean)
+        np.testing.assert_array_almost_equal(data.var(axis=0), var)
+        # the trains are read in chunks
+        self.assertEqual(1 + 4, run.select_trains.call_count)
+        # progress reported
+        self.assertIn("100%", log.info.call_args[0][0])
+
+        # run in a thread
+        reducer = _RunReducer(run, "src", "ppt", finished, log, ndim=3)
+        reducer.start()
+        reducer.join()
+        finished.assert_called_once()
+
+        # wrong dimension
+        log.reset_mock()
+        reducer = _RunReducer(run, "src", "ppt", finished, log, ndim=2)
+        reducer.start()
+        reducer.join()
+        log.error.assert_called_once()
+        self.assertIn("Data must be a 2D array! Actual shape: (13, 4, 3)",
+                      log.error.call_args[0][0])
+
+        # empty run
+        log.reset_mock()
+        reducer = _RunReducer(_SpecialSuiteProcessorTestBase._create_run(
+            data[:0]), "src", "ppt", finished, log)
+        reducer.start()
+        reducer.join()
+        log.error.assert_called_once()
+
+        # aborted
+        reducer = _RunReducer(run, "src", "ppt", finished, log)
+        reducer.abort()
+        self.assertIsNone(reducer.reduce())
+
+
+class TestProcessWorkerProxy(unittest.TestCase):
+    def _get_output(self, worker, timeout=5.0):
+        t0 = time.monotonic()
+        while time.monotonic() - t0 < timeout:
+            try:
+                return worker.getOutputDataST()
+            except Empty:
+                time.sleep(0.01)
+        raise TimeoutError
+
+    def testGeneral(self):
+        queue = SimpleQueue(maxsize=1)
+        cv = Condition()
+        worker = ProcessWorkerProxy(_ScaleProcessor, queue, cv)
+        worker.log = MagicMock()
+        thread = Thread(target=worker.runForeverST)
+        thread.start()
+
+        try:
+            # queries are answered by the local worker
+            self.assertListEqual([("device1:output", "property1", 1)],
+                                 worker.sources())
+
+            # slot calls are forwarded
+            worker.onScaleChanged(2)
+            self.assertEqual(2, worker._scale)
+
+            # methods which cannot be forwarded
+            with self.assertRaises(AttributeError):
+                worker.process({})
+
+            img = np.random.rand(64, 64)
+            for tid in range(3):
+                queue.put_pop({"raw": img, "tid": tid})
+                with cv:
+                    cv.notify()
+                processed = self._get_output(worker)
+                self.assertEqual(tid, processed["tid"])
+                np.testing.assert_array_equal(2 * img, processed["image"])
+
+            # log messages are forwarded
+            queue.put_pop({"raw": None, "tid": 3})
+            with cv:
+                cv.notify()
+            t0 = time.monotonic()
+            while not worker.log.error.called and time.monotonic() - t0 < 5:
+                time.sleep(0.01)
+            self.assertIn("raw data not found",
+                          worker.log.error.call_args[0][0])
+
+            worker.onResetST()
+            with self.assertRaises(Empty):
+                worker.getOutputDataST()
+        finally:
+            worker.terminateRunST()
+            thread.join()
+
+        self.assertFalse(worker._process_st.is_alive())
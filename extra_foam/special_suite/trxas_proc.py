@@ -252,32 +252,15 @@ class TrXasProcessor(QThreadWorker, _BinMixin):
         return roi1, roi2, roi3, a13, a23, a21, s1, s2
 
     def _new_1d_binning(self):
-        self._a13_stats, _, _ = compute_spectrum_1d(
+        stats, edges, counts = compute_spectrum_1d(
             self._slow1.data(),
-            self._a13.data(),
-            n_bins=self._n_bins1,
-            bin_range=self._actual_range1,
-            edge2center=False,
-            nan_to_num=True
-        )
-
-        self._a23_stats, _, _ = compute_spectrum_1d(
-            self._slow1.data(),
-            self._a23.data(),
-            n_bins=self._n_bins1,
-            bin_range=self._actual_range1,
-            edge2center=False,
-            nan_to_num=True
-        )
-
-        self._a21_stats, edges, counts = compute_spectrum_1d(
-            self._slow1.data(),
-            self._a21.data(),
+            np.stack([self._a13.data(), self._a23.data(), self._a21.data()]),
             n_bins=self._n_bins1,
             bin_range=self._actual_range1,
             edge2center=False,
             nan_to_num=True
         )
+        self._a13_stats, self._a23_stats, self._a21_stats = stats
         self._edges1 = edges
         self._counts1 = counts
 
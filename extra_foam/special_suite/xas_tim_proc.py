@@ -10,7 +10,7 @@ All rights reserved.
 import numpy as np
 
 from extra_foam.algorithms import (
-    compute_spectrum_1d, SimpleSequence, SimplePairSequence
+    SimpleSequence, SimplePairSequence, StreamingSpectrum
 )
 
 from .special_analysis_base import ProcessingError, profiler, QThreadWorker
@@ -51,6 +51,11 @@ class XasTimProcessor(QThreadWorker):
             for each digitizer channel.
         _energy (SimpleSequence): Store pulse energies.
         _energy_scan (SimplePairSequence): A sequence of (train ID, energy).
+        _spectrum (StreamingSpectrum): Incremental spectra of the filtered
+            pulses. The columns are apd data of MCP 1 - 4 and the XGM
+            intensity.
+        _spectrum_threshold (float): I0 threshold applied to the pulses
+            in _spectrum.
     """
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -81,6 +86,9 @@ class XasTimProcessor(QThreadWorker):
 
         self._energy_scan = SimplePairSequence(max_len=_MAX_WINDOW)
 
+        self._spectrum = StreamingSpectrum(5, max_len=_MAX_WINDOW)
+        self._spectrum_threshold = None
+
     def onXgmOutputChannelChanged(self, ch: str):
         self._xgm_output_channel = ch
 
@@ -174,40 +182,56 @@ class XasTimProcessor(QThreadWorker):
         for i, apd in enumerate(digitizer_apds):
             if self._digitizer_channels[i]:
                 self._i1[i].extend(apd)
-        self._energy.extend([energy] * len(xgm_intensity))
+        self._energy.extend(np.full(len(xgm_intensity), energy))
 
         self._energy_scan.append((tid, energy))
 
         return tid, xgm_intensity, digitizer_apds, energy
 
+    def _update_spectrum(self, xgm_intensity, digitizer_apds, energy):
+        threshold = self._i0_threshold
+        if threshold != self._spectrum_threshold:
+            # re-filter the whole data history
+            self._spectrum.reset()
+            self._spectrum_threshold = threshold
+            xgm_intensity = self._i0.data()
+            digitizer_apds = [item.data() if self._digitizer_channels[i]
+                              else None for i, item in enumerate(self._i1)]
+            energy = self._energy.data()
+        else:
+            energy = np.full(len(xgm_intensity), energy)
+
+        flt = xgm_intensity > threshold
+        # data of the channels which are not selected are not used
+        ys = [np.zeros(np.count_nonzero(flt)) if apd is None else apd[flt]
+              for apd in digitizer_apds]
+        ys.append(xgm_intensity[flt])
+
+        self._spectrum.window = self._window
+        self._spectrum.extend(energy[flt], ys)
+
     @profiler("XAS-TIM Processor")
     def process(self, data):
         """Override."""
         tid, xgm_intensity, digitizer_apds, energy = \
             self._update_data_history(data)
 
-        # apply filter
-        flt = self._i0.data() > self._i0_threshold
-        i0 = self._i0.data()[flt][-self._window:]
-        i1 = [None] * 4
-        for i, _item in enumerate(self._i1):
-            if self._digitizer_channels[i]:
-                i1[i] = _item.data()[flt][-self._window:]
-        energy = self._energy.data()[flt][-self._window:]
+        # apply filter and update spectra with the new pulses
+        self._update_spectrum(xgm_intensity, digitizer_apds, energy)
+        # Only the pulses in the correlation window are displayed. They are
+        # copied since the history will be updated by the next train.
+        _, ys = self._spectrum.data()
+        ys = ys[:, -self._correlation_window:]
+        i0 = ys[-1].copy()
+        i1 = [ys[i].copy() if self._digitizer_channels[i] else None
+              for i in range(4)]
 
         # compute spectra
-        stats = []
-        for i, item in enumerate(i1):
-            if self._digitizer_channels[i]:
-                mcp_stats, _, _ = compute_spectrum_1d(
-                    energy, item, n_bins=self._n_bins)
-                stats.append(mcp_stats)
-            else:
-                # Do not calculate spectrum which is not requested to display
-                stats.append(None)
-
-        i0_stats, centers, counts = compute_spectrum_1d(
-            energy, i0, n_bins=self._n_bins)
+        all_stats, centers, counts = self._spectrum.spectra(self._n_bins)
+        # Do not calculate spectrum which is not requested to display
+        stats = [all_stats[i] if self._digitizer_channels[i] else None
+                 for i in range(4)]
+        i0_stats = all_stats[-1]
         for i, _item in enumerate(stats):
             if _item is not None:
                 if i < 3:
@@ -236,3 +260,5 @@ class XasTimProcessor(QThreadWorker):
             item.reset()
         self._energy.reset()
         self._energy_scan.reset()
+        self._spectrum.reset()
+        self._spectrum_threshold = None
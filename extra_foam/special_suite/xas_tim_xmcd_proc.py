@@ -63,7 +63,7 @@ class XasTimXmcdProcessor(XasTimProcessor):
 
         current = self.getPropertyData(
             data['raw'], self._magnet_device_id, self._magnet_ppt)
-        self._current.extend([current] * len(xgm_intensity))
+        self._current.extend(np.full(len(xgm_intensity), current))
         self._current_scan.append((tid, current))
 
         # apply filters
@@ -83,25 +83,21 @@ class XasTimXmcdProcessor(XasTimProcessor):
         p_flt = current > 0
         n_flt = current < 0
         e_p, e_n = energy[p_flt], energy[n_flt]
-        stats = []
-        for i, _item in enumerate(i1):
-            if self._digitizer_channels[i]:
-                mcp_stats_p, _, _ = compute_spectrum_1d(
-                    e_p, _item[p_flt], n_bins=self._n_bins)
-                mcp_stats_n, _, _ = compute_spectrum_1d(
-                    e_n, _item[n_flt], n_bins=self._n_bins)
-                stats.append([mcp_stats_p, mcp_stats_n])
-            else:
-                # Do not calculate spectrum which is not requested to display
-                stats.append((None, None))
-
-        i0_stats_p, _, _ = compute_spectrum_1d(
-            e_p, i0[p_flt], n_bins=self._n_bins)
-        i0_stats_n, _, _ = compute_spectrum_1d(
-            e_n, i0[n_flt], n_bins=self._n_bins)
+        channels = [i for i in range(4) if self._digitizer_channels[i]]
+        ys = np.stack([i1[i] for i in channels] + [i0])
+        stats_p, _, _ = compute_spectrum_1d(
+            e_p, ys[:, p_flt], n_bins=self._n_bins)
+        stats_n, _, _ = compute_spectrum_1d(
+            e_n, ys[:, n_flt], n_bins=self._n_bins)
+        i0_stats_p, i0_stats_n = stats_p[-1], stats_n[-1]
         i0_stats, centers, counts = compute_spectrum_1d(
             energy, i0, n_bins=self._n_bins)
 
+        # Do not calculate spectrum which is not requested to display
+        stats = [(None, None)] * 4
+        for j, i in enumerate(channels):
+            stats[i] = [stats_p[j], stats_n[j]]
+
         for i, (p, n) in enumerate(stats):
             if p is not None:
                 if i < 3:
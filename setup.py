@@ -272,6 +272,7 @@ setup(
             'extra-foam-special-suite=extra_foam.special_suite.services:application',
             'extra-foam-kill=extra_foam.services:kill_application',
             'extra-foam-stream=extra_foam.services:stream_file',
+            'extra-foam-batch=extra_foam.offline.batch_runner:batch_process',
             'extra-foam-redis-cli=extra_foam.services:start_redis_client',
             'extra-foam-monitor=extra_foam.web.monitor:web_monitor'
         ],
@@ -204,4 +204,37 @@ PYBIND11_MODULE(imageproc, m)
   FOAM_CORRECT_GAIN_AND_OFFSET_IMPL(float, 2)
   FOAM_CORRECT_GAIN_AND_OFFSET_IMPL(double, 3)
   FOAM_CORRECT_GAIN_AND_OFFSET_IMPL(float, 3)
+
+  //
+  // downsampling
+  //
+
+  // The GIL is released so that images can be downsampled in parallel
+  // threads in Python.
+#define FOAM_DOWNSAMPLE_IMAGE_IMPL(VALUE_TYPE)                                              \
+  m.def("downsampleImage", &downsampleImage<xt::pytensor<VALUE_TYPE, 2>>,                   \
+    py::arg("src").noconvert(), py::arg("factor"),                                          \
+    py::call_guard<py::gil_scoped_release>());
+
+  FOAM_DOWNSAMPLE_IMAGE_IMPL(double)
+  FOAM_DOWNSAMPLE_IMAGE_IMPL(float)
+  FOAM_DOWNSAMPLE_IMAGE_IMPL(uint16_t)
+  FOAM_DOWNSAMPLE_IMAGE_IMPL(uint8_t)
+
+  //
+  // rendering
+  //
+
+#define FOAM_MAP_IMAGE_TO_COLOR_IMPL(VALUE_TYPE)                                            \
+  m.def("mapImageToColor",                                                                  \
+    &mapImageToColor<xt::pytensor<VALUE_TYPE, 2>, xt::pytensor<uint32_t, 1>,                 \
+                     xt::pytensor<uint32_t, 2>>,                                            \
+    py::arg("src").noconvert(), py::arg("lb"), py::arg("ub"),                               \
+    py::arg("lut").noconvert(), py::arg("nan_color"), py::arg("out").noconvert(),          \
+    py::call_guard<py::gil_scoped_release>());
+
+  FOAM_MAP_IMAGE_TO_COLOR_IMPL(double)
+  FOAM_MAP_IMAGE_TO_COLOR_IMPL(float)
+  FOAM_MAP_IMAGE_TO_COLOR_IMPL(uint16_t)
+  FOAM_MAP_IMAGE_TO_COLOR_IMPL(uint8_t)
 }
@@ -7,6 +7,7 @@
  * Copyright (C) European X-Ray Free-Electron Laser Facility GmbH.
  * All rights reserved.
  */
+#include <array>
 #include <vector>
 
 #include "pybind11/pybind11.h"
@@ -55,4 +56,78 @@ PYBIND11_MODULE(statistics, m)
   FOAM_NAN_REDUCER(nansum)
   FOAM_NAN_REDUCER(nanmean)
 
+#define FOAM_NAN_VAR_IMP(NAME, FUNCTOR, VALUE_TYPE, N_DIM)                                         \
+  m.def(NAME, [] (const xt::pytensor<VALUE_TYPE, N_DIM>& src, const std::vector<int>& axis,       \
+                  bool normalized)                                                                \
+  {                                                                                               \
+    return FUNCTOR(src, axis, normalized);                                                        \
+  }, py::arg("src").noconvert(), py::arg("axis"), py::arg("normalized") = false);                 \
+  m.def(NAME, [] (const xt::pytensor<VALUE_TYPE, N_DIM>& src, int axis, bool normalized)          \
+  {                                                                                               \
+    return FUNCTOR(src, std::vector<int>{axis}, normalized);                                      \
+  }, py::arg("src").noconvert(), py::arg("axis"), py::arg("normalized") = false);                 \
+  m.def(NAME, [] (const xt::pytensor<VALUE_TYPE, N_DIM>& src, bool normalized)                    \
+  {                                                                                               \
+    return FUNCTOR(src, normalized);                                                              \
+  }, py::arg("src").noconvert(), py::arg("normalized") = false);
+
+#define FOAM_NAN_VAR_ALL_DIMENSIONS(NAME, FUNCTOR, VALUE_TYPE)                                    \
+  FOAM_NAN_VAR_IMP(NAME, FUNCTOR, VALUE_TYPE, 1)                                                  \
+  FOAM_NAN_VAR_IMP(NAME, FUNCTOR, VALUE_TYPE, 2)                                                  \
+  FOAM_NAN_VAR_IMP(NAME, FUNCTOR, VALUE_TYPE, 3)                                                  \
+  FOAM_NAN_VAR_IMP(NAME, FUNCTOR, VALUE_TYPE, 4)                                                  \
+  FOAM_NAN_VAR_IMP(NAME, FUNCTOR, VALUE_TYPE, 5)
+
+#define FOAM_NAN_VAR(NAME, FUNCTOR)                                                               \
+  FOAM_NAN_VAR_ALL_DIMENSIONS(NAME, FUNCTOR, float)                                               \
+  FOAM_NAN_VAR_ALL_DIMENSIONS(NAME, FUNCTOR, double)
+
+  FOAM_NAN_VAR("nanvar", nanVar)
+  FOAM_NAN_VAR("nanstd", nanStd)
+
+#define FOAM_NANHIST_WITH_STATS_IMP(VALUE_TYPE, N_DIM)                                          \
+  m.def("nanhistWithStats", &nanhistWithStats<xt::pytensor<VALUE_TYPE, N_DIM>>,                 \
+        py::arg("src").noconvert(), py::arg("lb"), py::arg("ub"), py::arg("n_bins"));
+
+#define FOAM_NANHIST_WITH_STATS(VALUE_TYPE)                                                     \
+  FOAM_NANHIST_WITH_STATS_IMP(VALUE_TYPE, 1)                                                    \
+  FOAM_NANHIST_WITH_STATS_IMP(VALUE_TYPE, 2)                                                    \
+  FOAM_NANHIST_WITH_STATS_IMP(VALUE_TYPE, 3)
+
+  FOAM_NANHIST_WITH_STATS(float)
+  FOAM_NANHIST_WITH_STATS(double)
+
+#define FOAM_IMAGE_HISTOGRAM(VALUE_TYPE)                                                        \
+  m.def("imageHistogram", &imageHistogram<xt::pytensor<VALUE_TYPE, 2>>,                         \
+        py::arg("src").noconvert(), py::arg("n_bins"));
+
+  FOAM_IMAGE_HISTOGRAM(float)
+  FOAM_IMAGE_HISTOGRAM(double)
+
+#define FOAM_ROI_FOMS(VALUE_TYPE)                                                               \
+  m.def("roiFoms", &roiFoms<xt::pytensor<VALUE_TYPE, 3>, xt::pytensor<bool, 2>>,                \
+        py::arg("src").noconvert(), py::arg("image_mask").noconvert(),                          \
+        py::arg("lb"), py::arg("ub"), py::arg("rects"), py::arg("fom_types"));                  \
+  m.def("roiFoms", &roiFoms<xt::pytensor<VALUE_TYPE, 3>>,                                       \
+        py::arg("src").noconvert(), py::arg("lb"), py::arg("ub"),                               \
+        py::arg("rects"), py::arg("fom_types"));
+
+  FOAM_ROI_FOMS(float)
+  FOAM_ROI_FOMS(double)
+
+#define FOAM_ASIC_MOMENTS(VALUE_TYPE)                                                           \
+  m.def("asicMoments",                                                                          \
+        (xt::xtensor<double, 4> (*)(const xt::pytensor<VALUE_TYPE, 4>&,                         \
+                                    const std::array<int, 2>&, double))                         \
+        &asicMoments<xt::pytensor<VALUE_TYPE, 4>>,                                              \
+        py::arg("src").noconvert(), py::arg("asic_shape"), py::arg("saturation"));              \
+  m.def("asicMoments",                                                                          \
+        (xt::xtensor<double, 4> (*)(const std::vector<xt::pytensor<VALUE_TYPE, 3>>&,            \
+                                    const std::array<int, 2>&, double))                         \
+        &asicMoments<xt::pytensor<VALUE_TYPE, 3>>,                                              \
+        py::arg("src"), py::arg("asic_shape"), py::arg("saturation"));
+
+  FOAM_ASIC_MOMENTS(float)
+  FOAM_ASIC_MOMENTS(double)
+
 }
@@ -10,7 +10,12 @@
 #ifndef EXTRA_FOAM_IMAGE_PROC_H
 #define EXTRA_FOAM_IMAGE_PROC_H
 
+#include <algorithm>
+#include <cmath>
+#include <cstdint>
+#include <limits>
 #include <type_traits>
+#include <vector>
 
 #include "xtensor/xview.hpp"
 #include "xtensor/xmath.hpp"
@@ -18,6 +23,7 @@
 
 #if defined(FOAM_USE_TBB)
 #include "tbb/parallel_for.h"
+#include "tbb/blocked_range.h"
 #include "tbb/blocked_range2d.h"
 #endif
 
@@ -1103,6 +1109,143 @@ inline void correctImageData(E& src, const E& gain, const E& offset)
   }
 }
 
+/**
+ * Downsample an image by averaging non-overlapping square blocks.
+ *
+ * Nan pixels are ignored. The blocks at the bottom and right edges can
+ * be incomplete.
+ *
+ * @param src: image data. shape = (y, x)
+ * @param factor: size of the block.
+ * @return: the downsampled image. shape = (ceil(y / factor), ceil(x / factor))
+ */
+template <typename E, EnableIf<E, IsImage> = false>
+inline auto downsampleImage(const E& src, size_t factor)
+{
+  if (factor == 0) throw std::invalid_argument("'factor' cannot be zero!");
+
+  using value_type = std::conditional_t<
+    std::is_same<typename E::value_type, double>::value, double, float>;
+
+  auto shape = src.shape();
+  size_t h = shape[0];
+  size_t w = shape[1];
+  size_t ds_h = (h + factor - 1) / factor;
+  size_t ds_w = (w + factor - 1) / factor;
+
+  auto out = xt::xtensor<value_type, 2>::from_shape({ds_h, ds_w});
+
+#if defined(FOAM_USE_TBB)
+  tbb::parallel_for(tbb::blocked_range<int>(0, ds_h),
+    [&src, &out, factor, h, w, ds_w] (const tbb::blocked_range<int> &block)
+    {
+      std::vector<value_type> sums(ds_w);
+      std::vector<size_t> counts(ds_w);
+      for(int bj=block.begin(); bj != block.end(); ++bj)
+      {
+#else
+      std::vector<value_type> sums(ds_w);
+      std::vector<size_t> counts(ds_w);
+      for (size_t bj = 0; bj < ds_h; ++bj)
+      {
+#endif
+        std::fill(sums.begin(), sums.end(), value_type(0));
+        std::fill(counts.begin(), counts.end(), 0);
+
+        // iterate row by row for contiguous memory access
+        size_t j_end = std::min(h, (bj + 1) * factor);
+        for (size_t j = bj * factor; j < j_end; ++j)
+        {
+          for (size_t bk = 0; bk < ds_w; ++bk)
+          {
+            size_t k_end = std::min(w, (bk + 1) * factor);
+            for (size_t k = bk * factor; k < k_end; ++k)
+            {
+              auto v = static_cast<value_type>(src(j, k));
+              if (! std::isnan(v))
+              {
+                sums[bk] += v;
+                counts[bk] += 1;
+              }
+            }
+          }
+        }
+
+        for (size_t bk = 0; bk < ds_w; ++bk)
+        {
+          out(bj, bk) = counts[bk] == 0 ?
+            std::numeric_limits<value_type>::quiet_NaN() : sums[bk] / value_type(counts[bk]);
+        }
+      }
+#if defined(FOAM_USE_TBB)
+    }
+  );
+#endif
+
+  return out;
+}
+
+/**
+ * Map an image to 32-bit colors through a lookup table.
+ *
+ * The pixel values are scaled so that lb is mapped to the first entry
+ * and ub is mapped to the last entry of the lookup table. Values out of
+ * [lb, ub] are clipped.
+ *
+ * @param src: image data. shape = (y, x)
+ * @param lb: lower level.
+ * @param ub: upper level.
+ * @param lut: lookup table of 32-bit colors, e.g. ARGB32.
+ * @param nan_color: color of nan pixels.
+ * @param out: output color buffer. shape = (y, x)
+ */
+template <typename E, typename L, typename O, EnableIf<E, IsImage> = false>
+inline void mapImageToColor(const E& src, double lb, double ub, const L& lut,
+                            uint32_t nan_color, O& out)
+{
+  auto shape = src.shape();
+  utils::checkShape(shape, out.shape(), "Image and output have different shapes");
+
+  std::size_t n = lut.size();
+  if (n == 0) throw std::invalid_argument("Lookup table cannot be empty!");
+
+  if (! (ub > lb)) ub = std::nextafter(lb, std::numeric_limits<double>::infinity());
+  double scale = static_cast<double>(n) / (ub - lb);
+  double max_index = static_cast<double>(n - 1);
+
+#if defined(FOAM_USE_TBB)
+  tbb::parallel_for(tbb::blocked_range<int>(0, shape[0]),
+    [&src, &lut, &out, &shape, lb, scale, max_index, nan_color] (const tbb::blocked_range<int> &block)
+    {
+      for(int j=block.begin(); j != block.end(); ++j)
+      {
+#else
+      for (size_t j = 0; j < shape[0]; ++j)
+      {
+#endif
+        for (size_t k = 0; k < shape[1]; ++k)
+        {
+          double v = static_cast<double>(src(j, k));
+          if (std::isnan(v))
+          {
+            out(j, k) = nan_color;
+            continue;
+          }
+
+          double x = (v - lb) * scale;
+          std::size_t idx;
+          if (x <= 0.) idx = 0;
+          else if (x >= max_index) idx = static_cast<std::size_t>(max_index);
+          else idx = static_cast<std::size_t>(x);
+          out(j, k) = lut(idx);
+        }
+      }
+#if defined(FOAM_USE_TBB)
+    }
+  );
+#endif
+}
+
 } // foam
 
 #endif //EXTRA_FOAM_IMAGE_PROC_H
@@ -10,13 +10,24 @@
 #ifndef EXTRA_FOAM_F_STATISTICS_HPP
 #define EXTRA_FOAM_F_STATISTICS_HPP
 
+#include <algorithm>
+#include <array>
+#include <cmath>
+#include <cstdint>
+#include <limits>
+#include <sstream>
+#include <stdexcept>
+#include <tuple>
 #include <type_traits>
+#include <vector>
 
 #include "xtensor/xview.hpp"
 #include "xtensor/xmath.hpp"
 
 #if defined(FOAM_USE_TBB)
 #include "tbb/parallel_for.h"
+#include "tbb/parallel_reduce.h"
+#include "tbb/blocked_range.h"
 #include "tbb/blocked_range2d.h"
 #endif
 
@@ -26,6 +37,1200 @@
 namespace foam
 {
 
+/**
+ * FOM types of ROI. It must be consistent with extra_foam.config.RoiFom.
+ */
+enum class RoiFom : int
+{
+  SUM = 1,
+  MEAN = 2,
+  MEDIAN = 3,
+  MAX = 4,
+  MIN = 5,
+  STD = 6,
+  VAR = 7,
+  N_STD = 16,
+  N_VAR = 17
+};
+
+namespace detail
+{
+
+/**
+ * Number of elements in a row of a vector. A vector is split into rows
+ * of this size, so that a row is a reasonable unit of work.
+ */
+constexpr std::size_t kVectorRowSize = 4096;
+
+/**
+ * Number of "rows" of the data, where a row is a contiguous run along
+ * the last axis. Rows are the unit of work for parallel reductions.
+ */
+template<typename E, EnableIf<E, IsVector> = false>
+inline std::size_t nRows(const E& src)
+{
+  return (src.shape()[0] + kVectorRowSize - 1) / kVectorRowSize;
+}
+
+template<typename E, EnableIf<E, IsImage> = false>
+inline std::size_t nRows(const E& src)
+{
+  return src.shape()[0];
+}
+
+template<typename E, EnableIf<E, IsImageArray> = false>
+inline std::size_t nRows(const E& src)
+{
+  return src.shape()[0] * src.shape()[1];
+}
+
+/**
+ * Apply a functor to every element in a row of the data.
+ */
+template<typename E, typename F, EnableIf<E, IsVector> = false>
+inline void forEachInRow(const E& src, std::size_t r, F&& f)
+{
+  auto last = std::min(src.shape()[0], (r + 1) * kVectorRowSize);
+  for (std::size_t k = r * kVectorRowSize; k < last; ++k) f(src(k));
+}
+
+template<typename E, typename F, EnableIf<E, IsImage> = false>
+inline void forEachInRow(const E& src, std::size_t r, F&& f)
+{
+  auto nx = src.shape()[1];
+  for (std::size_t k = 0; k < nx; ++k) f(src(r, k));
+}
+
+template<typename E, typename F, EnableIf<E, IsImageArray> = false>
+inline void forEachInRow(const E& src, std::size_t r, F&& f)
+{
+  auto ny = src.shape()[1];
+  auto nx = src.shape()[2];
+  auto i = r / ny;
+  auto j = r % ny;
+  for (std::size_t k = 0; k < nx; ++k) f(src(i, j, k));
+}
+
+/**
+ * Welford's online algorithm for the mean and the variance.
+ */
+struct WelfordAccumulator
+{
+  std::size_t count = 0;
+  double mean = 0.;
+  double m2 = 0.;
+
+  void push(double v)
+  {
+    ++count;
+    double delta = v - mean;
+    mean += delta / count;
+    m2 += delta * (v - mean);
+  }
+
+  // Chan et al.
+  void merge(const WelfordAccumulator& other)
+  {
+    if (other.count == 0) return;
+    if (count == 0)
+    {
+      *this = other;
+      return;
+    }
+
+    std::size_t n = count + other.count;
+    double delta = other.mean - mean;
+    mean += delta * other.count / n;
+    m2 += other.m2 + delta * delta * count / n * other.count;
+    count = n;
+  }
+
+  /**
+   * Return the (normalized) variance or standard deviation.
+   *
+   * The normalized variance is normalized by the squared mean and the
+   * normalized standard deviation is normalized by the mean.
+   */
+  double result(bool normalized, bool take_sqrt) const
+  {
+    if (count == 0) return std::numeric_limits<double>::quiet_NaN();
+
+    double var = m2 / count;
+    if (take_sqrt)
+    {
+      double sd = std::sqrt(var);
+      return normalized ? sd / mean : sd;
+    }
+    return normalized ? var / (mean * mean) : var;
+  }
+};
+
+/**
+ * Find the bin of a value within the outer edges of a histogram.
+ *
+ * The index estimated from the bin width is corrected by comparing with
+ * the edges in the same way as numpy, so that a value on an edge always
+ * falls into the upper bin except for the last edge.
+ */
+template<typename T>
+inline std::size_t binIndex(T v, const std::vector<T>& edges, double norm)
+{
+  auto n_bins = edges.size() - 1;
+  auto idx = static_cast<std::size_t>((v - edges.front()) * norm);
+  if (idx >= n_bins) idx = n_bins - 1;
+  if (v < edges[idx]) --idx;
+  else if (idx + 1 < n_bins && v >= edges[idx + 1]) ++idx;
+  return idx;
+}
+
+/**
+ * Accumulate the histogram and/or the statistics of the non-nan values
+ * within [lb, ub] of the data.
+ */
+template<typename E>
+class HistogramReducer
+{
+public:
+  using value_type = typename E::value_type;
+
+  /**
+   * @param edges: bin edges within [lb, ub]. The histogram is not
+   *    accumulated if it is empty.
+   * @param with_stats: true for accumulating the min, max, mean and
+   *    sum of squared deviations.
+   */
+  HistogramReducer(const E& src, value_type lb, value_type ub,
+                   const std::vector<value_type>& edges, bool with_stats)
+    : src_(src), lb_(lb), ub_(ub), edges_(edges), with_stats_(with_stats),
+      hist(edges.empty() ? 0 : edges.size() - 1, 0)
+  {
+    if (not edges.empty()) norm_ = hist.size() / (static_cast<double>(edges.back()) - edges.front());
+  }
+
+#if defined(FOAM_USE_TBB)
+  HistogramReducer(HistogramReducer& other, tbb::split)
+    : src_(other.src_), lb_(other.lb_), ub_(other.ub_), edges_(other.edges_), norm_(other.norm_),
+      with_stats_(other.with_stats_), hist(other.hist.size(), 0) {}
+
+  void operator()(const tbb::blocked_range<std::size_t>& block)
+  {
+    for (std::size_t r = block.begin(); r != block.end(); ++r) reduce(r);
+  }
+#endif
+
+  void reduce(std::size_t r)
+  {
+    bool with_hist = not hist.empty();
+    forEachInRow(src_, r, [this, with_hist] (value_type v)
+    {
+      if (std::isnan(v) || v < lb_ || v > ub_) return;
+      if (with_stats_)
+      {
+        stats.push(v);
+        if (v < v_min) v_min = v;
+        if (v > v_max) v_max = v;
+      }
+      if (with_hist) hist[binIndex(v, edges_, norm_)] += 1;
+    });
+  }
+
+  void join(const HistogramReducer& other)
+  {
+    for (std::size_t i = 0; i < hist.size(); ++i) hist[i] += other.hist[i];
+    stats.merge(other.stats);
+    if (other.v_min < v_min) v_min = other.v_min;
+    if (other.v_max > v_max) v_max = other.v_max;
+  }
+
+private:
+  const E& src_;
+  value_type lb_;
+  value_type ub_;
+  const std::vector<value_type>& edges_;
+  double norm_ = 0.;
+  bool with_stats_;
+
+public:
+  std::vector<int64_t> hist;
+  WelfordAccumulator stats;
+  double v_min = std::numeric_limits<double>::infinity();
+  double v_max = -std::numeric_limits<double>::infinity();
+};
+
+/**
+ * Collect the non-nan values within [lb, ub) or [lb, ub] of the data.
+ */
+template<typename E>
+class RangeCollector
+{
+public:
+  using value_type = typename E::value_type;
+
+  RangeCollector(const E& src, value_type lb, value_type ub, bool closed)
+    : src_(src), lb_(lb), ub_(ub), closed_(closed) {}
+
+#if defined(FOAM_USE_TBB)
+  RangeCollector(RangeCollector& other, tbb::split)
+    : src_(other.src_), lb_(other.lb_), ub_(other.ub_), closed_(other.closed_) {}
+
+  void operator()(const tbb::blocked_range<std::size_t>& block)
+  {
+    for (std::size_t r = block.begin(); r != block.end(); ++r) reduce(r);
+  }
+#endif
+
+  void reduce(std::size_t r)
+  {
+    forEachInRow(src_, r, [this] (value_type v)
+    {
+      if (v >= lb_ && (v < ub_ || (closed_ && v == ub_))) values.push_back(v);
+    });
+  }
+
+  void join(const RangeCollector& other)
+  {
+    values.insert(values.end(), other.values.begin(), other.values.end());
+  }
+
+  std::vector<value_type> values;
+
+private:
+  const E& src_;
+  value_type lb_;
+  value_type ub_;
+  bool closed_;
+};
+
+/**
+ * Median of a buffer by selection. The buffer is partially re-ordered.
+ */
+template<typename T>
+inline double selectMedian(std::vector<T>& values)
+{
+  auto n = values.size();
+  if (n == 0) return std::numeric_limits<double>::quiet_NaN();
+
+  auto mid = values.begin() + n / 2;
+  std::nth_element(values.begin(), mid, values.end());
+  double upper = *mid;
+  if (n % 2 == 1) return upper;
+
+  double lower = *std::max_element(values.begin(), mid);
+  return 0.5 * (lower + upper);
+}
+
+/**
+ * Median of the values with the given ranks by selection.
+ *
+ * @param values: the values with ranks [offset, offset + values.size())
+ *    among n values. They are partially re-ordered.
+ * @param n: total number of values.
+ * @param offset: rank of the smallest value in the buffer.
+ */
+template<typename T>
+inline double selectMedian(std::vector<T>& values, std::size_t n, std::size_t offset)
+{
+  if (n == 0) return std::numeric_limits<double>::quiet_NaN();
+
+  auto mid = values.begin() + (n / 2 - offset);
+  std::nth_element(values.begin(), mid, values.end());
+  double upper = *mid;
+  if (n % 2 == 1) return upper;
+
+  double lower = *std::max_element(values.begin(), mid);
+  return 0.5 * (lower + upper);
+}
+
+} // detail
+
+/**
+ * Determine the outer edges of a histogram.
+ *
+ * An infinite bound is replaced by the min/max of the data. It follows
+ * the same convention as numpy.histogram.
+ *
+ * @param lb: lower bound of the bin range.
+ * @param ub: upper bound of the bin range.
+ * @param count: number of data points.
+ * @param v_min: min of the data.
+ * @param v_max: max of the data.
+ *
+ * @return: (lower edge, upper edge).
+ */
+inline std::array<double, 2> histOuterEdges(double lb, double ub, std::size_t count, double v_min, double v_max)
+{
+  if (not (lb < ub)) throw std::invalid_argument("Lower bound must be smaller than upper bound!");
+
+  if (not std::isfinite(lb) and not std::isfinite(ub))
+  {
+    if (count == 0)
+    {
+      lb = 0.;
+      ub = 0.;
+    } else
+    {
+      lb = v_min;
+      ub = v_max;
+    }
+
+    if (lb == ub)
+    {
+      lb -= 0.5;
+      ub += 0.5;
+    }
+  } else if (not std::isfinite(ub))
+  {
+    if (count == 0) ub = lb + 1.;
+    else
+    {
+      ub = v_max;
+      if (ub <= lb) ub = lb + 1.;
+    }
+  } else if (not std::isfinite(lb))
+  {
+    if (count == 0) lb = ub - 1.;
+    else
+    {
+      lb = v_min;
+      if (lb >= ub) lb = ub - 1.;
+    }
+  }
+
+  if (not std::isfinite(lb) or not std::isfinite(ub))
+  {
+    std::ostringstream ss;
+    ss << "Supplied range of [" << lb << ", " << ub << "] is not finite";
+    throw std::invalid_argument(ss.str());
+  }
+
+  return {lb, ub};
+}
+
+/**
+ * Compute the nan-histogram and the nan-statistics of the data within a
+ * bin range.
+ *
+ * Nan and the values outside the bin range are ignored. The histogram
+ * and the statistics except the median are accumulated in one pass over
+ * the data if both bounds are finite. Otherwise, the outer edges are found
+ * together with the statistics and the histogram needs another pass. The
+ * median is selected from the values of the bin(s) where it is located,
+ * which are the only values copied. The bin edges are computed in the
+ * value type of the data as numpy.histogram does.
+ *
+ * @param src: input data. shape = (x,), (y, x) or (indices, y, x)
+ * @param lb: lower bound of the bin range.
+ * @param ub: upper bound of the bin range.
+ * @param n_bins: number of bins.
+ *
+ * @return: (histogram, bin centers, mean, median, standard deviation)
+ */
+template<typename E>
+inline auto nanhistWithStats(const E& src, double lb, double ub, std::size_t n_bins)
+{
+  using value_type = typename E::value_type;
+
+  if (n_bins == 0) throw std::invalid_argument("Number of bins must be positive!");
+  if (not (lb < ub)) throw std::invalid_argument("Lower bound must be smaller than upper bound!");
+
+  // the same as numpy.linspace, which calculates in double precision
+  auto make_edges = [n_bins] (const std::array<double, 2>& outer)
+  {
+    std::vector<value_type> edges(n_bins + 1);
+    double step = (outer[1] - outer[0]) / n_bins;
+    for (std::size_t i = 0; i < n_bins; ++i) edges[i] = static_cast<value_type>(outer[0] + i * step);
+    edges[n_bins] = static_cast<value_type>(outer[1]);
+    return edges;
+  };
+
+  auto n_rows = detail::nRows(src);
+  auto reduce = [n_rows] (auto& reducer)
+  {
+#if defined(FOAM_USE_TBB)
+    tbb::parallel_reduce(tbb::blocked_range<std::size_t>(0, n_rows), reducer);
+#else
+    for (std::size_t r = 0; r < n_rows; ++r) reducer.reduce(r);
+#endif
+  };
+
+  bool finite = std::isfinite(lb) and std::isfinite(ub);
+  std::vector<value_type> bin_edges;
+  if (finite) bin_edges = make_edges({lb, ub});
+
+  // casting an infinite bound keeps it infinite
+  detail::HistogramReducer<E> reducer(
+    src, static_cast<value_type>(lb), static_cast<value_type>(ub), bin_edges, true);
+  reduce(reducer);
+
+  const auto& stats = reducer.stats;
+  auto count = stats.count;
+  std::vector<int64_t> counts;
+  if (finite)
+  {
+    counts = std::move(reducer.hist);
+  } else
+  {
+    bin_edges = make_edges(histOuterEdges(lb, ub, count, reducer.v_min, reducer.v_max));
+    detail::HistogramReducer<E> counter(src, bin_edges.front(), bin_edges.back(), bin_edges, false);
+    reduce(counter);
+    counts = std::move(counter.hist);
+  }
+
+  double nan = std::numeric_limits<double>::quiet_NaN();
+  double mean = count > 0 ? stats.mean : nan;
+  double stddev = count > 0 ? std::sqrt(stats.m2 / count) : nan;
+
+  double median = nan;
+  if (count > 0)
+  {
+    // find the bins of the middle one or two values
+    std::size_t first = count % 2 == 1 ? count / 2 : count / 2 - 1;
+    std::size_t offset = 0;
+    std::size_t b_lo = 0;
+    while (offset + counts[b_lo] <= first) offset += counts[b_lo++];
+    std::size_t b_hi = b_lo;
+    std::size_t cum = offset + counts[b_hi];
+    while (cum <= count / 2) cum += counts[++b_hi];
+
+    detail::RangeCollector<E> collector(src, bin_edges[b_lo], bin_edges[b_hi + 1], b_hi == n_bins - 1);
+    reduce(collector);
+    median = detail::selectMedian(collector.values, count, offset);
+  }
+
+  auto hist = xt::xtensor<int64_t, 1>::from_shape({n_bins});
+  auto centers = xt::xtensor<double, 1>::from_shape({n_bins});
+  for (std::size_t i = 0; i < n_bins; ++i)
+  {
+    hist(i) = counts[i];
+    centers(i) = (bin_edges[i] + bin_edges[i + 1]) / value_type(2);
+  }
+
+  return std::make_tuple(hist, centers, mean, median, stddev);
+}
+
+namespace detail
+{
+
+/**
+ * Find the nan-min and nan-max of the data.
+ */
+template<typename E>
+class MinMaxReducer
+{
+public:
+  using value_type = typename E::value_type;
+
+  explicit MinMaxReducer(const E& src) : src_(src) {}
+
+#if defined(FOAM_USE_TBB)
+  MinMaxReducer(MinMaxReducer& other, tbb::split) : src_(other.src_) {}
+
+  void operator()(const tbb::blocked_range<std::size_t>& block)
+  {
+    for (std::size_t r = block.begin(); r != block.end(); ++r) reduce(r);
+  }
+#endif
+
+  void reduce(std::size_t r)
+  {
+    forEachInRow(src_, r, [this] (value_type v)
+    {
+      if (std::isnan(v)) return;
+      if (v < v_min) v_min = v;
+      if (v > v_max) v_max = v;
+    });
+  }
+
+  void join(const MinMaxReducer& other)
+  {
+    if (other.v_min < v_min) v_min = other.v_min;
+    if (other.v_max > v_max) v_max = other.v_max;
+  }
+
+  double v_min = std::numeric_limits<double>::infinity();
+  double v_max = -std::numeric_limits<double>::infinity();
+
+private:
+  const E& src_;
+};
+
+/**
+ * Count the non-nan values of the data in equal-width bins.
+ */
+template<typename E>
+class FixedBinCounter
+{
+public:
+  using value_type = typename E::value_type;
+
+  FixedBinCounter(const E& src, double lb, double ub, std::size_t n_bins)
+    : src_(src), lb_(lb), norm_(n_bins / (ub - lb)), hist(n_bins, 0) {}
+
+#if defined(FOAM_USE_TBB)
+  FixedBinCounter(FixedBinCounter& other, tbb::split)
+    : src_(other.src_), lb_(other.lb_), norm_(other.norm_), hist(other.hist.size(), 0) {}
+
+  void operator()(const tbb::blocked_range<std::size_t>& block)
+  {
+    for (std::size_t r = block.begin(); r != block.end(); ++r) count(r);
+  }
+#endif
+
+  void count(std::size_t r)
+  {
+    auto n_bins = hist.size();
+    forEachInRow(src_, r, [this, n_bins] (value_type v)
+    {
+      if (std::isnan(v)) return;
+      auto idx = static_cast<std::size_t>((v - lb_) * norm_);
+      if (idx >= n_bins) idx = n_bins - 1;
+      hist[idx] += 1;
+    });
+  }
+
+  void join(const FixedBinCounter& other)
+  {
+    for (std::size_t i = 0; i < hist.size(); ++i) hist[i] += other.hist[i];
+  }
+
+private:
+  const E& src_;
+  double lb_;
+  double norm_;
+
+public:
+  std::vector<int64_t> hist;
+};
+
+} // detail
+
+/**
+ * Compute the nan-histogram of an image in equal-width bins spanning
+ * the range of the data.
+ *
+ * The bins are meant to be fine enough to be merged for display and to
+ * estimate quantiles, e.g. the levels of the image, without revisiting
+ * the data.
+ *
+ * @param src: image data.
+ * @param n_bins: number of bins.
+ *
+ * @return: (histogram, lower edge, upper edge). The edges are nan if the
+ *    image is all-nan. If all the values are the same, the range is
+ *    extended by 0.5 on both sides.
+ */
+template<typename E>
+inline auto imageHistogram(const E& src, std::size_t n_bins)
+{
+  if (n_bins == 0) throw std::invalid_argument("Number of bins must be positive!");
+
+  auto n_rows = detail::nRows(src);
+  detail::MinMaxReducer<E> reducer(src);
+#if defined(FOAM_USE_TBB)
+  tbb::parallel_reduce(tbb::blocked_range<std::size_t>(0, n_rows), reducer);
+#else
+  for (std::size_t r = 0; r < n_rows; ++r) reducer.reduce(r);
+#endif
+
+  auto hist = xt::xtensor<int64_t, 1>::from_shape({n_bins});
+  double lb = reducer.v_min;
+  double ub = reducer.v_max;
+  if (lb > ub)
+  {
+    // all-nan
+    std::fill(hist.begin(), hist.end(), 0);
+    double nan = std::numeric_limits<double>::quiet_NaN();
+    return std::make_tuple(hist, nan, nan);
+  }
+
+  if (lb == ub)
+  {
+    lb -= 0.5;
+    ub += 0.5;
+  }
+
+  detail::FixedBinCounter<E> counter(src, lb, ub, n_bins);
+#if defined(FOAM_USE_TBB)
+  tbb::parallel_reduce(tbb::blocked_range<std::size_t>(0, n_rows), counter);
+#else
+  for (std::size_t r = 0; r < n_rows; ++r) counter.count(r);
+#endif
+
+  std::copy(counter.hist.begin(), counter.hist.end(), hist.begin());
+  return std::make_tuple(hist, lb, ub);
+}
+
+namespace detail
+{
+
+/**
+ * Apply a functor to every element of a strided block of memory.
+ *
+ * @param ptr: pointer to the first element of the block.
+ * @param shape: shape of the block.
+ * @param strides: strides (in number of elements) of the block.
+ */
+template<typename T, typename F>
+inline void forEachStrided(const T* ptr,
+                           const std::vector<std::size_t>& shape,
+                           const std::vector<std::ptrdiff_t>& strides,
+                           F&& f)
+{
+  auto ndim = shape.size();
+  if (ndim == 0)
+  {
+    f(*ptr);
+    return;
+  }
+  for (auto s : shape) if (s == 0) return;
+
+  std::vector<std::size_t> index(ndim, 0);
+  auto last = ndim - 1;
+  auto n_last = shape[last];
+  auto s_last = strides[last];
+  while (true)
+  {
+    for (std::size_t k = 0; k < n_last; ++k) f(ptr[k * s_last]);
+
+    // move to the next innermost run
+    auto d = static_cast<std::ptrdiff_t>(last) - 1;
+    for (; d >= 0; --d)
+    {
+      ++index[d];
+      ptr += strides[d];
+      if (index[d] < shape[d]) break;
+      ptr -= strides[d] * static_cast<std::ptrdiff_t>(shape[d]);
+      index[d] = 0;
+    }
+    if (d < 0) return;
+  }
+}
+
+/**
+ * Parallel nan-Welford reduction over all the elements of an array by
+ * splitting the first axis.
+ */
+template<typename T>
+class NanWelfordReducer
+{
+public:
+  NanWelfordReducer(const T* ptr,
+                    std::ptrdiff_t stride,
+                    const std::vector<std::size_t>& shape,
+                    const std::vector<std::ptrdiff_t>& strides)
+    : ptr_(ptr), stride_(stride), shape_(shape), strides_(strides) {}
+
+#if defined(FOAM_USE_TBB)
+  NanWelfordReducer(NanWelfordReducer& other, tbb::split)
+    : ptr_(other.ptr_), stride_(other.stride_), shape_(other.shape_), strides_(other.strides_) {}
+
+  void operator()(const tbb::blocked_range<std::size_t>& block)
+  {
+    reduce(block.begin(), block.end());
+  }
+#endif
+
+  void reduce(std::size_t first, std::size_t last)
+  {
+    for (std::size_t i = first; i < last; ++i)
+    {
+      forEachStrided(ptr_ + i * stride_, shape_, strides_, [this] (T v)
+      {
+        if (not std::isnan(v)) acc.push(v);
+      });
+    }
+  }
+
+  void join(const NanWelfordReducer& other) { acc.merge(other.acc); }
+
+  WelfordAccumulator acc;
+
+private:
+  const T* ptr_;
+  std::ptrdiff_t stride_;
+  const std::vector<std::size_t>& shape_;
+  const std::vector<std::ptrdiff_t>& strides_;
+};
+
+template<typename E>
+inline auto nanVarImp(const E& src, bool normalized, bool take_sqrt)
+{
+  using value_type = typename E::value_type;
+
+  const auto& src_shape = src.shape();
+  const auto& src_strides = src.strides();
+  std::vector<std::size_t> shape(src_shape.begin() + 1, src_shape.end());
+  std::vector<std::ptrdiff_t> strides(src_strides.begin() + 1, src_strides.end());
+  auto n = static_cast<std::size_t>(src_shape[0]);
+
+  NanWelfordReducer<value_type> reducer(src.data(), src_strides[0], shape, strides);
+#if defined(FOAM_USE_TBB)
+  tbb::parallel_reduce(tbb::blocked_range<std::size_t>(0, n), reducer);
+#else
+  reducer.reduce(0, n);
+#endif
+
+  return static_cast<value_type>(reducer.acc.result(normalized, take_sqrt));
+}
+
+template<typename E>
+inline auto nanVarImp(const E& src, const std::vector<int>& axis, bool normalized, bool take_sqrt)
+{
+  using value_type = typename E::value_type;
+
+  auto ndim = static_cast<int>(src.shape().size());
+  std::vector<bool> reduced(ndim, false);
+  for (auto a : axis)
+  {
+    if (a < 0) a += ndim;
+    if (a < 0 || a >= ndim) throw std::invalid_argument("Axis is out of bounds!");
+    if (reduced[a]) throw std::invalid_argument("Duplicate value in 'axis'!");
+    reduced[a] = true;
+  }
+
+  std::vector<std::size_t> kept_shape, reduced_shape;
+  std::vector<std::ptrdiff_t> kept_strides, reduced_strides;
+  for (int i = 0; i < ndim; ++i)
+  {
+    if (reduced[i])
+    {
+      reduced_shape.push_back(src.shape()[i]);
+      reduced_strides.push_back(src.strides()[i]);
+    } else
+    {
+      kept_shape.push_back(src.shape()[i]);
+      kept_strides.push_back(src.strides()[i]);
+    }
+  }
+
+  auto out = xt::xarray<value_type>::from_shape(kept_shape);
+  auto n_out = out.size();
+  const value_type* ptr = src.data();
+  value_type* out_ptr = out.data();
+  auto n_kept = kept_shape.size();
+
+  auto reduce_one = [&] (std::size_t o)
+  {
+    // unravel the index of the output element
+    std::ptrdiff_t offset = 0;
+    auto r = o;
+    for (auto d = n_kept; d-- > 0;)
+    {
+      offset += static_cast<std::ptrdiff_t>(r % kept_shape[d]) * kept_strides[d];
+      r /= kept_shape[d];
+    }
+
+    WelfordAccumulator acc;
+    forEachStrided(ptr + offset, reduced_shape, reduced_strides, [&acc] (value_type v)
+    {
+      if (not std::isnan(v)) acc.push(v);
+    });
+    out_ptr[o] = static_cast<value_type>(acc.result(normalized, take_sqrt));
+  };
+
+#if defined(FOAM_USE_TBB)
+  tbb::parallel_for(tbb::blocked_range<std::size_t>(0, n_out),
+    [&reduce_one] (const tbb::blocked_range<std::size_t>& block)
+    {
+      for (std::size_t o = block.begin(); o != block.end(); ++o) reduce_one(o);
+    }
+  );
+#else
+  for (std::size_t o = 0; o < n_out; ++o) reduce_one(o);
+#endif
+
+  return out;
+}
+
+/**
+ * Apply a functor to every valid pixel in a rectangular ROI of an image
+ * in an array of images.
+ *
+ * A pixel is valid if it is not nan, it is within the threshold range and
+ * it is not masked by the image mask (if given).
+ */
+template<typename E, typename M, typename F>
+inline void forEachValidInRoi(const E& src, std::size_t p, const std::array<int, 4>& rect,
+                              const M* mask, double lb, double ub, F&& f)
+{
+  auto x0 = static_cast<std::size_t>(rect[0]);
+  auto y0 = static_cast<std::size_t>(rect[1]);
+  auto x1 = x0 + static_cast<std::size_t>(rect[2]);
+  auto y1 = y0 + static_cast<std::size_t>(rect[3]);
+  for (std::size_t j = y0; j < y1; ++j)
+  {
+    for (std::size_t k = x0; k < x1; ++k)
+    {
+      double v = src(p, j, k);
+      if (std::isnan(v) || v < lb || v > ub) continue;
+      if (mask != nullptr && (*mask)(j, k)) continue;
+      f(v);
+    }
+  }
+}
+
+/**
+ * Reduce the valid pixels in a rectangular ROI of an image in an array of
+ * images to a FOM.
+ *
+ * @param buffer: work space which is used to calculate median.
+ */
+template<typename E, typename M>
+inline double roiFomImp(const E& src, std::size_t p, const std::array<int, 4>& rect,
+                        RoiFom fom_type, const M* mask, double lb, double ub,
+                        std::vector<double>& buffer)
+{
+  constexpr double nan = std::numeric_limits<double>::quiet_NaN();
+
+  switch (fom_type)
+  {
+    case RoiFom::SUM:
+    case RoiFom::MEAN:
+    {
+      double sum = 0.;
+      std::size_t count = 0;
+      forEachValidInRoi(src, p, rect, mask, lb, ub, [&] (double v) { sum += v; ++count; });
+      if (fom_type == RoiFom::SUM) return sum;
+      return count == 0 ? nan : sum / count;
+    }
+    case RoiFom::MEDIAN:
+    {
+      buffer.clear();
+      forEachValidInRoi(src, p, rect, mask, lb, ub, [&buffer] (double v) { buffer.push_back(v); });
+      return selectMedian(buffer);
+    }
+    case RoiFom::MAX:
+    case RoiFom::MIN:
+    {
+      double ret = nan;
+      bool is_max = fom_type == RoiFom::MAX;
+      forEachValidInRoi(src, p, rect, mask, lb, ub, [&] (double v)
+      {
+        if (std::isnan(ret) || (is_max ? v > ret : v < ret)) ret = v;
+      });
+      return ret;
+    }
+    default:
+    {
+      WelfordAccumulator acc;
+      forEachValidInRoi(src, p, rect, mask, lb, ub, [&acc] (double v) { acc.push(v); });
+      bool normalized = fom_type == RoiFom::N_STD || fom_type == RoiFom::N_VAR;
+      bool take_sqrt = fom_type == RoiFom::STD || fom_type == RoiFom::N_STD;
+      return acc.result(normalized, take_sqrt);
+    }
+  }
+}
+
+template<typename E, typename M>
+inline auto roiFomsImp(const E& src, const M* mask, double lb, double ub,
+                       const std::vector<std::array<int, 4>>& rects,
+                       const std::vector<int>& fom_types)
+{
+  using value_type = typename E::value_type;
+
+  auto shape = src.shape();
+  if (mask != nullptr && (mask->shape()[0] != shape[1] || mask->shape()[1] != shape[2]))
+    throw std::invalid_argument("Image and mask have different shapes!");
+
+  if (rects.size() != fom_types.size())
+    throw std::invalid_argument("Number of ROIs and number of FOM types are different!");
+
+  std::vector<RoiFom> types;
+  for (auto t : fom_types)
+  {
+    switch (static_cast<RoiFom>(t))
+    {
+      case RoiFom::SUM: case RoiFom::MEAN: case RoiFom::MEDIAN:
+      case RoiFom::MAX: case RoiFom::MIN: case RoiFom::STD: case RoiFom::VAR:
+      case RoiFom::N_STD: case RoiFom::N_VAR:
+        types.push_back(static_cast<RoiFom>(t));
+        break;
+      default:
+        std::stringstream ss;
+        ss << "Unknown FOM type: " << t;
+        throw std::invalid_argument(ss.str());
+    }
+  }
+
+  for (const auto& rect : rects)
+  {
+    if (rect[0] < 0 || rect[1] < 0 || rect[2] < 0 || rect[3] < 0
+        || static_cast<std::size_t>(rect[0] + rect[2]) > shape[2]
+        || static_cast<std::size_t>(rect[1] + rect[3]) > shape[1])
+      throw std::invalid_argument("ROI is out of the image boundary!");
+  }
+
+  auto n_rois = rects.size();
+  auto n_pulses = static_cast<std::size_t>(shape[0]);
+  auto out = xt::xtensor<value_type, 2>::from_shape({n_rois, n_pulses});
+
+  auto reduce = [&] (std::size_t first, std::size_t last)
+  {
+    std::vector<double> buffer;
+    for (std::size_t p = first; p < last; ++p)
+    {
+      // all the ROIs in an image are processed together for cache locality
+      for (std::size_t i = 0; i < n_rois; ++i)
+      {
+        out(i, p) = static_cast<value_type>(
+          roiFomImp(src, p, rects[i], types[i], mask, lb, ub, buffer));
+      }
+    }
+  };
+
+#if defined(FOAM_USE_TBB)
+  tbb::parallel_for(tbb::blocked_range<std::size_t>(0, n_pulses),
+    [&reduce] (const tbb::blocked_range<std::size_t>& block)
+    {
+      reduce(block.begin(), block.end());
+    }
+  );
+#else
+  reduce(0, n_pulses);
+#endif
+
+  return out;
+}
+
+/**
+ * Calculate the moments of every ASIC of every module.
+ *
+ * @param value: functor which returns the value of a pixel given the
+ *               indices (module, pulse, y, x).
+ */
+template<typename F>
+inline auto asicMomentsImp(F&& value, std::size_t n_modules, std::size_t n_pulses,
+                           std::size_t module_h, std::size_t module_w,
+                           const std::array<int, 2>& asic_shape, double saturation)
+{
+  if (asic_shape[0] <= 0 || asic_shape[1] <= 0
+      || module_h % asic_shape[0] != 0 || module_w % asic_shape[1] != 0)
+  {
+    std::stringstream ss;
+    ss << "Module shape (" << module_h << ", " << module_w << ") cannot be divided into ASICs "
+       << "with shape (" << asic_shape[0] << ", " << asic_shape[1] << ")!";
+    throw std::invalid_argument(ss.str());
+  }
+
+  auto asic_h = static_cast<std::size_t>(asic_shape[0]);
+  auto asic_w = static_cast<std::size_t>(asic_shape[1]);
+  auto n_ay = module_h / asic_h;
+  auto n_ax = module_w / asic_w;
+
+  auto out = xt::xtensor<double, 4>::from_shape({n_modules, n_ay, n_ax, 4});
+
+  auto reduce = [&] (std::size_t first, std::size_t last)
+  {
+    for (std::size_t i = first; i < last; ++i)
+    {
+      std::size_t m = i / (n_ay * n_ax);
+      std::size_t ay = i / n_ax % n_ay;
+      std::size_t ax = i % n_ax;
+      std::size_t y0 = ay * asic_h;
+      std::size_t x0 = ax * asic_w;
+
+      WelfordAccumulator acc;
+      std::size_t n_saturated = 0;
+      for (std::size_t p = 0; p < n_pulses; ++p)
+      {
+        for (std::size_t j = y0; j < y0 + asic_h; ++j)
+        {
+          for (std::size_t k = x0; k < x0 + asic_w; ++k)
+          {
+            double v = value(m, p, j, k);
+            if (std::isnan(v)) continue;
+            acc.push(v);
+            if (v >= saturation) ++n_saturated;
+          }
+        }
+      }
+
+      out(m, ay, ax, 0) = static_cast<double>(acc.count);
+      out(m, ay, ax, 1) = acc.count == 0 ? std::numeric_limits<double>::quiet_NaN() : acc.mean;
+      out(m, ay, ax, 2) = acc.m2;
+      out(m, ay, ax, 3) = static_cast<double>(n_saturated);
+    }
+  };
+
+  // ASICs are the units of parallelism, e.g. 256 ASICs for AGIPD-1M
+  auto n_asics = n_modules * n_ay * n_ax;
+#if defined(FOAM_USE_TBB)
+  tbb::parallel_for(tbb::blocked_range<std::size_t>(0, n_asics),
+    [&reduce] (const tbb::blocked_range<std::size_t>& block)
+    {
+      reduce(block.begin(), block.end());
+    }
+  );
+#else
+  reduce(0, n_asics);
+#endif
+
+  return out;
+}
+
+} // detail
+
+/**
+ * Compute the variance of an array while ignoring nan.
+ *
+ * It uses Welford's algorithm and the array is iterated only once.
+ *
+ * @param src: input array.
+ * @param normalized: true for normalizing the variance by the squared mean.
+ *
+ * @return: the (normalized) variance.
+ */
+template<typename E>
+inline auto nanVar(const E& src, bool normalized = false)
+{
+  return detail::nanVarImp(src, normalized, false);
+}
+
+/**
+ * Compute the variance of an array along the given axes while ignoring nan.
+ *
+ * @param src: input array.
+ * @param axis: axes along which the variance is computed.
+ * @param normalized: true for normalizing the variance by the squared mean.
+ *
+ * @return: the (normalized) variance.
+ */
+template<typename E>
+inline auto nanVar(const E& src, const std::vector<int>& axis, bool normalized = false)
+{
+  return detail::nanVarImp(src, axis, normalized, false);
+}
+
+/**
+ * Compute the standard deviation of an array while ignoring nan.
+ *
+ * It uses Welford's algorithm and the array is iterated only once.
+ *
+ * @param src: input array.
+ * @param normalized: true for normalizing the standard deviation by the mean.
+ *
+ * @return: the (normalized) standard deviation.
+ */
+template<typename E>
+inline auto nanStd(const E& src, bool normalized = false)
+{
+  return detail::nanVarImp(src, normalized, true);
+}
+
+/**
+ * Compute the standard deviation of an array along the given axes while
+ * ignoring nan.
+ *
+ * @param src: input array.
+ * @param axis: axes along which the standard deviation is computed.
+ * @param normalized: true for normalizing the standard deviation by the mean.
+ *
+ * @return: the (normalized) standard deviation.
+ */
+template<typename E>
+inline auto nanStd(const E& src, const std::vector<int>& axis, bool normalized = false)
+{
+  return detail::nanVarImp(src, axis, normalized, true);
+}
+
+/**
+ * Calculate the FOMs of multiple rectangular ROIs in an array of images.
+ *
+ * Pixels which are nan, outside the threshold range or masked by the image
+ * mask are ignored. All the ROIs are reduced in a single pass over the
+ * images.
+ *
+ * @param src: array of images. Shape = (indices, y, x)
+ * @param image_mask: image mask. Shape = (y, x)
+ * @param lb: lower threshold.
+ * @param ub: upper threshold.
+ * @param rects: ROI rectangles in the form of (x, y, w, h).
+ * @param fom_types: FOM type of each ROI.
+ *
+ * @return: FOMs. Shape = (rois, indices)
+ */
+template<typename E, typename M, EnableIf<E, IsImageArray> = false, EnableIf<M, IsImageMask> = false>
+inline auto roiFoms(const E& src, const M& image_mask, double lb, double ub,
+                    const std::vector<std::array<int, 4>>& rects,
+                    const std::vector<int>& fom_types)
+{
+  return detail::roiFomsImp(src, &image_mask, lb, ub, rects, fom_types);
+}
+
+/**
+ * Calculate the FOMs of multiple rectangular ROIs in an array of images.
+ *
+ * @param src: array of images. Shape = (indices, y, x)
+ * @param lb: lower threshold.
+ * @param ub: upper threshold.
+ * @param rects: ROI rectangles in the form of (x, y, w, h).
+ * @param fom_types: FOM type of each ROI.
+ *
+ * @return: FOMs. Shape = (rois, indices)
+ */
+template<typename E, EnableIf<E, IsImageArray> = false>
+inline auto roiFoms(const E& src, double lb, double ub,
+                    const std::vector<std::array<int, 4>>& rects,
+                    const std::vector<int>& fom_types)
+{
+  using mask_type = xt::xtensor<bool, 2>;
+  return detail::roiFomsImp(src, static_cast<const mask_type*>(nullptr), lb, ub, rects, fom_types);
+}
+
+/**
+ * Calculate the moments of every ASIC of every module over a train.
+ *
+ * Each ASIC is reduced over all the pulses in a single pass with Welford's
+ * algorithm. The ASICs are processed in parallel. Pixels which are nan are
+ * ignored.
+ *
+ * @param src: multi-pulse, multi-module data. Shape = (memory cells, modules, y, x)
+ * @param asic_shape: shape (y, x) of an ASIC.
+ * @param saturation: pixels with values not less than it are counted as
+ *                    saturated.
+ *
+ * @return: (count, mean, sum of squared deviations, number of saturated
+ *          pixels) of each ASIC. Shape = (modules, asics in y, asics in x, 4)
+ */
+template<typename E, EnableIf<E, IsModulesArray> = false>
+inline auto asicMoments(const E& src, const std::array<int, 2>& asic_shape, double saturation)
+{
+  auto shape = src.shape();
+  return detail::asicMomentsImp(
+    [&src] (std::size_t m, std::size_t p, std::size_t j, std::size_t k) { return src(p, m, j, k); },
+    shape[1], shape[0], shape[2], shape[3], asic_shape, saturation);
+}
+
+/**
+ * Calculate the moments of every ASIC of every module over a train.
+ *
+ * @param src: a vector of module data. Shape of each = (memory cells, y, x)
+ * @param asic_shape: shape (y, x) of an ASIC.
+ * @param saturation: pixels with values not less than it are counted as
+ *                    saturated.
+ *
+ * @return: (count, mean, sum of squared deviations, number of saturated
+ *          pixels) of each ASIC. Shape = (modules, asics in y, asics in x, 4)
+ */
+template<typename E, EnableIf<E, IsImageArray> = false>
+inline auto asicMoments(const std::vector<E>& src, const std::array<int, 2>& asic_shape,
+                        double saturation)
+{
+  if (src.empty()) throw std::invalid_argument("Empty module data!");
+
+  auto shape = src[0].shape();
+  for (const auto& module : src)
+  {
+    auto ms = module.shape();
+    if (ms[0] != shape[0] || ms[1] != shape[1] || ms[2] != shape[2])
+      throw std::invalid_argument("Modules have different shapes!");
+  }
+
+  return detail::asicMomentsImp(
+    [&src] (std::size_t m, std::size_t p, std::size_t j, std::size_t k) { return src[m](p, j, k); },
+    src.size(), shape[0], shape[1], shape[2], asic_shape, saturation);
+}
+
 } // foam
 
 
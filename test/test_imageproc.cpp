@@ -393,5 +393,61 @@ TEST(correctImageData, TestGainOffset2D)
   EXPECT_THAT(img, ElementsAre(nan_mt, -2.f, nan_mt, -1.f, 0.f, -2.f));
 }
 
+TEST(downsampleImage, TestGeneral)
+{
+  xt::xtensor<float, 2> img {{1.f, 2.f, 3.f, 4.f, 5.f},
+                             {3.f, nan, 5.f, 6.f, 7.f},
+                             {nan, nan, 1.f, 1.f, 2.f}};
+
+  EXPECT_THROW(downsampleImage(img, 0), std::invalid_argument);
+
+  EXPECT_THAT(downsampleImage(img, 1), ElementsAre(1.f, 2.f, 3.f, 4.f, 5.f,
+                                                   3.f, nan_mt, 5.f, 6.f, 7.f,
+                                                   nan_mt, nan_mt, 1.f, 1.f, 2.f));
+
+  auto ds = downsampleImage(img, 2);
+  EXPECT_THAT(ds.shape(), ElementsAre(2, 3));
+  EXPECT_THAT(ds, ElementsAre(2.f, 4.5f, 6.f, nan_mt, 1.f, 2.f));
+
+  auto ds3 = downsampleImage(img, 3);
+  EXPECT_THAT(ds3, ElementsAre(2.5f, 25.f / 6));
+
+  xt::xtensor<uint16_t, 2> img_int {{1, 2}, {3, 5}};
+  auto ds_int = downsampleImage(img_int, 2);
+  static_assert(std::is_same<decltype(ds_int)::value_type, float>::value, "");
+  EXPECT_THAT(ds_int, ElementsAre(2.75f));
+}
+
+TEST(mapImageToColor, TestGeneral)
+{
+  xt::xtensor<uint32_t, 1> lut {10, 11, 12, 13};
+  uint32_t nan_color = 0;
+
+  xt::xtensor<float, 2> img {{-1.f, 0.f, 0.9f, 1.f}, {2.9f, 3.9f, 4.f, 100.f}};
+  xt::xtensor<uint32_t, 2> out = xt::zeros<uint32_t>({2, 4});
+  mapImageToColor(img, 0., 4., lut, nan_color, out);
+  EXPECT_THAT(out, ElementsAre(10, 10, 10, 11, 12, 13, 13, 13));
+
+  // nan and inf
+  img(0, 0) = nan;
+  img(0, 1) = std::numeric_limits<float>::infinity();
+  img(0, 2) = -std::numeric_limits<float>::infinity();
+  mapImageToColor(img, 0., 4., lut, nan_color, out);
+  EXPECT_THAT(xt::view(out, 0, xt::all()), ElementsAre(0, 13, 10, 11));
+
+  // degenerated levels
+  xt::xtensor<uint16_t, 2> img_int {{1, 2}, {3, 2}};
+  xt::xtensor<uint32_t, 2> out_int = xt::zeros<uint32_t>({2, 2});
+  mapImageToColor(img_int, 2., 2., lut, nan_color, out_int);
+  EXPECT_THAT(out_int, ElementsAre(10, 10, 13, 10));
+
+  // shape mismatch
+  xt::xtensor<uint32_t, 2> out_wrong = xt::zeros<uint32_t>({2, 3});
+  EXPECT_THROW(mapImageToColor(img, 0., 4., lut, nan_color, out_wrong), std::invalid_argument);
+
+  xt::xtensor<uint32_t, 1> empty_lut = xt::zeros<uint32_t>({0});
+  EXPECT_THROW(mapImageToColor(img, 0., 4., empty_lut, nan_color, out), std::invalid_argument);
+}
+
 } // test
 } // foam
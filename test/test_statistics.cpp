@@ -7,6 +7,10 @@
  * Copyright (C) European X-Ray Free-Electron Laser Facility GmbH.
  * All rights reserved.
  */
+#include <array>
+#include <cmath>
+#include <vector>
+
 #include "gtest/gtest.h"
 #include "gmock/gmock.h"
 
@@ -25,5 +29,176 @@ using ::testing::ElementsAreArray;
 using ::testing::NanSensitiveFloatEq;
 using ::testing::FloatEq;
 
+static constexpr auto nan = std::numeric_limits<float>::quiet_NaN();
+static constexpr auto inf = std::numeric_limits<float>::infinity();
+static const auto nan_mt = NanSensitiveFloatEq(nan);
+
+TEST(TestHistOuterEdges, TestGeneral)
+{
+  EXPECT_THAT(histOuterEdges(-1.5, 2.5, 4, 1., 4.), ElementsAre(-1.5, 2.5));
+  EXPECT_THAT(histOuterEdges(-inf, inf, 4, 1., 4.), ElementsAre(1., 4.));
+  EXPECT_THAT(histOuterEdges(-inf, inf, 4, 1., 1.), ElementsAre(0.5, 1.5));
+  EXPECT_THAT(histOuterEdges(-inf, inf, 0, inf, -inf), ElementsAre(-0.5, 0.5));
+  EXPECT_THAT(histOuterEdges(3., inf, 2, 3., 4.), ElementsAre(3., 4.));
+  EXPECT_THAT(histOuterEdges(5., inf, 0, inf, -inf), ElementsAre(5., 6.));
+  EXPECT_THAT(histOuterEdges(-inf, 1., 1, 1., 1.), ElementsAre(0., 1.));
+  EXPECT_THAT(histOuterEdges(-inf, 0., 0, inf, -inf), ElementsAre(-1., 0.));
+
+  EXPECT_THROW(histOuterEdges(1., 1., 1, 1., 1.), std::invalid_argument);
+  EXPECT_THROW(histOuterEdges(-inf, inf, 2, -inf, 1.), std::invalid_argument);
+  EXPECT_THROW(histOuterEdges(0., inf, 2, 1., inf), std::invalid_argument);
+}
+
+TEST(TestNanhistWithStats, TestGeneral)
+{
+  xt::xtensor<float, 2> roi {{nan, 1.f, 2.f}, {3.f, 6.f, nan}};
+  auto ret = nanhistWithStats(roi, 1., 3., 4);
+  EXPECT_THAT(std::get<0>(ret), ElementsAre(1, 0, 1, 1));
+  EXPECT_THAT(std::get<1>(ret), ElementsAre(1.25, 1.75, 2.25, 2.75));
+  EXPECT_DOUBLE_EQ(2., std::get<2>(ret));
+  EXPECT_DOUBLE_EQ(2., std::get<3>(ret));
+  EXPECT_DOUBLE_EQ(std::sqrt(2. / 3.), std::get<4>(ret));
+
+  // empty after filtering
+  xt::xtensor<float, 2> roi_empty {{nan, 0.f, 0.f}, {0.f, 0.f, nan}};
+  auto ret_empty = nanhistWithStats(roi_empty, 1., 3., 4);
+  EXPECT_THAT(std::get<0>(ret_empty), ElementsAre(0, 0, 0, 0));
+  EXPECT_TRUE(std::isnan(std::get<2>(ret_empty)));
+  EXPECT_TRUE(std::isnan(std::get<3>(ret_empty)));
+  EXPECT_TRUE(std::isnan(std::get<4>(ret_empty)));
+
+  // 3D input with even number of elements
+  xt::xtensor<double, 3> rois {{{nan, 1., 2.}, {3., 6., nan}},
+                               {{nan, 0., 1.}, {2., 5., nan}}};
+  auto ret3d = nanhistWithStats(rois, -inf, inf, 3);
+  EXPECT_THAT(std::get<0>(ret3d), ElementsAre(3, 3, 2));
+  EXPECT_THAT(std::get<1>(ret3d), ElementsAre(1., 3., 5.));
+  EXPECT_DOUBLE_EQ(2., std::get<3>(ret3d));
+
+  // finite outer edges cannot be found
+  xt::xtensor<float, 1> vec {-inf, nan, 3.f, 5.f};
+  EXPECT_THROW(nanhistWithStats(vec, -inf, inf, 4), std::invalid_argument);
+}
+
+TEST(TestImageHistogram, TestGeneral)
+{
+  xt::xtensor<float, 2> img {{0.f, 1.f, nan, 4.f}, {2.f, 3.f, 4.f, nan}};
+
+  auto ret = imageHistogram(img, 4);
+  EXPECT_THAT(std::get<0>(ret), ElementsAre(1, 1, 1, 3));
+  EXPECT_EQ(0., std::get<1>(ret));
+  EXPECT_EQ(4., std::get<2>(ret));
+
+  // all the values are the same
+  xt::xtensor<double, 2> img_c {{nan, 1.}, {1., 1.}};
+  ret = imageHistogram(img_c, 2);
+  EXPECT_THAT(std::get<0>(ret), ElementsAre(0, 3));
+  EXPECT_EQ(0.5, std::get<1>(ret));
+  EXPECT_EQ(1.5, std::get<2>(ret));
+
+  // all-nan
+  xt::xtensor<float, 2> img_nan {{nan, nan}};
+  ret = imageHistogram(img_nan, 2);
+  EXPECT_THAT(std::get<0>(ret), ElementsAre(0, 0));
+  EXPECT_TRUE(std::isnan(std::get<1>(ret)));
+  EXPECT_TRUE(std::isnan(std::get<2>(ret)));
+
+  EXPECT_THROW(imageHistogram(img, 0), std::invalid_argument);
+}
+
+TEST(TestNanVar, TestAllAxes)
+{
+  xt::xtensor<float, 2> a {{nan, 1.f, 2.f}, {3.f, 6.f, nan}};
+  // mean = 3, var = (4 + 1 + 0 + 9) / 4
+  EXPECT_FLOAT_EQ(3.5f, nanVar(a));
+  EXPECT_FLOAT_EQ(3.5f / 9.f, nanVar(a, true));
+  EXPECT_FLOAT_EQ(std::sqrt(3.5f), nanStd(a));
+  EXPECT_FLOAT_EQ(std::sqrt(3.5f) / 3.f, nanStd(a, true));
+
+  xt::xtensor<double, 1> b {nan, nan};
+  EXPECT_TRUE(std::isnan(nanVar(b)));
+  EXPECT_TRUE(std::isnan(nanStd(b, true)));
+}
+
+TEST(TestNanVar, TestWithAxis)
+{
+  xt::xtensor<float, 3> a {{{nan, nan, 2.f}, {3.f, 6.f, nan}},
+                           {{1.f, 4.f, nan}, {6.f, 2.f, nan}}};
+
+  EXPECT_THAT(nanVar(a, std::vector<int>{-2, -1}), ElementsAre(FloatEq(26.f / 9.f), FloatEq(3.6875f)));
+  EXPECT_THAT(nanStd(a, std::vector<int>{1, 2}, true),
+              ElementsAre(FloatEq(std::sqrt(26.f / 9.f) / (11.f / 3.f)), FloatEq(std::sqrt(3.6875f) / 3.25f)));
+
+  EXPECT_THAT(nanVar(a, std::vector<int>{0}),
+              ElementsAre(0.f, 0.f, 0.f, FloatEq(2.25f), 4.f, nan_mt));
+
+  EXPECT_THROW(nanVar(a, std::vector<int>{3}), std::invalid_argument);
+  EXPECT_THROW(nanVar(a, std::vector<int>{1, -2}), std::invalid_argument);
+}
+
+TEST(TestRoiFoms, TestGeneral)
+{
+  xt::xtensor<float, 3> imgs {{{1.f, 2.f, 3.f, 4.f}, {5.f, nan, 7.f, 8.f}, {9.f, 10.f, 11.f, 12.f}},
+                              {{nan, nan, nan, nan}, {nan, nan, nan, nan}, {nan, nan, nan, nan}}};
+  std::vector<std::array<int, 4>> rects {{1, 0, 2, 2}, {1, 0, 2, 2}, {1, 0, 2, 2}, {1, 0, 2, 2},
+                                         {1, 0, 2, 2}, {1, 0, 2, 2}, {0, 1, 4, 2}};
+  std::vector<int> types {1, 2, 3, 4, 5, 7, 1};
+
+  // valid pixels in the first ROI: 2, 3, 7
+  auto foms = roiFoms(imgs, -inf, inf, rects, types);
+  EXPECT_THAT(foms.shape(), ElementsAre(7, 2));
+  EXPECT_THAT(foms, ElementsAre(12.f, 0.f, 4.f, nan_mt, 3.f, nan_mt, 7.f, nan_mt, 2.f, nan_mt,
+                                FloatEq(14.f / 3.f), nan_mt, 62.f, 0.f));
+
+  // valid pixels in the first ROI: 3, 7
+  foms = roiFoms(imgs, 2.5, 10., rects, types);
+  EXPECT_THAT(foms, ElementsAre(10.f, 0.f, 5.f, nan_mt, 5.f, nan_mt, 7.f, nan_mt, 3.f, nan_mt,
+                                4.f, nan_mt, 39.f, 0.f));
+
+  // valid pixels in the first ROI: 2, 3
+  xt::xtensor<bool, 2> mask {{false, false, false, false}, {false, false, true, false},
+                             {false, false, false, true}};
+  foms = roiFoms(imgs, mask, -inf, inf, rects, types);
+  EXPECT_THAT(foms, ElementsAre(5.f, 0.f, 2.5f, nan_mt, 2.5f, nan_mt, 3.f, nan_mt, 2.f, nan_mt,
+                                0.25f, nan_mt, 43.f, 0.f));
+
+  EXPECT_THROW(roiFoms(imgs, -inf, inf, {{3, 0, 2, 2}}, {1}), std::invalid_argument);
+  EXPECT_THROW(roiFoms(imgs, -inf, inf, {{0, 2, 2, 2}}, {1}), std::invalid_argument);
+  EXPECT_THROW(roiFoms(imgs, -inf, inf, {{0, 0, 2, 2}}, {8}), std::invalid_argument);
+  EXPECT_THROW(roiFoms(imgs, -inf, inf, {{0, 0, 2, 2}}, {1, 2}), std::invalid_argument);
+}
+
+TEST(TestAsicMoments, TestGeneral)
+{
+  // 2 pulses, 2 modules, each module has 1 x 2 ASICs of shape (2, 2)
+  xt::xtensor<float, 4> modules {{{{1.f, 2.f, 5.f, 5.f}, {3.f, 4.f, 5.f, 5.f}},
+                                  {{nan, nan, nan, nan}, {nan, nan, nan, nan}}},
+                                 {{{5.f, 6.f, nan, nan}, {7.f, 8.f, nan, nan}},
+                                  {{nan, nan, nan, nan}, {nan, nan, nan, 10.f}}}};
+
+  auto nan_d = ::testing::NanSensitiveDoubleEq(nan);
+  auto moments = asicMoments(modules, {2, 2}, 5.f);
+  EXPECT_THAT(moments.shape(), ElementsAre(2, 1, 2, 4));
+  EXPECT_THAT(moments, ElementsAre(8., 4.5, 42., 4.,
+                                   4., 5., 0., 4.,
+                                   0., nan_d, 0., 0.,
+                                   1., 10., 0., 1.));
+
+  std::vector<xt::xtensor<float, 3>> modules_vec {
+    {{{1.f, 2.f, 5.f, 5.f}, {3.f, 4.f, 5.f, 5.f}}, {{5.f, 6.f, nan, nan}, {7.f, 8.f, nan, nan}}},
+    {{{nan, nan, nan, nan}, {nan, nan, nan, nan}}, {{nan, nan, nan, nan}, {nan, nan, nan, 10.f}}}
+  };
+  EXPECT_THAT(asicMoments(modules_vec, {2, 2}, 5.f), ElementsAre(8., 4.5, 42., 4.,
+                                                                 4., 5., 0., 4.,
+                                                                 0., nan_d, 0., 0.,
+                                                                 1., 10., 0., 1.));
+
+  EXPECT_THROW(asicMoments(modules, {3, 2}, 5.f), std::invalid_argument);
+  EXPECT_THROW(asicMoments(modules, {2, 0}, 5.f), std::invalid_argument);
+  modules_vec.pop_back();
+  modules_vec.emplace_back(xt::xtensor<float, 3>({1, 2, 4}, 0.f));
+  EXPECT_THROW(asicMoments(modules_vec, {2, 2}, 5.f), std::invalid_argument);
+}
+
 } //test
 } //foam
\ No newline at end of file